@@ -1,8 +1,18 @@
 import os
+import re
+import sys
+import glob
+import mmap
 import datetime
+import tempfile
+import multiprocessing
+import numpy
 import bernutils.geodesy
+import bernutils.report
 
-class FullStationRecord:
+__DEBUG_MODE__ = False
+
+class FullStationRecord(object):
   ''' This is just a helper class; it iis meant to hold a full, station solution
       info record block, with all relevant information from an ADDNEQ output
       file. These inlude (per station), cartesian and ellipsoidal coordinates
@@ -12,8 +22,19 @@ class FullStationRecord:
 
       Each ``FullStationRecord`` should totally represent a station included in
       the adjustment.
+
+      .. note:: Instances use ``__slots__`` (no per-instance dictionary) and
+        all numeric values are converted to ``float`` once, at construction.
+        For batch (columnar) access to many records, see :func:`station_table`.
   '''
 
+  __slots__ = ('__name', '__aa', '__obs', '__adjt',
+    '__xapr', '__yapr', '__zapr', '__latapr', '__lonapr', '__hgtapr',
+    '__xest', '__xcor', '__xrms', '__yest', '__ycor', '__yrms',
+    '__zest', '__zcor', '__zrms', '__uest', '__ucor', '__urms',
+    '__nest', '__ncor', '__nrms', '__eest', '__ecor', '__erms',
+    '__dn', '__de', '__du')
+
   def __init__(self, _name, _list):
     ''' Constructor; this is not **at all** handy, but is useful when we need it
         the most, i.e. see function :fun:`toHtml`. To initialize an instance, all
@@ -46,82 +67,82 @@ class FullStationRecord:
     self.__aa     = _list[0]
     self.__obs    = _list[1]
     self.__adjt   = _list[2]
-    self.__xapr   = _list[3]
-    self.__yapr   = _list[4]
-    self.__zapr   = _list[5]
-    self.__latapr = _list[6]
-    self.__lonapr = _list[7]
-    self.__hgtapr = _list[8]
-
-    xapr2  = _list[9][0]
+    self.__xapr   = float(_list[3])
+    self.__yapr   = float(_list[4])
+    self.__zapr   = float(_list[5])
+    self.__latapr = float(_list[6])
+    self.__lonapr = float(_list[7])
+    self.__hgtapr = float(_list[8])
+
+    xapr2  = float(_list[9][0])
     if xapr2 != self.__xapr:
       raise RuntimeError('Incompatible station info for station %s (x)' %self.__name)
-    self.__xest   = _list[9][1]
-    self.__xcor   = _list[9][2]
-    self.__xrms   = _list[9][3]
+    self.__xest   = float(_list[9][1])
+    self.__xcor   = float(_list[9][2])
+    self.__xrms   = float(_list[9][3])
 
-    yapr2  = _list[10][0]
+    yapr2  = float(_list[10][0])
     if yapr2 != self.__yapr:
       raise RuntimeError('Incompatible station info for station %s (y)' %self.__name)
-    self.__yest   = _list[10][1]
-    self.__ycor   = _list[10][2]
-    self.__yrms   = _list[10][3]
+    self.__yest   = float(_list[10][1])
+    self.__ycor   = float(_list[10][2])
+    self.__yrms   = float(_list[10][3])
 
-    zapr2  = _list[11][0]
+    zapr2  = float(_list[11][0])
     if zapr2 != self.__zapr:
       raise RuntimeError('Incompatible station info for station %s (z)' %self.__name)
-    self.__zest   = _list[11][1]
-    self.__zcor   = _list[11][2]
-    self.__zrms   = _list[11][3]
+    self.__zest   = float(_list[11][1])
+    self.__zcor   = float(_list[11][2])
+    self.__zrms   = float(_list[11][3])
 
-    uapr2  = _list[12][0]
+    uapr2  = float(_list[12][0])
     if uapr2 != self.__hgtapr:
       raise RuntimeError('Incompatible station info for station %s (h)' %self.__name)
-    self.__uest   = _list[12][1]
-    self.__ucor   = _list[12][2]
-    self.__urms   = _list[12][3]
+    self.__uest   = float(_list[12][1])
+    self.__ucor   = float(_list[12][2])
+    self.__urms   = float(_list[12][3])
 
-    napr2  = _list[13][0]
+    napr2  = float(_list[13][0])
     if napr2 != self.__latapr:
       raise RuntimeError('Incompatible station info for station %s (lat)' %self.__name)
-    self.__nest   = _list[13][1]
-    self.__ncor   = _list[13][2]
-    self.__nrms   = _list[13][3]
+    self.__nest   = float(_list[13][1])
+    self.__ncor   = float(_list[13][2])
+    self.__nrms   = float(_list[13][3])
 
-    eapr2  = _list[14][0]
+    eapr2  = float(_list[14][0])
     if eapr2 != self.__lonapr:
       raise RuntimeError('Incompatible station info for station %s (lon)' %self.__name)
-    self.__eest   = _list[14][1]
-    self.__ecor   = _list[14][2]
-    self.__erms   = _list[14][3]
+    self.__eest   = float(_list[14][1])
+    self.__ecor   = float(_list[14][2])
+    self.__erms   = float(_list[14][3])
 
     ## TODO what ellipsoid ?? which is the reference point ??
     self.__dn, self.__de, self.__du = bernutils.geodesy.cartesian2topocentric(self.__xapr, self.__yapr, self.__zapr, self.__xest, self.__yest, self.__zest)
 
-  def xest(self)  : return float(self.__xest)
-  def xapr(self)  : return float(self.__xapr)
-  def xcor(self)  : return float(self.__xcor)
-  def xrms(self)  : return float(self.__xrms)
-  def yest(self)  : return float(self.__yest)
-  def yapr(self)  : return float(self.__yapr)
-  def ycor(self)  : return float(self.__ycor)
-  def yrms(self)  : return float(self.__yrms)
-  def zest(self)  : return float(self.__zest)
-  def zapr(self)  : return float(self.__zapr)
-  def zcor(self)  : return float(self.__zcor)
-  def zrms(self)  : return float(self.__zrms)
-  def latest(self): return float(self.__nest)
-  def latapr(self): return float(self.__latapr)
-  def latcor(self): return float(self.__ncor)
-  def latrms(self): return float(self.__nrms)
-  def lonest(self): return float(self.__eest)
-  def lonapr(self): return float(self.__lonapr)
-  def loncor(self): return float(self.__ecor)
-  def lonrms(self): return float(self.__erms)
-  def hgtest(self): return float(self.__uest)
-  def hgtapr(self): return float(self.__hgtapr)
-  def hgtcor(self): return float(self.__ucor)
-  def hgtrms(self): return float(self.__urms)
+  def xest(self)  : return self.__xest
+  def xapr(self)  : return self.__xapr
+  def xcor(self)  : return self.__xcor
+  def xrms(self)  : return self.__xrms
+  def yest(self)  : return self.__yest
+  def yapr(self)  : return self.__yapr
+  def ycor(self)  : return self.__ycor
+  def yrms(self)  : return self.__yrms
+  def zest(self)  : return self.__zest
+  def zapr(self)  : return self.__zapr
+  def zcor(self)  : return self.__zcor
+  def zrms(self)  : return self.__zrms
+  def latest(self): return self.__nest
+  def latapr(self): return self.__latapr
+  def latcor(self): return self.__ncor
+  def latrms(self): return self.__nrms
+  def lonest(self): return self.__eest
+  def lonapr(self): return self.__lonapr
+  def loncor(self): return self.__ecor
+  def lonrms(self): return self.__erms
+  def hgtest(self): return self.__uest
+  def hgtapr(self): return self.__hgtapr
+  def hgtcor(self): return self.__ucor
+  def hgtrms(self): return self.__urms
   def adjtp(self) : return self.__adjt
   def north(self) : return self.__dn
   def east(self)  : return self.__de
@@ -192,14 +213,67 @@ html_header_dict = { 'x': 'X',
   'du'    : 'dUp'
 }
 
+STATION_TABLE_FIELDS = ['x', 'xapr', 'xcor', 'xrms', 'y', 'yapr', 'ycor', 'yrms',
+  'z', 'zapr', 'zcor', 'zrms', 'lat', 'latapr', 'latcor', 'latrms', 'lon',
+  'lonapr', 'loncor', 'lonrms', 'hgt', 'hgtapr', 'hgtcor', 'hgtrms', 'dn', 'de',
+  'du']
+''' The (float) columns of a station table (see :func:`station_table`); the
+    names match the keys of ``func_dict``.
+'''
+
+def station_table(mdict):
+  ''' Transform a dictionary of ``FullStationRecord`` instances to a (columnar)
+      numpy structured array, with one row per station. The array has the
+      fields ``station``, ``adj`` and all fields in ``STATION_TABLE_FIELDS``,
+      so that e.g. ``numpy.abs(table['dn']) > .005`` checks all stations at
+      once.
+
+      :param mdict: A dictionary with key = station name and value the
+        corresponding ``FullStationRecord`` instance (see
+        :func:`AddneqFile.full_station_records`).
+
+      :returns: A numpy structured array; rows follow the iteration order of
+        ``mdict``.
+  '''
+  max_name = max([ len(sta) for sta in mdict ] or [1])
+  dtype = [('station', 'S%i' %max_name), ('adj', 'S8')] \
+    + [ (field, float) for field in STATION_TABLE_FIELDS ]
+  funcs = [ func_dict[field] for field in STATION_TABLE_FIELDS ]
+  rows  = [ (sta, val.adjtp()) + tuple([ f(val) for f in funcs ]) for sta, val in mdict.iteritems() ]
+  return numpy.array(rows, dtype=dtype)
+
+SECTION_HEADERS = [
+  ('apriori',     r' A PRIORI INFORMATION$'),
+  ('constraints', r'[ \t]*Network constraints:[ \t]*$'),
+  ('nq_files',    r' INPUT NORMAL EQUATION FILES$'),
+  ('nq_info',     r' Main characteristics of normal equation files:$'),
+  ('summary',     r' SUMMARY OF RESULTS$'),
+  ('coordinates', r' Station coordinates and velocities:$'),
+  ('apriori_crd', r' A priori station coordinates:')
+]
+''' The section headers (of an ADDNEQ2 output file) recorded by the indexer, as
+    a list of ``(key, regular_expression)``. Each expression is matched at the
+    start of a line.
+'''
+
+__SECTION_RE__ = re.compile('|'.join([ '^(?P<%s>%s)' %(k, r) for k, r in SECTION_HEADERS ]), re.MULTILINE)
+
 class AddneqFile:
   ''' A class to hold ADDNEQ2 output/summary files.
+
+      .. note:: The first time any of the section accessors is called, the
+        whole file is scanned (once) and the byte offset of every header in
+        ``SECTION_HEADERS`` is recorded; all accessors then seek directly to
+        their section. Parsed results are memoized on the instance, so that
+        e.g. :func:`toHtml` and :func:`warnings` do not re-read the file.
   '''
 
   def __init__(self, filen):
     if not os.path.isfile(filen):
       raise RuntimeError('Cannot find ADDNEQ2 file [%s]' %filen)
     self.__filename = filen
+    self.__sections = None
+    self.__memo     = {}
     self.read_header()
 
   def read_header(self):
@@ -266,16 +340,72 @@ class AddneqFile:
   def run_at(self):   return self.__run_at
   def run_by(self):   return self.__user
 
+  def __index_sections__(self):
+    ''' Scan the file (once) and record the byte offsets of all section headers
+        listed in ``SECTION_HEADERS``.
+
+        :returns: A dictionary with key the section key (see ``SECTION_HEADERS``)
+          and value a (sorted) list of offsets, one for every occurance of the
+          header in the file.
+    '''
+    if self.__sections is not None:
+      return self.__sections
+
+    sections = dict([ (k, []) for k, r in SECTION_HEADERS ])
+    if os.path.getsize(self.__filename) > 0:
+      with open(self.__filename, 'rb') as fin:
+        buf = mmap.mmap(fin.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+          for m in __SECTION_RE__.finditer(buf):
+            sections[m.lastgroup].append(m.start())
+        finally:
+          buf.close()
+
+    self.__sections = sections
+    return sections
+
+  def __section_offsets__(self, key, after=-1):
+    ''' Return the (list of) offsets of the section ``key`` located after the
+        offset ``after``.
+    '''
+    return [ i for i in self.__index_sections__()[key] if i > after ]
+
+  def __seek_section__(self, fin, key, after=-1):
+    ''' Position the (open) file ``fin`` at the first occurance of the section
+        ``key`` located after the offset ``after`` and read the header line.
+
+        :returns: The header line, or an empty string if no such section exists.
+    '''
+    offsets = self.__section_offsets__(key, after)
+    if not len(offsets):
+      return ''
+    fin.seek(offsets[0])
+    return fin.readline()
+
+  def __memoized__(self, key, func):
+    ''' Return the memoized result of ``func`` (stored under ``key``); call
+        it if it has not been called before.
+    '''
+    if key not in self.__memo:
+      self.__memo[key] = func()
+    return self.__memo[key]
+
   def apriori_info(self):
+    ''' Collect a-priori information, i.e. a-priori sigma of unit weight,
+        reference frame and the network constraints.
+
+        :returns: A tuple ``(apr_sigma, ref_frame, adj_cmp)``, where ``adj_cmp``
+          is a list of ``[param, sigma, unit]`` entries.
+    '''
+    apr_sigma, ref_frame, adj_cmp = self.__memoized__('apriori_info', self.__apriori_info__)
+    return apr_sigma, ref_frame, [ list(i) for i in adj_cmp ]
+
+  def __apriori_info__(self):
 
     with open(self.__filename, 'r') as fin:
 
       ## 
-      line = fin.readline()
-      while line:
-        if line == ' A PRIORI INFORMATION\n':
-          break
-        line = fin.readline()
+      line = self.__seek_section__(fin, 'apriori')
 
       if not line:
         raise RuntimeError('Cannot find a-priori Information for file %s (1)' %self.__filename)
@@ -297,11 +427,7 @@ class AddneqFile:
       if lns[1] != 'A' or lns[2] != '=' or lns[5] != 'DX':
         raise RuntimeError('Cannot find a-priori Information for file %s (4)' %self.__filename)
 
-      line = fin.readline()
-      while line:
-        if line.strip() == 'Network constraints:':
-          break
-        line = fin.readline()
+      line = self.__seek_section__(fin, 'constraints', fin.tell() - 1)
 
       if not line:
         raise RuntimeError('Cannot find a-priori Information for file %s (5)' %self.__filename)
@@ -367,15 +493,15 @@ class AddneqFile:
             4 ['${P}/GREECE/SOL/FFG0540004.NQ0', datetime.datetime(2012, 2, 23, 0, 0), datetime.datetime(2012, 2, 24, 0, 0), 19665, 378, 19287]
 
     '''
+    nq_dict = self.__memoized__('nq_files', self.__get_nq_files__)
+    return dict([ (k, list(v)) for k, v in nq_dict.iteritems() ])
+
+  def __get_nq_files__(self):
 
     with open(self.__filename, 'r') as fin:
 
       ## find the start of the block
-      line = fin.readline()
-      while line:
-        if line == ' INPUT NORMAL EQUATION FILES\n':
-          break
-        line = fin.readline()
+      line = self.__seek_section__(fin, 'nq_files')
 
       if not line:
         raise RuntimeError('Cannot find Normal Equation Information for file %s (1)' %self.__filename)
@@ -392,12 +518,8 @@ class AddneqFile:
         nq_file_list[int(lns[0])] = lns[1]
         line = fin.readline()
 
-      ## keep on reading untill next block
-      line = fin.readline()
-      while line:
-        if line == ' Main characteristics of normal equation files:\n':
-          break
-        line = fin.readline()
+      ## go to the next block
+      line = self.__seek_section__(fin, 'nq_info', fin.tell() - 1)
 
       if not line:
         raise RuntimeError('Cannot find Normal Equation Information for file %s (2)' %self.__filename)
@@ -516,24 +638,35 @@ class AddneqFile:
           ]
 
     '''
+    return dict(self.__memoized__('station_coordinates', self.__get_station_coordinates__)[1])
+
+  def reference_epoch(self):
+    ''' Return the reference epoch (as ``datetime``) of the estimated station
+        coordinates (see :func:`get_station_coordinates`).
+    '''
+    return self.__memoized__('station_coordinates', self.__get_station_coordinates__)[0]
+
+  def __get_station_coordinates__(self):
+
     with open(self.__filename, 'r') as fin:
 
       ##  find the start of the block
       ##  WARNING There is one more than one block starting with the string:
       ##+ 'Station coordinates and velocities:\n', so we need to make sure we
       ##+ get to the right one!. The one we want, is at the section:
-      ##+ ' SUMMARY OF RESULTS', but it not he first one!
-      sumary_of_results_found = False
-      line = fin.readline()
-      while line:
-        if line == ' Station coordinates and velocities:\n' and sumary_of_results_found == True:
+      ##+ ' SUMMARY OF RESULTS', but it not he first one! It is the one
+      ##+ followed (two lines below) by the reference epoch.
+      line = ''
+      summary = self.__section_offsets__('summary')
+      if len(summary):
+        for offset in self.__section_offsets__('coordinates', summary[0]):
+          fin.seek(offset)
+          line = fin.readline()
           line = fin.readline()
           line = fin.readline()
           if len(line.split()) == 4:
             break
-        if line == ' SUMMARY OF RESULTS\n':
-          sumary_of_results_found = True
-        line = fin.readline()
+          line = ''
 
       if not line:
         raise RuntimeError('Cannot find Station Information for file %s (1)' %self.__filename)
@@ -566,7 +699,7 @@ class AddneqFile:
         line = fin.readline()
         block= []
 
-    return ret_dict
+    return reference_epoch, ret_dict
 
   def get_apriori_coordinates(self):
     '''Collect coordinates and other information of from a block of type: ::
@@ -588,14 +721,14 @@ class AddneqFile:
           collected information, i.e. a list of type: [num, obs, adjt, x, y, z, lat, lon, hgt]
 
     '''
+    return dict(self.__memoized__('apriori_coordinates', self.__get_apriori_coordinates__))
+
+  def __get_apriori_coordinates__(self):
+
     sta_dict = {}
 
     with open(self.__filename, 'r') as fin:
-      line = fin.readline()
-      while line:
-        if line[0:len('  A priori station coordinates:')-1] == ' A priori station coordinates:':
-          break
-        line = fin.readline()
+      line = self.__seek_section__(fin, 'apriori_crd')
       if not line:
         raise RuntimeError('Cannot find A-priori Station Information for file %s (1)' %self.__filename)
 
@@ -634,7 +767,29 @@ class AddneqFile:
 
     return sta_dict
 
-  def warnings(self, format_str, html_output=False, mdict=None):
+  def full_station_records(self):
+    ''' Combine the a-priori and estimated station coordinates (see
+        :func:`get_apriori_coordinates` and :func:`get_station_coordinates`)
+        into a single dictionary.
+
+        :returns: A dictionary with key = station name and value the
+          corresponding ``FullStationRecord`` instance.
+    '''
+    return dict(self.__memoized__('full_station_records', self.__full_station_records__))
+
+  def __full_station_records__(self):
+    lst1  = self.get_station_coordinates() ## in the old days, this was a list!
+    dict1 = self.get_apriori_coordinates()
+
+    ##  combine into a single dictionary, with name as key
+    ##+ and values of type FullStationRecord
+    ret_dict = {}
+    for key, val in dict1.iteritems():
+      ret_dict[key] = FullStationRecord(key, val + lst1[key])
+
+    return ret_dict
+
+  def warnings(self, format_str, html_output=False, mdict=None, writer=None):
     ''' This function will output warning messages depending on criteria given as
         input. The output can be formated as html or plain text.
 
@@ -658,54 +813,48 @@ class AddneqFile:
           elements from the ``mdict`` dictionary. This dictionary should have
           key = stations name and value = corresponding FullStationRecord instance.
 
+        :param writer: (Optional) A report writer (see ``bernutils.report``) to
+          write the warnings to (as part of a larger report). If not set, a
+          (complete) html document or plain text is written to stdout,
+          depending on ``html_output``.
+
         .. note:: To produce nice-looking html warning messages, we will us Bootstrap,
           see http://www.w3schools.com/bootstrap/bootstrap_get_started.asp
     '''
 
-    ## In case we want html output, we will use Bootstrap
-    ## http://www.w3schools.com/bootstrap/bootstrap_get_started.asp
-    if html_output == True:
-      print '<!DOCTYPE html>'\
-        '<html lang=\"en\">'\
-        '<head>'\
-          '<title>Some Title</title>'\
-          '<meta charset=\"utf-8\">'\
-          '<meta name=\"viewport\" content=\"width=device-width, initial-scale=1\">'\
-          '<link rel=\"stylesheet\" href=\"http://maxcdn.bootstrapcdn.com/bootstrap/3.3.5/css/bootstrap.min.css\">'\
-          '<script src=\"https://ajax.googleapis.com/ajax/libs/jquery/1.11.3/jquery.min.js\"></script>'\
-          '<script src=\"http://maxcdn.bootstrapcdn.com/bootstrap/3.3.5/js/bootstrap.min.js\"></script>'\
-        '</head>'\
-        '<body>'
-
+    if writer is None:
+      if html_output == True:
+        out = bernutils.report.HtmlReport()
+        out.begin('ADDNEQ2 warnings', bernutils.report.BOOTSTRAP_HEAD)
+      else:
+        out = bernutils.report.TextReport()
+    else:
+      out = writer
 
     if not mdict:
-      lst1  = self.get_station_coordinates()
-      dict1 = self.get_apriori_coordinates()
-
-      ##  combine into a single dictionary, with name as key
-      ##+ and values of type FullStationRecord
-      for key, val in dict1.iteritems():
-        full_info = val + lst1[key]
-        dict1[key] = FullStationRecord(key, full_info)
-
-      mdict = dict1
-
-    for sta, val in mdict.iteritems():
-      for frm in format_str.split(','):
-        func, limit = frm.split('=')
-        limit = float(limit)
-        if abs(func_dict[func](val)) > limit:
-          func_name = html_header_dict[func]
-          warn_str = 'Station %s has %s = %.4f ; limit = %.4f' %(sta, func_name, func_dict[func](val), limit)
-          if html_output == True:
-            print '<div class=\"alert alert-danger\">'\
-              '<a href=\"#\" class=\"close\" data-dismiss=\"alert\" aria-label=\"close\">&times;</a>'\
-              '<strong>Warning!</strong> %s.' \
-            '</div>' %(warn_str)
-          else:
-            print '[WARNING]', warn_str
-
-  def toHtml(self, format_str, warnings_str=None):
+      mdict = self.full_station_records()
+
+    ##  check all stations at once (one column per criterion), then report
+    ##+ per station
+    checks = []
+    for frm in format_str.split(','):
+      func, limit = frm.split('=')
+      checks.append((func, float(limit)))
+    table  = station_table(mdict)
+    exceed = numpy.column_stack([ numpy.abs(table[func]) > limit for func, limit in checks ])
+
+    for row in numpy.flatnonzero(exceed.any(axis=1)):
+      sta = table['station'][row]
+      for col in numpy.flatnonzero(exceed[row]):
+        func, limit = checks[col]
+        func_name = html_header_dict[func]
+        out.alert('Station %s has %s = %.4f ; limit = %.4f' %(sta, func_name, table[func][row], limit))
+
+    if writer is None:
+      out.end()
+      out.close()
+
+  def toHtml(self, format_str, warnings_str=None, writer=None):
     ''' Create an html table with adjustment information. The user can select the
         type of information to be recorded.
 
@@ -722,43 +871,274 @@ class AddneqFile:
           to produce warning messages. This parameter is going to act as the input
           parameter to the :func:`warnings` function.
 
+        :param writer: (Optional) A report writer (see ``bernutils.report``); any
+          back-end can be used, so the same table can be written as html, json
+          or csv. If not set, the html table is written to stdout.
+
     '''
+    out    = writer if writer is not None else bernutils.report.HtmlReport()
+    dict1  = self.full_station_records()
+    table  = station_table(dict1)
+    fields = format_str.split(',')
 
-    lst1  = self.get_station_coordinates() ## in the old days, this was a list!
-    dict1 = self.get_apriori_coordinates()
-
-    ##  combine into a single dictionary, with name as key
-    ##+ and values of type FullStationRecord
-    for key, val in dict1.iteritems():
-      full_info = val + lst1[key]
-      dict1[key] = FullStationRecord(key, full_info)
-
-    ## Table header
-    print """<table style="width:100%" id="t01" border="1">"""
-    print "\t<thead>"
-    print "\t<tr>"
-    print '<th>Station</th>'
-    for frm in format_str.split(','):
-      print '<th>', html_header_dict[frm], '</th>'
-    print "\t</tr>"
-    print "\t</thead>"
-
-    print "\t<tbody>"
-
-    for sta, val in dict1.iteritems():
-      print '<tr>'
-      print '<th>%s</th>' %sta
-      for frm in format_str.split(','):
-        param = func_dict[frm](val)
-        if type(param) != str:
-          print '<th>%.4f</th>' %func_dict[frm](val)
-        else:
-          print '<th>%s</th>' %func_dict[frm](val)
-      print '</tr>'
-
-    print "\t</tbody>"
-    print "\t<caption>Adjustment information, extracted from %s at %s</caption>" %(self.__filename, datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
-    print "</table>"
+    header  = ['Station'] + [ html_header_dict[frm] for frm in fields ]
+    columns = [table['station']] + [ table[frm] for frm in fields ]
+    formats = ['%s'] + [ '%.4f' if table.dtype[frm].kind == 'f' else '%s' for frm in fields ]
+    caption = 'Adjustment information, extracted from %s at %s' %(self.__filename, datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
+    out.table(header, columns, formats, caption)
 
     if warnings_str != None:
-      self.warnings(warnings_str, html_output=True, mdict=dict1)
+      self.warnings(warnings_str, html_output=True, mdict=dict1, writer=out)
+
+    if writer is None:
+      out.close()
+
+
+##  Multi-day coordinate time series. Station coordinates (see
+##+ :func:`AddneqFile.get_station_coordinates`) of many ADDNEQ2 files are
+##+ parsed in a process pool and stored (as one structured array, sorted by
+##+ station and epoch) in a numpy ``.npz`` file, along with the list of
+##+ ingested files. Re-running :func:`ingest_time_series` only parses files
+##+ that are new (or have changed) since the last run.
+
+TS_VERSION = 1
+TS_DTYPE = numpy.dtype([
+  ('station', 'S20'),
+  ('epoch',   'datetime64[s]'),
+  ('file',    numpy.int32),
+  ('x',    float), ('y',    float), ('z',    float),
+  ('xrms', float), ('yrms', float), ('zrms', float),
+  ('dn',   float), ('de',   float), ('du',   float),
+  ('nrms', float), ('erms', float), ('urms', float)
+])
+''' The record type of the time series; ``x``, ``y``, ``z`` are the estimated
+    cartesian coordinates, ``dn``, ``de``, ``du`` the (north, east, up)
+    corrections and ``*rms`` the respective rms values (all in meters). The
+    field ``file`` is the index of the ADDNEQ2 file in the list of ingested
+    files.
+'''
+
+def ts_files_dtype(width):
+  ''' The record type of the list of ingested files, i.e. ``path``, ``size``
+      and ``mtime``; the ``path`` field is ``width`` characters wide.
+  '''
+  return numpy.dtype([
+    ('path',  'S%i' %max(width, 1)),
+    ('size',  numpy.int64),
+    ('mtime', float)
+  ])
+
+def __ts_files__(rows):
+  ''' Utility function; the array of ingested files, given a list of
+      ``(path, size, mtime)`` tuples. The ``path`` field is as wide as the
+      longest path, so that no path is ever truncated (a truncated path would
+      never match on the next run and its file would be ingested again).
+  '''
+  return numpy.array(rows, dtype=ts_files_dtype(max([ len(r[0]) for r in rows ] or [1])))
+
+def collect_addneq_files(pattern=None, start=None, stop=None, path_format=None):
+  ''' Collect a (sorted) list of ADDNEQ2 output files, using either a glob
+      ``pattern`` or a date range.
+
+      :param pattern:     A glob pattern, e.g. ``'/data/OUT/FFG*.OUT'``.
+      :param start:       First day (``datetime.date`` or ``datetime``) of the
+                          date range.
+      :param stop:        Last day (inclusive) of the date range.
+      :param path_format: The file name of each day, given as a ``strftime``
+                          format, e.g. ``'/data/OUT/FFG%y%j0.OUT'``.
+
+      :returns:           A list of (existing) file names; days for which no
+                          file exists are skipped.
+  '''
+  files = []
+  if pattern is not None:
+    files += glob.glob(pattern)
+  if start is not None or stop is not None or path_format is not None:
+    if start is None or stop is None or path_format is None:
+      raise RuntimeError('A date range needs start, stop and path_format')
+    day = datetime.datetime(start.year, start.month, start.day)
+    while day.date() <= datetime.date(stop.year, stop.month, stop.day):
+      filen = day.strftime(path_format)
+      if os.path.isfile(filen):
+        files.append(filen)
+      day += datetime.timedelta(days=1)
+  return sorted(set(files))
+
+def __addneq_time_series__(filen):
+  ''' Utility function (run in the worker processes); parse the station
+      coordinates of an ADDNEQ2 file.
+
+      :returns: A tuple ``(filen, epoch, rows, error)``, where ``rows`` is a list
+                of ``(station, x, y, z, xrms, yrms, zrms, dn, de, du, nrms, erms,
+                urms)`` tuples. On failure, ``rows`` is ``None`` and ``error``
+                the error message.
+  '''
+  try:
+    adnq  = AddneqFile(filen)
+    crd   = adnq.get_station_coordinates()
+    epoch = adnq.reference_epoch()
+  except Exception, e:
+    return filen, None, None, str(e)
+  rows = []
+  for sta, (x, y, z, u, n, e) in crd.iteritems():
+    rows.append((sta, x[1], y[1], z[1], x[3], y[3], z[3], n[2], e[2], u[2], n[3], e[3], u[3]))
+  return filen, epoch, rows, None
+
+def read_time_series(store):
+  ''' Read a time series store (written by :func:`ingest_time_series`).
+
+      :returns: A :py:class:`CoordinateTimeSeries` instance; if the store does
+                not exist, the instance is empty.
+  '''
+  if not os.path.isfile(store):
+    return CoordinateTimeSeries(numpy.zeros(0, dtype=TS_DTYPE), __ts_files__([]))
+  with numpy.load(store) as npz:
+    if int(npz['version']) != TS_VERSION:
+      raise RuntimeError('Invalid time series version in file %s' %store)
+    return CoordinateTimeSeries(npz['records'], npz['files'])
+
+def ingest_time_series(files, store, processes=None):
+  ''' Parse (the station coordinates of) a list of ADDNEQ2 files and add them
+      to the time series ``store`` (a numpy ``.npz`` file). Files already in
+      the store (with the same size and modification time) are skipped; files
+      that have changed are re-parsed and replace their old records. The store
+      is written to a temporary file which is then renamed.
+
+      :param files:     A list of ADDNEQ2 files (see :func:`collect_addneq_files`).
+      :param store:     The name of the time series file.
+      :param processes: Number of worker processes; if ``None``, the number of
+                        CPUs is used. With ``processes=1`` no pool is created.
+
+      :returns:         A tuple ``(CoordinateTimeSeries, ingested, failed)``,
+                        where ``ingested`` is the list of files parsed in this
+                        run and ``failed`` a list of ``(file, error)`` tuples
+                        (e.g. files that cannot be parsed or no longer exist).
+                        Failed files are not recorded, so they are retried on
+                        the next run.
+  '''
+  ts        = read_time_series(store)
+  records   = ts.records
+  ingested  = ts.files.tolist()
+  known     = dict([ (p, i) for i, (p, size, mtime) in enumerate(ingested) ])
+
+  todo, failed = [], []
+  for filen in files:
+    path = os.path.abspath(filen)
+    try:
+      st = os.stat(path)
+    except OSError, e:
+      failed.append((path, str(e)))
+      continue
+    i = known.get(path)
+    if i is None or ingested[i][1] != st.st_size or ingested[i][2] != st.st_mtime:
+      todo.append(path)
+
+  if not len(todo):
+    return ts, [], failed
+
+  if processes == 1 or len(todo) == 1:
+    results = map(__addneq_time_series__, todo)
+  else:
+    pool = multiprocessing.Pool(processes)
+    try:
+      results = pool.map(__addneq_time_series__, todo, chunksize=max(1, len(todo) / (4 * (processes or multiprocessing.cpu_count()))))
+    finally:
+      pool.close()
+      pool.join()
+
+  done = []
+  for path, epoch, rows, err in results:
+    if err is None:
+      try:
+        st = os.stat(path)
+      except OSError, e:
+        ## removed while being parsed
+        err = str(e)
+    if err is not None:
+      failed.append((path, err))
+      if __DEBUG_MODE__ == True:
+        print >> sys.stderr, '[DEBUG] Failed to parse ADDNEQ2 file %s (%s)' %(path, err)
+      continue
+    done.append((path, epoch, rows, st))
+
+  ## drop the records of changed files; new files are appended to the list
+  reparsed = [ known[p] for p, e, r, st in done if p in known ]
+  if len(reparsed):
+    records = records[~numpy.in1d(records['file'], reparsed)]
+
+  chunks, parsed = [records], []
+  for path, epoch, rows, st in done:
+    if path in known:
+      idx = known[path]
+      ingested[idx] = (path, st.st_size, st.st_mtime)
+    else:
+      idx = len(ingested)
+      ingested.append((path, st.st_size, st.st_mtime))
+    chunk = numpy.zeros(len(rows), dtype=TS_DTYPE)
+    if len(rows):
+      cols = zip(*rows)
+      chunk['station'] = cols[0]
+      for i, field in enumerate(TS_DTYPE.names[3:]):
+        chunk[field] = cols[i+1]
+    chunk['epoch'] = numpy.datetime64(epoch, 's')
+    chunk['file']  = idx
+    chunks.append(chunk)
+    parsed.append(path)
+
+  ingested = __ts_files__(ingested)
+  records  = numpy.concatenate(chunks)
+  records  = records[numpy.lexsort((records['epoch'], records['station']))]
+
+  store_dir = os.path.dirname(os.path.abspath(store))
+  fd, tmp = tempfile.mkstemp(dir=store_dir, prefix='.adnq', suffix='.npz')
+  try:
+    with os.fdopen(fd, 'wb') as fout:
+      numpy.savez_compressed(fout, version=TS_VERSION, records=records, files=ingested)
+    os.rename(tmp, store)
+  except:
+    if os.path.isfile(tmp): os.remove(tmp)
+    raise
+
+  return CoordinateTimeSeries(records, ingested), parsed, failed
+
+class CoordinateTimeSeries:
+  ''' A class to hold (multi-day) station coordinate time series, as
+      collected by :func:`ingest_time_series`. Records are stored in a single
+      structured array (of type ``TS_DTYPE``), sorted by station and epoch.
+  '''
+
+  def __init__(self, records, files):
+    self.records = records
+    self.files   = files
+    names = records['station']
+    if len(names):
+      ## records are sorted by station; find the start/stop of each station
+      brk = numpy.flatnonzero(names[1:] != names[:-1]) + 1
+      starts = numpy.concatenate(([0], brk))
+      stops  = numpy.concatenate((brk, [len(names)]))
+      self.__slices = dict([ (names[i], (i, j)) for i, j in zip(starts, stops) ])
+    else:
+      self.__slices = {}
+
+  def __len__(self): return len(self.records)
+
+  def stations(self):
+    ''' Return a (sorted) list of the stations in the time series.
+    '''
+    return sorted(self.__slices)
+
+  def station(self, name):
+    ''' Return the time series of station ``name``, as a dictionary of
+        (columnar) arrays, i.e. with keys the fields of ``TS_DTYPE`` (except
+        ``station``). Arrays are sorted by epoch.
+    '''
+    if name not in self.__slices:
+      raise RuntimeError('No time series for station %s' %name)
+    i, j = self.__slices[name]
+    rec  = self.records[i:j]
+    return dict([ (field, rec[field]) for field in TS_DTYPE.names[1:] ])
+
+  def source_files(self):
+    ''' Return the list of (ingested) ADDNEQ2 files.
+    '''
+    return list(self.files['path'])
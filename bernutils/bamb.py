@@ -1,5 +1,7 @@
 import os
+import numpy
 from datetime import datetime
+import bernutils.report
 
 amb_dict  = {'cbwl': '#AR_WL',
   'cbnl': '#AR_NL',
@@ -28,14 +30,38 @@ def amb_str2amb_key(ambstr):
       :returns: The key (as string) corresponding to the input ambiguity 
                 resolution method (see ``amb_dict`` dictionary).
   '''
-  for key, astr in amb_dict.iteritems():
-    if ambstr.strip() == astr:
-      return key
-  raise RuntimeError('Invalid AmbLine resolution string: %s' %ambstr)
+  key = amb_keys.get(ambstr.strip())
+  if key is None:
+    raise RuntimeError('Invalid AmbLine resolution string: %s' %ambstr)
+  return key
+
+amb_keys = dict([ (astr, key) for key, astr in amb_dict.iteritems() ])
+''' The inverse of ``amb_dict``, i.e. match a resolution method string to its
+    key.
+'''
 
 amb_lcs   = {'cbwl': 1, 'cbnl': 1, 'pbwl': 1, 'pbnl': 1, 'qif': 2, 'l12': 1}
 ''' Number of LC's for every method (i.e. columns of type: 'Max/RMS ??').
 '''
+AMB_HTML_STYLE = '''<style>
+table#t01, th#t01, td#t01  {
+\twidth: 100%;
+\tbackground-color: #eee;
+\tborder-collapse: collapse;
+\tborder: 1px solid black;
+}
+table#t02 {
+\twidth: 50%;
+\tbackground-color: #eee;
+\tborder: 1px solid black;
+\tborder-collapse:collapse;
+}
+th#t02, td#t02 {
+\tborder: 0;
+}
+</style>'''
+''' CSS used by :func:`AmbFile.toHtml`.
+'''
 satsys_dict = {'G': 'GPS', 'R': 'GLONASS', 'GR': 'MIXED'}
 ''' Satellite System id-names and their equivelant representation in Bernese
     v5.2 ambiguity summary files (.SUM).
@@ -47,16 +73,18 @@ class AmbLine:
       to an instance of AmbLine.
   '''
 
-  def __init__(self, line):
+  def __init__(self, line, tokens=None):
     ''' Constructor; the input record line ``line`` is examined to check
-        the resolution method, using the last column (field).
+        the resolution method, using the last column (field). If the line is
+        already split, the (whitespace-seperated) fields can be passed in
+        as ``tokens``.
     '''
     self.__line = line
+    self.__lns  = tokens if tokens is not None else line.split()
     try:
-      self.__method  = amb_str2amb_key(self.__line.split()[-1])
+      self.__method  = amb_str2amb_key(self.__lns[-1])
     except:
       raise RuntimeError('Invalid AmbLine resolution string: %s' %line)
-    self.__lns = line.split()
 
   def receiver1(self):
     ''' Return the name of the first receiver '''
@@ -107,8 +135,32 @@ class AmbLine:
       raise RuntimeError('Invalid satellite system string %s' %sys)
     return sys, satsys_dict[sys]
 
+AMB_RECORD_DTYPE = numpy.dtype([
+  ('baseline',    'S4'),
+  ('station1',    'S16'),
+  ('station2',    'S16'),
+  ('length',      float),
+  ('ambs_before', numpy.int32),
+  ('mm_before',   float),
+  ('ambs_after',  numpy.int32),
+  ('mm_after',    float),
+  ('percent',     float),
+  ('satsys',      'S2'),
+  ('receiver1',   'S20'),
+  ('receiver2',   'S20')
+])
+''' The record type of the (per method) baseline records, see
+    :func:`AmbFile.records`. Lengths are in km.
+'''
+
 class AmbFile:
   ''' A class to hold a Bernese ambiguity summary file (.SUM).
+
+      .. note:: All lines are split (once) when the file is loaded, and indexed
+        per resolution method and satellite system. The baseline records of
+        each method are parsed
+        (once, when first needed) to a numpy structured array (see
+        ``AMB_RECORD_DTYPE``), from which all statistics are computed.
   '''
 
   def __init__(self, filename):
@@ -128,12 +180,54 @@ class AmbFile:
     ## close the input stream
     fin.close()
 
+    ## split all lines and index them per method
+    self.__index_lines__()
+
   def __load_lines__(self, ibuf):
     ''' Load all lines with size > 0 to memory (i.e. in the object's lines list)
         given the input (stream) buffer.
     '''
     return [ line for line in ibuf.readlines() if len(line) > 0 ]
 
+  def __index_lines__(self):
+    ''' Split all lines (once) and collect, for every resolution method and
+        satellite system, the indexes of the lines belonging to it (in the
+        order they appear in the file). The key ``(method, None)`` holds all
+        lines of a method. The satellite system is the 10th field of a
+        baseline record and the 9th field of a summary (``'Tot:'``) line.
+    '''
+    self.__tokens  = [ line.split() for line in self.__lines ]
+    self.__methods = dict([ ((key, None), []) for key in amb_dict ])
+    for i, lns in enumerate(self.__tokens):
+      if len(lns) and len(self.__lines[i]) > 10:
+        key = amb_keys.get(lns[-1])
+        if key is not None:
+          self.__methods[(key, None)].append(i)
+          col = 8 if lns[0] == 'Tot:' else 9
+          if len(lns) > col and lns[col] in satsys_dict:
+            self.__methods.setdefault((key, lns[col]), []).append(i)
+    self.__records = {}
+
+  def __method_indexes__(self, res_method, sat_sys=None, include_summary_block=True):
+    ''' Return the indexes of the lines corresponding to the given ambiguity
+        resolution method, see :func:`method_lines`.
+    '''
+    if not res_method in amb_dict:
+      raise RuntimeError('Invalid resolution method string: %s' 
+        %res_method)
+    if sat_sys and not sat_sys in satsys_dict:
+      raise RuntimeError('Invalid satellite system string: %s' 
+        %sat_sys)
+
+    indexes = self.__methods.get((res_method, sat_sys or None), [])
+
+    ## filter the summary block (if needed)
+    if not include_summary_block:
+      tokens  = self.__tokens
+      indexes = [ i for i in indexes if tokens[i][0] != 'Tot:' ]
+
+    return indexes
+
   def method_lines(self, res_method, sat_sys=None, include_summary_block=True):
     ''' Collect all info lines corresponding to the given ambiguity resolution
         method. Note that the returned list will also contain the "summary" 
@@ -171,36 +265,76 @@ class AmbFile:
                            given ambiguity resolution method.
     '''
 
-    ## match the given method to an identifier
-    if res_method in amb_dict:
-      method_str = amb_dict[res_method]
-    else:
-      raise RuntimeError('Invalid resolution method string: %s' 
-        %res_method)
+    return [ self.__lines[i] for i in self.__method_indexes__(res_method, sat_sys, include_summary_block) ]
 
-    ret_list = []
-
-    ## collect lines for the given method.
-    ret_list = [l for l in self.__lines if len(l)>10 \
-      and l.split()[len(l.split())-1] == method_str]
-
-    ## filter the summary block (if needed)
-    if not include_summary_block:
-      ret_list = [l for l in ret_list if l.split()[0] != 'Tot:']
+  def records(self, res_method, sat_sys=None):
+    ''' Return the baseline records (i.e. not the summary block) of the given
+        ambiguity resolution method, as a numpy structured array of type
+        ``AMB_RECORD_DTYPE``, in the order they appear in the file. Arrays are
+        built once (per method and satellite system) and cached.
 
-    ## filter the satellite system (if needed)
-    if sat_sys:
-      if not sat_sys in satsys_dict:
-        raise RuntimeError('Invalid satellite system string: %s' 
-          %method)
-      ret_list = [l for l in ret_list if len(l.split())>9 \
-        and ( l.split()[8] == sat_sys \
-        or l.split()[9] == sat_sys) ]
+        :param res_method: The resolution method (see :func:`method_lines`).
+        :param sat_sys:    **(Optional)** if set, only the records of the
+                           selected satellite system are returned (see
+                           :func:`method_lines`).
 
-    ## return the filtered list.
-    return ret_list
-
-  def toHtml(self, sat_sys=None):
+        :returns:          A numpy structured array (one row per record).
+    '''
+    key = (res_method, sat_sys or None)
+    if key in self.__records:
+      return self.__records[key]
+
+    rows = []
+    for i in self.__method_indexes__(res_method, sat_sys, include_summary_block=False):
+      line = AmbLine(self.__lines[i], self.__tokens[i])
+      lns  = self.__tokens[i]
+      try:
+        rows.append((line.baseline(), lns[1], lns[2], float(lns[3]), int(lns[4]), \
+          float(lns[5]), int(lns[6]), float(lns[7]), float(lns[8]), lns[9], \
+          line.receiver1(), line.receiver2()))
+      except (IndexError, ValueError):
+        raise RuntimeError('Invalid ambiguity record line: %s' %self.__lines[i])
+
+    self.__records[key] = numpy.array(rows, dtype=AMB_RECORD_DTYPE)
+    return self.__records[key]
+
+  def statistics(self, res_method, sat_sys=None):
+    ''' Compute statistics for the baseline records of the given ambiguity
+        resolution method (and satellite system), see :func:`records`.
+
+        :returns: A dictionary with keys:
+
+                  * ``'records'``: number of records,
+                  * ``'baselines'``: number of (unique) baselines,
+                  * ``'length'``: mean baseline length (km),
+                  * ``'ambs_before'``, ``'ambs_after'``: total number of
+                    ambiguities before and after the resolution,
+                  * ``'percent'``: percentage of resolved ambiguities (over all
+                    records),
+                  * ``'percent_mean'``, ``'percent_min'``, ``'percent_max'``:
+                    statistics of the per record percentages.
+
+                  If there are no records, all values (except the counts) are
+                  ``None``.
+    '''
+    rec = self.records(res_method, sat_sys)
+    if not len(rec):
+      return {'records': 0, 'baselines': 0, 'length': None, 'ambs_before': 0, \
+        'ambs_after': 0, 'percent': None, 'percent_mean': None, \
+        'percent_min': None, 'percent_max': None}
+    before = int(rec['ambs_before'].sum())
+    after  = int(rec['ambs_after'].sum())
+    return {'records': len(rec),
+      'baselines': len(numpy.unique(rec['baseline'])),
+      'length': float(rec['length'].mean()),
+      'ambs_before': before,
+      'ambs_after': after,
+      'percent': 100.0*(before - after)/before if before else None,
+      'percent_mean': float(rec['percent'].mean()),
+      'percent_min': float(rec['percent'].min()),
+      'percent_max': float(rec['percent'].max())}
+
+  def toHtml(self, sat_sys=None, writer=None):
     ''' Translate the ambiguity resolution information from this file to a
         html table.
         
@@ -213,134 +347,60 @@ class AmbFile:
                            * ``'R'`` for glonass,
                            * ``'GR'`` for mixed, i.e. gps and glonass
 
-        :returns: Nothing. All output is directed to stdout.
+        :param writer:     **(Optional)** a report writer (see ``bernutils.report``)
+                           to write the table to; any back-end can be used, so
+                           the table can also be written as json or csv. If
+                           not set, a (complete) html document is written to
+                           stdout.
+
+        :returns: Nothing. All output is directed to ``writer`` (or stdout).
     '''
 
-    ## current baseline
-    cur_baseline = ''
-    ## html table rows for a single baseline
-    html_rows = []
-    ## number of rows for a single baseline
-    row_span = 1
-
-    ## write CSS info and html head section
-    print "<head>"
-    print "<style>"
-    print "table#t01, th#t01, td#t01  {"
-    print "\twidth: 100%;"
-    print "\tbackground-color: #eee;"
-    print "\tborder-collapse: collapse;"
-    print "\tborder: 1px solid black;"
-    print "}"
-    print "table#t02 {"
-    print "\twidth: 50%;"
-    print "\tbackground-color: #eee;"
-    print "\tborder: 1px solid black;"
-    print "\tborder-collapse:collapse;"
-    print "}"
-    print "th#t02, td#t02 {"
-    print "\tborder: 0;"
-    print "}"
-    print "</style>"
-    print "</head>"
-    print "<body>"
+    if writer is None:
+      out = bernutils.report.HtmlReport()
+      out.begin('Ambiguity resolution', [AMB_HTML_STYLE])
+    else:
+      out = writer
 
     ## Table header
-    print """<table style="width:100%" id="t01" border="1">"""
-    print "\t<thead>"
-    print "\t<tr>"
-    for th in ('Baseline', 'Station 1', 'Station 2', 'Length (km)', '# of Ambs', \
-      'Resolved (%)', 'Receiver 1', 'Receiver 2', 'Sat. System', 'Method'):
-      print "\t\t<th>"+th+"</th>"
-    print "\t</tr>"
-    print "\t</thead>"
-
-    print "\t<tbody>"
+    out.begin_table(('Baseline', 'Station 1', 'Station 2', 'Length (km)', '# of Ambs', \
+      'Resolved (%)', 'Receiver 1', 'Receiver 2', 'Sat. System', 'Method'), \
+      'Ambiguity resolution information, extracted from %s at %s' %(self.__filename, datetime.now().strftime('%Y-%m-%d %H:%M:%S')))
 
     ## For every resolution method posible ..
     for ambmth in amb_dict:
 
-      ## create a list holding all baselines (for this method)
-      m_lines = self.method_lines(ambmth, sat_sys, include_summary_block=True)
-
-      ##  split the m_lines list in a list holding baseline records and 
-      ##+ another holding the summary block
-      s_lines = []
-      if len(m_lines) > 0:
-        while m_lines[-1].split()[0] == "Tot:" :
-          s_lines.append(m_lines[-1])
-          del m_lines[-1]
-
-      ## for every ambiguity line (for current method) ..
-      for aline in m_lines:
-
-        ## cast the line to an AmbLine instance
-        ambline = AmbLine(aline)
-
-        ##  if this is a new baseline, flush the entries of html_rows list
-        ##  this can happen (i.e. baselines repeated) if the ambiguity summary
-        ##+ file is multi-gnss, so we have one line per method.
-        if ambline.baseline() != cur_baseline:
-
-          ## before flushing, substitute the correct number of ROWSPAN
-          for tr in html_rows:
-            print tr.replace("ROWSPAN", "\""+str(row_span)+"\"")
-
-          ## re-initialize
-          row_span     = 1
-          html_rows    = []
-          cur_baseline = ambline.baseline()
-
-          ## read the line in the html_rows list
-          html_rows.append("\n\t<tr>" + \
-          "\n\t\t<td rowspan=ROWSPAN>%s</td>" % ambline.baseline() + \
-          "\n\t\t<td rowspan=ROWSPAN>%s</td>" % ambline.station1() + \
-          "\n\t\t<td rowspan=ROWSPAN>%s</td>" % ambline.station2() + \
-          "\n\t\t<td rowspan=ROWSPAN>%6.1f</td>" % ambline.length() + \
-          "\n\t\t<td>%4i (%3.1f)</td>" % (ambline.ambsbefore()[0], ambline.ambsbefore()[1]) + \
-          "\n\t\t<td>%4.1f</td>" % ambline.percent() + \
-          "\n\t\t<td rowspan=ROWSPAN>%s</td>"  % ambline.receiver1() + \
-          "\n\t\t<td rowspan=ROWSPAN>%s</td>" % ambline.receiver2() + \
-          "\n\t\t<td>%s</td>" % ambline.satsys()[1] + \
-          "\n\t\t<td>%s</td>" % ambline.method().upper() + \
-          "\n\t</tr>")
-
-        else:
-          ##  same baseline; just add the info in a new element in the 
-          ##+ html_rows list.
-          row_span += 1
-          html_rows.append("\n\t<tr>" + \
-          "\n\t\t<td>%4i (%3.1f)</td>" % (ambline.ambsbefore()[0], ambline.ambsbefore()[1]) + \
-          "\n\t\t<td>%4.1f</td>" % ambline.percent() + \
-          "\n\t\t<td>%s</td>" % ambline.satsys()[1] + \
-          "\n\t\t<td>%s</td>" % ambline.method().upper() + \
-          "\n\t</tr>")
-
-      ## flush remaining baselines (last baseline of current method).
-      for tr in html_rows:
-        print tr.replace("ROWSPAN", "\""+str(row_span)+"\"")
-      html_rows = []
+      ## the summary block (for this method)
+      s_lines = [ self.__tokens[i] for i in self.__method_indexes__(ambmth, sat_sys) if self.__tokens[i][0] == 'Tot:' ]
+      s_lines.reverse()
+
+      ##  write the baseline records (for current method); rows of the same
+      ##+ baseline are grouped, i.e. baseline, stations, length and receivers
+      ##+ are written once per baseline. This can happen (i.e. baselines
+      ##+ repeated) if the ambiguity summary file is multi-gnss, so we have one
+      ##+ line per method.
+      rec = self.records(ambmth, sat_sys)
+      columns  = [
+        rec['baseline'], rec['station1'], rec['station2'], rec['length'],
+        zip(rec['ambs_before'].tolist(), rec['mm_before'].tolist()),
+        rec['percent'], rec['receiver1'], rec['receiver2'],
+        [ satsys_dict[i] for i in rec['satsys'] ],
+        [ ambmth.upper() ]*len(rec)
+      ]
+      out.rows(columns, ['%s', '%s', '%s', '%6.1f', '%4i (%3.1f)', '%4.1f', '%s', '%s', '%s', '%s'], \
+        group=0, spans=(0, 1, 2, 3, 6, 7))
 
       ## nearly done with this method; just add the statistics block
       if len(s_lines) == 0:
-        print "\t<tr style=\"background-color:green\">"
-        print "\t\t<td colspan=\"10\">Resolution method \"%s\" not used</td>" %(ambmth)
+        out.row(['Resolution method "%s" not used' %(ambmth)], [10], 'background-color:green')
       else :
-        for tr in s_lines:
-          if not sat_sys or tr.split()[8] == sat_sys:
-            l = tr.split()
-            print "\t<tr style=\"background-color:red\">"
-            print "\t\t<td colspan=\"3\">%s</td>" % l[1]
-            print "\t\t<td>%6.1f</td>" % float(l[2])
-            print "\t\t<td>%4i (%3.1f)</td>" % (int(l[3]), float(l[4]))
-            print "\t\t<td>%4.1f</td>" % float(l[7])
-            print "\t\t<td colspan=\"2\"></td>"
-            print "\t\t<td>%s</td>"  %satsys_dict[l[8]]
-            print "\t\t<td>%s</td>" %amb_str2amb_key(l[-1]).upper()
-            print "\t</tr>"
-      s_lines = []
-
-    print "\t</tbody>"
-    print "\t<caption>Ambiguity resolution information, extracted from %s at %s</caption>" %(self.__filename, datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
-    print "</table>"
-    print "</body>"
+        for l in s_lines:
+          out.row([l[1], '%6.1f' % float(l[2]), '%4i (%3.1f)' % (int(l[3]), float(l[4])), \
+            '%4.1f' % float(l[7]), '', satsys_dict[l[8]], amb_str2amb_key(l[-1]).upper()], \
+            [3, 1, 1, 1, 2, 1, 1], 'background-color:red')
+
+    out.end_table()
+
+    if writer is None:
+      out.end()
+      out.close()
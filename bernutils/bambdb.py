@@ -0,0 +1,272 @@
+''' A local (SQLite) store of ambiguity resolution records, collected from
+    (many) ambiguity summary files (.SUM), see :py:class:`AmbDatabase`.
+'''
+
+import os
+import re
+import sys
+import sqlite3
+import datetime
+import multiprocessing
+import numpy
+import bernutils.bamb
+
+__DEBUG_MODE__ = False
+
+AMBDB_VERSION = 1
+
+__SCHEMA__ = [
+  '''CREATE TABLE IF NOT EXISTS info (
+      key   TEXT PRIMARY KEY,
+      value TEXT)''',
+  '''CREATE TABLE IF NOT EXISTS files (
+      id      INTEGER PRIMARY KEY,
+      path    TEXT UNIQUE NOT NULL,
+      size    INTEGER,
+      mtime   REAL,
+      network TEXT,
+      date    TEXT)''',
+  '''CREATE TABLE IF NOT EXISTS records (
+      file_id     INTEGER NOT NULL REFERENCES files(id),
+      network     TEXT,
+      date        TEXT NOT NULL,
+      method      TEXT NOT NULL,
+      satsys      TEXT NOT NULL,
+      baseline    TEXT NOT NULL,
+      station1    TEXT,
+      station2    TEXT,
+      length      REAL,
+      ambs_before INTEGER,
+      mm_before   REAL,
+      ambs_after  INTEGER,
+      mm_after    REAL,
+      percent     REAL,
+      receiver1   TEXT,
+      receiver2   TEXT)''',
+  'CREATE INDEX IF NOT EXISTS records_baseline ON records (baseline, date)',
+  'CREATE INDEX IF NOT EXISTS records_date ON records (date)',
+  'CREATE INDEX IF NOT EXISTS records_method ON records (method, satsys, date)',
+  'CREATE INDEX IF NOT EXISTS records_file ON records (file_id)'
+]
+
+__RECORD_COLUMNS__ = ('file_id', 'network', 'date', 'method') \
+  + bernutils.bamb.AMB_RECORD_DTYPE.names
+
+__SUM_DATE__ = re.compile(r'(\d{2})(\d{3})[0-9A-Za-z]?(?:_[A-Za-z0-9]+)?\.SUM$', re.IGNORECASE)
+
+def sum_file_date(filen):
+  ''' Resolve the date of an ambiguity summary file from its name; Bernese
+      names these files using the year (2 digits) and day of year, e.g.
+      ``FFG120540.SUM`` or ``FFU151000_GNSS.SUM``.
+
+      :returns: The date as a ``datetime.date`` instance.
+  '''
+  m = __SUM_DATE__.search(os.path.basename(filen))
+  if not m:
+    raise RuntimeError('Cannot resolve date of ambiguity summary file %s' %filen)
+  year = int(m.group(1))
+  year += 2000 if year < 80 else 1900
+  return (datetime.datetime(year, 1, 1) + datetime.timedelta(days=int(m.group(2))-1)).date()
+
+def sum_file_network(filen):
+  ''' Resolve the network (i.e. solution id) of an ambiguity summary file from
+      its name, i.e. the first three characters (e.g. ``FFG`` for
+      ``FFG120540.SUM``).
+  '''
+  return os.path.basename(filen)[0:3]
+
+def __parse_sum_file__(filen):
+  ''' Utility function (run in the worker processes); parse the baseline
+      records of all resolution methods of an ambiguity summary file.
+
+      :returns: A tuple ``(filen, rows, error)``; ``rows`` is a list of
+                ``(method, record fields ...)`` tuples (see
+                ``bernutils.bamb.AMB_RECORD_DTYPE``). On failure, ``rows`` is
+                ``None`` and ``error`` the error message.
+  '''
+  try:
+    amb  = bernutils.bamb.AmbFile(filen)
+    rows = []
+    for method in bernutils.bamb.amb_dict:
+      for rec in amb.records(method).tolist():
+        rows.append((method,) + rec)
+  except Exception, e:
+    return filen, None, str(e)
+  return filen, rows, None
+
+class AmbDatabase:
+  ''' A local (SQLite) store of ambiguity resolution records. Each baseline
+      record (of every resolution method and satellite system) of every
+      ingested ambiguity summary file is a row of the table ``records``, which
+      is indexed on baseline/date, date and method/satellite system/date.
+  '''
+
+  def __init__(self, filename):
+    ''' Open (or create) the database ``filename``. '''
+    self.__filename = filename
+    self.__db = sqlite3.connect(filename)
+    self.__db.text_factory = str
+    cur = self.__db.cursor()
+    for sql in __SCHEMA__:
+      cur.execute(sql)
+    cur.execute('SELECT value FROM info WHERE key = ?', ('version',))
+    row = cur.fetchone()
+    if row is None:
+      cur.execute('INSERT INTO info VALUES (?, ?)', ('version', str(AMBDB_VERSION)))
+    elif int(row[0]) != AMBDB_VERSION:
+      raise RuntimeError('Invalid ambiguity database version in file %s' %filename)
+    self.__db.commit()
+
+  def close(self):
+    ''' Close the database. '''
+    self.__db.close()
+
+  def connection(self):
+    ''' Return the (sqlite3) connection, e.g. to run custom queries. '''
+    return self.__db
+
+  def ingest(self, files, network=None, processes=None, date=sum_file_date):
+    ''' Parse a list of ambiguity summary files (in a process pool) and add
+        their records to the database. Files already in the database (with
+        the same size and modification time) are skipped; files that have
+        changed replace their old records. All records of a run are inserted
+        in a single transaction.
+
+        :param files:     A list of ambiguity summary files.
+        :param network:   The network name to record; if ``None``, it is
+                          resolved from each file name (see
+                          :func:`sum_file_network`).
+        :param processes: Number of worker processes; if ``None``, the number
+                          of CPUs is used. With ``processes=1`` no pool is
+                          created.
+        :param date:      A function resolving the date of a file from its
+                          name (default :func:`sum_file_date`).
+
+        :returns:         A tuple ``(ingested, failed)``, where ``ingested`` is
+                          the list of files parsed in this run and ``failed``
+                          a list of ``(file, error)`` tuples (e.g. files that
+                          cannot be parsed or no longer exist).
+    '''
+    cur   = self.__db.cursor()
+    known = dict([ (r[0], r[1:]) for r in cur.execute('SELECT path, id, size, mtime FROM files') ])
+
+    todo, failed = [], []
+    for filen in files:
+      path = os.path.abspath(filen)
+      try:
+        st = os.stat(path)
+        if path in known and known[path][1] == st.st_size and known[path][2] == st.st_mtime:
+          continue
+        todo.append((path, date(path)))
+      except (OSError, RuntimeError), e:
+        failed.append((path, str(e)))
+
+    if not len(todo):
+      return [], failed
+
+    args = [ path for path, day in todo ]
+    if processes == 1 or len(todo) == 1:
+      results = map(__parse_sum_file__, args)
+    else:
+      pool = multiprocessing.Pool(processes)
+      try:
+        results = pool.map(__parse_sum_file__, args, chunksize=max(1, len(args) / (4 * (processes or multiprocessing.cpu_count()))))
+      finally:
+        pool.close()
+        pool.join()
+
+    ingested = []
+    insert   = 'INSERT INTO records (%s) VALUES (%s)' %(','.join(__RECORD_COLUMNS__), ','.join('?'*len(__RECORD_COLUMNS__)))
+    try:
+      for (path, day), (filen, rows, err) in zip(todo, results):
+        if err is not None:
+          failed.append((path, err))
+          if __DEBUG_MODE__ == True:
+            print >> sys.stderr, '[DEBUG] Failed to parse ambiguity summary file %s (%s)' %(path, err)
+          continue
+        try:
+          st = os.stat(path)
+        except OSError, e:
+          ## removed while being parsed
+          failed.append((path, str(e)))
+          continue
+        ntwk = network if network is not None else sum_file_network(path)
+        sday = day.strftime('%Y-%m-%d')
+        if path in known:
+          file_id = known[path][0]
+          cur.execute('DELETE FROM records WHERE file_id = ?', (file_id,))
+          cur.execute('UPDATE files SET size = ?, mtime = ?, network = ?, date = ? WHERE id = ?', \
+            (st.st_size, st.st_mtime, ntwk, sday, file_id))
+        else:
+          cur.execute('INSERT INTO files (path, size, mtime, network, date) VALUES (?, ?, ?, ?, ?)', \
+            (path, st.st_size, st.st_mtime, ntwk, sday))
+          file_id = cur.lastrowid
+        cur.executemany(insert, [ (file_id, ntwk, sday) + r for r in rows ])
+        ingested.append(path)
+      self.__db.commit()
+    except:
+      self.__db.rollback()
+      raise
+
+    return ingested, failed
+
+  def __where__(self, baseline, method, satsys, network, start, stop):
+    ''' Build the WHERE clause (and parameters) of a records query. '''
+    clauses, params = [], []
+    for column, value in (('baseline', baseline), ('method', method), ('satsys', satsys), ('network', network)):
+      if value is not None:
+        clauses.append('%s = ?' %column)
+        params.append(value)
+    if start is not None:
+      clauses.append('date >= ?')
+      params.append(start.strftime('%Y-%m-%d'))
+    if stop is not None:
+      clauses.append('date <= ?')
+      params.append(stop.strftime('%Y-%m-%d'))
+    return (' WHERE ' + ' AND '.join(clauses)) if len(clauses) else '', params
+
+  def daily_percent(self, baseline=None, method=None, satsys=None, network=None, start=None, stop=None):
+    ''' Compute the daily mean resolution percentage, per baseline,
+        resolution method and satellite system (percentages of different
+        methods or systems are never averaged together; e.g. the ``GR``
+        record already combines ``G`` and ``R``). All parameters are
+        optional filters (``start`` and ``stop`` are dates, inclusive).
+
+        :returns: A dictionary with key a tuple ``(baseline, method, satsys)``
+                  and value a tuple of arrays ``(dates, percent)``; ``dates``
+                  are ``numpy.datetime64`` (days), sorted.
+    '''
+    where, params = self.__where__(baseline, method, satsys, network, start, stop)
+    sql = 'SELECT baseline, method, satsys, date, AVG(percent) FROM records%s ' \
+      'GROUP BY baseline, method, satsys, date ORDER BY baseline, method, satsys, date' %where
+    rows = self.__db.execute(sql, params).fetchall()
+    if not len(rows):
+      return {}
+    bsls, mths, syss, dates, percent = zip(*rows)
+    keys    = numpy.array(zip(bsls, mths, syss), dtype=object)
+    dates   = numpy.array(dates, dtype='datetime64[D]')
+    percent = numpy.array(percent, dtype=float)
+    brk     = numpy.flatnonzero((keys[1:] != keys[:-1]).any(axis=1)) + 1
+    starts  = numpy.concatenate(([0], brk))
+    stops   = numpy.concatenate((brk, [len(keys)]))
+    return dict([ (tuple(keys[i]), (dates[i:j], percent[i:j])) for i, j in zip(starts, stops) ])
+
+  def rolling_mean_percent(self, window=30, baseline=None, method=None, satsys=None, network=None, start=None, stop=None):
+    ''' Compute the rolling mean of the (daily mean) resolution percentage,
+        per baseline, resolution method and satellite system, see
+        :func:`daily_percent`. The mean at a date ``d`` is the mean of all
+        daily values in the (calendar) window ``(d - window, d]``; days without
+        records are not counted.
+
+        :param window: The window length, in days.
+
+        :returns: A dictionary with key a tuple ``(baseline, method, satsys)``
+                  and value a tuple of arrays ``(dates, rolling_mean)``.
+    '''
+    ret_dict = {}
+    for key, (dates, percent) in self.daily_percent(baseline, method, satsys, network, start, stop).iteritems():
+      csum  = numpy.concatenate(([0.], numpy.cumsum(percent)))
+      first = numpy.searchsorted(dates, dates - numpy.timedelta64(window - 1, 'D'), side='left')
+      last  = numpy.arange(1, len(dates) + 1)
+      ret_dict[key] = (dates, (csum[last] - csum[first]) / (last - first))
+    return ret_dict
@@ -1,4 +1,5 @@
 import os
+import numpy
 
 ## Variables for Bernese v5.2 .CRD files
 ## Describe the format of a .CRD data line
@@ -14,6 +15,38 @@ YCOMP_LENGTH         = 15
 ZCOMP_INDEX          = 52
 ZCOMP_LENGTH         = 15
 FLAG_INDEX           = 67
+FLAG_LENGTH          = 8
+
+##  The (numpy) dtype of a .CRD data line, as a sequence of fixed-width fields;
+##+ used to split all lines of a file in one go (see :func:`CrdFile.getTable`).
+CRD_LINE_DTYPE = numpy.dtype([
+  ('aa',     'S%i' %MARKER_NAME_INDEX),
+  ('name',   'S%i' %MARKER_NAME_LENGTH),
+  ('sep1',   'S%i' %(MARKER_NUMBER_INDEX-MARKER_NAME_INDEX-MARKER_NAME_LENGTH)),
+  ('number', 'S%i' %MARKER_NUMBER_LENGTH),
+  ('sep2',   'S%i' %(XCOMP_INDEX-MARKER_NUMBER_INDEX-MARKER_NUMBER_LENGTH)),
+  ('x',      'S%i' %XCOMP_LENGTH),
+  ('y',      'S%i' %YCOMP_LENGTH),
+  ('z',      'S%i' %ZCOMP_LENGTH),
+  ('flag',   'S%i' %FLAG_LENGTH)])
+CRD_LINE_LENGTH = CRD_LINE_DTYPE.itemsize
+
+## The (numpy) dtype of the columns of a :class:`CrdTable`
+CRD_DTYPE = numpy.dtype([
+  ('name',   'S%i' %MARKER_NAME_LENGTH),
+  ('number', 'S%i' %MARKER_NUMBER_LENGTH),
+  ('x',      'f8'),
+  ('y',      'f8'),
+  ('z',      'f8'),
+  ('flag',   'S%i' %FLAG_LENGTH)])
+
+def __format_aa__(aa):
+  ''' Format the (3-digit) number of a .CRD record; as the Fortran I3
+      format does, numbers that do not fit are written as '***', so that the
+      rest of the columns are not shifted.
+  '''
+  if aa > 999: return '***'
+  return '%03i' %aa
 
 class CrdPoint:
   ''' Class to represent a (GNSS/geodetic) Point as recorded in a Bernese
@@ -86,8 +119,102 @@ class CrdPoint:
       iaa = int(aa)
     except:
       raise ArithmeticError('Invalid aa integer %s' %str(aa))
-    return "%03i  %-17s%15.5f%15.5f%15.5f   %-5s" \
-            %(iaa, self.name(), self.xcmp_,self.ycmp_,self.zcmp_,self.flag_)
+    return "%3s  %-17s%15.5f%15.5f%15.5f   %-5s" \
+            %(__format_aa__(iaa), self.name(), self.xcmp_,self.ycmp_,self.zcmp_,self.flag_)
+
+class CrdTable:
+  ''' A columnar representation of (the points of) a .CRD file. The points
+      are held in a numpy structured array (``self.data``, of type
+      :data:`CRD_DTYPE`, i.e. with columns ``name``, ``number``, ``x``, ``y``,
+      ``z`` and ``flag``), plus the file header (``self.header``, a list of
+      lines). Station names are compared as ``name + ' ' + number`` (marker
+      number stripped of trailing blanks), or just ``name`` (i.e. the 4-char
+      id) if the marker number is disregarded.
+  '''
+
+  def __init__(self, data=None, header=None):
+    if data is None:
+      data = numpy.zeros(0, dtype=CRD_DTYPE)
+    self.data    = data
+    self.header  = header if header is not None else []
+    self.__index = {}
+
+  def __len__(self):
+    return len(self.data)
+
+  def names(self, use_marker_number=True):
+    ''' Return the (array of) station names; i.e. ``marker_name`` +
+        ``marker_number``, or just the ``marker_name`` if ``use_marker_number``
+        is set to ``False``.
+    '''
+    if not use_marker_number:
+      return self.data['name']
+    ## no trailing blank for stations with no marker number
+    return numpy.char.rstrip(numpy.char.add(numpy.char.add(self.data['name'], ' '), self.data['number']))
+
+  def index(self, use_marker_number=True):
+    ''' Return a dictionary mapping station names (see :func:`names`) to
+        rows of ``self.data``. If a station appears more than once, the first
+        row is used.
+    '''
+    if use_marker_number not in self.__index:
+      names = self.names(use_marker_number).tolist()
+      self.__index[use_marker_number] = dict(zip(reversed(names), xrange(len(names)-1, -1, -1)))
+    return self.__index[use_marker_number]
+
+  def row(self, station, use_marker_number=True):
+    ''' Return the row (of ``self.data``) of station ``station``, or ``None``
+        if the station is not in the table.
+    '''
+    if not use_marker_number: station = station[0:MARKER_NAME_LENGTH]
+    return self.index(use_marker_number).get(station.rstrip())
+
+  def select(self, stalst=None, disregard_number=False, flags=None):
+    ''' Return a new :class:`CrdTable` holding only the points matched in
+        ``stalst`` (a list of station names) and/or having a flag in
+        ``flags`` (a list of flags). If ``disregard_number`` is set to
+        ``True``, the station names are compared using only the 4-char id.
+    '''
+    mask = numpy.ones(len(self.data), dtype=bool)
+    if stalst is not None:
+      if disregard_number:
+        stalst = [ s[0:MARKER_NAME_LENGTH] for s in stalst ]
+      else:
+        stalst = [ s.rstrip() for s in stalst ]
+      mask &= numpy.in1d(self.names(not disregard_number), stalst)
+    if flags is not None:
+      mask &= numpy.in1d(self.data['flag'], flags)
+    return CrdTable(self.data[mask], self.header)
+
+  def toPoints(self):
+    ''' Return the points as a list of (new) :class:`CrdPoint` instances.
+    '''
+    return [ CrdPoint(n, nr, x, y, z, f) for n, nr, x, y, z, f in self.data.tolist() ]
+
+  def asStrings(self):
+    ''' Compile the (Bernese v5.2 .CRD) record lines for all points.
+
+        :returns: A list of lines (with no trailing newline chars).
+    '''
+    return [ "%3s  %-17s%15.5f%15.5f%15.5f   %-5s" %(__format_aa__(i+1), (n + ' ' + nr.ljust(MARKER_NUMBER_LENGTH)), x, y, z, f) \
+      for i, (n, nr, x, y, z, f) in enumerate(self.data.tolist()) ]
+
+  def write(self, filename, header=None):
+    ''' Write the table as a .CRD file. If ``header`` (a list of lines) is
+        not given, ``self.header`` is used. The file is first written to a
+        temporary file (in the same directory), which is then renamed.
+    '''
+    if header is None: header = self.header
+    tmp = os.path.join(os.path.dirname(os.path.abspath(filename)),
+      '.%s.tmp' %os.path.basename(filename))
+    try:
+      with open(tmp, 'w') as fout:
+        fout.write('\n'.join(header + self.asStrings()))
+        fout.write('\n\n')
+      os.rename(tmp, filename)
+    except:
+      if os.path.isfile(tmp): os.remove(tmp)
+      raise
 
 class CrdFile:
   ''' A class to hold a Bernese v5.2 format .CRD file. '''
@@ -99,6 +226,46 @@ class CrdFile:
     if not os.path.isfile(self.filename_):
       raise RuntimeError('Error. Cannot locate .CRD file %s' %filename)
 
+  def getTable(self, stalst=None, disregard_number=False, flags=None):
+    ''' Read the points of the .CRD file into a (columnar)
+        :class:`CrdTable`. All data lines are split into their fixed-width
+        fields in one go (via ``numpy.frombuffer``); the coordinate columns are
+        then converted to float as whole arrays. The optional arguments
+        ``stalst``, ``disregard_number`` and ``flags`` are passed to
+        :func:`CrdTable.select`.
+
+        :returns: A :class:`CrdTable` instance.
+    '''
+    try:
+      fin = open(self.filename_, 'r')
+    except:
+      raise IOError('Failed to open file %s' %self.filename_)
+    with fin:
+      header = [ fin.readline().rstrip('\n') for i in range(0, CRD_HEADER_LINES) ]
+      lines  = [ l.rstrip('\r\n') for l in fin ]
+    lines = [ l for l in lines if len(l.strip()) > 0 ]
+
+    for l in lines:
+      if len(l) < 65:
+        raise RuntimeError('Error reading point from crd file [%s]' %l)
+
+    raw  = numpy.frombuffer(''.join([ l[0:CRD_LINE_LENGTH].ljust(CRD_LINE_LENGTH) for l in lines ]),
+      dtype=CRD_LINE_DTYPE)
+    data = numpy.empty(len(raw), dtype=CRD_DTYPE)
+    data['name']   = raw['name']
+    data['number'] = numpy.char.rstrip(raw['number'])
+    try:
+      for c in ['x', 'y', 'z']:
+        data[c] = raw[c].astype(float)
+    except ValueError:
+      raise RuntimeError('Error reading point(s) from crd file %s' %self.filename_)
+    data['flag']   = numpy.char.strip(raw['flag'])
+
+    table = CrdTable(data, header)
+    if stalst is not None or flags is not None:
+      table = table.select(stalst, disregard_number, flags)
+    return table
+
   def getListOfPoints(self, stalst=None, disregard_number=False):
     ''' Read points off from a .CRD file; return all points as list.
         If the optional argument ``stalst`` is given, (which is supposed
@@ -112,38 +279,11 @@ class CrdFile:
         *NOT* the marker number.
 
         :returns: A list of points (i.e. ``CrdPoint`` s)
-    '''
 
-    points = []
-
-    try:
-      fin = open(self.filename_, 'r')
-    except:
-      raise IOError('Failed to open file %s' %self.filename_)
-
-    ## Skip the first header lines
-    for i in range(0,6): line = fin.readline()
-
-    pt  = CrdPoint()
-    ## Read off all the points and add them to the points list
-    pt = crdpoint()
-    for line in fin:
-      pt.setFromCrdLine(line)
-      if stalst is not None:
-        if disregard_number:
-          if pt.name_ in stalst:
-            points.append(pt)
-        else:
-          if pt.name() in stalst:
-            points.append(pt)
-      else:
-        points.append(pt)
-
-    ## Close the file
-    fin.close()
-
-    ## Return the list of points
-    return points
+        .. note:: This is built on :func:`getTable`; for large files, use
+          the (columnar) table directly.
+    '''
+    return self.getTable(stalst, disregard_number).toPoints()
 
   def getFileHeader(self):
     ''' Return the header of a .CRD file as a list of lines,
@@ -161,4 +301,72 @@ class CrdFile:
       header_lines.append(fin.readline().rstrip('\n'))
 
     fin.close()
-    return header_lines
\ No newline at end of file
+    return header_lines
+
+def mergeTables(update, reference, disregard_number=False, flags=None,
+  include_unmatched=False, delete_unmatched=False):
+  ''' Update the points of the table ``update`` using the points of the table
+      ``reference``. Points are matched by name (i.e. ``marker_name`` +
+      ``marker_number``, or just the 4-char id if ``disregard_number`` is
+      ``True``), using a hash join: each update point is looked up in the
+      name index of the reference table (the first reference point of that
+      name is used).
+
+      * A matched point (whose reference flag is in ``flags``, if ``flags`` is
+        given) keeps its name (and number) but takes the coordinates and flag of
+        the reference point.
+      * Unmatched points are kept as they are, unless ``delete_unmatched`` is
+        ``True``.
+      * If ``include_unmatched`` is ``True``, reference points not present
+        (by name) in the result are appended to it.
+
+      :returns: A tuple ``(table, matched)``, where ``table`` is the merged
+                :class:`CrdTable` (with the header of the ``reference``) and
+                ``matched`` is the number of points updated.
+  '''
+  use_number = not disregard_number
+  ref_index  = reference.index(use_number)
+  ref_rows   = numpy.array([ ref_index.get(n, -1) for n in update.names(use_number).tolist() ],
+    dtype=int)
+  matched    = ref_rows >= 0
+  if flags is not None:
+    ## only index the matched rows; the reference table may be empty
+    matched[matched] &= numpy.in1d(reference.data['flag'][ref_rows[matched]], flags)
+
+  data = update.data.copy()
+  for c in ['x', 'y', 'z', 'flag']:
+    data[c][matched] = reference.data[c][ref_rows[matched]]
+  if delete_unmatched:
+    data = data[matched]
+
+  if include_unmatched:
+    present = set(CrdTable(data).names(use_number).tolist())
+    extra   = []
+    for i, name in enumerate(reference.names(use_number).tolist()):
+      if name not in present:
+        extra.append(i)
+        present.add(name)
+    data = numpy.concatenate([data, reference.data[extra]])
+
+  return CrdTable(data, reference.header), int(numpy.count_nonzero(matched))
+
+def mergeCrdFiles(update_file, reference_file, output_file=None, stalst=None,
+  disregard_number=False, flags=None, include_unmatched=False,
+  delete_unmatched=False):
+  ''' Update the .CRD file ``update_file`` using the points of the .CRD file
+      ``reference_file`` (see :func:`mergeTables`). Only stations in
+      ``stalst`` (if given) are read off from both files. The result is
+      written (atomically, i.e. via a temporary file which is then renamed) to
+      ``output_file``, or to ``update_file`` if ``output_file`` is ``None``.
+      If the result holds no points, nothing is written.
+
+      :returns: A tuple ``(written, matched)``; the number of points written
+                and the number of points updated.
+  '''
+  update    = CrdFile(update_file).getTable(stalst, disregard_number)
+  reference = CrdFile(reference_file).getTable(stalst, disregard_number)
+  table, matched = mergeTables(update, reference, disregard_number, flags,
+    include_unmatched, delete_unmatched)
+  if len(table) > 0:
+    table.write(output_file if output_file is not None else update_file)
+  return len(table), matched
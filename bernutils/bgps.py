@@ -1,7 +1,23 @@
 import os
+import re
+import mmap
+
+SECTION_RE = re.compile(r'^[ \t]*(\d+\.[ \t]+[A-Z][^\r\n]*?|INPUT AND OUTPUT FILENAMES)[ \t]*\r?$', re.MULTILINE)
+''' Regular expression matching the (numbered) section headers of a GPSEST
+    output file, e.g. ``2. OBSERVATION FILES`` or ``13. RESULTS (PART 1)``,
+    plus the (unnumbered) ``INPUT AND OUTPUT FILENAMES`` header.
+'''
 
 class gpsoutfile:
-    ''' A class to hold a Bernese v5.2 GPSEST output file '''
+    ''' A class to hold a Bernese v5.2 GPSEST output file
+
+        .. note:: The first time a section is needed, the whole file is scanned
+            (once) and the byte offsets of all section headers (see
+            ``SECTION_RE``) are recorded; all accessors then seek directly to
+            their section, using a single (open) input stream. Results are
+            memoized on the instance. Call :func:`close` to release the
+            stream.
+    '''
 
     def __init__(self,filename):
         ''' Constructor; check for file existance '''
@@ -12,10 +28,74 @@ class gpsoutfile:
         self.__ses       = ''  #: Session (processed)
         self.__yr        = ''  #: Year (processed)
         self.__stations  = []  #: List of stations included in the processing/output file
+        self.__stream    = None  #: The (single) input stream
+        self.__sections  = None  #: Section header offsets
+        self.__memo      = {}  #: Memoized results
         if not os.path.isfile(self.__filename):
             raise IOError('No such file '+filename)
 
-    def findFirstLine(self,stream,line,eof_line='>>>',max_lines=1000):
+    def close(self):
+        ''' Close the input stream (if open). '''
+        if self.__stream is not None:
+            self.__stream.close()
+            self.__stream = None
+
+    def __stream__(self):
+        ''' Return the input stream, opening the file if needed. '''
+        if self.__stream is None:
+            try:
+                self.__stream = open(self.__filename,'r')
+            except:
+                raise IOError('No such file '+self.__filename)
+        return self.__stream
+
+    def __index_sections__(self):
+        ''' Scan the file (once) and record the byte offsets of all section
+            headers (see ``SECTION_RE``).
+
+            :returns: A dictionary with key the (stripped) header line, e.g.
+                      ``'2. OBSERVATION FILES'`` and value a (sorted) list of
+                      offsets, one for every occurance of the header.
+        '''
+        if self.__sections is not None:
+            return self.__sections
+
+        sections = {}
+        if os.path.getsize(self.__filename) > 0:
+            with open(self.__filename, 'rb') as fin:
+                buf = mmap.mmap(fin.fileno(), 0, access=mmap.ACCESS_READ)
+                try:
+                    for m in SECTION_RE.finditer(buf):
+                        sections.setdefault(m.group(1), []).append(m.start())
+                finally:
+                    buf.close()
+
+        self.__sections = sections
+        return sections
+
+    def sections(self):
+        ''' Return a (sorted by offset) list of ``(offset, header)`` tuples, for
+            all section headers in the file.
+        '''
+        return sorted([ (o, h) for h, offs in self.__index_sections__().iteritems() for o in offs ])
+
+    def __seek_section__(self, header, nth=0, after=-1):
+        ''' Position the input stream at the end of the ``nth`` occurance of
+            the section ``header`` located after the offset ``after``; a
+            negative ``nth`` counts from the last occurance (as in list
+            indexing).
+
+            :returns: The input stream.
+        '''
+        offsets = [ o for o in self.__index_sections__().get(header, []) if o > after ]
+        if not len(offsets) or nth >= len(offsets):
+            raise RuntimeError('Cannot find section \'%s\' in file %s' %(header, self.__filename))
+        fin = self.__stream__()
+        fin.seek(offsets[nth])
+        fin.readline()
+        return fin
+
+    def findFirstLine(self,stream,line,eof_line='>>>',max_lines=None):
         ''' Given a GPSEST output file, try to match the line passed as
             ``line``, until ``eof_line`` is not matched and no more than
             ``max_lines`` are read.
@@ -25,7 +105,9 @@ class gpsoutfile:
             :param stream:    The (calling) instance's input stream.
             :param line:      The prototype line to match.
             :param eof_line:  EOF record.
-            :param max_lines: Max lines to be read befor quiting.
+            :param max_lines: Max lines to be read befor quiting; if ``None``,
+                              there is no limit (search until ``eof_line`` or
+                              the end of file).
 
             :returns:         On success, the matched line; input buffer is set
                               at the end of the matched line.
@@ -42,7 +124,7 @@ class gpsoutfile:
 
         stop = len(eof_line)
         dummy_it = 0
-        while (dummy_it < max_lines):
+        while ln and (max_lines is None or dummy_it < max_lines):
             if ln.strip() == line:
                 return ln
             elif ln.strip()[0:stop] == eof_line:
@@ -50,17 +132,29 @@ class gpsoutfile:
             dummy_it += 1
             ln = stream.readline()
 
+        raise RuntimeError('Cannot find line :'+line)
+
+    def __memoized__(self, key, func):
+        ''' Return the memoized result ``key``, computing it via ``func()`` if
+            needed.
+        '''
+        if key not in self.__memo:
+            self.__memo[key] = func()
+        return self.__memo[key]
+
     def getHeaderInfo(self):
         ''' Given a GPSEST output file, try to read the header
             information and return in in a list as:
             campaign_name, doy, session, year, date_run, username, # of stations
         '''
+        return self.__memoized__('header', self.__header_info__)
 
-        try:
-            fin = open(self.__filename,'r')
-        except:
-            fin.close()
-            raise IOError('No such file '+self.__filename)
+    def __header_info__(self):
+        ''' Parse the header (first 11 lines) and the station list (section
+            *4. STATIONS*), see :func:`getHeaderInfo`.
+        '''
+        fin = self.__stream__()
+        fin.seek(0)
 
         ## first line is empty
         line = fin.readline()
@@ -73,7 +167,6 @@ class gpsoutfile:
         ##  Bernese GNSS Software, Version 5.2
         line = fin.readline().strip()
         if line != 'Bernese GNSS Software, Version 5.2':
-            fin.close()
             raise RuntimeError('Invalid GPSEST format: line 3')
 
         ## Forth line ->
@@ -85,7 +178,6 @@ class gpsoutfile:
         ## Program        : GPSEST
         line = fin.readline().split()
         if not (len(line) == 3 and line[2] == 'GPSEST'):
-            fin.close()
             raise RuntimeError('Invalid GPSEST format: line 5')
         self.__program = line[2]
 
@@ -101,7 +193,6 @@ class gpsoutfile:
         ## Campaign       : ${P}/LAVMO
         line = fin.readline().split()
         if not len(line) == 3:
-            fin.close()
             raise RuntimeError('Invalid GPSEST format: line 8')
         self.__campaign = line[2].split('/')[-1]
 
@@ -109,7 +200,6 @@ class gpsoutfile:
         ## Default session: 1190 year 2015
         line = fin.readline().split()
         if not len(line) == 5:
-            fin.close()
             raise RuntimeError('Invalid GPSEST format: line 9')
         self.__doy = line[2][0:-1]
         self.__ses = line[2][-1]
@@ -119,7 +209,6 @@ class gpsoutfile:
         ## Date           : 15-Jun-2015 15:16:49
         line = fin.readline().split()
         if not len(line) == 4:
-            fin.close()
             raise RuntimeError('Invalid GPSEST format: line 10')
         dtrun = line[2] + ' ' + line[3]
 
@@ -127,39 +216,30 @@ class gpsoutfile:
         ## User name      : xanthos
         line = fin.readline().split()
         if not len(line) == 4:
-            fin.close()
             raise RuntimeError('Invalid GPSEST format: line 11')
         user = line[3]
 
-        ## go to the second occurance of '4. STATIONS'
-        self.__stations = []
-        lstr = '4. STATIONS'
-        try:
-            self.findFirstLine(fin,lstr)
-        except:
-            fin.close()
-            raise RuntimeError('Station list not found until EOF!')
+        ##  go to the second occurance of '4. STATIONS'; the first one is in
+        ##+ the table of contents.
         self.__stations = []
-        lstr = '4. STATIONS'
         try:
-            self.findFirstLine(fin,lstr)
+            self.__seek_section__('4. STATIONS', 1)
         except:
-            fin.close()
             raise RuntimeError('Station list not found until EOF!')
 
         for i in range(0,17): line = fin.readline()
 
         if line.strip() != 'num  Station name     obs e/f/h        X (m)           Y (m)           Z (m)        Latitude       Longitude    Height (m)':
-            fin.close()
             raise RuntimeError('Error matching station list!')
         line = fin.readline()
 
         line = fin.readline()
+        stations = []
         while (True):
             if len(line) < 5:
                 break;
             try:
-                self.__stations.append(line[6:21].strip())
+                stations.append(line[6:21].strip())
                 feh = line[27:34].strip()
                 x = float(line[34:50])
                 y = float(line[50:66])
@@ -167,8 +247,7 @@ class gpsoutfile:
             except:
                 raise RuntimeError('Error matching station list!')
             line = fin.readline()
-
-        fin.close()
+        self.__stations = stations
 
         return self.__campaign, self.__doy, self.__ses, self.__yr, dtrun, user
 
@@ -183,29 +262,25 @@ class gpsoutfile:
             [FILE TYP FREQ.  STATION 1        STATION 2        SESS  FIRST OBSERV.TIME  #EPO  DT #EF #CLK ARC #SAT  W 12    #AMB  L1  L2  L5  RM]
             and the concatenated list is returned, i.e.:
             [aa, baseline_name, type, frequency, station1, station2, first_observation, # of epochs]
-        '''
 
-        try:
-            fin = open(self.__filename,'r')
-        except:
-            raise IOError('No such file '+self.__filename)
+            .. note:: The session of each baseline is checked against the
+                header's session; if the header is not read yet, this will
+                call :func:`getHeaderInfo`.
+        '''
+        return [ list(b) for b in self.__memoized__('baselines', self.__baseline_list__) ]
 
-        num_of_bsl = 0
-        dummy_it   = 0
+    def __baseline_list__(self):
+        ''' Parse the baseline tables, see :func:`getBaselineList`. '''
+        self.getHeaderInfo()
 
-        ## skip everything until 'INPUT AND OUTPUT FILENAMES' line
-        lstr = 'INPUT AND OUTPUT FILENAMES'
+        ## the first '2. OBSERVATION FILES' after 'INPUT AND OUTPUT FILENAMES'
         try:
-            self.findFirstLine(fin,lstr)
+            start = self.__index_sections__()['INPUT AND OUTPUT FILENAMES'][0]
         except:
-            fin.close()
             raise RuntimeError('Baseline list not found until EOF!')
-
-        lstr = '2. OBSERVATION FILES'
         try:
-            self.findFirstLine(fin,lstr)
+            fin = self.__seek_section__('2. OBSERVATION FILES', 0, start)
         except:
-            fin.close()
             raise RuntimeError('"2. OBSERVATION FILES" list not found until EOF!')
 
         ## skip next 10 lines
@@ -215,15 +290,15 @@ class gpsoutfile:
         ## next line should be:
         ## FILE  OBSERVATION FILE HEADER          OBSERVATION FILE                  SESS     RECEIVER 1            RECEIVER 2
         if line.strip() != 'FILE  OBSERVATION FILE HEADER          OBSERVATION FILE                  SESS     RECEIVER 1            RECEIVER 2':
-            fin.close()
             raise RuntimeError('Unexpected line wile searching for baselines [1]!')
 
         ## skip next 2 lines
         for i in range(0,2):
             line = fin.readline()
 
-        dummy_it = 0
-        bsl_lst_1 = []
+        session    = self.__doy + self.__ses
+        num_of_bsl = 0
+        bsl_lst_1  = []
         ## read baselines
         line = fin.readline()
         while len(line) > 5:
@@ -233,27 +308,17 @@ class gpsoutfile:
                 _head = l[1]
                 _obs  = l[2]
                 _ses  = l[3]
-                _rec1 = line[83:106].strip()
-                _rec2 = line[106:].strip()
                 bsl_lst_1.append( [_aa,os.path.basename(_head)[0:-3]] )
-                ## print 'added list element ->',[_aa,os.path.basename(_head)[0:-3]]
                 num_of_bsl += 1
             except:
-                fin.close()
                 raise RuntimeError('Failed reading baselines!')
-            if _ses != self.__doy + self.__ses:
-                fin.close()
+            if _ses != session:
                 raise RuntimeError('Failed reading baselines! Invalid session')
             line = fin.readline()
-            dummy_it += 1
-            if dummy_it > 200:
-                fin.close()
-                raise RuntimeError('Failed reading baselines!')
 
         line = fin.readline()
         line = fin.readline()
         if line.strip() != 'FILE TYP FREQ.  STATION 1        STATION 2        SESS  FIRST OBSERV.TIME  #EPO  DT #EF #CLK ARC #SAT  W 12    #AMB  L1  L2  L5  RM':
-            fin.close()
             raise RuntimeError('Unexpected line wile searching for baselines [2]!')
 
         ## skip next 2 lines
@@ -262,12 +327,10 @@ class gpsoutfile:
 
         ## read baselines
         bsl_lst_2   = []
-        dummy_it    = 0
         num_of_bsl2 = 0
         line = fin.readline()
         while len(line) > 5:
             if (num_of_bsl2 > num_of_bsl):
-                fin.close()
                 raise RuntimeError('Failed reading baselines!')
             l = line.split()
             try:
@@ -280,17 +343,10 @@ class gpsoutfile:
                 _epochs = int(line[77:81])
                 num_of_bsl2 += 1
                 bsl_lst_2.append( [_aa,_type,_freq,_sta1,_sta2,_first_obs,_epochs] )
-                ## print 'added list element ->',[_aa,_type,_freq,_sta1,_sta2,_first_obs,_epochs]
             except:
-                fin.close()
                 raise RuntimeError('Failed reading baselines!')
-            if _ses != self.__doy + self.__ses:
-                fin.close()
-                raise RuntimeError('Failed reading baselines! Invalid session')
             line = fin.readline()
 
-        fin.close()
-
         baseline_list = []
         for i, j in zip(bsl_lst_1,bsl_lst_2):
             if i[0] != j[0]:
@@ -305,26 +361,25 @@ class gpsoutfile:
         ''' Given a GPSEST output file, this function will try to read information regarding the
             (solution) coordinate results. The information is collected from the table:
             'NUM  STATION NAME     PARAMETER    A PRIORI VALUE       NEW VALUE     NEW- A PRIORI  RMS ERROR   3-D ELLIPSOID       2-D ELLIPSE'
-            for every stations already mentioned in the instances station list. So make sure,
-            the instances station list is already filled. The return list, contains
+            for every station in the instance's station list; if the list is
+            not filled yet, this will call :func:`getHeaderInfo`. The return list, contains
             a list for every station, in the following format:
             [name,3x(a-priori,estimated,new-old,rms),3x(new-old,rms)]
             for   X, Y, Z                            HGT, LAT, LON
             TODO A same block of information maybe available in the section 'RESULTS PART 2'. Try reading that
             before reading the blok from 'RESULTS PART 1'.
         '''
+        return [ list(s) for s in self.__memoized__('coordinates', self.__crd_sol_info__) ]
 
-        try:
-            fin = open(self.__filename,'r')
-        except:
-            raise IOError('No such file '+self.__filename)
+    def __crd_sol_info__(self):
+        ''' Parse the coordinate results, see :func:`getCrdSolInfo`. '''
+        self.getHeaderInfo()
 
-        ## skip everything until '13. RESULTS (PART 1)' line
-        lstr = '13. RESULTS (PART 1)'
+        ##  go to the first occurance of '13. RESULTS (PART 1)' (maybe in the
+        ##+ table of contents) and search forward for the coordinate table.
         try:
-            self.findFirstLine(fin,lstr)
+            fin = self.__seek_section__('13. RESULTS (PART 1)', 0)
         except:
-            fin.close()
             raise RuntimeError('Coordinate list not found until EOF!')
 
         ## skip everything until
@@ -332,7 +387,6 @@ class gpsoutfile:
         try:
             self.findFirstLine(fin,lstr)
         except:
-            fin.close()
             raise RuntimeError('Coordinate list not found until EOF!')
 
         line = fin.readline()
@@ -350,7 +404,6 @@ class gpsoutfile:
                         tmp_info.append(station_)
                     cflag = line[23:25].strip()
                     if (i == 0 and cflag != 'X') or (i == 1 and cflag != 'Y') or (i == 2 and cflag != 'Z'):
-                        fin.close()
                         raise RuntimeError('Error reading parameter' + str(i))
                     a_priori  = float(line[36:51])
                     estimated = float(line[55:70])
@@ -358,7 +411,6 @@ class gpsoutfile:
                     rms       = float(line[85:].strip())
                     tmp_info += [a_priori,estimated,new_old,rms]
                 except:
-                    fin.close()
                     raise RuntimeError('Error reading cartesian parameters' + str(i))
 
             line = fin.readline()
@@ -369,17 +421,13 @@ class gpsoutfile:
                     rms       = float(line[85:95])
                     tmp_info += [new_old,rms]
                 except:
-                    fin.close()
                     raise RuntimeError('Error reading geodetic parameters' + str(i))
 
             station_info.append( tmp_info )
-            ##print tmp_info
             it += 1
             line = fin.readline()
 
         if it != len(self.__stations):
-            fin.close()
             raise RuntimeError('Error collecting station parameters')
 
-        fin.close()
         return station_info
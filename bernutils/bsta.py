@@ -2,7 +2,14 @@ import os
 import sys
 import re
 import fnmatch
+import bisect
+import itertools
+import operator
 import datetime
+import hashlib
+import tempfile
+import cPickle
+import numpy
 
 __DEBUG_MODE__ = False
 
@@ -12,10 +19,11 @@ MAX_STA_DATE = datetime.datetime.max
 class Type001:
   ''' A class to hold type 001 station information records for a single station.
   '''
-  def __init__(self, line):
+  def __init__(self, line=None, fields=None):
     ''' Initialize a :py:class:`bernutils.bsta.type001` instance using a type 001
         information line. This will set the start and stop date and the 
-        station name.
+        station name. Alternatively, the instance can be constructed from
+        (already resolved) ``fields``, as returned by :func:`__fields__`.
 
         An example of a .STA file type 001 info line follows::
 
@@ -25,30 +33,21 @@ class Type001:
           ISBA 20308M001        003                                            ISBA                  EXTRA RENAMING
 
     '''
+    if fields is not None:
+      strings, floats, self.__start_date, self.__stop_date = fields
+      self.__sta_name, self.__flag, self.__old_name, self.__remark = strings
+      return
+
     self.__sta_name   = line[0:16].rstrip()
     self.__flag       = line[22:25].rstrip()
     self.__old_name   = line[69:89].rstrip()
     self.__remark     = line[91:].rstrip()
 
     ## resolve the start date (or set to min if empty)
-    t_str = line[27:46].strip()
-    if len(t_str) == 0:
-      self.__start_date = MIN_STA_DATE
-    else:
-      try:
-        self.__start_date = datetime.datetime.strptime(t_str.strip(), '%Y %m %d %H %M %S')
-      except:
-        raise RuntimeError('Invalid date format at line [%s]' %line.strip())
-
-    ## resolve stop date (or set to now)
-    t_str = line[48:67].strip()
-    if len(t_str) == 0:
-      self.__stop_date = MAX_STA_DATE ##datetime.datetime.now()
-    else:
-      try:
-        self.__stop_date = datetime.datetime.strptime(t_str.strip(), '%Y %m %d %H %M %S')
-      except:
-        raise RuntimeError('Invalid date format at line [%s]' %line.strip())
+    self.__start_date = resolve_sta_date(line, 27, MIN_STA_DATE)
+
+    ## resolve stop date (or set to max if empty)
+    self.__stop_date = resolve_sta_date(line, 48, MAX_STA_DATE)
 
   def __str_format__(self):
     ''' Format the instance as a valid Type 001 record
@@ -68,6 +67,13 @@ class Type001:
   def __str__(self):
     return self.__str_format__()
 
+  def __fields__(self):
+    ''' Return the (resolved) fields of the instance, as a tuple
+        ``(strings, floats, start, stop)``.
+    '''
+    return (self.__sta_name, self.__flag, self.__old_name, self.__remark), \
+      (), self.__start_date, self.__stop_date
+
   def __issue_renaming__warning__(self, station):
     ''' Issue a warning (to stderr) of a station renaming
     '''
@@ -108,10 +114,11 @@ class Type002:
   ''' A class to hold type 002 station information records for a single station.
   '''
 
-  def __init__(self, line):
+  def __init__(self, line=None, fields=None):
     ''' Initialize a :py:class:`bernutils.bsta.type002` instance using a type 002
         information line. This will set the start and stop date and the 
-        station name.
+        station name. Alternatively, the instance can be constructed from
+        (already resolved) ``fields``, as returned by :func:`__fields__`.
 
         An example of a .STA file type 002 info line follows::
 
@@ -122,6 +129,14 @@ class Type002:
           AZGB 49541S001        001  2004 07 21 00 00 00  2004 08 26 23 59 59  TRIMBLE 4700                                999999  TRM33429.00+GP  NONE                        999999    0.0000    0.0000    0.0000  Globe, US               NEW
 
     '''
+    if fields is not None:
+      strings, floats, self.__start_date, self.__stop_date = fields
+      self.__sta_name, self.__flag, self.__receiver_t, self.__receiver_sn, \
+        self.__receiver_nr, self.__antenna_t, self.__antenna_sn, \
+        self.__antenna_nr, self.__description, self.__remark = strings
+      self.__north, self.__east, self.__up = floats
+      return
+
     self.__sta_name    = line[0:16].rstrip()
     self.__flag        = line[22:25].rstrip()
     self.__receiver_t  = line[69:89].rstrip()
@@ -138,24 +153,10 @@ class Type002:
     self.__remark      = line[227:].rstrip()
 
     ## resolve the start date (or set to min if empty)
-    t_str = line[27:46].strip()
-    if len(t_str) == 0:
-      self.__start_date = MIN_STA_DATE
-    else:
-      try:
-        self.__start_date = datetime.datetime.strptime(t_str.strip(), '%Y %m %d %H %M %S')
-      except:
-        raise RuntimeError('Invalid date format at line [%s]' %line.strip())
-
-    ## resolve stop date (or set to now)
-    t_str = line[48:67].strip()
-    if len(t_str) == 0:
-      self.__stop_date = MAX_STA_DATE
-    else:
-      try:
-        self.__stop_date = datetime.datetime.strptime(t_str.strip(), '%Y %m %d %H %M %S')
-      except:
-        raise RuntimeError('Invalid date format at line [%s]' %line.strip())
+    self.__start_date = resolve_sta_date(line, 27, MIN_STA_DATE)
+
+    ## resolve stop date (or set to max if empty)
+    self.__stop_date = resolve_sta_date(line, 48, MAX_STA_DATE)
 
   def station_name(self):
     return self.__sta_name
@@ -163,6 +164,14 @@ class Type002:
   def flag(self):
     return self.__flag
 
+  def start(self):
+    ''' Return the start datetime (as ``datetime``). '''
+    return self.__start_date
+
+  def stop(self):
+    ''' Return the stop datetime (as ``datetime``). '''
+    return self.__stop_date
+
   def receiver_type(self):
     return self.__receiver_t
 
@@ -210,6 +219,15 @@ class Type002:
   def __str__(self):
     return self.__str_format__()
 
+  def __fields__(self):
+    ''' Return the (resolved) fields of the instance, as a tuple
+        ``(strings, floats, start, stop)``.
+    '''
+    return (self.__sta_name, self.__flag, self.__receiver_t, self.__receiver_sn,
+      self.__receiver_nr, self.__antenna_t, self.__antenna_sn, self.__antenna_nr,
+      self.__description, self.__remark), (self.__north, self.__east, self.__up), \
+      self.__start_date, self.__stop_date
+
   def __match_t1__(self, t1, no_marker_number=False):
     ''' Check if (this) Type 002 entry matches a Type 001 entry. Will check the
         following:
@@ -234,41 +252,515 @@ class Type002:
       and (self.__start_date >= t1.start() or  self.__start_date == MIN_STA_DATE) \
       and (self.__stop_date <= t1.stop() or self.__stop_date == MAX_STA_DATE)
 
+class StaRecord:
+  ''' A class to hold a (raw) Type 003, 004 or 005 record. Only the station
+      name, flag and validity interval are resolved; the rest of the line is
+      kept as is.
+
+      An example of a .STA file type 003 info line follows::
+
+        STATION NAME          FLG          FROM                   TO         REMARK
+        ****************      ***  YYYY MM DD HH MM SS  YYYY MM DD HH MM SS  ************************
+        AUCK 50209M001        001  2004 01 01 00 00 00  2004 01 31 23 59 59  Receiver problems
+
+      Type 004 records (relative constraints between two stations) have no
+      flag and no validity interval; for these, the interval is set to
+      [MIN_STA_DATE, MAX_STA_DATE].
+  '''
+
+  def __init__(self, line, itype, fields=None):
+    if fields is not None:
+      strings, floats, self.__start_date, self.__stop_date = fields
+      self.__line, self.__sta_name, self.__flag = strings
+      self.__type = itype
+      return
+
+    self.__type     = itype
+    self.__line     = line.rstrip('\n')
+    self.__sta_name = line[0:16].rstrip()
+    if itype == 4:
+      self.__flag       = ''
+      self.__start_date = MIN_STA_DATE
+      self.__stop_date  = MAX_STA_DATE
+    else:
+      self.__flag       = line[22:25].rstrip()
+      self.__start_date = resolve_sta_date(line, 27, MIN_STA_DATE)
+      self.__stop_date  = resolve_sta_date(line, 48, MAX_STA_DATE)
+
+  def __repr__(self):
+    return self.__line
+
+  def __str__(self):
+    return self.__line
+
+  def __fields__(self):
+    ''' Return the (resolved) fields of the instance, as a tuple
+        ``(strings, floats, start, stop)``.
+    '''
+    return (self.__line, self.__sta_name, self.__flag), (), \
+      self.__start_date, self.__stop_date
+
+  def type(self):
+    ''' Return the type (i.e. block) of the record, as integer. '''
+    return self.__type
+
+  def station_name(self):
+    return self.__sta_name
+
+  def flag(self):
+    return self.__flag
+
+  def start(self):
+    ''' Return the start datetime (as ``datetime``). '''
+    return self.__start_date
+
+  def stop(self):
+    ''' Return the stop datetime (as ``datetime``). '''
+    return self.__stop_date
+
+##  Memo of the (fixed-width) date fields already resolved by resolve_sta_date;
+##+ the same few timestamps (e.g. '2099 12 31 00 00 00') are repeated all over
+##+ a .STA file.
+__STA_DATES__    = {}
+MAX_MEMO_DATES   = 100000
+
+def resolve_sta_date(line, col, default):
+  ''' Resolve a (fixed-width) date field of a .STA record, starting at column
+      ``col`` of ``line``, in the format ``YYYY MM DD HH MM SS``. If the field
+      is empty, ``default`` is returned (i.e. one of ``MIN_STA_DATE`` or
+      ``MAX_STA_DATE``).
+
+      The integer fields are sliced off the line directly (no ``strptime``) and
+      the results are memoized. Fields not following the fixed-column layout
+      are passed to ``strptime``, so the result is always the same as
+      ``datetime.datetime.strptime(field.strip(), '%Y %m %d %H %M %S')``.
+  '''
+  t_str = line[col:col+19]
+  date  = __STA_DATES__.get(t_str)
+  if date is not None:
+    return date
+  if len(t_str.strip()) == 0:
+    return default
+
+  try:
+    if len(t_str) == 19 and t_str[4] == t_str[7] == t_str[10] == t_str[13] == t_str[16] == ' ' \
+      and (t_str[0:4] + t_str[5:7] + t_str[8:10] + t_str[11:13] + t_str[14:16] + t_str[17:19]).isdigit():
+      date = datetime.datetime(int(t_str[0:4]), int(t_str[5:7]), int(t_str[8:10]),
+        int(t_str[11:13]), int(t_str[14:16]), int(t_str[17:19]))
+    else:
+      date = datetime.datetime.strptime(t_str.strip(), '%Y %m %d %H %M %S')
+  except:
+    raise RuntimeError('Invalid date format at line [%s]' %line.strip())
+
+  if len(__STA_DATES__) >= MAX_MEMO_DATES:
+    __STA_DATES__.clear()
+  __STA_DATES__[t_str] = date
+  return date
+
+class StaIndex:
+  ''' An index of the records of a .STA file, built in a single pass. For
+      each type (001 to 005), records are held in dictionaries keyed by
+      station name and by station id (i.e. the first 4 chars of the name). The
+      per-station lists are sorted by start date, so that validity intervals can
+      be searched using bisection.
+
+      Type 001 records are further indexed by their ``OLD STATION NAME`` (which
+      may contain UNIX shell-type wildcards), bucketed by its first 4 chars.
+  '''
+
+  def __init__(self):
+    ## all records (in file order), per type
+    self.records   = {}
+    ## per type, dictionaries {station name: [records]} and {station id: [records]}
+    self.by_name   = {}
+    self.by_id     = {}
+    ## the start dates of the lists in by_name and by_id (for bisection)
+    self.__starts  = {}
+    ## Type 001 old station name patterns; key is the first 4 chars
+    self.old_names = {}
+    ## Type 001 old station name patterns, with wildcards in the first 4 chars
+    self.old_wild  = []
+    ## position of each Type 001 record in the file
+    self.__order   = {}
+
+  def add(self, itype, rec):
+    ''' Add a record of type ``itype`` (records must be added in file order).
+        The per-station dictionaries are only built by :func:`finalize`.
+    '''
+    self.records.setdefault(itype, []).append(rec)
+    if itype == 1:
+      self.__order[rec] = len(self.__order)
+      pattern = rec.old_staname()
+      if any(c in pattern[0:4] for c in '*?['):
+        self.old_wild.append(rec)
+      else:
+        self.old_names.setdefault(pattern[0:4], []).append(rec)
+
+  def finalize(self):
+    ''' Build the per-station (and per-id) lists, sorted by start date.
+        Records with the same start date keep their order in the file.
+    '''
+    for itype, recs in self.records.iteritems():
+      keys = [ (r.station_name(), r.start(), i) for i, r in enumerate(recs) ]
+      for by_key, dct, cut in [ ('name', self.by_name, 16), ('id', self.by_id, 4) ]:
+        dct[itype] = {}
+        ## sort on (station, start date, position in file)
+        for sta, group in itertools.groupby(sorted((k[0][0:cut], k[1], k[2]) for k in keys), \
+          key=operator.itemgetter(0)):
+          group = list(group)
+          dct[itype][sta] = [ recs[g[2]] for g in group ]
+          self.__starts[(by_key, itype, sta)] = [ g[1] for g in group ]
+
+  def station_records(self, itype, station, no_marker_number=False):
+    ''' Return the (sorted by start date) list of records of type ``itype``
+        for the station ``station``. If ``no_marker_number`` is set to True,
+        only the first 4 chars of the station name (i.e. the id) are used.
+    '''
+    if no_marker_number == True:
+      return self.by_id.get(itype, {}).get(station[0:4], [])
+    return self.by_name.get(itype, {}).get(station, [])
+
+  def match_old_name(self, station):
+    ''' Return all Type 001 records, whose ``OLD STATION NAME`` (used as UNIX
+        shell-type pattern) matches ``station`` (in file order).
+    '''
+    candidates = self.old_names.get(station[0:4], [])
+    if len(self.old_wild) > 0:
+      candidates = sorted(candidates + self.old_wild, key=lambda r: self.__order[r])
+    return [ r for r in candidates if fnmatch.fnmatch(station, r.old_staname()) ]
+
+  def within(self, itype, station, start, stop, no_marker_number=False):
+    ''' Return the records of type ``itype`` for the station ``station``
+        that lie within the interval [``start``, ``stop``] (sorted by start
+        date). Open-ended records (i.e. starting at ``MIN_STA_DATE`` or ending
+        at ``MAX_STA_DATE``) are considered to match at the open end.
+    '''
+    recs = self.station_records(itype, station, no_marker_number)
+    if len(recs) == 0:
+      return []
+    if no_marker_number == True:
+      starts = self.__starts[('id', itype, station[0:4])]
+    else:
+      starts = self.__starts[('name', itype, station)]
+    ## records with start date == MIN_STA_DATE are placed first
+    nmin = bisect.bisect_right(starts, MIN_STA_DATE)
+    lo   = max(nmin, bisect.bisect_left(starts, start))
+    return [ r for r in recs[0:nmin] + recs[lo:] \
+      if r.stop() <= stop or r.stop() == MAX_STA_DATE ]
+
+##  Sidecar cache of (parsed) .STA files. For each type, the cache holds flat
+##+ arrays of start/stop epochs (int64 seconds since STA_EPOCH; the sentinels
+##+ MIN_STA_DATE and MAX_STA_DATE are mapped to the int64 limits), of indexes to
+##+ a table of (unique) strings and of the float fields. The cache file starts
+##+ with a header holding the signature (size, mtime and sha256) of the .STA
+##+ file it was created from; it is only used if the signature matches.
+CACHE_VERSION = 1
+CACHE_SUFFIX  = '.cache'
+STA_EPOCH     = datetime.datetime(1970, 1, 1)
+MIN_STA_SECS  = -2**63
+MAX_STA_SECS  = 2**63 - 1
+
+def sta_file_signature(filen):
+  ''' Return the signature of a file, as a tuple ``(size, mtime, sha256)``.
+  '''
+  st  = os.stat(filen)
+  sha = hashlib.sha256()
+  with open(filen, 'rb') as fin:
+    for block in iter(lambda: fin.read(1024*1024), ''):
+      sha.update(block)
+  return st.st_size, st.st_mtime, sha.hexdigest()
+
+def __date2secs__(date):
+  ''' Utility function; translate a .STA date to (integer) seconds. '''
+  if date == MIN_STA_DATE:
+    return MIN_STA_SECS
+  if date == MAX_STA_DATE:
+    return MAX_STA_SECS
+  delta = date - STA_EPOCH
+  return delta.days*86400 + delta.seconds
+
+def __secs2date__(secs, memo):
+  ''' Utility function; translate (integer) seconds to a .STA date. ``memo``
+      is a dictionary of already translated values (seeded with the
+      sentinels).
+  '''
+  date = memo.get(secs)
+  if date is None:
+    date = memo[secs] = STA_EPOCH + datetime.timedelta(seconds=secs)
+  return date
+
+def write_cache(idx, signature, cache_file):
+  ''' Write a :py:class:`StaIndex` to the (sidecar) cache file ``cache_file``.
+      The file is first written to a temporary file (in the same directory),
+      which is then renamed, so that readers never see a partial cache.
+
+      :param idx:        The :py:class:`StaIndex` instance to write.
+      :param signature:  The signature of the .STA file, as returned by
+                         :func:`sta_file_signature`.
+      :param cache_file: The name of the cache file.
+  '''
+  strings = []
+  lookup  = {}
+  types   = {}
+  for itype, recs in idx.records.iteritems():
+    starts, stops, str_idx, floats = [], [], [], []
+    for rec in recs:
+      strs, flts, start, stop = rec.__fields__()
+      row = []
+      for x in strs:
+        if x not in lookup:
+          lookup[x] = len(strings)
+          strings.append(x)
+        row.append(lookup[x])
+      str_idx.append(row)
+      floats.append(flts)
+      starts.append(__date2secs__(start))
+      stops.append(__date2secs__(stop))
+    types[itype] = {
+      'start'   : numpy.array(starts, dtype=numpy.int64),
+      'stop'    : numpy.array(stops, dtype=numpy.int64),
+      'strings' : numpy.array(str_idx, dtype=numpy.int32),
+      'floats'  : numpy.array(floats, dtype=float)
+    }
+
+  header = {'version': CACHE_VERSION, 'signature': signature}
+  cache_dir = os.path.dirname(os.path.abspath(cache_file))
+  fd, tmp = tempfile.mkstemp(dir=cache_dir, prefix='.sta')
+  try:
+    with os.fdopen(fd, 'wb') as fout:
+      cPickle.dump(header, fout, 2)
+      cPickle.dump({'strings': strings, 'types': types}, fout, 2)
+    os.rename(tmp, cache_file)
+  except:
+    if os.path.isfile(tmp): os.remove(tmp)
+    raise
+
+def read_cache(cache_file, signature):
+  ''' Read a :py:class:`StaIndex` from the (sidecar) cache file ``cache_file``.
+
+      :param cache_file: The name of the cache file.
+      :param signature:  The signature of the .STA file, as returned by
+                         :func:`sta_file_signature`.
+
+      :returns:          A :py:class:`StaIndex` instance, or ``None`` if the
+                         cache file does not exist, is not valid or was not
+                         created from a file with the given signature.
+  '''
+  if not os.path.isfile(cache_file):
+    return None
+  try:
+    with open(cache_file, 'rb') as fin:
+      header = cPickle.load(fin)
+      if header.get('version') != CACHE_VERSION or header.get('signature') != signature:
+        return None
+      data = cPickle.load(fin)
+  except Exception, e:
+    if __DEBUG_MODE__ == True:
+      print '[DEBUG] Failed to read .STA cache %s (%s)' %(cache_file, e)
+    return None
+
+  strings = numpy.array([ intern(x) for x in data['strings'] ], dtype=object)
+  memo    = {MIN_STA_SECS: MIN_STA_DATE, MAX_STA_SECS: MAX_STA_DATE}
+  idx     = StaIndex()
+  for itype in sorted(data['types']):
+    arrays = data['types'][itype]
+    starts = [ __secs2date__(x, memo) for x in arrays['start'].tolist() ]
+    stops  = [ __secs2date__(x, memo) for x in arrays['stop'].tolist() ]
+    ## translate all string indexes in one go
+    strs   = strings[arrays['strings']].tolist()
+    floats = arrays['floats'].tolist()
+    if itype == 1:
+      recs = [ Type001(fields=f) for f in zip(strs, floats, starts, stops) ]
+    elif itype == 2:
+      recs = [ Type002(fields=f) for f in zip(strs, floats, starts, stops) ]
+    else:
+      recs = [ StaRecord(None, itype, f) for f in zip(strs, floats, starts, stops) ]
+    for rec in recs:
+      idx.add(itype, rec)
+  idx.finalize()
+  return idx
+
+def __epochs2secs__(epochs):
+  ''' Utility function; translate epochs to an (int64) array of seconds since
+      STA_EPOCH. ``epochs`` can be a ``datetime`` (or a list of), a numpy
+      ``datetime64`` array or an array of integer seconds (since STA_EPOCH).
+  '''
+  if isinstance(epochs, datetime.datetime):
+    return numpy.array([__date2secs__(epochs)], dtype=numpy.int64)
+  if isinstance(epochs, numpy.ndarray):
+    if epochs.dtype.kind == 'M':
+      return epochs.astype('datetime64[s]').astype(numpy.int64)
+    return epochs.astype(numpy.int64)
+  return numpy.array([ __date2secs__(e) for e in epochs ], dtype=numpy.int64)
+
+class IntervalIndex:
+  ''' A per-station index of the validity intervals of .STA records (e.g.
+      Type 002), answering "which record was valid for station X at epoch T?".
+
+      Records of all stations are held in flat (int64) arrays, sorted on the
+      key (station, start); stations occupy consecutive segments. Next to the
+      start and stop epochs, the running (prefix) maximum of the stop epochs
+      within each segment is kept. A query bisects the keys to find the last
+      record of the station starting before the epoch; only if that record has
+      already stopped (i.e. the intervals overlap) are earlier records checked,
+      and only back to the point where the prefix maximum of the stop epochs
+      falls before the epoch. Open ended intervals (``MIN_STA_DATE``/
+      ``MAX_STA_DATE``) map to the int64 limits.
+  '''
+
+  ##  the (station, start) key is station_row * 2**40 + start (clipped to
+  ##+ +/- 2**39 seconds, i.e. way beyond the years 1 to 9999).
+  __SHIFT = 2**40
+  __CLIP  = 2**39 - 1
+
+  def __init__(self, records):
+    ''' Build the index.
+
+        :param records: A dictionary; key is the station name (or id) and
+                        value is a list of records (e.g. Type002 instances).
+    '''
+    self.__rows    = {}
+    self.__records = []
+    self.__start_dates = []
+    self.__offset  = [0]
+    starts, stops, maxstop = [], [], []
+    for sta in sorted(records):
+      recs  = sorted(records[sta], key=lambda r: r.start())
+      self.__rows[sta] = len(self.__rows)
+      self.__records.append(recs)
+      self.__start_dates.append([ r.start() for r in recs ])
+      self.__offset.append(self.__offset[-1] + len(recs))
+      stop_max = MIN_STA_SECS
+      for r in recs:
+        starts.append(__date2secs__(r.start()))
+        stops.append(__date2secs__(r.stop()))
+        stop_max = max(stop_max, stops[-1])
+        maxstop.append(stop_max)
+    self.__offset  = numpy.array(self.__offset, dtype=numpy.int64)
+    self.__flat    = [ r for recs in self.__records for r in recs ]
+    self.__starts  = numpy.array(starts, dtype=numpy.int64)
+    self.__stops   = numpy.array(stops, dtype=numpy.int64)
+    self.__maxstop = numpy.array(maxstop, dtype=numpy.int64)
+    rows = numpy.repeat(numpy.arange(len(self.__rows), dtype=numpy.int64), numpy.diff(self.__offset))
+    self.__keys    = self.__key__(rows, self.__starts)
+
+  def __key__(self, rows, secs):
+    return rows * self.__SHIFT + secs.clip(-self.__CLIP, self.__CLIP)
+
+  def stations(self):
+    ''' Return the list of stations in the index. '''
+    return self.__rows.keys()
+
+  def records(self, station):
+    ''' Return the (sorted by start date) records of a station. '''
+    if station not in self.__rows: return []
+    return self.__records[self.__rows[station]]
+
+  def __search__(self, rows, secs):
+    ''' For each (station row, epoch), return the (global) index of the valid
+        record, or -1.
+    '''
+    first  = self.__offset[rows]
+    i      = numpy.searchsorted(self.__keys, self.__key__(rows, secs), side='right') - 1
+    inside = i >= first
+    ic     = numpy.where(inside, i, 0)
+    ok     = inside & (self.__stops[ic] >= secs)
+    result = numpy.where(ok, i, -1)
+
+    ## overlapping intervals; an earlier record may still contain the epoch
+    for k in numpy.nonzero(~ok & inside & (self.__maxstop[ic] >= secs))[0]:
+      j = i[k] - 1
+      while j >= first[k] and self.__maxstop[j] >= secs[k]:
+        if self.__stops[j] >= secs[k]:
+          result[k] = j
+          break
+        j -= 1
+    return result
+
+  def find(self, station, epochs):
+    ''' For each epoch, find the (index of the) record of ``station`` valid
+        at that epoch.
+
+        :param station: The station name (or id).
+        :param epochs:  The epochs to query, as a ``datetime``, a list of
+                        ``datetime``, a numpy ``datetime64`` array or an array
+                        of (integer) seconds since :data:`STA_EPOCH`.
+
+        :returns:       An (integer) array, holding for each epoch the index of
+                        the matching record in :func:`records`, or -1 if no
+                        record is valid. If more than one record is valid, the
+                        one starting last is chosen.
+    '''
+    secs = __epochs2secs__(epochs)
+    if station not in self.__rows:
+      return numpy.full(len(secs), -1, dtype=numpy.int64)
+    row  = self.__rows[station]
+    idx  = self.__search__(numpy.full(len(secs), row, dtype=numpy.int64), secs)
+    return numpy.where(idx >= 0, idx - self.__offset[row], -1)
+
+  def at(self, station, epoch):
+    ''' Return the record of ``station`` valid at ``epoch`` (a ``datetime``),
+        or ``None`` if there is no such record.
+    '''
+    recs = self.records(station)
+    ## the common case (no overlapping intervals) by plain bisection
+    i = bisect.bisect_right(self.__start_dates[self.__rows[station]], epoch) - 1 if recs else -1
+    if i >= 0 and recs[i].stop() >= epoch:
+      return recs[i]
+    if i < 0:
+      return None
+    i = self.find(station, epoch)[0]
+    return recs[i] if i >= 0 else None
+
+  def at_many(self, stations, epochs):
+    ''' Batch version of :func:`at`, for a list of (station, epoch) pairs.
+
+        :param stations: A list of station names (or ids).
+        :param epochs:   The epochs (one per station), in any of the forms
+                         accepted by :func:`find`.
+
+        :returns:        A list of records (or ``None``), one per pair.
+    '''
+    secs = __epochs2secs__(epochs)
+    if len(secs) != len(stations):
+      raise RuntimeError('Number of stations and epochs differ')
+    rows  = numpy.array([ self.__rows.get(s, -1) for s in stations ], dtype=numpy.int64)
+    known = rows >= 0
+    idx   = numpy.full(len(secs), -1, dtype=numpy.int64)
+    idx[known] = self.__search__(rows[known], secs[known])
+    flat  = self.__flat
+    return [ flat[i] if i >= 0 else None for i in idx.tolist() ]
+
 class StaFile:
   ''' A class to represent a Bernese-format station information file (.STA)
   '''
 
-  def __init__(self, filen):
-    ''' Initialize a StaFile instance; set the filename, try to open the file
-        and then search and mark all places (in the file) where a type starts
+  def __init__(self, filen, cache=False):
+    ''' Initialize a StaFile instance; set the filename and try to open the
+        file. The file is not read here; it is read (once) by :func:`index`,
+        which also marks all places (in the file) where a type starts.
+
+        :param cache: If ``True``, the parsed records are stored to (and, if
+                      valid, loaded from) a sidecar cache file, named as
+                      ``filen`` plus :data:`CACHE_SUFFIX`. A (string) file
+                      name can also be passed, to use as cache file.
     '''
     if not os.path.isfile(filen):
       raise RuntimeError('Cannot find .STA file [%s]' %filen)
     fin = open(filen, 'r')
 
-    ## search for the places in the file, where 'TYPE XXX' starts
-    self.__type_pos = {}
-    line = fin.readline()
-    rgx  = re.compile("^TYPE 00[1-9]:")
-    while line:
-      if rgx.match(line):
-        self.__type_pos[int(line[7])] = fin.tell()
-      line = fin.readline()
-
-    ## add a dummy mark at the end of the dictionary
-    self.__type_pos[max(self.__type_pos.keys())+1] = fin.tell()
-
-    ## return at the top
-    fin.seek(0)
-
-    ## we must at least have read the type 001 and type 002 lies
-    if 1 not in self.__type_pos or 2 not in self.__type_pos:
-      fin.close()
-      raise RuntimeError('Invalid sta file. Type001 and/or Type002 not found')
-
     ## assign the filename
     self.__filename = filen
     self.__stream   = fin
+    self.__type_pos = None
+    self.__index    = None
+    self.__intervals = {}
+    if cache == True:
+      self.__cache  = filen + CACHE_SUFFIX
+    elif cache:
+      self.__cache  = cache
+    else:
+      self.__cache  = None
 
   def __del__(self):
     if not self.__stream.closed:
@@ -276,53 +768,123 @@ class StaFile:
         print '[DEBUG] Destructor closed the file.'
       self.__stream.close()
 
+  def __set_type_pos__(self, type_pos, eof):
+    ''' Set the places in the file where each type starts (plus a dummy mark
+        at the end of the file); Type 001 and Type 002 must be present.
+    '''
+    if 1 not in type_pos or 2 not in type_pos:
+      raise RuntimeError('Invalid sta file. Type001 and/or Type002 not found')
+    type_pos[max(type_pos.keys())+1] = eof
+    self.__type_pos = type_pos
+
   def __type_range__(self, int_type):
     ''' Return the range (i.e. the places in the file) where a specific type
-        starts and ends.
+        starts and ends. The places are marked by :func:`index`; if the index
+        was loaded from the cache, the file is scanned for the ``TYPE`` lines.
     '''
+    if self.__type_pos is None:
+      type_pos = {}
+      rgx = re.compile("^TYPE 00[1-9]:")
+      self.__stream.seek(0)
+      line = self.__stream.readline()
+      while line:
+        if rgx.match(line):
+          type_pos[int(line[7])] = self.__stream.tell()
+        line = self.__stream.readline()
+      self.__set_type_pos__(type_pos, self.__stream.tell())
     return [self.__type_pos[int_type], self.__type_pos[int_type+1]]
 
-  def __match_type_001__help__(self, end_of_block):
-    ''' This is a help function, do not use as standalone! It will read the
-        Type 001 block and populate a dictionary where the key is the station name
-        (actually the old station name) and the vaues are lists containing
-        ype001 instances.
+  def index(self):
+    ''' Return the :py:class:`StaIndex` of the file. The first call will read
+        and resolve all Type 001 to 005 records in a single pass (marking the
+        places in the file where each type starts); subsequent calls return
+        the same (cached) index.
+    '''
+    if self.__index is not None:
+      return self.__index
+
+    if self.__cache is not None:
+      signature = sta_file_signature(self.__filename)
+      idx = read_cache(self.__cache, signature)
+      if idx is not None:
+        if __DEBUG_MODE__ == True:
+          print '[DEBUG] Loaded .STA file %s from cache %s' %(self.__filename, self.__cache)
+        self.__index = idx
+        return idx
+
+    idx   = StaIndex()
+    rgx   = re.compile("^TYPE 00([1-9]):")
+    itype = None
+    skip  = 0
+    type_pos = {}
+
+    self.__stream.seek(0)
+    line = self.__stream.readline()
+    while line:
+      m = rgx.match(line)
+      if m:
+        ## there should be an extra 4 (header) lines after the TYPE line
+        itype = int(m.group(1))
+        skip  = 4
+        type_pos[itype] = self.__stream.tell()
+      elif skip > 0:
+        skip -= 1
+      elif itype is not None:
+        if len(line.strip()) == 0:
+          ## an empty line marks the end of the block
+          itype = None
+        elif itype == 1:
+          idx.add(1, Type001(line))
+        elif itype == 2:
+          idx.add(2, Type002(line))
+        elif itype <= 5:
+          idx.add(itype, StaRecord(line, itype))
+      line = self.__stream.readline()
+    self.__set_type_pos__(type_pos, self.__stream.tell())
+    idx.finalize()
 
-        :param end_of_block: The position (i the input file) where the Type 001
-                             block ends.
+    if self.__cache is not None:
+      try:
+        write_cache(idx, signature, self.__cache)
+      except (IOError, OSError), e:
+        if __DEBUG_MODE__ == True:
+          print '[DEBUG] Failed to write .STA cache %s (%s)' %(self.__cache, e)
 
-        :returns:        A dictionary, where the key is the station name (actually
-                         the old station name) and the vaues are lists containing
-                         Type001 instances. If a station has more than one Type 001
-                         records, then it's value will have multiple Type001 
-                         instances, all appended to the same list.
+    if __DEBUG_MODE__ == True:
+      print '[DEBUG] Indexed .STA file %s; records per type: %s' \
+        %(self.__filename, dict((k, len(v)) for k, v in idx.records.iteritems()))
+
+    self.__index = idx
+    return idx
 
-        .. warning:: The input stream/buffer must be placed at the begining of
-          the block. Any empty lines will cause an exception to be thrown.
+  def station_records(self, itype, station, no_marker_number=False):
+    ''' Return the list of Type ``itype`` (i.e. 1 to 5) records for the station
+        ``station``, sorted by start date.
 
+        :param no_marker_number: If set to true, then the station is matched
+          using only the first 4 chars of its name (i.e. the station id).
     '''
-    ##  a dcitionary; the key is the stations name (**NOT** old station name) and
-    ##+ the values are a list (for each station) of type001 instances.
-    tp01_dic = {}
+    return self.index().station_records(itype, station, no_marker_number)
 
-    ## read all stations ...
-    line = self.__stream.readline()
-    while line and  self.__stream.tell() < end_of_block:
-      t1 = Type001(line)
-      if t1.flag() == 3:
-        t1.__issue_renaming__warning__(t1.old_staname())
-      else:
-        station = t1.old_staname()
-        if station in tp01_dic:
-          tp01_dic[station].append(t1)
-        else:
-          tp01_dic[station] = [t1]
-      line = self.__stream.readline()
+  def interval_index(self, itype=2, no_marker_number=False):
+    ''' Return an :py:class:`IntervalIndex` of the Type ``itype`` records
+        (default Type 002), keyed by station name (or by station id, if
+        ``no_marker_number`` is set to True). The index is built once per
+        instance.
 
-    if __DEBUG_MODE__ == True:
-      print '[DEBUG] Found %5i stations in .STA file %s' %(len(tp01_dic), self.__filename)
+        E.g. to find the receiver of a station at some epoch::
 
-    return tp01_dic
+          t2 = stafile.interval_index().at('WTZR 14201M010', datetime.datetime(2015, 1, 1))
+          if t2 is not None: print t2.receiver_type()
+    '''
+    key = (itype, no_marker_number)
+    if key not in self.__intervals:
+      idx = self.index()
+      if no_marker_number == True:
+        self.__intervals[key] = IntervalIndex(idx.by_id.get(itype, {}))
+      else:
+        self.__intervals[key] = IntervalIndex(idx.by_name.get(itype, {}))
+    return self.__intervals[key]
 
   def __match_type_001__(self, stations=[]):
     ''' Given a list of stations, search in Type 001 to find them, and return
@@ -330,7 +892,8 @@ class StaFile:
 
         .. note:: The comparisson (i.e. if a certain station in the ``stations``
           list matches a given record), is performed using the ``OLD STATION NAME``
-          column, using UNIX shell-type wildcards.
+          column, using UNIX shell-type wildcards. A record is assigned to (at
+          most) one station; the first one (in ``stations``) it matches.
 
         :param stations: A list of stations to match (if possible) in the Type 001
                          block. If an empty list is passed instead, the function
@@ -346,37 +909,34 @@ class StaFile:
         .. warning:: Note that Type001 records, with a flag = '003' are not used
           to extract information. They only triger a warning message.
     '''
-    ## get the range in file to search for
-    from_p, to_p = self.__type_range__(1)
-
-    ## go to the begining of the block
-    self.__stream.seek(from_p)
-
-    ## there should be an extra 4 lines ...
-    for i in range(0, 4): line = self.__stream.readline()
+    idx = self.index()
 
     ##  if we are going to read in all stations (i.e the stations list is empty)
-    ##+ let the help function do the work ...
+    ##+ the key is the old station name.
     if len(stations) == 0:
-      return self.__match_type_001__help__(to_p)
+      tp01_dic = {}
+      for t1 in idx.records.get(1, []):
+        if t1.flag() == 3:
+          t1.__issue_renaming__warning__(t1.old_staname())
+        else:
+          tp01_dic.setdefault(t1.old_staname(), []).append(t1)
+      if __DEBUG_MODE__ == True:
+        print '[DEBUG] Found %5i stations in .STA file %s' %(len(tp01_dic), self.__filename)
+      return tp01_dic
 
     ## the dictionary to be returned
     ## for each station in the list, add an entry
     sta_tp1 = {}
-    for sta in stations: sta_tp1[sta] = []
-
-    ## read all stations ...
-    line = self.__stream.readline()
-    while line and  self.__stream.tell() < to_p:
-      t1 = Type001(line)
-      for sta in stations:
-        if fnmatch.fnmatch(sta, t1.old_staname()):
-          if t1.flag() == 3:
-            t1.__issue_renaming__warning__(station)
-          else:
-            sta_tp1[sta].append(t1)
-            break
-      line = self.__stream.readline()
+    claimed = set()
+    for sta in stations:
+      if sta in sta_tp1: continue
+      sta_tp1[sta] = []
+      for t1 in idx.match_old_name(sta):
+        if t1.flag() == 3:
+          t1.__issue_renaming__warning__(sta)
+        elif t1 not in claimed:
+          sta_tp1[sta].append(t1)
+          claimed.add(t1)
 
     if __DEBUG_MODE__ == True:
       print '[DEBUG] Found %5i stations in .STA file %s' %(len(sta_tp1), self.__filename)
@@ -398,32 +958,24 @@ class StaFile:
           (i.e. the station id).
 
         :returns: A dictionary with the same keys as the original, but with values
-          the corresponding Type 002 entries.
+          the corresponding Type 002 entries (sorted by start date). A Type 002
+          entry is assigned to (at most) one key; the first one it matches.
 
     '''
-    ## find the entries in Type 002
-    from_p, to_p = self.__type_range__(2)
-    self.__stream.seek(from_p)
-    for i in range(0, 4): line = self.__stream.readline()
+    idx = self.index()
 
     ## the dictionary to be returned
     ## for each station in the dictionary, add an entry
     sta_tp2 = {}
-    for sta in dictnr: sta_tp2[sta] = []
-
-    ## walk through all entries of type 002
-    line = self.__stream.readline()
-    while line and len(line)>10 and self.__stream.tell() < to_p:
-      t2       = Type002(line)
-      archived = False
-      for sta in dictnr:
-        if archived: break
-        for tp1 in dictnr[sta]:
-          if t2.__match_t1__(tp1, no_marker_number):
+    claimed = set()
+    for sta in dictnr:
+      sta_tp2[sta] = []
+      for tp1 in dictnr[sta]:
+        for t2 in idx.within(2, tp1.station_name(), tp1.start(), tp1.stop(), no_marker_number):
+          if t2 not in claimed:
             sta_tp2[sta].append(t2)
-            archived = True
-            break
-      line = self.__stream.readline()
+            claimed.add(t2)
+      sta_tp2[sta].sort(key=lambda r: r.start())
 
     return sta_tp2
 
@@ -465,7 +1017,7 @@ class StaFile:
       for sta in station_list:
         if fnmatch.fnmatch(sta, t1.old_staname()):
           if t1.flag() == 3:
-            t1.__issue_renaming__warning__(station)
+            t1.__issue_renaming__warning__(sta)
           else:
             sta_tp1[sta].append(t1)
           break
@@ -1,4 +1,5 @@
 import math
+import numpy
 
 class Ellipsoid:
   ''' A class to represent a Reference Ellipsoid. It can be a "standard" ellipsoid,
@@ -78,7 +79,7 @@ class Ellipsoid:
   def semiMinorAxis(self):
     ''' return the Semi-Minor Axis (i.e. parameter ``b``)
     '''
-    return self.__a - self.eccentricitySquared() * self.__a
+    return self.__a * ( 1.0e0 - self.__f )
 
   def radiusOfCurvature(self, lat):
     ''' Compute the normal radious of curvature at a given latitude. See
@@ -91,6 +92,38 @@ class Ellipsoid:
     den   = math.sqrt(acosf*acosf + bsinf*bsinf)
     return (self.__a * self.__a) / den
 
+__ELLIPSOIDS__ = {}
+
+def getEllipsoid(name='GRS80'):
+  ''' Return a (standard) :py:class:`Ellipsoid` instance, e.g.
+      ``getEllipsoid('WGS84')``. Instances are constructed once and then cached,
+      so this should be preferred over ``Ellipsoid(name)`` in loops.
+  '''
+  try:
+    return __ELLIPSOIDS__[name]
+  except KeyError:
+    ell = Ellipsoid(name)
+    __ELLIPSOIDS__[name] = ell
+    return ell
+
+__C2E_CONSTANTS__ = {}
+
+def __c2e_constants__(ellipsoid):
+  ''' Utility function; the (cached) functions of ellipsoid parameters used by
+      :py:func:`cartesian2ellipsoidal` and :py:func:`cartesian2ellipsoidal_vec`,
+      i.e. the tuple ``(a, e2, e4t, ep2, ep, aep, aeps2)``.
+  '''
+  key = (ellipsoid.semiMajorAxis(), ellipsoid.flattening())
+  try:
+    return __C2E_CONSTANTS__[key]
+  except KeyError:
+    a, f  = key
+    e2    = (2.0e0-f)*f
+    ep2   = 1.0e0-e2
+    ep    = math.sqrt(ep2)
+    __C2E_CONSTANTS__[key] = (a, e2, e2*e2*1.5e0, ep2, ep, a*ep, a*a*1e-32)
+    return __C2E_CONSTANTS__[key]
+
 def cartesian2ellipsoidal(x, y, z, ellipsoid=None):
   ''' Given a set of geocentric, cartesian coordinates and optionaly a reference
       ellispoid, transform the set to ellipsoidal coordinates, i.e. longtitude,
@@ -98,17 +131,10 @@ def cartesian2ellipsoidal(x, y, z, ellipsoid=None):
   '''
 
   if ellipsoid == None:
-    ellipsoid = Ellipsoid('GRS80')
+    ellipsoid = getEllipsoid('GRS80')
 
   ## Functions of ellipsoid parameters.
-  a     = ellipsoid.semiMajorAxis()
-  f     = ellipsoid.flattening()
-  aeps2 = a*a*1e-32
-  e2    = (2.0e0-f)*f
-  e4t   = e2*e2*1.5e0
-  ep2   = 1.0e0-e2
-  ep    = math.sqrt(ep2)
-  aep   = a*ep
+  a, e2, e4t, ep2, ep, aep, aeps2 = __c2e_constants__(ellipsoid)
 
   ''' Compute Coefficients of (Modified) Quartic Equation
       Remark: Coefficients are rescaled by dividing by 'a'
@@ -172,7 +198,7 @@ def ellipsoidal2cartesian(lon, lat, hgt, ellipsoid=None):
   '''
 
   if ellipsoid == None:
-    ellipsoid = Ellipsoid('GRS80')
+    ellipsoid = getEllipsoid('GRS80')
 
   ## Eccentricity squared.
   e2 = ellipsoid.eccentricitySquared()
@@ -187,9 +213,9 @@ def ellipsoidal2cartesian(lon, lat, hgt, ellipsoid=None):
   N = ellipsoid.radiusOfCurvature(lat)
 
   ## Compute geocentric rectangular coordinates.
-  x = (N+h) * cosf * cosl
-  y = (N+h) * cosf * sinl
-  z = ((1.0e0-e2) * N + h) * sinf
+  x = (N+hgt) * cosf * cosl
+  y = (N+hgt) * cosf * sinl
+  z = ((1.0e0-e2) * N + hgt) * sinf
 
   return x, y, z
 
@@ -242,4 +268,191 @@ def topocentric2azd(north, east, up):
   ## zenith angle [0-pi)
   zenith = math.acos(up / distance)
 
-  return azimouth, zenith, distance
\ No newline at end of file
+  return azimouth, zenith, distance
+
+##  Array-aware versions of the above. Every function accepts either scalars or
+##+ numpy arrays of shape (N,) for each component, or a single array of shape
+##+ (N,3) holding all three components (the other two arguments omitted). In
+##+ the latter case, the result is also an (N,3) array; else it is a tuple of
+##+ three (N,) arrays.
+
+def __components__(x, y, z):
+  ''' Utility function; split an (N,3) array (given as ``x``) to components,
+      or convert the ``x``, ``y``, ``z`` components to float arrays. The last
+      element of the returned tuple is ``True`` if the input was an (N,3) array.
+  '''
+  if y is None and z is None:
+    xyz = numpy.asarray(x, dtype=float)
+    if xyz.ndim == 0 or xyz.shape[-1] != 3:
+      raise RuntimeError('Expected an array of shape (N,3), got %s' %str(xyz.shape))
+    return xyz[...,0], xyz[...,1], xyz[...,2], True
+  return numpy.asarray(x, dtype=float), numpy.asarray(y, dtype=float), numpy.asarray(z, dtype=float), False
+
+def __result__(a, b, c, stacked):
+  if stacked:
+    return numpy.column_stack((a, b, c)) if numpy.ndim(a) == 1 else numpy.array([a, b, c])
+  return a, b, c
+
+def cartesian2ellipsoidal_vec(x, y=None, z=None, ellipsoid=None):
+  ''' Array version of :py:func:`cartesian2ellipsoidal`; same (Halley-corrected)
+      algorithm, applied elementwise.
+
+      :param x: The x components (shape (N,)), or an (N,3) array of x, y, z.
+      :param y: The y components (omit if ``x`` is an (N,3) array).
+      :param z: The z components (omit if ``x`` is an (N,3) array).
+
+      :returns: Longtitude, latitude (radians) and height, either as a tuple
+                of (N,) arrays, or as an (N,3) array.
+  '''
+  x, y, z, stacked = __components__(x, y, z)
+
+  if ellipsoid == None:
+    ellipsoid = getEllipsoid('GRS80')
+
+  a, e2, e4t, ep2, ep, aep, aeps2 = __c2e_constants__(ellipsoid)
+
+  ## Distance from polar axis squared; longitude (zero on the polar axis).
+  p2   = x*x + y*y
+  lon  = numpy.where(p2 != .0e0, numpy.arctan2(y, x), .0e0)
+  absz = numpy.abs(z)
+
+  ## Normalized distances (the pole case is replaced below).
+  p   = numpy.sqrt(p2)
+  s0  = absz/a
+  pn  = p/a
+  zp  = ep*s0
+  ## Newton correction factors.
+  c0  = ep*pn
+  c02 = c0*c0
+  c03 = c02*c0
+  s02 = s0*s0
+  s03 = s02*s0
+  a02 = c02+s02
+  a0  = numpy.sqrt(a02)
+  a03 = a02*a0
+  d0  = zp*a03 + e2*s03
+  f0  = pn*a03 - e2*c03
+  ## Halley correction factor.
+  b0  = e4t*s02*c02*pn*(a0-ep)
+  s1  = d0*f0 - b0*s0
+  cp  = ep*(f0*f0-b0*c0)
+  s12 = s1*s1
+  cp2 = cp*cp
+
+  with numpy.errstate(divide='ignore', invalid='ignore'):
+    lat = numpy.arctan(s1/cp)
+    hgt = (p*cp+absz*s1-a*numpy.sqrt(ep2*s12+cp2))/numpy.sqrt(s12+cp2)
+
+  ## Special case: pole.
+  pole = p2 <= aeps2
+  lat  = numpy.where(pole, math.pi / 2e0, lat)
+  hgt  = numpy.where(pole, absz - aep, hgt)
+
+  ## Restore sign of latitude.
+  lat  = numpy.where(z < 0.e0, -lat, lat)
+
+  return __result__(lon, lat, hgt, stacked)
+
+def ellipsoidal2cartesian_vec(lon, lat=None, hgt=None, ellipsoid=None):
+  ''' Array version of :py:func:`ellipsoidal2cartesian`.
+
+      :param lon: Longtitude(s) in radians (shape (N,)), or an (N,3) array of
+                  longtitude, latitude and height.
+      :param lat: Latitude(s) in radians (omit if ``lon`` is an (N,3) array).
+      :param hgt: Height(s) (omit if ``lon`` is an (N,3) array).
+
+      :returns: x, y and z, either as a tuple of (N,) arrays, or as an (N,3)
+                array.
+  '''
+  lon, lat, hgt, stacked = __components__(lon, lat, hgt)
+
+  if ellipsoid == None:
+    ellipsoid = getEllipsoid('GRS80')
+
+  a  = ellipsoid.semiMajorAxis()
+  b  = ellipsoid.semiMinorAxis()
+  e2 = ellipsoid.eccentricitySquared()
+
+  ## Trigonometric numbers.
+  sinf = numpy.sin(lat)
+  cosf = numpy.cos(lat)
+  sinl = numpy.sin(lon)
+  cosl = numpy.cos(lon)
+
+  ## Radius of curvature in the prime vertical.
+  N = (a*a) / numpy.sqrt((a*cosf)**2 + (b*sinf)**2)
+
+  ## Compute geocentric rectangular coordinates.
+  x = (N+hgt) * cosf * cosl
+  y = (N+hgt) * cosf * sinl
+  z = ((1.0e0-e2) * N + hgt) * sinf
+
+  return __result__(x, y, z, stacked)
+
+def cartesian2topocentric_vec(xi, yi, zi=None, xj=None, yj=None, zj=None, ellipsoid=None):
+  ''' Array version of :py:func:`cartesian2topocentric`. Can be called either
+      as ``cartesian2topocentric_vec(xi, yi, zi, xj, yj, zj)`` (components of
+      the reference point(s) and the rover(s)), or as
+      ``cartesian2topocentric_vec(ref, rover)``, where ``ref`` and ``rover``
+      are arrays of shape (3,) or (N,3). A single reference point is
+      broadcasted against many rovers (e.g. a station time series).
+
+      :returns: North, east and up, either as a tuple of (N,) arrays, or as an
+                (N,3) array (if called with (N,3) arrays).
+  '''
+  if zi is None and xj is None and yj is None and zj is None:
+    ref, rover          = xi, yi
+    xi, yi, zi, stacked = __components__(ref, None, None)
+    xj, yj, zj, dummy   = __components__(rover, None, None)
+  else:
+    xi, yi, zi, stacked = __components__(xi, yi, zi)
+    xj, yj, zj, dummy   = __components__(xj, yj, zj)
+
+  ## Ellipsoidal coordinates of reference point(s).
+  lambda_i, phi_i, h_i = cartesian2ellipsoidal_vec(xi, yi, zi, ellipsoid)
+
+  ## Trigonometric numbers.
+  cosf = numpy.cos(phi_i)
+  cosl = numpy.cos(lambda_i)
+  sinf = numpy.sin(phi_i)
+  sinl = numpy.sin(lambda_i)
+
+  ## Catresian vector.
+  dx = xj - xi
+  dy = yj - yi
+  dz = zj - zi
+
+  ## Topocentric vector.
+  north = - sinf * cosl * dx - sinf * sinl * dy + cosf * dz
+  east  = - sinl * dx        + cosl * dy
+  up    =   cosf * cosl * dx + cosf * sinl * dy + sinf * dz
+
+  return __result__(north, east, up, stacked)
+
+def topocentric2azd_vec(north, east=None, up=None):
+  ''' Array version of :py:func:`topocentric2azd`.
+
+      :param north: North component(s) (shape (N,)), or an (N,3) array of
+                    north, east and up.
+      :param east:  East component(s) (omit if ``north`` is an (N,3) array).
+      :param up:    Up component(s) (omit if ``north`` is an (N,3) array).
+
+      :returns: Azimouth [0-2pi), zenith angle [0-pi) and distance, either as a
+                tuple of (N,) arrays, or as an (N,3) array.
+  '''
+  north, east, up, stacked = __components__(north, east, up)
+
+  ## spatial distance of vector
+  distance = numpy.sqrt(north*north + east*east + up*up)
+
+  ## check if zero distance or north are zero
+  if numpy.any(distance == .0e0) or numpy.any(north == .0e0):
+    raise RuntimeError('geodesy::top2daz -> Zero Division !!')
+
+  ## azimouth, normalized to range [0-2pi)
+  azimouth = numpy.mod(numpy.arctan2(east, north), math.pi*2.0e0)
+
+  ## zenith angle [0-pi)
+  zenith = numpy.arccos(up / distance)
+
+  return __result__(azimouth, zenith, distance, stacked)
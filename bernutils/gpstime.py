@@ -1,10 +1,12 @@
 import datetime
 import time
+import numpy
 
 """ Global Variables (Constants)
 """
 JAN61980    = 44244
 JAN11901    = 15385
+JAN11970    = 40587
 SEC_PER_DAY = 86400.0e0
 
 month_day = [
@@ -30,9 +32,11 @@ def mjd2pydt(mjd,fmjd=.0):
                    (MJD) date.
 
     '''
-  jd   = mjd + fmjd
-  i, d = divmod(jd, 1)
-  mjd  = int(i) ## just to be sure !
+  ## split each part separately, so that fmjd keeps its precision
+  i1, d1 = divmod(mjd, 1)
+  i2, d2 = divmod(fmjd, 1)
+  i, d   = divmod(d1 + d2, 1)
+  mjd  = int(i + i1 + i2) ## just to be sure !
   fmjd = float(d)
 
   days_fr_jan1_1901 = mjd - JAN11901
@@ -43,16 +47,17 @@ def mjd2pydt(mjd,fmjd=.0):
 
   year   = years_so_far + delta_yrs
   yday   = days_left - 365*delta_yrs + 1
-  hour   = fmjd*24.0
-  minute = fmjd*1440.0 - hour*60.0
-  second = fmjd*86400.0 - hour*3600.0 - minute*60.0
+  usec   = int(round(fmjd*86400.0e6))
+  hour, usec   = divmod(usec, 3600000000)
+  minute, usec = divmod(usec, 60000000)
+  second, usec = divmod(usec, 1000000)
   leap   = int(year%4 == 0)
-  guess  = yday*0.032
+  guess  = int(yday*0.032)
   more   = int(( yday - month_day[leap][guess+1] ) > 0)
   month  = guess + more + 1
   mday   = yday - month_day[leap][guess+more]
 
-  return datetime.datetime(year, month, mday, hour, minute, second)
+  return datetime.datetime(year, month, mday) + datetime.timedelta(hours=hour, minutes=minute, seconds=second, microseconds=usec)
 
 def pydt2ydoy(datetm):
   ''' Transform a Python ``datetime`` instance to year and 
@@ -62,8 +67,9 @@ def pydt2ydoy(datetm):
 
   '''
   try:
-    iyear = int(datetm.strftime('%Y'))
-    idoy  = int(datetm.strftime('%j'))
+    tt    = datetm.timetuple()
+    iyear = tt.tm_year
+    idoy  = tt.tm_yday
   except:
     raise RuntimeError('Invalid date.')
 
@@ -156,6 +162,126 @@ def ydoy2pydt(year, doy, hour=0, minute=0, seconds=0):
   except:
     raise RuntimeError('Invalid date.')
 
-  date_string = '%4i %03i %02i %02i %02i' %(iyear, idoy, ihour, imin, isec)
+  if idoy < 1 or idoy > 366:
+    raise RuntimeError('Invalid date.')
+
+  try:
+    return datetime.datetime(iyear, 1, 1, ihour, imin, isec) + datetime.timedelta(days=idoy-1)
+  except ValueError:
+    raise RuntimeError('Invalid date.')
+
+
+##  Array versions of the above. These accept (integer/float) numpy arrays (or
+##+ anything convertible to one), use integer arithmetic for the day part and
+##+ keep the fraction of day separately, as the scalar functions do. Dates
+##+ must lie in the range 1901 to 2099 (same as :py:func:`ydoy2mjd`).
+
+def __normalize_mjd__(mjd, fmjd):
+  ''' Utility function; split ``mjd + fmjd`` to an integer (int64) MJD and a
+      fraction of day in [0, 1).
+  '''
+  fmjd  = numpy.asarray(fmjd, dtype=float)
+  mjd   = numpy.asarray(mjd)
+  if mjd.dtype.kind == 'f':
+    fmjd = fmjd + (mjd - numpy.floor(mjd))
+    mjd  = numpy.floor(mjd)
+  extra = numpy.floor(fmjd)
+  return mjd.astype(numpy.int64) + extra.astype(numpy.int64), fmjd - extra
+
+def ydoy2mjd_vec(year, doy, sec=0):
+  ''' Array version of :py:func:`ydoy2mjd`.
+
+      :param year: Year(s) (integer array).
+      :param doy:  Day(s) of year (integer array).
+      :param sec:  (Optional) Seconds of day, in the range [0, 86400].
+
+      :returns:    A tuple of arrays ``(mjd, fmjd)``; ``mjd`` is the (int64)
+                   Modified Julian Date and ``fmjd`` the fraction of day.
+  '''
+  year = numpy.asarray(year, dtype=numpy.int64)
+  doy  = numpy.asarray(doy,  dtype=numpy.int64)
+  sec  = numpy.asarray(sec,  dtype=float)
+
+  if numpy.any((doy < 1) | (doy > 366)) or numpy.any((sec < 0) | (sec > SEC_PER_DAY)):
+    raise RuntimeError('Invalid date.')
+
+  dy  = year - 1901
+  mjd = (dy // 4)*1461 + (dy % 4)*365 + doy - 1 + JAN11901
+
+  return mjd, sec / SEC_PER_DAY
+
+def mjd2ydoy_vec(mjd, fmjd=.0):
+  ''' Array version of the inverse of :py:func:`ydoy2mjd`.
+
+      :returns: A tuple of arrays ``(year, doy, sec)``, where ``sec`` are the
+                seconds of day.
+  '''
+  mjd, fmjd = __normalize_mjd__(mjd, fmjd)
+
+  days_fr_jan1_1901 = mjd - JAN11901
+  num_four_yrs      = days_fr_jan1_1901 // 1461
+  days_left         = days_fr_jan1_1901 - 1461*num_four_yrs
+  delta_yrs         = days_left // 365 - days_left // 1460
 
-  return datetime.strptime(date_string, '%Y %j %H %M %S')
\ No newline at end of file
+  year = 1901 + 4*num_four_yrs + delta_yrs
+  doy  = days_left - 365*delta_yrs + 1
+
+  return year, doy, fmjd * SEC_PER_DAY
+
+def mjd2gps_vec(mjd, fmjd=.0):
+  ''' Transform (arrays of) Modified Julian Date to gps week and seconds of
+      week.
+
+      :returns: A tuple of arrays ``(gps_week, sec_of_week)``.
+  '''
+  mjd, fmjd = __normalize_mjd__(mjd, fmjd)
+  gps_week  = (mjd - JAN61980) // 7
+  sec_of_week = ((mjd - JAN61980) - gps_week*7) * SEC_PER_DAY + fmjd * SEC_PER_DAY
+  return gps_week, sec_of_week
+
+def gps2mjd_vec(gps_week, sec_of_week):
+  ''' Transform (arrays of) gps week and seconds of week to Modified Julian
+      Date.
+
+      :returns: A tuple of arrays ``(mjd, fmjd)``.
+  '''
+  gps_week    = numpy.asarray(gps_week, dtype=numpy.int64)
+  sec_of_week = numpy.asarray(sec_of_week, dtype=float)
+  days, sec   = numpy.divmod(sec_of_week, SEC_PER_DAY)
+  return JAN61980 + gps_week*7 + days.astype(numpy.int64), sec / SEC_PER_DAY
+
+def ydoy2gps_vec(year, doy, sec=0):
+  ''' Array version of :py:func:`ydoy2gps`; ``sec`` are seconds of day.
+
+      :returns: A tuple of arrays ``(gps_week, sec_of_week)``.
+  '''
+  return mjd2gps_vec(*ydoy2mjd_vec(year, doy, sec))
+
+def mjd2datetime64_vec(mjd, fmjd=.0):
+  ''' Transform (arrays of) Modified Julian Date to ``numpy.datetime64``
+      (microsecond resolution).
+  '''
+  mjd, fmjd = __normalize_mjd__(mjd, fmjd)
+  usec = numpy.round(fmjd * SEC_PER_DAY * 1e6).astype(numpy.int64)
+  return ((mjd - JAN11970) * 86400000000 + usec).astype('datetime64[us]')
+
+def datetime642mjd_vec(dt64):
+  ''' Transform (arrays of) ``numpy.datetime64`` to Modified Julian Date.
+
+      :returns: A tuple of arrays ``(mjd, fmjd)``.
+  '''
+  usec = numpy.asarray(dt64).astype('datetime64[us]').astype(numpy.int64)
+  days, usec = numpy.divmod(usec, 86400000000)
+  return days + JAN11970, usec / (SEC_PER_DAY * 1e6)
+
+def ydoy2datetime64_vec(year, doy, sec=0):
+  ''' Transform (arrays of) year, day of year and seconds of day to
+      ``numpy.datetime64`` (microsecond resolution).
+  '''
+  return mjd2datetime64_vec(*ydoy2mjd_vec(year, doy, sec))
+
+def gps2datetime64_vec(gps_week, sec_of_week):
+  ''' Transform (arrays of) gps week and seconds of week to
+      ``numpy.datetime64`` (microsecond resolution).
+  '''
+  return mjd2datetime64_vec(*gps2mjd_vec(gps_week, sec_of_week))
@@ -0,0 +1,461 @@
+import sys
+import array
+import binascii
+import __builtin__
+
+MAGIC      = '\x1f\x9d'
+''' The two magic bytes at the start of every UNIX-compressed (.Z) file. '''
+BLOCK_MODE = 0x80
+BIT_MASK   = 0x1f
+INIT_BITS  = 9
+MAX_BITS   = 16
+CLEAR      = 256
+''' Code signaling a dictionary reset (in block mode). '''
+CHECK_GAP  = 10000
+''' Number of input bytes between compression-ratio checks (once the dictionary
+    is full); if the ratio has dropped, the compressor emits a :py:data:`CLEAR`.
+'''
+CHUNK_SIZE = 64 * 1024
+BIG_ENDIAN = sys.byteorder == 'big'
+
+##  A note on the format (as written by ncompress):
+##+ codes are packed lsb-first, in groups of n_bits bytes (i.e. 8 codes). When
+##+ the code width changes or a CLEAR code is read, the rest of the current group
+##+ is padding and must be skipped. The decoder increases the width (before
+##+ reading a code) when the next free entry exceeds the current max code.
+
+def __pack__(codes, n_bits, nbytes):
+  ''' Utility function; pack (up to 8) codes of ``n_bits`` width into a string
+      of ``nbytes`` bytes (lsb first).
+  '''
+  val = 0
+  for code in reversed(codes):
+    val = (val << n_bits) | code
+  return binascii.unhexlify('%0*x' %(2*n_bits, val))[::-1][0:nbytes]
+
+class LzwDecompressor:
+  ''' A streaming decompressor for UNIX-compressed (.Z) data; the interface
+      follows ``zlib.decompressobj``, i.e. feed (any size of) compressed chunks
+      to :py:func:`decompress` and call :py:func:`flush` at the end.
+  '''
+
+  def __init__(self):
+    self.maxbits    = None
+    self.block_mode = None
+    self.eof        = False
+    self.__header   = ''
+    self.__buf      = ''
+
+  def __setup__(self, header):
+    if header[0:2] != MAGIC:
+      raise ValueError('Not in compressed (.Z) format')
+    self.maxbits    = ord(header[2]) & BIT_MASK
+    self.block_mode = bool(ord(header[2]) & BLOCK_MODE)
+    if self.maxbits < INIT_BITS or self.maxbits > MAX_BITS:
+      raise ValueError('Compressed with %i bits; can only handle %i to %i bits'
+        %(self.maxbits, INIT_BITS, MAX_BITS))
+    self.__maxmaxcode = 1 << self.maxbits
+    self.__n_bits     = INIT_BITS
+    self.__maxcode    = (1 << INIT_BITS) - 1
+    self.__table      = [ chr(i) for i in range(256) ]
+    if self.block_mode:
+      self.__table.append('') ## CLEAR; never referenced
+    self.__first      = len(self.__table)
+    self.__prev       = None
+
+  def decompress(self, data):
+    ''' Decompress ``data`` (a string); returns the uncompressed bytes available
+        so far. Some input may be buffered, until more data (or
+        :py:func:`flush`) is given.
+    '''
+    if self.eof:
+      raise ValueError('Decompressor already flushed')
+    if self.maxbits is None:
+      self.__header += data
+      if len(self.__header) < 3:
+        return ''
+      self.__setup__(self.__header)
+      data = self.__header[3:]
+      self.__header = ''
+    self.__buf += data
+    return self.__decode__(False)
+
+  def flush(self):
+    ''' Decompress any buffered data; no more input is accepted afterwards. '''
+    if self.maxbits is None:
+      if self.__header:
+        raise ValueError('Truncated compressed (.Z) header')
+      self.eof = True
+      return ''
+    out = self.__decode__(True)
+    self.eof = True
+    return out
+
+  def __decode__(self, final):
+    buf       = self.__buf
+    size      = len(buf)
+    pos       = 0
+    out       = []
+    append    = out.append
+    table     = self.__table
+    tappend   = table.append
+    prev      = self.__prev
+    n_bits    = self.__n_bits
+    maxcode   = self.__maxcode
+    maxmax    = self.__maxmaxcode
+    maxbits   = self.maxbits
+    block     = self.block_mode
+    first     = self.__first
+    free_ent  = len(table)
+    hexlify   = binascii.hexlify
+
+    while pos < size:
+      if n_bits == 16:
+        ##  fast path: 16-bit codes are just little-endian shorts (and there
+        ##+ are no more width changes); unpack all complete groups at once.
+        if final:
+          end = pos + ((size - pos) & ~1)
+        else:
+          end = pos + ((size - pos) & ~15)
+        if end == pos: break
+        codes = array.array('H', buf[pos:end])
+        if BIG_ENDIAN: codes.byteswap()
+        for i, code in enumerate(codes):
+          if code == CLEAR and block:
+            end      = min(pos + ((i >> 3) + 1) * 16, size)
+            del table[first:]
+            free_ent = first
+            prev     = None
+            n_bits   = INIT_BITS
+            maxcode  = (1 << INIT_BITS) - 1
+            break
+          if code < free_ent:
+            entry = table[code]
+          elif code == free_ent and prev is not None:
+            entry = prev + prev[0]
+          else:
+            raise ValueError('Corrupt compressed (.Z) input; invalid code %i' %code)
+          append(entry)
+          if prev is not None and free_ent < maxmax:
+            tappend(prev + entry[0])
+            free_ent += 1
+          prev = entry
+        pos = end
+        continue
+      end = pos + n_bits
+      if end <= size:
+        ncodes = 8
+      elif final:
+        end    = size
+        ncodes = ((size - pos) * 8) // n_bits
+        if not ncodes: break
+      else:
+        break
+      val  = int(hexlify(buf[pos:end][::-1]), 16)
+      mask = (1 << n_bits) - 1
+      for i in xrange(ncodes):
+        if free_ent > maxcode:
+          ## width change; skip the rest of the group (if any code was read)
+          if not i: end = pos
+          n_bits += 1
+          maxcode = maxmax if n_bits == maxbits else (1 << n_bits) - 1
+          break
+        code = val & mask
+        val >>= n_bits
+        if code == CLEAR and block:
+          del table[first:]
+          free_ent = first
+          prev     = None
+          n_bits   = INIT_BITS
+          maxcode  = (1 << INIT_BITS) - 1
+          break
+        if code < free_ent:
+          entry = table[code]
+        elif code == free_ent and prev is not None:
+          entry = prev + prev[0]
+        else:
+          raise ValueError('Corrupt compressed (.Z) input; invalid code %i' %code)
+        append(entry)
+        if prev is not None and free_ent < maxmax:
+          tappend(prev + entry[0])
+          free_ent += 1
+        prev = entry
+      pos = end
+
+    self.__buf     = buf[pos:]
+    self.__prev    = prev
+    self.__n_bits  = n_bits
+    self.__maxcode = maxcode
+    return ''.join(out)
+
+class LzwCompressor:
+  ''' A streaming compressor producing UNIX-compressed (.Z) data, compatible
+      with ncompress' ``compress``; the interface follows ``zlib.compressobj``.
+  '''
+
+  def __init__(self, maxbits=MAX_BITS, block_mode=True):
+    ''' :param maxbits:    Max code width (10 to 16); 9-bit streams are not
+                           produced, since decompressors handle them
+                           inconsistently.
+        :param block_mode: Allow emitting :py:data:`CLEAR` codes (should
+                           always be ``True``, unless the output is meant for
+                           really old decompressors).
+    '''
+    if maxbits <= INIT_BITS or maxbits > MAX_BITS:
+      raise ValueError('Invalid number of bits: %i' %maxbits)
+    self.maxbits      = maxbits
+    self.block_mode   = block_mode
+    self.__header     = MAGIC + chr(maxbits | (BLOCK_MODE if block_mode else 0))
+    self.__first      = CLEAR + 1 if block_mode else CLEAR
+    self.__dict       = {}
+    self.__free_ent   = self.__first
+    self.__n_bits     = INIT_BITS
+    self.__group      = []
+    self.__prefix     = -1
+    self.__bytes_in   = 0
+    self.__bytes_out  = 3
+    self.__checkpoint = CHECK_GAP
+    self.__ratio      = 0.0
+    self.__flushed    = False
+
+  def compress(self, data):
+    ''' Compress ``data`` (a string); returns the compressed bytes available so
+        far (the rest are returned by later calls or by :py:func:`flush`).
+    '''
+    if self.__flushed:
+      raise ValueError('Compressor already flushed')
+    out      = [self.__header]
+    append   = out.append
+    self.__header = ''
+    dct      = self.__dict
+    get      = dct.get
+    group    = self.__group
+    gappend  = group.append
+    prefix   = self.__prefix
+    free_ent = self.__free_ent
+    n_bits   = self.__n_bits
+    extcode  = (1 << n_bits) + 1
+    maxmax   = 1 << self.maxbits
+    maxbits  = self.maxbits
+    block    = self.block_mode
+    bytes_in = self.__bytes_in
+    nout     = self.__bytes_out
+
+    for i, c in enumerate(bytearray(data)):
+      if prefix < 0:
+        prefix = c
+        continue
+      key  = (prefix << 8) | c
+      code = get(key)
+      if code is not None:
+        prefix = code
+        continue
+      ## emit the prefix; increase the code width first, if the decoder will
+      if free_ent >= extcode and n_bits < maxbits:
+        if group:
+          append(__pack__(group, n_bits, n_bits))
+          nout += n_bits
+          del group[:]
+        n_bits += 1
+        extcode = (1 << n_bits) + 1
+      gappend(prefix)
+      if len(group) == 8:
+        append(__pack__(group, n_bits, n_bits))
+        nout += n_bits
+        del group[:]
+      if free_ent < maxmax:
+        dct[key]  = free_ent
+        free_ent += 1
+      elif block and bytes_in + i >= self.__checkpoint:
+        ## dictionary is full; reset it if the compression ratio dropped
+        self.__checkpoint = bytes_in + i + CHECK_GAP
+        ratio = float(bytes_in + i) / (nout + len(group) * n_bits / 8.0)
+        if ratio > self.__ratio:
+          self.__ratio = ratio
+        else:
+          self.__ratio = 0.0
+          gappend(CLEAR)
+          append(__pack__(group, n_bits, n_bits))
+          nout += n_bits
+          del group[:]
+          dct.clear()
+          get      = dct.get
+          free_ent = self.__first
+          n_bits   = INIT_BITS
+          extcode  = (1 << n_bits) + 1
+      prefix = c
+
+    self.__prefix    = prefix
+    self.__free_ent  = free_ent
+    self.__n_bits    = n_bits
+    self.__bytes_in  = bytes_in + len(data)
+    self.__bytes_out = nout
+    return ''.join(out)
+
+  def flush(self):
+    ''' Emit any pending codes; no more input is accepted afterwards. '''
+    if self.__flushed:
+      raise ValueError('Compressor already flushed')
+    out   = [self.__header]
+    group = self.__group
+    if self.__prefix >= 0:
+      if self.__free_ent >= (1 << self.__n_bits) + 1 and self.__n_bits < self.maxbits:
+        if group:
+          out.append(__pack__(group, self.__n_bits, self.__n_bits))
+          del group[:]
+        self.__n_bits += 1
+      group.append(self.__prefix)
+    if group:
+      out.append(__pack__(group, self.__n_bits, (len(group)*self.__n_bits + 7) // 8))
+      del group[:]
+    self.__flushed = True
+    return ''.join(out)
+
+class LzwFile:
+  ''' A (read-only) file-like object, giving the uncompressed content of a
+      UNIX-compressed (.Z) file; similar to ``gzip.GzipFile``. Supports
+      :py:func:`read`, :py:func:`readline`, :py:func:`readlines`, iteration
+      (line by line) and the ``with`` statement.
+  '''
+
+  def __init__(self, filename=None, mode='rb', fileobj=None):
+    ''' :param filename: The name of the .Z file to read.
+        :param mode:     Only reading (``'r'`` or ``'rb'``) is supported.
+        :param fileobj:  (Optional) An already opened (binary) file object to
+                         read the compressed data from, instead of ``filename``.
+    '''
+    if mode not in ['r', 'rb']:
+      raise ValueError('Invalid mode for LzwFile: %s' %mode)
+    if fileobj is None:
+      fileobj = __builtin__.open(filename, 'rb')
+      self.__own = True
+    else:
+      self.__own = False
+    self.name     = filename if filename else getattr(fileobj, 'name', '')
+    self.closed   = False
+    self.__fileobj = fileobj
+    self.__dec    = LzwDecompressor()
+    self.__buf    = ''
+    self.__offset = 0
+
+  def __fill__(self):
+    ''' Decompress the next chunk; return ``False`` at the end of the file. '''
+    while True:
+      if self.__dec.eof:
+        return False
+      data = self.__fileobj.read(CHUNK_SIZE)
+      if data:
+        out = self.__dec.decompress(data)
+      else:
+        out = self.__dec.flush()
+      if out:
+        self.__buf    = self.__buf[self.__offset:] + out
+        self.__offset = 0
+        return True
+
+  def read(self, size=-1):
+    ''' Read (at most) ``size`` uncompressed bytes; if ``size`` is negative,
+        read until the end of the file.
+    '''
+    if self.closed:
+      raise ValueError('I/O operation on closed file')
+    if size < 0:
+      parts = [self.__buf[self.__offset:]]
+      while self.__fill__():
+        parts.append(self.__buf)
+        self.__offset = len(self.__buf)
+      self.__buf, self.__offset = '', 0
+      return ''.join(parts)
+    while len(self.__buf) - self.__offset < size:
+      if not self.__fill__(): break
+    data = self.__buf[self.__offset:self.__offset+size]
+    self.__offset += len(data)
+    return data
+
+  def readline(self, size=-1):
+    ''' Read one (uncompressed) line, including the trailing newline. '''
+    if self.closed:
+      raise ValueError('I/O operation on closed file')
+    start = self.__offset
+    while True:
+      idx = self.__buf.find('\n', start)
+      if idx >= 0:
+        end = idx + 1
+        break
+      start = len(self.__buf) - self.__offset
+      if not self.__fill__():
+        end = len(self.__buf)
+        break
+      start += self.__offset
+    if size >= 0 and end - self.__offset > size:
+      end = self.__offset + size
+    line = self.__buf[self.__offset:end]
+    self.__offset = end
+    return line
+
+  def readlines(self, sizehint=0):
+    ''' Read all (remaining) lines, as a list. '''
+    return self.read().splitlines(True)
+
+  def __iter__(self):
+    return self
+
+  def next(self):
+    line = self.readline()
+    if not line:
+      raise StopIteration
+    return line
+
+  def close(self):
+    if not self.closed:
+      if self.__own:
+        self.__fileobj.close()
+      self.closed   = True
+      self.__buf    = ''
+      self.__offset = 0
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, *args):
+    self.close()
+
+def open(filename, mode='rb'):
+  ''' Open a UNIX-compressed (.Z) file for reading; returns an
+      :py:class:`LzwFile` instance (e.g. ``for line in bernutils.lzw.open(f)``).
+  '''
+  return LzwFile(filename, mode)
+
+def decompress(data):
+  ''' Uncompress a (complete) UNIX-compressed (.Z) string. '''
+  dec = LzwDecompressor()
+  return dec.decompress(data) + dec.flush()
+
+def compress(data, maxbits=MAX_BITS):
+  ''' Compress a string to the UNIX-compressed (.Z) format. '''
+  enc = LzwCompressor(maxbits)
+  return enc.compress(data) + enc.flush()
+
+def decompressFile(inputf, outputf):
+  ''' Uncompress the UNIX-compressed file ``inputf`` to ``outputf``. '''
+  dec = LzwDecompressor()
+  with __builtin__.open(inputf, 'rb') as fin:
+    with __builtin__.open(outputf, 'wb') as fout:
+      while True:
+        data = fin.read(CHUNK_SIZE)
+        if not data: break
+        fout.write(dec.decompress(data))
+      fout.write(dec.flush())
+  return outputf
+
+def compressFile(inputf, outputf, maxbits=MAX_BITS):
+  ''' Compress the file ``inputf`` to the UNIX-compressed file ``outputf``. '''
+  enc = LzwCompressor(maxbits)
+  with __builtin__.open(inputf, 'rb') as fin:
+    with __builtin__.open(outputf, 'wb') as fout:
+      while True:
+        data = fin.read(CHUNK_SIZE)
+        if not data: break
+        fout.write(enc.compress(data))
+      fout.write(enc.flush())
+  return outputf
@@ -0,0 +1,543 @@
+import os
+import re
+import json
+import time
+import fcntl
+import atexit
+import shutil
+import hashlib
+import posixpath
+import threading
+import contextlib
+
+import bernutils.webutils
+
+__DEBUG_MODE__ = False
+
+CACHE_DIR_ENV  = 'BERNUTILS_PRODUCT_CACHE'
+''' Name of the environment variable holding the cache directory; if set, the
+    cache is enabled at import time.
+'''
+CACHE_SIZE_ENV = 'BERNUTILS_PRODUCT_CACHE_SIZE'
+''' Name of the environment variable holding the max cache size (in MB). '''
+
+DEFAULT_MAX_BYTES = 2 * 1024 * 1024 * 1024
+
+PRODUCT_CLASSES = [
+  ('ultra-rapid', re.compile(r'^(ig[uv]\d{5}_\d{2}\.|cod\.\w+_u$)', re.IGNORECASE), 3*3600),
+  ('broadcast',   re.compile(r'^\w{4}\d{3}[0a-x]\.\d{2}[ngh](\.z)?$', re.IGNORECASE), 3*3600),
+  ('prediction',  re.compile(r'(_(5d|p|p2|p5)$|^igu00p01\.)', re.IGNORECASE), 6*3600),
+  ('rapid',       re.compile(r'(^igr|_[rm](\.z)?$)', re.IGNORECASE), 24*3600),
+  ('running',     re.compile(r'^p[12][cp][12](_rinex)?\.dcb$', re.IGNORECASE), 24*3600)
+]
+''' A list of ``(product class, filename regex, time-to-live)`` tuples. The
+    filename of a cached product is matched against the regular expressions (in
+    this order) to decide for how many seconds a cached copy is valid. Any file
+    not matching (e.g. final orbits, erps, monthly dcbs) is considered a
+    ``'final'`` product and never expires. Broadcast (and station)
+    navigation files (e.g. ``brdc0010.15n.Z``) are updated during the day,
+    hence they expire as ultra-rapid products do.
+'''
+
+def productClass(filen):
+  ''' Given a (remote) product filename, return its product class and
+      time-to-live, using the :py:data:`PRODUCT_CLASSES` list.
+
+      :param filen: The product's filename (e.g. ``'igr18000.sp3.Z'``).
+
+      :returns:     A tuple ``(product_class, ttl)``; ``ttl`` is in seconds, or
+                    ``None`` if the product never expires.
+  '''
+  for pclass, regex, ttl in PRODUCT_CLASSES:
+    if regex.search(filen):
+      return pclass, ttl
+  return 'final', None
+
+def sha256sum(filen, chunk=1024*1024):
+  ''' Compute the sha256 checksum (hex digest) of a (local) file. '''
+  h = hashlib.sha256()
+  with open(filen, 'rb') as fin:
+    while True:
+      buf = fin.read(chunk)
+      if not buf: break
+      h.update(buf)
+  return h.hexdigest()
+
+ACCESS_FLUSH_INTERVAL = 60
+''' Max number of seconds the last-access times of cache hits are kept in
+    memory, before they are written to the cache index (see
+    :py:func:`ProductCache.flush`).
+'''
+
+class ProductCache:
+  ''' An on-disk cache of remote (product) files. Entries are keyed by the
+      remote ``(host, dir, filename)`` triple, while the files themselves are
+      stored once, under their sha256 checksum (i.e. the cache is
+      content-addressed). The cache directory holds:
+
+      * ``index.json`` the metadata index; for every key, the file's size,
+        mtime, sha256, product class, fetch and last-access time,
+      * ``index.lock`` the lock file guarding the index,
+      * ``objects/xx/<sha256>`` the cached files.
+
+      Cached files are (re-)validated by size and mtime, expire according to
+      the :py:data:`PRODUCT_CLASSES` time-to-live policy and are evicted in
+      least-recently-used order when the total size exceeds ``max_bytes``.
+
+      .. note:: The cache may be shared between threads and processes; every
+        read-modify-write of the index (and every removal of cached files)
+        is done holding an exclusive ``flock`` on ``index.lock``. The
+        last-access times of cache hits are only written to the index every
+        :py:data:`ACCESS_FLUSH_INTERVAL` seconds (or on :py:func:`flush`), so
+        a hit does not rewrite the index.
+  '''
+
+  def __init__(self, cache_dir, max_bytes=DEFAULT_MAX_BYTES):
+    ''' Initialize (and if needed create) a cache at ``cache_dir``.
+
+        :param cache_dir: The cache directory.
+        :param max_bytes: Max size (in bytes) of the cached files.
+    '''
+    self.cache_dir = os.path.abspath(cache_dir)
+    self.max_bytes = max_bytes
+    self.__lock    = threading.Lock()
+    self.__index   = {}
+    self.__stamp   = None
+    self.__access  = {}
+    self.__flushed = time.time()
+    self.__stats   = {'hits': 0, 'misses': 0, 'expired': 0, 'evictions': 0}
+    if not os.path.isdir(os.path.join(self.cache_dir, 'objects')):
+      try:
+        os.makedirs(os.path.join(self.cache_dir, 'objects'))
+      except OSError:
+        if not os.path.isdir(os.path.join(self.cache_dir, 'objects')):
+          raise RuntimeError('Cannot create cache directory %s' %self.cache_dir)
+    with self.__locked__():
+      self.__load__()
+
+  def __index_file__(self):
+    return os.path.join(self.cache_dir, 'index.json')
+
+  def __object_file__(self, sha256):
+    return os.path.join(self.cache_dir, 'objects', sha256[0:2], sha256)
+
+  @contextlib.contextmanager
+  def __locked__(self):
+    ''' Hold the (thread) lock and the (process) lock on the index. '''
+    with self.__lock:
+      with open(os.path.join(self.cache_dir, 'index.lock'), 'a') as flock:
+        fcntl.flock(flock.fileno(), fcntl.LOCK_EX)
+        try:
+          yield
+        finally:
+          fcntl.flock(flock.fileno(), fcntl.LOCK_UN)
+
+  def __load__(self):
+    ''' (Re-)read the index file, if it was changed (e.g. by another
+        process) since it was last read. Call holding the lock.
+    '''
+    try:
+      st = os.stat(self.__index_file__())
+    except OSError:
+      self.__index, self.__stamp = {}, None
+      return
+    stamp = (st.st_ino, st.st_size, st.st_mtime)
+    if stamp == self.__stamp:
+      return
+    try:
+      with open(self.__index_file__(), 'r') as fin:
+        self.__index = json.load(fin)
+      self.__stamp = stamp
+    except (IOError, ValueError):
+      self.__index, self.__stamp = {}, None
+
+  def __dump__(self):
+    ''' Write the index file (atomically, via a temporary file), including
+        any pending last-access times. Call holding the lock.
+    '''
+    for key, accessed in self.__access.iteritems():
+      if key in self.__index:
+        self.__index[key]['accessed'] = max(self.__index[key]['accessed'], accessed)
+    self.__access  = {}
+    self.__flushed = time.time()
+    tmp = '%s.%i' %(self.__index_file__(), os.getpid())
+    with open(tmp, 'w') as fout:
+      json.dump(self.__index, fout, indent=1, sort_keys=True)
+    os.rename(tmp, self.__index_file__())
+    st = os.stat(self.__index_file__())
+    self.__stamp = (st.st_ino, st.st_size, st.st_mtime)
+
+  def key(self, host, dirn, filen):
+    ''' Return the index key for the remote file ``(host, dirn, filen)``. '''
+    dirn = posixpath.normpath('/' + dirn.strip('/')) if dirn else '/'
+    return '%s:%s' %(host, posixpath.join(dirn, filen))
+
+  def __valid__(self, entry, now):
+    ''' Check an index entry; returns ``None`` if valid, else the reason. '''
+    obj = self.__object_file__(entry['sha256'])
+    try:
+      st = os.stat(obj)
+    except OSError:
+      return 'missing'
+    if st.st_size != entry['size'] or int(st.st_mtime) != entry['mtime']:
+      return 'modified'
+    if entry['ttl'] is not None and now - entry['fetched'] > entry['ttl']:
+      return 'expired'
+    return None
+
+  def lookup(self, host, dirn, filen):
+    ''' Search the cache for the remote file ``(host, dirn, filen)``.
+
+        :returns: The path to the cached file, or ``None`` if the file is not
+                  cached (or the cached copy is no longer valid).
+    '''
+    key = self.key(host, dirn, filen)
+    now = time.time()
+    with self.__locked__():
+      self.__load__()
+      entry = self.__index.get(key)
+      if entry is None:
+        self.__stats['misses'] += 1
+        return None
+      reason = self.__valid__(entry, now)
+      if reason is not None:
+        if __DEBUG_MODE__:
+          print 'Cache entry %s is %s' %(key, reason)
+        del self.__index[key]
+        self.__remove_orphans__([entry['sha256']])
+        self.__dump__()
+        self.__stats['misses'] += 1
+        if reason == 'expired': self.__stats['expired'] += 1
+        return None
+      self.__access[key] = now
+      if now - self.__flushed > ACCESS_FLUSH_INTERVAL:
+        self.__dump__()
+      self.__stats['hits'] += 1
+      return self.__object_file__(entry['sha256'])
+
+  def store(self, host, dirn, filen, localfile):
+    ''' Add the (just downloaded) file ``localfile`` to the cache, as the
+        copy of the remote file ``(host, dirn, filen)``.
+
+        :returns: The path to the cached file.
+    '''
+    key    = self.key(host, dirn, filen)
+    sha256 = sha256sum(localfile)
+    obj    = self.__object_file__(sha256)
+    pclass, ttl = productClass(filen)
+    with self.__locked__():
+      self.__load__()
+      if not os.path.isfile(obj):
+        if not os.path.isdir(os.path.dirname(obj)):
+          os.makedirs(os.path.dirname(obj))
+        tmp = '%s.%i' %(obj, os.getpid())
+        shutil.copyfile(localfile, tmp)
+        os.rename(tmp, obj)
+      old = self.__index.get(key)
+      now = time.time()
+      st  = os.stat(obj)
+      self.__index[key] = {'size': st.st_size, 'mtime': int(st.st_mtime),
+        'sha256': sha256, 'class': pclass, 'ttl': ttl,
+        'fetched': now, 'accessed': now}
+      if old is not None and old['sha256'] != sha256:
+        self.__remove_orphans__([old['sha256']])
+      self.__evict__()
+      self.__dump__()
+    return obj
+
+  def serve(self, cached, saveas):
+    ''' Place (a copy of) the cached file ``cached`` at ``saveas``. An
+        existing ``saveas`` is overwritten.
+
+        .. note:: Cached files are never hardlinked; the served file may later
+          be re-written in place (e.g. by :py:func:`grabFtpFile` on a
+          miss), which would silently change the cached object.
+    '''
+    if os.path.exists(saveas) and os.path.samefile(cached, saveas):
+      return os.path.abspath(saveas)
+    tmp = '%s.%i' %(saveas, os.getpid())
+    try:
+      shutil.copyfile(cached, tmp)
+      os.rename(tmp, saveas)
+    except:
+      if os.path.lexists(tmp): os.remove(tmp)
+      raise
+    return os.path.abspath(saveas)
+
+  def __remove_orphans__(self, sha_list):
+    ''' Remove cached files (by sha256) not referenced by any index entry.
+        Call holding the lock (and with a freshly loaded index).
+    '''
+    used = set([ e['sha256'] for e in self.__index.values() ])
+    for sha256 in sha_list:
+      if sha256 not in used:
+        try: os.remove(self.__object_file__(sha256))
+        except OSError: pass
+
+  def __evict__(self):
+    ''' Drop expired entries and then least-recently-used entries, until the
+        size of the cached files is less than ``max_bytes``. Call holding the
+        lock.
+    '''
+    now = time.time()
+    for key, entry in self.__index.items():
+      if self.__valid__(entry, now) is not None:
+        del self.__index[key]
+        self.__remove_orphans__([entry['sha256']])
+        self.__stats['evictions'] += 1
+    refs, sizes = {}, {}
+    for entry in self.__index.values():
+      refs[entry['sha256']]  = refs.get(entry['sha256'], 0) + 1
+      sizes[entry['sha256']] = entry['size']
+    total = sum(sizes.values())
+    accessed = lambda x: max(x[1]['accessed'], self.__access.get(x[0], 0))
+    for key, entry in sorted(self.__index.items(), key=accessed):
+      if total <= self.max_bytes: break
+      del self.__index[key]
+      refs[entry['sha256']] -= 1
+      if refs[entry['sha256']] == 0:
+        total -= entry['size']
+        self.__remove_orphans__([entry['sha256']])
+      self.__stats['evictions'] += 1
+
+  def evict(self):
+    ''' Apply the expiration and size policy to the cache. '''
+    with self.__locked__():
+      self.__load__()
+      self.__evict__()
+      self.__dump__()
+
+  def flush(self):
+    ''' Write any pending last-access times (of cache hits) to the index. '''
+    with self.__locked__():
+      if self.__access:
+        self.__load__()
+        self.__dump__()
+
+  def clear(self):
+    ''' Remove all entries (and files) from the cache. '''
+    with self.__locked__():
+      self.__load__()
+      shas = [ e['sha256'] for e in self.__index.values() ]
+      self.__index = {}
+      self.__remove_orphans__(shas)
+      self.__dump__()
+
+  def stats(self):
+    ''' Return a dictionary with the cache counters, i.e. ``'hits'``,
+        ``'misses'``, ``'expired'``, ``'evictions'``, plus the number of
+        ``'entries'`` and the total ``'bytes'`` of the cached files.
+    '''
+    with self.__lock:
+      dct = dict(self.__stats)
+      dct['entries'] = len(self.__index)
+      dct['bytes']   = sum(dict([ (e['sha256'], e['size']) for e in self.__index.values() ]).values())
+    return dct
+
+PRODUCT_CACHE = None
+''' The process-wide :py:class:`ProductCache` instance used by
+    :py:func:`grabProduct`; ``None`` means the cache is disabled. See
+    :py:func:`enable`.
+'''
+
+def enable(cache_dir, max_bytes=DEFAULT_MAX_BYTES):
+  ''' Enable the (process-wide) product cache, using the directory ``cache_dir``
+      and a max size of ``max_bytes``.
+
+      :returns: The :py:class:`ProductCache` instance.
+  '''
+  global PRODUCT_CACHE
+  PRODUCT_CACHE = ProductCache(cache_dir, max_bytes)
+  return PRODUCT_CACHE
+
+def disable():
+  ''' Disable the (process-wide) product cache. The cached files are not
+      removed.
+  '''
+  global PRODUCT_CACHE
+  if PRODUCT_CACHE is not None:
+    PRODUCT_CACHE.flush()
+  PRODUCT_CACHE = None
+
+def __flush_at_exit__():
+  ''' Write the pending last-access times of the process-wide cache. '''
+  if PRODUCT_CACHE is not None:
+    try:
+      PRODUCT_CACHE.flush()
+    except (IOError, OSError):
+      pass
+atexit.register(__flush_at_exit__)
+
+if os.environ.get(CACHE_DIR_ENV):
+  try:
+    enable(os.environ[CACHE_DIR_ENV],
+      int(os.environ.get(CACHE_SIZE_ENV, DEFAULT_MAX_BYTES/1024/1024))*1024*1024)
+  except (RuntimeError, ValueError):
+    print '[WARNING] Failed to enable product cache at %s' %os.environ[CACHE_DIR_ENV]
+
+def grabProduct(host, dirn, filen, saveas=None):
+  ''' Download a (single) product file from an ftp server, going through the
+      product cache (if enabled, see :py:func:`enable`). On a cache hit, the
+      file is copied to ``saveas`` and no network access is
+      made; on a miss it is downloaded via
+      :py:func:`bernutils.webutils.grabFtpFile` and then cached.
+
+      :param host:   The host ip/hostname (e.g. ``ftp.unibe.ch``).
+      :param dirn:   The directory on the host, where the file lives.
+      :param filen:  The name of the file to download.
+      :param saveas: (Optional) The (local) name of the saved file.
+
+      :returns:      Same as :py:func:`bernutils.webutils.grabFtpFile`, i.e.
+                     ``[[saved_file, remote_file]]``.
+  '''
+  if not saveas: saveas = filen
+  cache = PRODUCT_CACHE
+
+  if cache is not None:
+    cached = cache.lookup(host, dirn, filen)
+    if cached is not None:
+      if __DEBUG_MODE__:
+        print 'Serving %s from the cache' %cache.key(host, dirn, filen)
+      try:
+        return [[cache.serve(cached, saveas), os.path.join(host, dirn, filen)]]
+      except (IOError, OSError):
+        ## e.g. evicted by another process after the lookup; download it
+        pass
+
+  info = bernutils.webutils.grabFtpFile(host, dirn, filen, saveas)
+
+  if cache is not None:
+    try:
+      cache.store(host, dirn, filen, saveas)
+    except (IOError, OSError):
+      print '[WARNING] Failed to cache file %s' %saveas
+
+  return info
+
+PROBE_WORKERS = 8
+''' Max number of candidate files probed concurrently by
+    :py:func:`planDownload`.
+'''
+
+def planDownload(options, max_workers=PROBE_WORKERS):
+  ''' Given a list of candidate ``[FILENAME, HOST, DIR]`` triples (in order of
+      preference), find out which of them are available, without downloading
+      anything. The product cache (if enabled) is consulted first; all
+      candidates preferred over the first cached one are then probed
+      concurrently on the remote hosts (see
+      :py:func:`bernutils.webutils.probeFiles`).
+
+      :param options:     A list of ``[FILENAME, HOST, DIR]`` lists.
+      :param max_workers: Max number of candidates probed concurrently.
+
+      :returns:           A list of dictionaries, one per candidate (in the
+                          order of ``options``), with keys: ``'filename'``,
+                          ``'host'``, ``'dir'``, ``'status'``, ``'size'``,
+                          ``'latency'`` (seconds the probe took, or ``None`` if
+                          not probed), ``'error'`` and ``'cached'`` (the path
+                          to the cached file, if any). ``'status'`` is any of:
+
+                          * ``'cached'``    the file is in the product cache,
+                          * ``'available'`` the file exists on the host,
+                          * ``'missing'``   the file does not exist on the host,
+                          * ``'unknown'``   the probe failed (or was not needed),
+                          * ``'skipped'``   a preferred candidate is cached.
+
+      .. note:: If only one candidate is left to probe, it is not probed (its
+        status is ``'unknown'``); trying to download it costs the same.
+  '''
+  plan = [ {'filename': t[0], 'host': t[1], 'dir': t[2], 'status': 'unknown',
+    'size': None, 'latency': None, 'error': None, 'cached': None} for t in options ]
+
+  nr_probes = len(plan)
+  cache = PRODUCT_CACHE
+  if cache is not None:
+    for idx, p in enumerate(plan):
+      cached = cache.lookup(p['host'], p['dir'], p['filename'])
+      if cached is not None:
+        p['status'], p['cached'] = 'cached', cached
+        for q in plan[idx+1:]: q['status'] = 'skipped'
+        nr_probes = idx
+        break
+
+  if nr_probes > 1:
+    jobs    = [ ('ftp', p['host'], p['dir'], p['filename']) for p in plan[0:nr_probes] ]
+    results = bernutils.webutils.probeFiles(jobs, max_workers, max_workers)
+    for p, (remote, exists, size, latency, error) in zip(plan, results):
+      p['size'], p['latency'], p['error'] = size, latency, error
+      if exists is not None:
+        p['status'] = 'available' if exists else 'missing'
+
+  if __DEBUG_MODE__ == True:
+    print planReport(plan)
+  return plan
+
+def planReport(plan):
+  ''' Format the result of :py:func:`planDownload` (i.e. each candidate's
+      status and probe latency) as a (multi-line) string.
+  '''
+  lines = []
+  for idx, p in enumerate(plan):
+    latency = '%8.3f sec' %p['latency'] if p['latency'] is not None else '%12s' %'-'
+    lines.append('%2i %-9s %s %s%s%s%s' %(idx, p['status'], latency, p['host'],
+      p['dir'], p['filename'], ' (%s)' %p['error'] if p['error'] else ''))
+  return '\n'.join(lines)
+
+def grabFirstAvailable(options, out_dir=None, descr='product', report=None):
+  ''' Given a list of candidate ``[FILENAME, HOST, DIR]`` triples (in order of
+      preference), download the first one available (via
+      :py:func:`grabProduct`). The candidates are first checked via
+      :py:func:`planDownload`, i.e. concurrently, so that candidates not
+      (yet) available on their hosts are never downloaded (which costs a full
+      ``RETR`` failure each).
+
+      :param options: A list of ``[FILENAME, HOST, DIR]`` lists.
+      :param out_dir: (Optional) Directory where the downloaded file is saved.
+      :param descr:   A description of the product (used in the error message).
+      :param report:  (Optional) A stream (e.g. ``sys.stdout``) to write the
+                      candidates' status and probe latencies to (see
+                      :py:func:`planReport`).
+
+      :returns:       A list containing the saved file and the remote file.
+
+      .. note:: Candidates whose probe failed (status ``'unknown'``) are still
+        tried, in order of preference. If the cached candidate cannot be
+        served, it is downloaded instead, and then the (``'skipped'``) less
+        preferred candidates are tried, in order.
+  '''
+  plan = planDownload(options)
+  if report is not None:
+    report.write(planReport(plan) + '\n')
+
+  nr_tries = 0
+  fallback = False
+  for p in plan:
+    if p['status'] == 'missing' or (p['status'] == 'skipped' and not fallback):
+      continue
+    nr_tries += 1
+    if out_dir:
+      saveas = os.path.join(out_dir, p['filename'])
+    else:
+      saveas = p['filename']
+    if p['status'] == 'cached':
+      try:
+        PRODUCT_CACHE.serve(p['cached'], saveas)
+      except (IOError, OSError, AttributeError):
+        ##  the cached copy is gone (e.g. evicted by another process); download
+        ##+ it, else try the (skipped) less preferred candidates
+        fallback = True
+        try:
+          grabProduct(p['host'], p['dir'], p['filename'], saveas)
+        except:
+          continue
+    else:
+      try:
+        grabProduct(p['host'], p['dir'], p['filename'], saveas)
+      except:
+        continue
+    ret_list = [saveas, '%s%s%s' %(p['host'], p['dir'], p['filename'])]
+    if __DEBUG_MODE__ == True:
+      print 'Tries: %1i/%1i Downloaded %s to %s' %(nr_tries, len(options), ret_list[1], ret_list[0])
+    return ret_list
+
+  raise RuntimeError('Failed to download %s file (0/%1i)' %(descr, len(options)))
@@ -5,6 +5,7 @@ import ftplib
 import bernutils.gpstime
 import bernutils.webutils
 import bernutils.products.prodgen
+import bernutils.products.prodcache
 
 COD_HOST      = bernutils.products.prodgen.COD_HOST
 COD_DIR       = bernutils.products.prodgen.COD_DIR
@@ -27,7 +28,7 @@ def _getRunningDcb_(filename, saveas):
   HOST = COD_HOST
   dirn = COD_DIR
   try:
-    return bernutils.webutils.grabFtpFile(HOST, dirn, filename, saveas)
+    return bernutils.products.prodcache.grabProduct(HOST, dirn, filename, saveas)
   except:
     raise
 
@@ -39,7 +40,7 @@ def _getFinalDcb_(year, filename, saveas):
   HOST = COD_HOST
   dirn = '%s/%04i/' %(COD_DIR, year)
   try:
-    return bernutils.webutils.grabFtpFile(HOST,dirn,filename,saveas)
+    return bernutils.products.prodcache.grabProduct(HOST, dirn, filename, saveas)
   except:
     raise
 
@@ -104,7 +105,7 @@ def getCodDcb(stype, datetm, out_dir=None):
     saveas   = filename
     if out_dir: saveas = os.path.join(out_dir, filename)
     try:
-      localfile, webfile = _getRunningDcb_(filename, saveas)
+      localfile, webfile = _getRunningDcb_(filename, saveas)[0]
       return [localfile, webfile]
     except:
       raise
@@ -116,7 +117,7 @@ def getCodDcb(stype, datetm, out_dir=None):
     saveas   = filename
     if out_dir:  saveas = os.path.join(out_dir, filename)
     try:
-      localfile, webfile = _getFinalDcb_(iyear,filename,saveas)
+      localfile, webfile = _getFinalDcb_(iyear,filename,saveas)[0]
       return [localfile, webfile]
     except:
       filename = generic_file.replace('yymm', '')
@@ -124,7 +125,7 @@ def getCodDcb(stype, datetm, out_dir=None):
       if out_dir:
         saveas = os.path.join(out_dir, filename)
       try:
-        localfile, webfile = _getRunningDcb_(filename,saveas)
+        localfile, webfile = _getRunningDcb_(filename,saveas)[0]
         return [localfile, webfile]
       except:
         raise
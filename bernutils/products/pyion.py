@@ -5,6 +5,7 @@ import ftplib
 import bernutils.gpstime
 import bernutils.webutils
 import bernutils.products.prodgen
+import bernutils.products.prodcache
 
 __DEBUG_MODE__ = False
 
@@ -169,29 +170,6 @@ def getCodIon(datetm, out_dir=None):
     for i in options:
       print 'will try: ', i
 
-  ## the successeful triple is ..
-  ret_list = []
-  nr_tries = 0
-
-  ##  for every possible  erp file, see if we can download it. we stop at the
-  ##+ first successeful download.
-  for triple in options:
-    nr_tries += 1
-    try:
-      if out_dir: 
-        saveas = os.path.join(out_dir, triple[0])
-      else:
-        saveas = triple[0]
-      info = bernutils.webutils.grabFtpFile(triple[1], triple[2], triple[0], saveas)
-      ret_list = [saveas, '%s%s%s' %(triple[1], triple[2], triple[0])]
-      break
-    except:
-      pass
-
-  if len(ret_list) == 0:
-    raise RuntimeError('Failed to download ion file (0/%1i)' %len(options))
-
-  if __DEBUG_MODE__ == True:
-    print 'Tries: %1i/%1i Downloaded %s to %s' %(nr_tries, len(options), ret_list[1], ret_list[0])
-
-  return ret_list
+  ##  download the first available candidate (going through the product
+  ##+ cache, if enabled).
+  return bernutils.products.prodcache.grabFirstAvailable(options, out_dir, 'ion')
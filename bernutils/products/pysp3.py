@@ -2,10 +2,12 @@ import sys
 import os
 import datetime
 import ftplib
+import numpy
 
 import bernutils.gpstime
 import bernutils.webutils
 import bernutils.products.prodgen
+import bernutils.products.prodcache
 import bernutils.products.pysp3_mrg
 
 __DEBUG_MODE__ = False
@@ -318,32 +320,9 @@ def getIgsSp3Gps(datetm, out_dir=None, igs_repro2=False):
     for i in options:
       print 'will try: ', i
 
-  ## the successeful triple is ..
-  ret_list = []
-  nr_tries = 0
-
-  ##  for every possible  erp file, see if we can download it. we stop at the
-  ##+ first successeful download.
-  for triple in options:
-    nr_tries += 1
-    try:
-      if out_dir: 
-        saveas = os.path.join(out_dir, triple[0])
-      else:
-        saveas = triple[0]
-      info = bernutils.webutils.grabFtpFile(triple[1], triple[2], triple[0], saveas)
-      ret_list = [saveas, '%s%s%s' %(triple[1], triple[2], triple[0])]
-      break
-    except:
-      pass
-
-  if len(ret_list) == 0:
-    raise RuntimeError('Failed to download sp3 file (0/%1i)' %len(options))
-
-  if __DEBUG_MODE__ == True:
-    print 'Tries: %1i/%1i Downloaded %s to %s' %(nr_tries, len(options), ret_list[1], ret_list[0])
-
-  return ret_list
+  ##  download the first available candidate (going through the product
+  ##+ cache, if enabled).
+  return bernutils.products.prodcache.grabFirstAvailable(options, out_dir, 'sp3')
 
 def getIgsSp3Glo(datetm, out_dir=None):
   ''' This function is responsible for downloading an optimal, valid sp3 file
@@ -405,32 +384,9 @@ def getIgsSp3Glo(datetm, out_dir=None):
     for i in options:
       print 'will try: ', i
 
-  ## the successeful triple is ..
-  ret_list = []
-  nr_tries = 0
-
-  ##  for every possible sp3 file, see if we can download it. we stop at the
-  ##+ first successeful download.
-  for triple in options:
-    nr_tries += 1
-    try:
-      if out_dir:
-        saveas = os.path.join(out_dir, triple[0])
-      else:
-        saveas = triple[0]
-      info = bernutils.webutils.grabFtpFile(triple[1], triple[2], triple[0], saveas)
-      ret_list = [saveas, '%s%s%s' %(triple[1], triple[2], triple[0])]
-      break
-    except:
-      pass
-
-  if len(ret_list) == 0:
-    raise RuntimeError('Failed to download sp3 file (0/%1i)' %len(options))
-
-  if __DEBUG_MODE__ == True:
-    print 'Tries: %1i/%1i Downloaded %s to %s' %(nr_tries, len(options), ret_list[1], ret_list[0])
-
-  return ret_list
+  ##  download the first available candidate (going through the product
+  ##+ cache, if enabled).
+  return bernutils.products.prodcache.grabFirstAvailable(options, out_dir, 'sp3')
 
 def getIgsSp3(datetm, out_dir=None, use_glonass=False, igs_repro2=False):
   ''' This function is responsible for downloading an optimal, valid sp3 file
@@ -576,32 +532,9 @@ def getCodSp3(datetm, out_dir=None, use_repro_13=False, use_one_day_sol=False, i
     for i in options:
       print 'will try: ', i
 
-  ## the successeful triple is ..
-  ret_list = []
-  nr_tries = 0
-
-  ##  for every possible sp3 file, see if we can download it. we stop at the
-  ##+ first successeful download.
-  for triple in options:
-    nr_tries += 1
-    try:
-      if out_dir: 
-        saveas = os.path.join(out_dir, triple[0])
-      else:
-        saveas = triple[0]
-      info = bernutils.webutils.grabFtpFile(triple[1], triple[2], triple[0], saveas)
-      ret_list = [saveas, '%s%s%s' %(triple[1], triple[2], triple[0])]
-      break
-    except:
-      pass
-
-  if len(ret_list) == 0:
-    raise RuntimeError('Failed to download sp3 file (0/%1i)' %len(options))
-
-  if __DEBUG_MODE__ == True:
-    print 'Tries: %1i/%1i Downloaded %s to %s' %(nr_tries, len(options), ret_list[1], ret_list[0])
-
-  return ret_list
+  ##  download the first available candidate (going through the product
+  ##+ cache, if enabled).
+  return bernutils.products.prodcache.grabFirstAvailable(options, out_dir, 'sp3')
 
 def obsolete_getOrb(datetm, ac='cod', out_dir=None, use_glonass=False, use_repro_13=False, use_one_day_sol=False, igs_repro2=False):
   ''' This function is responsible for downloading an optimal, valid sp3/brdc file
@@ -805,7 +738,7 @@ def getNav(datetm, sat_sys='G', out_dir=None, station=None, hour=None):
     saveas = os.path.join(out_dir, saveas)
 
   try:
-    info = bernutils.webutils.grabFtpFile(HOST, DIR, NAVFILE, saveas)
+    info = bernutils.products.prodcache.grabProduct(HOST, DIR, NAVFILE, saveas)
     return info
   except:
     raise RuntimeError('Failed to fetch navigation file: %s' %(HOST+DIR+NAVFILE))
@@ -823,16 +756,130 @@ def merge_sp3_GR(gps_sp3, glo_sp3, out_sp3=None):
 
       :param out_sp3: if specified, the filename of the merged file.
 
+      .. note:: Any number of sp3 files (of any satellite system) can be
+        merged via :func:`bernutils.products.pysp3_mrg.merge`.
+
   '''
   if out_sp3 != None:
-    temp       = sys.stdout
-    sys.stdout = open(out_sp3, 'w')
-
+    with open(out_sp3, 'w') as fout:
+      bernutils.products.pysp3_mrg.merge([ gps_sp3, glo_sp3 ], fout)
+  else:
+    bernutils.products.pysp3_mrg.merge([ gps_sp3, glo_sp3 ], sys.stdout)
+
+SP3_BAD_CLOCK = 999999.999999
+''' Clock value (microsec) denoting a bad or absent clock record. '''
+
+SP3_FIELD_DTYPE = numpy.dtype('S14')
+''' The (fixed-width) layout of the x, y, z and clock fields (columns 5-60) of
+    a position (``P``) or velocity (``V``) record, e.g.
+    ``PG01  -6114.801556 -13827.040063  22049.826004    238.589726``
+'''
+
+def __sp3_records__(lines, epoch_index, nepochs, sat_index):
+  ''' Utility function; parse a list of position (or velocity) records, in bulk.
+      Columns 5-60 of all records are joined and converted in one go; if any
+      field is blank, they are instead split in fixed-width fields (see
+      ``SP3_FIELD_DTYPE``).
+
+      :param lines:       A list of records (lines).
+      :param epoch_index: An array holding the epoch index of every record.
+      :param nepochs:     Number of epochs in the file.
+      :param sat_index:   The satellite to index dictionary.
+
+      :returns:           A float array of shape ``(nepochs, nsats, 4)``;
+                          missing values are ``numpy.nan``.
+  '''
+  data = numpy.empty((nepochs, len(sat_index), 4))
+  data.fill(numpy.nan)
+  if not len(lines):
+    return data
   try:
-    bernutils.products.pysp3_mrg. __merge_igl_igs__(gps_sp3, glo_sp3)
-  except:
-    raise
+    svs, inv = numpy.unique([ l[1:4] for l in lines ], return_inverse=True)
+    sat  = numpy.array([ sat_index[bernutils.products.pysp3_mrg.sp3_satellite(sv)] for sv in svs ], dtype=int)[inv]
+    vals = numpy.fromstring(' '.join([ l[4:60] for l in lines ]), sep=' ')
+    if vals.size != 4*len(lines):
+      flds = numpy.frombuffer(''.join([ l[4:60].ljust(56) for l in lines ]), dtype=SP3_FIELD_DTYPE)
+      vals = numpy.where(numpy.char.strip(flds) == '', 'nan', flds).astype(float)
+    data[epoch_index, sat, :] = vals.reshape(-1, 4)
+  except KeyError, e:
+    raise RuntimeError('Satellite %s not in the sp3 header' %e.args[0])
+  except ValueError:
+    raise RuntimeError('Failed to resolve sp3 position/velocity records')
+  return data
+
+class Sp3File:
+  ''' A class to hold (all) the records of an SP3-c or SP3-d orbit file; the
+      file may be UNIX-compressed (.Z) or gzip-compressed (.gz), see
+      :func:`bernutils.products.pysp3_mrg.open_sp3`.
+
+      The records are stored in dense arrays, of shape
+      ``(epochs, satellites, 4)``, holding ``[x, y, z, clock]`` for every
+      epoch (see ``epochs``) and satellite (see ``satellites`` and
+      ``sat_index``); positions are in km and clocks in microsec (velocities
+      in dm/sec and clock rates in 10**-4 microsec/sec). Absent records,
+      zero positions (i.e. bad or absent) and bad clocks (``999999.999999``)
+      are ``numpy.nan``.
+
+      Header information is stored in the dictionary ``header``, see
+      :func:`bernutils.products.pysp3_mrg.parse_header`.
+  '''
 
-  if out_sp3 != None:
-    sys.stdout.close()
-    sys.stdout = temp
+  def __init__(self, filename):
+    ''' Constructor; read the whole file. '''
+    self.filename   = filename
+    self.header     = {}
+    self.satellites = []  #: List of satellites (as in the header)
+    self.sat_index  = {}  #: Satellite to index dictionary
+    self.epochs     = None  #: Array of epochs (numpy.datetime64, microsec)
+    self.data       = None  #: Array of positions and clocks
+    self.velocities = None  #: Array of velocities and clock rates (if any)
+
+    fin = bernutils.products.pysp3_mrg.open_sp3(filename)
+    try:
+      lines = fin.read().splitlines()
+    finally:
+      fin.close()
+    self.__parse__(lines)
+
+  def __parse__(self, lines):
+    ''' Resolve the header and data records. '''
+    ## the record type (i.e. first char) of every line, up to 'EOF'
+    kinds = numpy.array([ l[0:1] for l in lines ])
+    eof   = [ i for i in numpy.flatnonzero(kinds == 'E') if lines[i][0:3] == 'EOF' ]
+    if len(eof):
+      kinds = kinds[0:eof[0]]
+    epochs = numpy.flatnonzero(kinds == '*')
+    if not len(epochs):
+      raise RuntimeError('No epochs in sp3 file: %s' %self.filename)
+
+    self.header, self.satellites = bernutils.products.pysp3_mrg.parse_header(lines[0:epochs[0]], self.filename)
+    self.sat_index = dict([ (sv, i) for i, sv in enumerate(self.satellites) ])
+    self.epochs = numpy.array([ bernutils.products.pysp3_mrg.resolve_epoch(lines[i][3:31]) for i in epochs ], dtype='datetime64[us]')
+
+    ## position (and velocity) records, with the index of their epoch
+    records = {}
+    for c in ('P', 'V'):
+      idx = numpy.flatnonzero(kinds == c)
+      if len(idx) and idx[0] < epochs[0]:
+        raise RuntimeError('Invalid sp3 format (records before epoch): %s' %self.filename)
+      records[c] = ([ lines[i] for i in idx ], numpy.searchsorted(epochs, idx) - 1)
+
+    self.data = __sp3_records__(records['P'][0], records['P'][1], len(epochs), self.sat_index)
+    with numpy.errstate(invalid='ignore'):
+      self.data[:, :, 0:3][numpy.all(self.data[:, :, 0:3] == 0e0, axis=2)] = numpy.nan
+      self.data[:, :, 3][self.data[:, :, 3] >= SP3_BAD_CLOCK] = numpy.nan
+    if len(records['V'][0]):
+      self.velocities = __sp3_records__(records['V'][0], records['V'][1], len(epochs), self.sat_index)
+
+  def satellite(self, sv):
+    ''' Return the records of a satellite (e.g. ``'G01'``), as an array of
+        shape ``(epochs, 4)``, i.e. ``[x, y, z, clock]`` for every epoch.
+    '''
+    try:
+      return self.data[:, self.sat_index[bernutils.products.pysp3_mrg.sp3_satellite(sv)], :]
+    except KeyError:
+      raise RuntimeError('Satellite %s not in sp3 file %s' %(sv, self.filename))
+
+  def interval(self):
+    ''' Return the epoch interval in seconds (as in the header). '''
+    return self.header['interval']
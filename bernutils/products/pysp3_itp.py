@@ -0,0 +1,210 @@
+''' Interpolation of satellite positions (and clocks) from sp3 files, see
+    :py:class:`Sp3Interpolator`.
+'''
+
+import numpy
+import bernutils.products.pysp3
+
+__DEBUG_MODE__ = False
+
+DEFAULT_ORDER = 9
+''' Default order of the (Lagrange) interpolating polynomial, i.e. windows of
+    10 epochs.
+'''
+
+def barycentric_weights(x):
+  ''' Compute the barycentric weights of (one or more) sets of interpolation
+      nodes.
+
+      :param x: An array of shape ``(..., n)``, holding the node times.
+
+      :returns: An array of shape ``(..., n)``; the weights are scaled by the
+                nodes' mean spacing (to keep the products in range), which
+                does not affect the (second form) barycentric formula.
+  '''
+  x  = numpy.asarray(x, dtype=float)
+  n  = x.shape[-1]
+  dx = x[..., :, None] - x[..., None, :]
+  dx[..., numpy.arange(n), numpy.arange(n)] = 1e0
+  h  = (x[..., -1] - x[..., 0]) / (n - 1)
+  return 1e0 / numpy.prod(dx / h[..., None, None], axis=-1)
+
+def concatenate(sp3_list):
+  ''' Concatenate the records of (consecutive) sp3 files, e.g. daily files
+      D-1, D and D+1. Files are sorted by their first epoch; epochs already
+      present in a previous file (e.g. a midnight epoch included in both
+      files) are taken from the first file they appear in. The satellite list
+      is the union of all files' satellites (in order of first appearance).
+
+      :param sp3_list: A list of :py:class:`bernutils.products.pysp3.Sp3File`
+                       instances and/or sp3 filenames.
+
+      :returns:        A tuple ``(epochs, satellites, data)``, see
+                       :py:class:`bernutils.products.pysp3.Sp3File`.
+  '''
+  sp3s = [ s if isinstance(s, bernutils.products.pysp3.Sp3File) else bernutils.products.pysp3.Sp3File(s) for s in sp3_list ]
+  if not len(sp3s):
+    raise RuntimeError('No sp3 files to concatenate')
+  sp3s.sort(key=lambda s: s.epochs[0])
+
+  satellites = []
+  for s in sp3s:
+    satellites += [ sv for sv in s.satellites if sv not in satellites ]
+  sat_index = dict([ (sv, i) for i, sv in enumerate(satellites) ])
+
+  epochs, blocks = [], []
+  last = None
+  for s in sp3s:
+    keep = numpy.ones(len(s.epochs), dtype=bool) if last is None else s.epochs > last
+    if not keep.any():
+      continue
+    block = numpy.empty((keep.sum(), len(satellites), 4))
+    block.fill(numpy.nan)
+    block[:, [ sat_index[sv] for sv in s.satellites ], :] = s.data[keep]
+    epochs.append(s.epochs[keep])
+    blocks.append(block)
+    last = s.epochs[keep][-1]
+
+  epochs = numpy.concatenate(epochs)
+  if (numpy.diff(epochs) <= numpy.timedelta64(0, 'us')).any():
+    raise RuntimeError('Overlapping (unsorted) epochs in sp3 files')
+  return epochs, satellites, numpy.concatenate(blocks)
+
+class Sp3Interpolator:
+  ''' Sliding-window Lagrange interpolation of satellite positions from (one or
+      more consecutive) sp3 files.
+
+      For an epoch ``t``, the polynomial of order ``n`` is fitted to the
+      ``n+1`` sp3 epochs closest to ``t`` (i.e. centered around ``t``, or
+      shifted at the start/end of the arc). The polynomial is evaluated in its
+      barycentric form; the barycentric weights only depend on the window (not
+      the satellite or the epoch) and are computed once per window and cached,
+      so repeated queries within the same interval are cheap. All evaluations
+      are vectorized over epochs and satellites.
+
+      Clocks are interpolated linearly between the two nearest sp3 epochs.
+
+      .. note:: A satellite with an absent (``nan``) record at any epoch of a
+        window, gets ``nan`` for all epochs interpolated in this window.
+        Epochs outside the span of the sp3 epochs also get ``nan``.
+  '''
+
+  def __init__(self, sp3_list, order=DEFAULT_ORDER):
+    ''' Constructor.
+
+        :param sp3_list: A list of :py:class:`bernutils.products.pysp3.Sp3File`
+                         instances and/or sp3 filenames, covering consecutive
+                         intervals (see :func:`concatenate`); a single instance
+                         or filename is also accepted.
+        :param order:    The order of the interpolating polynomial.
+    '''
+    if not isinstance(sp3_list, (list, tuple)):
+      sp3_list = [ sp3_list ]
+    self.epochs, self.satellites, self.data = concatenate(sp3_list)
+    self.sat_index = dict([ (sv, i) for i, sv in enumerate(self.satellites) ])
+    if order < 1 or order >= len(self.epochs):
+      raise RuntimeError('Invalid interpolation order %i (%i sp3 epochs)' %(order, len(self.epochs)))
+    self.order = order
+    ## node times, in seconds after the first epoch
+    self.__t0    = self.epochs[0]
+    self.__nodes = (self.epochs - self.__t0).astype('timedelta64[us]').astype(float) * 1e-6
+    ## cached barycentric weights, per window start index
+    nwin = len(self.__nodes) - order
+    self.__weights = numpy.zeros((nwin, order + 1))
+    self.__cached  = numpy.zeros(nwin, dtype=bool)
+
+  def __seconds__(self, epochs):
+    ''' Convert epochs (``numpy.datetime64`` or ``datetime.datetime``
+        instances) to seconds after the first sp3 epoch.
+    '''
+    epochs = numpy.atleast_1d(numpy.asarray(epochs, dtype='datetime64[us]'))
+    return (epochs - self.__t0).astype('timedelta64[us]').astype(float) * 1e-6
+
+  def __sat_indexes__(self, sats):
+    ''' Resolve a list of satellites to indexes (``None`` means all). '''
+    if sats is None:
+      return numpy.arange(len(self.satellites))
+    try:
+      return numpy.array([ self.sat_index[sv] for sv in sats ], dtype=int)
+    except KeyError, e:
+      raise RuntimeError('Satellite %s not in sp3 file(s)' %e.args[0])
+
+  def __window_weights__(self, starts):
+    ''' Return the barycentric weights for the windows starting at the (node)
+        indexes ``starts``, computing (and caching) those not yet computed.
+    '''
+    missing = numpy.unique(starts[~self.__cached[starts]])
+    if len(missing):
+      x = self.__nodes[missing[:, None] + numpy.arange(self.order + 1)]
+      self.__weights[missing] = barycentric_weights(x)
+      self.__cached[missing]  = True
+      if __DEBUG_MODE__ == True:
+        print '[DEBUG] Computed barycentric weights for %i windows' %len(missing)
+    return self.__weights[starts]
+
+  def position(self, epochs, sats=None):
+    ''' Interpolate satellite positions.
+
+        :param epochs: An epoch or a list/array of epochs
+                       (``numpy.datetime64`` or ``datetime.datetime``).
+        :param sats:   (Optional) A list of satellites, e.g. ``['G01', 'R12']``;
+                       if ``None``, all satellites (see ``satellites``).
+
+        :returns:      An array of shape ``(epochs, satellites, 3)``, holding
+                       the interpolated ``[x, y, z]`` in km.
+    '''
+    t    = self.__seconds__(epochs)
+    sidx = self.__sat_indexes__(sats)
+    npts = self.order + 1
+    out  = numpy.empty((len(t), len(sidx), 3))
+    out.fill(numpy.nan)
+
+    inside = (t >= self.__nodes[0]) & (t <= self.__nodes[-1])
+    if not inside.any():
+      return out
+    ti     = t[inside]
+    starts = numpy.searchsorted(self.__nodes, ti) - npts // 2
+    starts = numpy.clip(starts, 0, len(self.__nodes) - npts)
+    idx    = starts[:, None] + numpy.arange(npts)
+    w      = self.__window_weights__(starts)
+    dt     = ti[:, None] - self.__nodes[idx]
+    ## epochs matching an sp3 epoch get the sp3 value
+    exact  = dt == 0e0
+    dt[exact] = 1e0
+    c = w / dt
+    c[exact.any(axis=1)] = 0e0
+    c[exact] = 1e0
+    vals = self.data[idx[:, :, None], sidx[None, None, :], 0:3]
+    out[inside] = numpy.einsum('en,ensk->esk', c, vals) / c.sum(axis=1)[:, None, None]
+    return out
+
+  def clock(self, epochs, sats=None):
+    ''' Interpolate (linearly) satellite clocks; see :func:`position`.
+
+        :returns: An array of shape ``(epochs, satellites)``, holding the
+                  interpolated clock corrections in microsec.
+    '''
+    t    = self.__seconds__(epochs)
+    sidx = self.__sat_indexes__(sats)
+    out  = numpy.empty((len(t), len(sidx)))
+    out.fill(numpy.nan)
+
+    inside = (t >= self.__nodes[0]) & (t <= self.__nodes[-1])
+    if not inside.any():
+      return out
+    ti = t[inside]
+    i  = numpy.clip(numpy.searchsorted(self.__nodes, ti) - 1, 0, len(self.__nodes) - 2)
+    f  = (ti - self.__nodes[i]) / (self.__nodes[i+1] - self.__nodes[i])
+    c0 = self.data[i[:, None], sidx[None, :], 3]
+    c1 = self.data[i[:, None]+1, sidx[None, :], 3]
+    out[inside] = c0 + f[:, None] * (c1 - c0)
+    return out
+
+  def interpolate(self, epochs, sats=None):
+    ''' Interpolate satellite positions and clocks, see :func:`position` and
+        :func:`clock`.
+
+        :returns: An array of shape ``(epochs, satellites, 4)``, holding the
+                  interpolated ``[x, y, z, clock]``.
+    '''
+    return numpy.concatenate((self.position(epochs, sats), self.clock(epochs, sats)[:, :, None]), axis=2)
@@ -1,5 +1,8 @@
-''' @package merge_igl_igs
-    @brief Function to merge two sp3 files
+''' @package pysp3_mrg
+    @brief Streaming (k-way) merging of any number of sp3 files, see
+           :func:`merge`; also holds the sp3 utilities (opening, header
+           parsing and writing, epoch block reading) shared by the sp3
+           reader, interpolator and splicer.
 
     Created         : Sep 2014
     Last Update     : Sep 2015
@@ -14,439 +17,373 @@
 ''' Import Libraries '''
 import os
 import sys
+import gzip
+import heapq
 import datetime
+import numpy
 
-def __close_fs(f1, f2):
-  f1.close()
-  f2.close()
+import bernutils.lzw
 
-def print_until_next_epoch (inf, line):
-  ''' Print all lines untill next epoch header.
+SP3_GZIP_MAGIC = '\x1f\x8b'
+''' The two magic bytes at the start of every gzip-compressed (.gz) file. '''
 
-      :param inf:  The input file stream.
-
-      :param line: The current line in buffer (read of from the ``inf`` stream.
+SP3C_MAX_SATS = 85
+''' Max number of satellites in an SP3-c file (5 lines of 17 satellites); more
+    satellites need an SP3-d file.
+'''
 
-      :returns: ``status, lines_read, last_line``
+SP3_SATS_PER_LINE = 17
 
-        * if status = -1, an error occured,
-        * if status = -2, EOF encountered,
-        * if status =  0,  all ok
+def open_sp3(filen):
+  ''' Open an sp3 file for reading, uncompressing it on the fly if it is
+      UNIX-compressed (.Z) or gzip-compressed (.gz). The format is resolved
+      from the first (magic) bytes, not the extension.
 
+      :returns: A (read-only) file-like object.
   '''
-  ln = line
-  counter = 0
-  while True:
-    if ln[0] == '*':
-      return 0, counter, ln
-    if ln[0] == 'E':
-      lns = ln.split()
-      if lns[0] == 'EOF':
-        return -2, counter, ln
-    if ln[0] != 'P' and ln[0] != 'V':
-      return -1, counter, ln
-    print ln.strip()
-    ln = inf.readline()
-    counter += 1
-
-def resolve_date_line (line):
-  ''' Resolve an sp3 epoch line e.g. (``'*  2013  3  4 23 45  0.00000000'``) to 
-      datetime.datetime instance
-  '''
-  l = line.split()
-  if len(l) != 7:
-    raise RuntimeError('ERROR (1) resolving epoch line: [%s]' %line)
-  if l[0] != '*':
-    raise RuntimeError('Error (2) resolving epoch line: [%s]' %line)
-  try:
-    iy, im, idom, ih, imn = [ int(x) for x in l[1:6] ]
-    is_ = int(float(l[6]))
-    if float(l[6]) != float (is_):
-      raise RuntimeError('Error (2.5) resolving epoch line [%s] SECONDS NOT INTEGER !' %line)
-  except:
-    raise RuntimeError('Error (3) resolving epoch line [%s]' %line)
-  try:
-    d = datetime.datetime(iy,im,idom,ih,imn,is_)
-  except:
-    raise RuntimeError('Error (4) resolving epoch line [%s]' %line)
-  return d
-
-def __merge_igl_igs__(igsf, iglf):
-  """
-  """
   try:
-    gin = open (igsf, 'r')
-    rin = open (iglf, 'r')
+    with open(filen, 'rb') as fin:
+      magic = fin.read(2)
   except:
-    raise RuntimeError('Unable to open input files')
-
-  # number of current line
-  gline_nr = 0
-  rline_nr = 0
-
-  '''
-  ____LINE 1____________________________________________________________________
-  read first line; must be the same ::
-
-    #cP2013  8  3  0  0  0.00000000      96 ORBIT IGb08 HLM  IGS
-
-  '''
-  line_g = gin.readline ()
-  line_r = rin.readline ()
-  gline_nr = rline_nr = 1
-  if line_g != line_r :
-    __close_fs(gin, rin)
-    raise RuntimeError('Error in line %4i' %gline_nr)
-  ## write the first line
-  print line_r,
-
+    raise RuntimeError('Cannot open sp3 file: %s' %filen)
+  if magic == bernutils.lzw.MAGIC:
+    return bernutils.lzw.open(filen)
+  elif magic == SP3_GZIP_MAGIC:
+    return gzip.open(filen, 'rb')
+  return open(filen, 'rb')
+
+def sp3_satellite(sv):
+  ''' Normalize a satellite id, e.g. ``'G 1'`` or ``' 01'`` to ``'G01'`` (a
+      blank system identifier means GPS).
   '''
-  ____LINE 2____________________________________________________________________
-  read second line; must be the same for the two orbit files ::
-
-    ## 1751 518400.00000000   900.00000000 56507 0.0000000000000
-
+  sv = sv.strip().rjust(3)
+  sys_id = sv[0] if sv[0] != ' ' else 'G'
+  return sys_id + sv[1:].replace(' ', '0')
+
+def resolve_epoch(estr):
+  ''' Resolve an sp3 epoch string, e.g. ``'2013  3  4 23 45  0.00000000'``
+      (i.e. columns 4-31 of an epoch line) to a ``numpy.datetime64`` instance
+      (microsec).
   '''
-  line_g = gin.readline ()
-  line_r = rin.readline ()
-  gline_nr+=1
-  rline_nr+=1 
-  if line_g != line_r :
-    __close_fs(gin, rin)
-    raise RuntimeError('Error in line %4i' %gline_nr)
-  ## write the second line
-  print line_r,
-
+  l = estr.split()
+  if len(l) != 6:
+    raise RuntimeError('Error resolving sp3 epoch: [%s]' %estr)
+  try:
+    iy, im, idom, ih, imn = [ int(x) for x in l[0:5] ]
+    usec = int(round(float(l[5])*1e6))
+    return numpy.datetime64('%04i-%02i-%02iT%02i:%02i' %(iy, im, idom, ih, imn), 'us') \
+      + numpy.timedelta64(usec, 'us')
+  except:
+    raise RuntimeError('Error resolving sp3 epoch: [%s]' %estr)
+
+def parse_header(lines, filen=''):
+  ''' Resolve the header records of an SP3-c or SP3-d file.
+
+      :param lines: The header lines (i.e. all lines before the first epoch).
+      :param filen: The name of the file (only used in error messages).
+
+      :returns:     A tuple ``(header, satellites)``; ``header`` is a
+                    dictionary with keys: ``version``, ``pos_vel``, ``start``
+                    (``numpy.datetime64``), ``num_of_epochs``, ``data_used``,
+                    ``crd_sys``, ``orb_type``, ``agency``, ``gps_week``,
+                    ``sow``, ``interval``, ``mjd``, ``fraction``,
+                    ``file_type``, ``time_sys``, ``base_pos``, ``base_clk``,
+                    ``accuracy`` (a dictionary, per satellite) and
+                    ``comments`` (a list). ``satellites`` is the list of
+                    satellites, as in the header.
   '''
-  ____LINES 3 - 7_______________________________________________________________
-  third line contains number of sats and a list of the sats ::
-
-    +   32   G01G02G03G04G05G06G07G08G09G10G11G12G13G14G15G16G17
+  if len(lines) < 2 or lines[0][0:1] != '#' or lines[1][0:2] != '##':
+    raise RuntimeError('Invalid sp3 format: %s' %filen)
+  version = lines[0][1]
+  if version not in ('c', 'd'):
+    raise RuntimeError('Unsupported sp3 version \'%s\': %s' %(version, filen))
 
-  '''
-  # first for gps
-  gsats_s   = []
-  line_g    = gin.readline().strip()
-  gline_nr += 1
+  hdr = {}
   try:
-    gsats  = int(line_g[4:6])
+    hdr['version']       = version
+    hdr['pos_vel']       = lines[0][2]
+    hdr['start']         = resolve_epoch(lines[0][3:31])
+    hdr['num_of_epochs'] = int(lines[0][32:39])
+    hdr['data_used']     = lines[0][40:45].strip()
+    hdr['crd_sys']       = lines[0][46:51].strip()
+    hdr['orb_type']      = lines[0][52:55].strip()
+    hdr['agency']        = lines[0][56:60].strip()
+    hdr['gps_week']      = int(lines[1][3:7])
+    hdr['sow']           = float(lines[1][8:23])
+    hdr['interval']      = float(lines[1][24:38])
+    hdr['mjd']           = int(lines[1][39:44])
+    hdr['fraction']      = float(lines[1][45:60])
   except:
-    __close_fs(gin, rin)
-    raise RuntimeError('Error in line %4i' %gline_nr)
-  sat_str = line_g[9:]
-  # read the following 4 lines
-  for i in range(0, 4):
-    line_g    = gin.readline ().strip ()
-    gline_nr += 1
-    if line_g[0] != '+' :
-      __close_fs(gin, rin)
-      raise RuntimeError('Error in line %4i' %gline_nr)
-    sat_str += line_g[9:]
-  # resolve satellites from accumulated line
-  tl = [ sat_str[i:i+3] for i in range(0, len(sat_str), 3) ]
-  for j in tl:
-    if j != '  0':
-      if j[0] != 'G' :
-        __close_fs(gin, rin)
-        raise RuntimeError('Error reading gps satellite: [%s]; line nr %4i' %(j, gline_nr))
-      gsats_s.append(j)
-  # see that all satellites are resolved
-  if gsats != len(gsats_s):
-    __close_fs(gin, rin)
-    raise RuntimeError('Error reading gps satellites for file [%s]' %igsf)
-
-  # then for glonass
-  rsats_s   = []
-  line_r    = rin.readline().strip();
-  rline_nr +=1
+    raise RuntimeError('Invalid sp3 header (lines 1-2): %s' %filen)
+
+  sats, accs, nsats = '', '', None
+  hdr['comments'] = []
+  for line in lines[2:]:
+    if line[0:2] == '+ ':
+      if nsats is None:
+        try:
+          nsats = int(line[3:6])
+        except:
+          raise RuntimeError('Invalid sp3 header (satellite records): %s' %filen)
+      sats += line[9:60].ljust(51)
+    elif line[0:2] == '++':
+      accs += line[9:60].ljust(51)
+    elif line[0:2] == '%c' and 'file_type' not in hdr:
+      hdr['file_type'] = line[3:5].strip()
+      hdr['time_sys']  = line[9:12].strip()
+    elif line[0:2] == '%f' and 'base_pos' not in hdr:
+      try:
+        hdr['base_pos'] = float(line[3:13])
+        hdr['base_clk'] = float(line[14:26])
+      except:
+        raise RuntimeError('Invalid sp3 header (base records): %s' %filen)
+    elif line[0:2] == '/*':
+      hdr['comments'].append(line[3:].rstrip())
+
+  if nsats is None:
+    raise RuntimeError('Invalid sp3 header (no satellite records): %s' %filen)
+  satellites = [ sp3_satellite(sats[i:i+3]) for i in range(0, 3*nsats, 3) ]
+  if len(set(satellites)) != nsats:
+    raise RuntimeError('Invalid sp3 header (satellite records): %s' %filen)
   try:
-    rsats  = int(line_r[4:6])
+    hdr['accuracy'] = dict([ (sv, int(accs[3*i:3*i+3])) for i, sv in enumerate(satellites) ])
   except:
-    __close_fs(gin, rin)
-    raise RuntimeError('Error in line %4i' %rline_nr)
-  sat_str = line_r[9:]
-  # read the following 4 lines
-  for i in range(0, 4):
-    line_r    = rin.readline ().strip ()
-    rline_nr += 1
-    if line_r[0] != '+' :
-      __close_fs(gin, rin)
-      raise RuntimeError('Error in line %4i' %rline_nr)
-    sat_str += line_r[9:]
-  # resolve satellites from accumulated line
-  tl = [ sat_str[i:i+3] for i in range(0, len(sat_str), 3) ]
-  for j in tl:
-    if j != '  0':
-      if j[0] != 'R' :
-        __close_fs(gin, rin)
-        raise RuntimeError('Error reading glonass satellite: [%s]; line nr %4i' %(j, rline_nr))
-      rsats_s.append (j)
-  # see that all satellites are resolved
-  if rsats != len (rsats_s):
-    __close_fs(gin, rin)
-    raise RuntimeError('Error reading glonass satellites for file [%s]' %igsl)
-
-  ##  AT THIS POINT THE LISTS gsats_s AND rsats_s CONTAIN ALL SATELLITES, GPS 
-  ##+ PLUS GLONASS AS STRINGS
-
-  ## write the accumulated satellites
-  sat_str = gsats_s + rsats_s
-  s=''
-  for i in range(len(sat_str), 17*5):
-    sat_str.append ('  0')
-  # 17 sats in each line i.e. 17*3 = 51 chars
-  print '+   %02i   %51s' %(rsats+gsats,s.join(sat_str[0:17]))
-  print '+        %51s'   %(s.join(sat_str[17:2*17]))
-  print '+        %51s'   %(s.join(sat_str[2*17:3*17]))
-  print '+        %51s'   %(s.join(sat_str[3*17:4*17]))
-  print '+        %51s'   %(s.join(sat_str[4*17:5*17]))
-
+    hdr['accuracy'] = {}
+  return hdr, satellites
+
+def write_header(out, header, satellites):
+  ''' Write the header of an sp3 file; the satellite and accuracy blocks are
+      regenerated for any number of satellites (i.e. more than 5 lines for
+      SP3-d files with more than 85 satellites).
+
+      :param out:        The output stream.
+      :param header:     A header dictionary, as returned by
+                         :func:`parse_header`.
+      :param satellites: The list of satellites.
   '''
-  ____LINES 8 - 12______________________________________________________________
-  next 5 lines contain accuracy codes ::
-
-    ++         2  2  2  2  2  2  2  2  2  2  2  2  2  2  2  2  2
-
+  nsats = len(satellites)
+  if header['version'] == 'c' and nsats > SP3C_MAX_SATS:
+    raise RuntimeError('Too many satellites (%i) for an SP3-c file' %nsats)
+  start = header['start'].astype(datetime.datetime)
+  secs  = start.second + start.microsecond * 1e-6
+
+  out.write('#%1s%1s%4i %2i %2i %2i %2i %11.8f %7i %-5s %-5s %-3s %4s\n' \
+    %(header['version'], header['pos_vel'], start.year, start.month, start.day,
+    start.hour, start.minute, secs, header['num_of_epochs'], header['data_used'],
+    header['crd_sys'], header['orb_type'], header['agency']))
+  out.write('## %4i %15.8f %14.8f %5i %15.13f\n' %(header['gps_week'],
+    header['sow'], header['interval'], header['mjd'], header['fraction']))
+
+  nlines = max(5, (nsats + SP3_SATS_PER_LINE - 1) // SP3_SATS_PER_LINE)
+  pad    = nlines * SP3_SATS_PER_LINE - nsats
+  sats   = satellites + [ '  0' ] * pad
+  accs   = [ '%3i' %header['accuracy'].get(sv, 0) for sv in satellites ] + [ '  0' ] * pad
+  for i in range(0, nlines):
+    chunk = slice(i * SP3_SATS_PER_LINE, (i + 1) * SP3_SATS_PER_LINE)
+    if i == 0:
+      out.write('+  %3i   %s\n' %(nsats, ''.join(sats[chunk])))
+    else:
+      out.write('+        %s\n' %''.join(sats[chunk]))
+  for i in range(0, nlines):
+    chunk = slice(i * SP3_SATS_PER_LINE, (i + 1) * SP3_SATS_PER_LINE)
+    out.write('++       %s\n' %''.join(accs[chunk]))
+
+  out.write('%%c %-2s cc %-3s ccc cccc cccc cccc cccc ccccc ccccc ccccc ccccc\n' %(header['file_type'], header['time_sys']))
+  out.write('%c cc cc ccc ccc cccc cccc cccc cccc ccccc ccccc ccccc ccccc\n')
+  out.write('%%f %10.7f %12.9f  0.00000000000  0.000000000000000\n' %(header['base_pos'], header['base_clk']))
+  out.write('%f  0.0000000  0.000000000  0.00000000000  0.000000000000000\n')
+  out.write('%i    0    0    0    0      0      0      0      0         0\n')
+  out.write('%i    0    0    0    0      0      0      0      0         0\n')
+  comments = header['comments']
+  if header['version'] == 'c':
+    comments = comments[0:4]
+  comments = comments + [ '' ] * (4 - len(comments))
+  for c in comments:
+    out.write(('/* %s' %c)[0:80].rstrip() + '\n')
+
+class Sp3Stream:
+  ''' A (streaming) reader of an sp3 file; the header is read at construction
+      and then epoch blocks are read one at a time (see :func:`next_block`), so
+      only one epoch is held in memory.
   '''
-  # first for gps
-  gsats_s = []
-  sat_str = ''
-  # read the following 5 lines
-  for i in range(0,5):
-    line_g = gin.readline().strip ()
-    gline_nr += 1
-    if line_g[0:2] != '++' :
-      __close_fs(gin, rin)
-      raise RuntimeError('Error in line %4i' %gline_nr)
-    sat_str += line_g[9:]
-  # resolve satellite accuracies from accumulated line
-  tl = [ sat_str[i:i+3] for i in range(0, len(sat_str), 3) ]
-  for j in tl:
-    try:
-      ij = int(j)
-    except:
-      __close_fs(gin, rin)
-      raise RuntimeError('Error in line %4i' %gline_nr)
-    gsats_s.append(j)
-  # only save as many accuracies as the satellite number
-  gsats_s = gsats_s[0:gsats]
-
-  # then for glonass
-  rsats_s = []
-  sat_str = ''
-  # read the following 5 lines
-  for i in range (0,5):
-    line_r = rin.readline ().strip ()
-    rline_nr+=1;
-    if line_r[0:2] != '++' :
-      __close_fs(gin, rin)
-      raise RuntimeError('Error in line %4i' %rline_nr)
-    sat_str += line_r[9:]
-  # resolve satellite accuracies from accumulated line
-  tl = [ sat_str[i:i+3] for i in range(0, len(sat_str), 3) ]
-  for j in tl:
+
+  def __init__(self, filename):
+    ''' Constructor; open the file (see :func:`open_sp3`) and read the header. '''
+    self.filename = filename
+    self.__fin    = open_sp3(filename)
+    lines = []
+    line  = self.__fin.readline()
+    while line and line[0] != '*':
+      lines.append(line.rstrip('\r\n'))
+      line = self.__fin.readline()
+    if not line:
+      self.close()
+      raise RuntimeError('No epochs in sp3 file: %s' %filename)
     try:
-      ij = int(j)
+      self.header, self.satellites = parse_header(lines, filename)
     except:
-      __close_fs(gin, rin)
-      raise RuntimeError('Error in line %4i' %rline_nr)
-    rsats_s.append (j)
-  # only save as many accuracies as the satellite number
-  rsats_s = rsats_s[0:rsats]
-
-  ## write info rof all satellites
-  sat_str = gsats_s + rsats_s
-  s=''
-  for i in range (len(sat_str), 17*5):
-    sat_str.append ('  0')
-  # 17 sats in each line i.e. 17*3 = 51 chars
-  print '++       %51s' %(s.join(sat_str[0:17]))
-  print '++       %51s' %(s.join(sat_str[17:2*17]))
-  print '++       %51s' %(s.join(sat_str[2*17:3*17]))
-  print '++       %51s' %(s.join(sat_str[3*17:4*17]))
-  print '++       %51s' %(s.join(sat_str[4*17:5*17]))
-
-  '''
-  ____LINE 13___________________________________________________________________
-  THis line should follow the format: ::
-
-    %c R  cc GPS ccc cccc cccc cccc cccc ccccc ccccc ccccc ccccc ## for lonass
-    %c G  cc GPS ccc cccc cccc cccc cccc ccccc ccccc ccccc ccccc ## for gps
-    ## we should write something like:
-    %c ft  cc tsf ccc cccc cccc cccc cccc ccccc ccccc ccccc ccccc
-    ##    ft: "G " for GPS only files
-    ##        "M " for mixed files
-    ##        "R " for GLONASS only files
-    ## tsf: "GPS" for GPS time, "UTC" for UTC time
-
-  '''
-  line_g    = gin.readline ()
-  line_r    = rin.readline ()
-  gline_nr += 1
-  rline_nr += 1
-  gps_sys  = line_g[3:5].strip(' ')
-  gps_tsys = line_g[9:12].strip()
-  glo_sys  = line_r[3:5].strip()
-  glo_tsys = line_r[9:12].strip()
-  # chech the systems
-  if gps_sys != 'G':
-    __close_fs(gin, rin)
-    raise RuntimeError('Error! Expected satellite system \"G\", found' %gps_sys)
-  if glo_sys != 'R':
-    __close_fs(gin, rin)
-    raise RuntimeError('Error! Expected satellite system \"R\", found' %glo_sys)
-  if gps_tsys != glo_tsys:
-    __close_fs(gin, rin)
-    raise RuntimeError('Error! Different time systems in orbit files')
-
-  print '%%c %1s  cc %3s ccc cccc cccc cccc cccc ccccc ccccc ccccc ccccc' %('M',glo_tsys)
-
-  '''
-  ____LINE 14___________________________________________________________________
-  this line hold nothing! ::
-
-    %c cc cc ccc ccc cccc cccc cccc cccc ccccc ccccc ccccc ccccc
-
+      self.close()
+      raise
+    self.__line = line
+
+  def last_epoch(self):
+    ''' The last epoch of the file, according to its header. '''
+    return self.header['start'] + numpy.timedelta64(int(round(self.header['interval']*1e6)), 'us') \
+      * (self.header['num_of_epochs'] - 1)
+
+  def next_block(self):
+    ''' Read the next epoch block.
+
+        :returns: A tuple ``(epoch, epoch_line, records)``, or ``None`` at the
+                  end of the file. ``records`` is a list of
+                  ``(satellite, lines)`` tuples, where ``lines`` holds the
+                  position record of the satellite plus any velocity and
+                  correlation (``EP``/``EV``) records following it.
+    '''
+    if self.__line is None:
+      return None
+    epoch_line = self.__line.rstrip()
+    epoch      = resolve_epoch(epoch_line[3:31])
+    records    = []
+    line = self.__fin.readline()
+    while line and line[0] != '*':
+      if line[0:3] == 'EOF':
+        break
+      if line[0] == 'P':
+        records.append((sp3_satellite(line[1:4]), [ line.rstrip() ]))
+      elif line[0] in ('V', 'E') and len(records):
+        records[-1][1].append(line.rstrip())
+      elif line.strip():
+        raise RuntimeError('Invalid sp3 record [%s] in file %s' %(line.rstrip(), self.filename))
+      line = self.__fin.readline()
+    self.__line = line if line and line[0] == '*' else None
+    return epoch, epoch_line, records
+
+  def close(self):
+    ''' Close the input stream. '''
+    self.__fin.close()
+
+def merged_header(headers, satellites, comments=[]):
+  ''' Compute the header of a merged sp3 file.
+
+      The coordinate and time systems, epoch interval and base factors must be
+      the same for all files. The start epoch (and line 2 of the header) is
+      that of the earliest file and the number of epochs is the size of the
+      union of the files' epochs (as described in their headers). The result
+      is an SP3-d file if any input file is SP3-d or the satellites are more
+      than 85; it holds velocities only if all files do.
+
+      :param headers:    A list of header dictionaries, see
+                         :func:`parse_header`.
+      :param satellites: The (merged) satellite list.
+      :param comments:   (Optional) Comment lines to put first.
   '''
-  line_g = gin.readline ()
-  line_r = rin.readline ()
-  gline_nr +=1
-  rline_nr +=1
-  print '%c cc cc ccc ccc cccc cccc cccc cccc ccccc ccccc ccccc ccccc'
-
+  for key in ('crd_sys', 'time_sys', 'interval', 'base_pos', 'base_clk'):
+    if len(set([ h[key] for h in headers ])) != 1:
+      raise RuntimeError('Cannot merge sp3 files with different \'%s\' header records' %key)
+
+  first    = min(headers, key=lambda h: h['start'])
+  interval = numpy.timedelta64(int(round(first['interval']*1e6)), 'us')
+  epochs   = numpy.unique(numpy.concatenate([ (h['start'] - first['start']) / interval
+    + numpy.arange(h['num_of_epochs']) for h in headers ]))
+
+  hdr = dict(first)
+  hdr['num_of_epochs'] = len(epochs)
+  hdr['version']   = 'd' if len(satellites) > SP3C_MAX_SATS or any([ h['version'] == 'd' for h in headers ]) else 'c'
+  hdr['pos_vel']   = 'V' if all([ h['pos_vel'] == 'V' for h in headers ]) else 'P'
+  for key, mixed in (('data_used', 'MIXED'), ('orb_type', first['orb_type']), ('agency', 'MIX')):
+    if len(set([ h[key] for h in headers ])) != 1:
+      hdr[key] = mixed
+  systems = set([ sv[0] for sv in satellites ])
+  hdr['file_type'] = systems.pop() if len(systems) == 1 else 'M'
+  hdr['accuracy'] = {}
+  for h in reversed(headers):
+    hdr['accuracy'].update(h['accuracy'])
+  hdr['comments'] = list(comments)
+  for h in headers:
+    hdr['comments'] += [ c for c in h['comments'] if c not in hdr['comments'] ]
+  return hdr
+
+def merge(files, out, comments=None):
+  ''' Merge any number of sp3 files (e.g. holding different satellite systems
+      for the same day), epoch by epoch (k-way), writing the result to the
+      stream ``out``. Files are read in a streaming fashion (one epoch block
+      per file held in memory). At each epoch, the records of each satellite
+      are taken from the first file (in the order given) holding it.
+
+      :param files:    A list of sp3 files (plain, .Z or .gz).
+      :param out:      The output stream (any object with a ``write`` method).
+      :param comments: (Optional) Comment lines to add in the header; if
+                       ``None``, a line listing the input files is added.
+
+      :returns:        The number of epochs written.
+
+      .. note:: Epochs missing from a file (within the span of the file, as
+        described in its header) are reported on stderr.
   '''
-  ____LINE 15___________________________________________________________________
-  This line holds the base for Pos/Vel and Clk/Rate ::
-
-    %f  1.2500000  1.025000000  0.00000000000  0.000000000000000
+  if comments is None:
+    comments = [ 'merged sp3 file via bernutils@ntua',
+      'files: %s' %' '.join([ os.path.basename(f) for f in files ]) ]
 
-  '''
-  line_g    = gin.readline().strip()
-  line_r    = rin.readline().strip()
-  gline_nr += 1
-  rline_nr += 1
-  gls = line_g.split()
-  rls = line_r.split()
+  readers = []
   try:
-    g_base_for_pos = float(gls[1])
-    g_base_for_clk = float(gls[2])
-    r_base_for_pos = float(rls[1])
-    r_base_for_clk = float(rls[2])
-  except:
-    __close_fs(gin, rin)
-    raise RuntimeError('Error resolving base factors, line %2i' %gline_nr)
-
-  if g_base_for_pos != r_base_for_pos or g_base_for_clk != r_base_for_clk:
-    __close_fs(gin, rin)
-    raise RuntimeError('Error different base factors, line %2i' %gline_nr)
-
-  print '%%f %10.7f %12.9f  0.00000000000  0.000000000000000' %(g_base_for_pos, g_base_for_clk)
-
-  '''
-  ____LINES 16 - 18_____________________________________________________________
-  these lines offer nothing! ::
-  '''
-  for i in range(0,3):
-    line_g    = gin.readline ()
-    line_r    = rin.readline ()
-    gline_nr += 1
-    rline_nr += 1
-
-  print '%f  0.0000000  0.000000000  0.00000000000  0.000000000000000'
-  print '%i    0    0    0    0      0      0      0      0         0'
-  print '%i    0    0    0    0      0      0      0      0         0'
-
-  '''
-  ____COMMENT LINES (19 - 22)___________________________________________________
-  '''
-  while True:
-    line_g    = gin.readline().strip()
-    gline_nr += 1
-    if line_g == 'EOF':
-      __close_fs(gin, rin)
-      raise RuntimeError('Error! EOF encountered while searching for comments! file : %s' %igsf)
-    if line_g[0:2] == '/*':
-      print line_g
-    else:
-      break
-
-  while True:
-    line_r = rin.readline().strip()
-    rline_nr+=1;
-    if line_r == 'EOF':
-      __close_fs(gin, rin)
-      raise RuntimeError('Error! EOF encountered while searching for comments! file : %s' %iglf)
-    if line_r[0:2] == '/*':
-      print line_r
-    else:
-      break
-
-  nstr1 = '/* merged sp3 file G+R via bernutils@ntua '
-  nstr2 = '/* files: %s and %s' %(os.path.basename(igsf), os.path.basename(iglf))
-  if len(nstr2) >= 80 : nstr2 = nstr2[0:78]
-  print nstr1
-  print nstr2
-
-  '''
-  ____DATA LINES _______________________________________________________________
+    for f in files:
+      readers.append(Sp3Stream(f))
+
+    satellites = []
+    for r in readers:
+      satellites += [ sv for sv in r.satellites if sv not in satellites ]
+    header = merged_header([ r.header for r in readers ], satellites, comments)
+    keep_velocities = header['pos_vel'] == 'V'
+    write_header(out, header, satellites)
+
+    heap = []
+    for i, r in enumerate(readers):
+      block = r.next_block()
+      if block is not None:
+        heapq.heappush(heap, (block[0], i, block))
+
+    nepochs = 0
+    while len(heap):
+      epoch   = heap[0][0]
+      written = set()
+      found   = []
+      while len(heap) and heap[0][0] == epoch:
+        e, i, block = heapq.heappop(heap)
+        epoch_line, records = block[1], block[2]
+        if not len(found):
+          out.write(epoch_line + '\n')
+        found.append(i)
+        for sv, lines in records:
+          if sv in written:
+            continue
+          written.add(sv)
+          for line in lines:
+            if keep_velocities or line[0] == 'P' or line[0:2] == 'EP':
+              out.write(line + '\n')
+        block = readers[i].next_block()
+        if block is not None:
+          if block[0] <= e:
+            raise RuntimeError('Unsorted epochs in sp3 file %s' %readers[i].filename)
+          heapq.heappush(heap, (block[0], i, block))
+      for i, r in enumerate(readers):
+        if i not in found and r.header['start'] <= epoch <= r.last_epoch():
+          print >> sys.stderr, '[WARNING] Epoch %s not available in sp3 file %s' %(epoch, r.filename)
+      nepochs += 1
+
+    out.write('EOF\n')
+  finally:
+    for r in readers:
+      r.close()
+  return nepochs
+
+def __merge_igl_igs__(igsf, iglf, out=None):
+  ''' Merge an IGS (GPS-only) sp3 file with an IGL (GLONASS-only) sp3 file;
+      see :func:`merge`.
+
+      :param igsf: The gps sp3 file.
+      :param iglf: The glonass sp3 file.
+      :param out:  The output stream; if ``None``, ``sys.stdout``.
   '''
-  ## Now the current lines for both files are the first epoch records, e.g.
-  ## *  2013  3  4  0  0  0.00000000
-  break_gps = False
-  break_glo = False
-
-  while (not break_gps) and (not break_glo):
-
-    ## resolve dates
-    gd = resolve_date_line(line_g)
-    rd = resolve_date_line(line_r)
-
-    ## first case, dates are the same
-    if gd == rd:
-      print line_g.strip()
-      line_g    = gin.readline()
-      gline_nr +=1
-      i, c, line_g = print_until_next_epoch(gin, line_g)
-      gline_nr +=c
-      if i == -1:
-        __close_fs(gin, rin)
-      if i == -2:
-        break_gps = True
-      line_r    = rin.readline()
-      rline_nr += 1
-      i, c, line_r = print_until_next_epoch(rin, line_r)
-      rline_nr += c
-      if i == -1:
-        __close_fs(gin, rin)
-      if i == -2:
-        break_glo = True
-
-    elif gd > rd:
-      print >>sys.stderr, '[WARNING] Epoch %s not available in gps orbit file' %rd
-      print line_r.strip()
-      line_r    = rin.readline()
-      rline_nr += 1
-      i, c, line_r = print_until_next_epoch(rin, line_r)
-      rline_nr += c
-      if i == -1:
-        __close_fs(gin, rin)
-      if i == -2:
-        break_glo = True
-
-    elif gd < rd:
-      print >>sys.stderr,'[WARNING] Epoch %s not available in glonass orbit file' %gd
-      print line_g.strip()
-      line_g    = gin.readline()
-      gline_nr += 1
-      i, c, line_g = print_until_next_epoch(gin, line_g)
-      gline_nr += c
-      if i == -1:
-        __close_fs(gin, rin)
-      if i == -2:
-        break_gps = True
-
-  print 'EOF'
-
-  ##print '#### Number of lines in GPS file',gline_nr
-  ##print '#### Number of lines in GLO file',rline_nr
-  return
\ No newline at end of file
+  merge([ igsf, iglf ], out if out is not None else sys.stdout)
+  return 0
@@ -0,0 +1,260 @@
+''' Splicing (and resampling) of consecutive sp3 files into a single file, see
+    :func:`splice` and :func:`spliceOrb`.
+'''
+
+import os
+import sys
+import datetime
+import collections
+import numpy
+
+import bernutils.gpstime
+import bernutils.products.pysp3
+import bernutils.products.pysp3_mrg
+import bernutils.products.pysp3_itp
+
+__DEBUG_MODE__ = False
+
+def __set_start__(header, start):
+  ''' Utility function; set the start epoch (and the gps week, seconds of
+      week, MJD and fraction of day) of a header dictionary.
+  '''
+  mjd, fmjd = bernutils.gpstime.datetime642mjd_vec(start)
+  week, sow = bernutils.gpstime.mjd2gps_vec(mjd, fmjd)
+  header['start']    = start
+  header['gps_week'] = int(week)
+  header['sow']      = float(sow)
+  header['mjd']      = int(mjd)
+  header['fraction'] = float(fmjd)
+
+def __epoch_line__(epoch):
+  ''' Utility function; format an epoch (``numpy.datetime64``) line. '''
+  d = epoch.astype(datetime.datetime)
+  return '*  %4i %2i %2i %2i %2i %11.8f' %(d.year, d.month, d.day, d.hour,
+    d.minute, d.second + d.microsecond * 1e-6)
+
+def __native_blocks__(readers, start=None, stop=None):
+  ''' Utility function (generator); yield the epoch blocks of (consecutive)
+      sp3 files in time order, see
+      :func:`bernutils.products.pysp3_mrg.Sp3Stream.next_block`. Epochs
+      already yielded (i.e. duplicate boundary epochs) are skipped; if given,
+      only epochs in the interval ``[start, stop]`` are yielded.
+  '''
+  last = None
+  for r in readers:
+    block = r.next_block()
+    while block is not None:
+      if stop is not None and block[0] > stop:
+        break
+      if (last is None or block[0] > last) and (start is None or block[0] >= start):
+        yield block
+        last = block[0]
+      elif __DEBUG_MODE__ == True and last is not None and block[0] <= last:
+        print >> sys.stderr, '[DEBUG] Skipping (duplicate) epoch %s of file %s' %(block[0], r.filename)
+      block = r.next_block()
+
+def __block_row__(records, sat_index):
+  ''' Utility function; resolve the position records of an epoch block to an
+      array of shape ``(satellites, 4)`` (``nan`` for absent/bad values).
+  '''
+  row = numpy.empty((len(sat_index), 4))
+  row.fill(numpy.nan)
+  for sv, lines in records:
+    line = lines[0]
+    try:
+      vals = [ float(line[i:i+14]) if line[i:i+14].strip() else numpy.nan for i in (4, 18, 32, 46) ]
+    except ValueError:
+      raise RuntimeError('Invalid sp3 record [%s]' %line)
+    if vals[0] == 0e0 and vals[1] == 0e0 and vals[2] == 0e0:
+      vals[0:3] = [ numpy.nan ] * 3
+    if vals[3] >= bernutils.products.pysp3.SP3_BAD_CLOCK:
+      vals[3] = numpy.nan
+    row[sat_index[sv]] = vals
+  return row
+
+def __write_records__(out, epoch, satellites, row):
+  ''' Utility function; write an (interpolated) epoch block; absent positions
+      are written as zeros and absent clocks as ``999999.999999``.
+  '''
+  row = row.copy()
+  row[numpy.isnan(row[:, 0:3]).any(axis=1), 0:3] = 0e0
+  row[numpy.isnan(row[:, 3]), 3] = bernutils.products.pysp3.SP3_BAD_CLOCK
+  out.write(__epoch_line__(epoch) + '\n' + ''.join([ 'P%3s%14.6f%14.6f%14.6f%14.6f\n' %(sv, x, y, z, c)
+    for sv, (x, y, z, c) in zip(satellites, row.tolist()) ]))
+
+def splice(files, out, interval=None, start=None, stop=None, order=bernutils.products.pysp3_itp.DEFAULT_ORDER, comments=None):
+  ''' Splice consecutive (e.g. daily) sp3 files into one, writing the result to
+      the stream ``out``. Files are streamed epoch block by epoch block;
+      duplicate boundary epochs (e.g. a midnight epoch present in two files)
+      are taken from the earlier file. Optionally, the records are resampled
+      to a different interval, via (sliding-window) Lagrange interpolation of
+      the positions (see :class:`bernutils.products.pysp3_itp.Sp3Interpolator`)
+      and linear interpolation of the clocks; then only ``2*(order+1)`` epoch
+      blocks are held in memory.
+
+      :param files:    A list of sp3 files (plain, .Z or .gz), e.g. the files
+                       of days D-1, D and D+1 (in any order).
+      :param out:      The output stream (any object with a ``write`` method).
+      :param interval: (Optional) The output interval in seconds; if ``None``
+                       (or equal to the files' interval), no resampling is
+                       performed.
+      :param start:    (Optional) First epoch to write (``numpy.datetime64``
+                       or ``datetime.datetime``); default is the first epoch
+                       of the files.
+      :param stop:     (Optional) Last epoch to write; default is the last
+                       epoch of the files.
+      :param order:    The order of the interpolating polynomial (only used
+                       when resampling).
+      :param comments: (Optional) Comment lines to add in the header; if
+                       ``None``, a line listing the input files is added.
+
+      :returns:        The number of epochs written.
+
+      .. note:: The number of epochs written in the header is computed from
+        the input headers; epochs missing from the (not resampled) input files
+        are reported on stderr.
+  '''
+  if comments is None:
+    comments = [ 'spliced sp3 file via bernutils@ntua',
+      'files: %s' %' '.join([ os.path.basename(f) for f in files ]) ]
+  if start is not None:
+    start = numpy.datetime64(start, 'us')
+  if stop is not None:
+    stop = numpy.datetime64(stop, 'us')
+
+  readers = []
+  try:
+    for f in files:
+      readers.append(bernutils.products.pysp3_mrg.Sp3Stream(f))
+    readers.sort(key=lambda r: r.header['start'])
+
+    satellites = []
+    for r in readers:
+      satellites += [ sv for sv in r.satellites if sv not in satellites ]
+    header = bernutils.products.pysp3_mrg.merged_header([ r.header for r in readers ], satellites, comments)
+
+    ## the (native) epochs of the files, according to their headers
+    step   = numpy.timedelta64(int(round(header['interval']*1e6)), 'us')
+    native = numpy.unique(numpy.concatenate([ r.header['start'] + step * numpy.arange(r.header['num_of_epochs']) for r in readers ]))
+    first  = native[0] if start is None else max(start, native[0])
+    last   = native[-1] if stop is None else min(stop, native[-1])
+    resample = interval is not None and abs(interval - header['interval']) > 1e-6
+    if resample:
+      step   = numpy.timedelta64(int(round(interval*1e6)), 'us')
+      epochs = first + step * numpy.arange((last - first) // step + 1)
+      header['interval'] = float(interval)
+      header['pos_vel']  = 'P'
+    else:
+      epochs = native[(native >= first) & (native <= last)]
+    if not len(epochs):
+      raise RuntimeError('No epochs to splice in interval [%s, %s]' %(first, last))
+    header['num_of_epochs'] = len(epochs)
+    __set_start__(header, epochs[0])
+    bernutils.products.pysp3_mrg.write_header(out, header, satellites)
+
+    nepochs = 0
+    if not resample:
+      keep_velocities = header['pos_vel'] == 'V'
+      for epoch, epoch_line, records in __native_blocks__(readers, first, last):
+        out.write(epoch_line + '\n')
+        for sv, lines in records:
+          for line in lines:
+            if keep_velocities or line[0] == 'P' or line[0:2] == 'EP':
+              out.write(line + '\n')
+        nepochs += 1
+    else:
+      nepochs = __resample__(out, __native_blocks__(readers), epochs, satellites, order)
+    out.write('EOF\n')
+
+    if nepochs != len(epochs):
+      print >> sys.stderr, '[WARNING] Wrote %i epochs; header records %i epochs' %(nepochs, len(epochs))
+  finally:
+    for r in readers:
+      r.close()
+  return nepochs
+
+def __resample__(out, blocks, epochs, satellites, order):
+  ''' Utility function; interpolate (streamed) epoch blocks at the (output)
+      ``epochs`` and write the records; see :func:`splice`.
+  '''
+  sat_index = dict([ (sv, i) for i, sv in enumerate(satellites) ])
+  npts   = order + 1
+  t0     = epochs[0]
+  times  = collections.deque(maxlen=2*npts)
+  rows   = collections.deque(maxlen=2*npts)
+  cached = (None, None)
+  more   = True
+
+  nepochs = 0
+  for epoch in epochs:
+    t = (epoch - t0).astype('timedelta64[us]').astype(float) * 1e-6
+    ## read ahead, until (at least) a window is buffered and half a window follows t
+    while more and (len(times) < npts or sum([ 1 for x in times if x > t ]) < npts - npts // 2):
+      try:
+        e, epoch_line, records = blocks.next()
+      except StopIteration:
+        more = False
+        break
+      times.append((e - t0).astype('timedelta64[us]').astype(float) * 1e-6)
+      rows.append(__block_row__(records, sat_index))
+    if len(times) < npts:
+      raise RuntimeError('Too few epochs (%i) for interpolation of order %i' %(len(times), order))
+
+    nodes = numpy.array(times)
+    k = min(max(numpy.searchsorted(nodes, t) - npts // 2, 0), len(nodes) - npts)
+    x = nodes[k:k+npts]
+    if cached[0] is None or not numpy.array_equal(cached[0], x):
+      cached = (x, bernutils.products.pysp3_itp.barycentric_weights(x))
+    vals = numpy.array([ rows[i] for i in range(k, k+npts) ])
+
+    row   = numpy.empty((len(satellites), 4))
+    exact = numpy.flatnonzero(x == t)
+    if len(exact):
+      row[:] = vals[exact[0]]
+    else:
+      c = cached[1] / (t - x)
+      row[:, 0:3] = numpy.tensordot(c, vals[:, :, 0:3], axes=(0, 0)) / c.sum()
+      i = min(max(numpy.searchsorted(x, t) - 1, 0), npts - 2)
+      f = (t - x[i]) / (x[i+1] - x[i])
+      row[:, 3] = vals[i, :, 3] + f * (vals[i+1, :, 3] - vals[i, :, 3])
+    __write_records__(out, epoch, satellites, row)
+    nepochs += 1
+  return nepochs
+
+def spliceOrb(datetm, out_sp3, days_before=1, days_after=1, interval=None, order=bernutils.products.pysp3_itp.DEFAULT_ORDER, **kwargs):
+  ''' Download (via :func:`bernutils.products.pysp3.getOrb`) the sp3 files for
+      the days ``datetm - days_before`` to ``datetm + days_after`` and splice
+      them (see :func:`splice`) into the file ``out_sp3``, e.g. to get
+      continuous orbits for a 3-day solution.
+
+      :param datetm:      The (central) date, as a Python ``datetime.datetime``
+                          or ``datetime.date`` instance.
+      :param out_sp3:     The spliced (output) sp3 file; it is first written
+                          to a temporary file, which is then renamed.
+      :param days_before: Number of days before ``datetm``.
+      :param days_after:  Number of days after ``datetm``.
+      :param interval:    (Optional) Resample to this interval (seconds).
+      :param order:       The order of the interpolating polynomial (only used
+                          when resampling).
+      :param kwargs:      Any other (optional) argument of
+                          :func:`bernutils.products.pysp3.getOrb`, e.g.
+                          ``ac``, ``out_dir`` or ``use_glonass``.
+
+      :returns:           A tuple ``(out_sp3, files)``, where ``files`` is the
+                          list of the (downloaded) sp3 files spliced.
+  '''
+  files = []
+  for day in range(-days_before, days_after + 1):
+    kwargs['date'] = datetm + datetime.timedelta(days=day)
+    files.append(bernutils.products.pysp3.getOrb(**kwargs)[0])
+
+  tmp = out_sp3 + '.tmp'
+  try:
+    with open(tmp, 'w') as fout:
+      splice(files, fout, interval, order=order)
+    os.rename(tmp, out_sp3)
+  except:
+    if os.path.isfile(tmp):
+      os.remove(tmp)
+    raise
+  return out_sp3, files
@@ -0,0 +1,363 @@
+''' Report writers. A report writer takes an output stream and buffers all
+    writes, so that a report is built by a few (large) writes instead of
+    hundreds of ``print`` statements. Tables are given as columnar data, i.e.
+    a list of columns (lists, tuples or numpy arrays), and are rendered in one
+    pass. All back-ends (:py:class:`HtmlReport`, :py:class:`JsonReport`,
+    :py:class:`CsvReport` and :py:class:`TextReport`) share the same
+    interface, so that the same code can produce any type of report: ::
+
+      writer = bernutils.report.HtmlReport(open('foo.html', 'w'))
+      writer.begin('Some Title')
+      writer.paragraph('Some text')
+      writer.table(['Station', 'dN'], [['ANKR', 'ARTU'], [.001, .002]], ['%s', '%.4f'])
+      writer.end()
+      writer.close()
+'''
+
+import sys
+import csv
+import json
+import cStringIO
+
+BUFFER_SIZE = 64*1024
+''' Flush the (buffered) output to the stream, when the buffer exceeds this
+    size (in characters).
+'''
+
+BOOTSTRAP_HEAD = [
+  '<meta name="viewport" content="width=device-width, initial-scale=1">',
+  '<link rel="stylesheet" href="http://maxcdn.bootstrapcdn.com/bootstrap/3.3.5/css/bootstrap.min.css">',
+  '<script src="https://ajax.googleapis.com/ajax/libs/jquery/1.11.3/jquery.min.js"></script>',
+  '<script src="http://maxcdn.bootstrapcdn.com/bootstrap/3.3.5/js/bootstrap.min.js"></script>'
+]
+''' Html head elements needed to use Bootstrap, see
+    http://www.w3schools.com/bootstrap/bootstrap_get_started.asp
+'''
+
+def __format_column__(fmt, column):
+  ''' Format all values of a column using the format string ``fmt``; a value
+      can be a tuple, if the format string needs more than one argument.
+  '''
+  if hasattr(column, 'tolist'):
+    column = column.tolist()
+  return [ fmt %v for v in column ]
+
+def __plain_column__(column):
+  ''' Return a column as a list of plain Python values (e.g. for json).
+  '''
+  if hasattr(column, 'tolist'):
+    return column.tolist()
+  return [ list(v) if type(v) == tuple else v for v in column ]
+
+def __group_sizes__(column):
+  ''' Split a column in groups of consecutive equal values; return the size of
+      each group.
+  '''
+  sizes = []
+  prev  = object()
+  for v in column:
+    if sizes and v == prev:
+      sizes[-1] += 1
+    else:
+      sizes.append(1)
+      prev = v
+  return sizes
+
+class ReportWriter:
+  ''' Base class for all report writers; it holds the output stream and the
+      buffer. Back-ends override the rendering functions (``begin``,
+      ``paragraph``, ``items``, ``alert``, ``begin_table``, ``rows``, ``row``,
+      ``end_table`` and ``end``).
+  '''
+
+  def __init__(self, stream=None, buffer_size=BUFFER_SIZE):
+    ''' Constructor.
+
+        :param stream:      The output stream (any object with a ``write``
+                            function); if not given, ``sys.stdout`` is used.
+        :param buffer_size: Flush the buffer when it exceeds this size.
+    '''
+    self.__stream = stream if stream is not None else sys.stdout
+    self.__buffer = []
+    self.__size   = 0
+    self.__limit  = buffer_size
+
+  def write(self, text):
+    ''' Write (i.e. buffer) a string. '''
+    self.__buffer.append(text)
+    self.__size += len(text)
+    if self.__size > self.__limit:
+      self.flush()
+
+  def writeln(self, text=''):
+    ''' Write (i.e. buffer) a string plus a newline character. '''
+    self.write(text + '\n')
+
+  def flush(self):
+    ''' Write all buffered output to the stream. '''
+    if len(self.__buffer):
+      self.__stream.write(''.join(self.__buffer))
+      self.__buffer = []
+      self.__size   = 0
+
+  def close(self):
+    ''' Flush the buffer; the stream is **not** closed. '''
+    self.flush()
+
+  def begin(self, title=None, head=None): pass
+  def end(self): pass
+
+  def table(self, header, columns, formats=None, caption=None, group=None, spans=()):
+    ''' Write a whole table (header and rows), see :func:`begin_table` and
+        :func:`rows`.
+    '''
+    self.begin_table(header, caption)
+    self.rows(columns, formats, group, spans)
+    self.end_table()
+
+class HtmlReport(ReportWriter):
+  ''' Write reports as html. '''
+
+  def __init__(self, stream=None, buffer_size=BUFFER_SIZE):
+    ReportWriter.__init__(self, stream, buffer_size)
+    self.__caption = None
+
+  def begin(self, title=None, head=None):
+    ''' Start the html document.
+
+        :param title: The title of the document.
+        :param head:  A list of extra elements (strings) to add to the head
+                      section (e.g. ``BOOTSTRAP_HEAD`` or css).
+    '''
+    self.writeln('<!DOCTYPE html>')
+    self.writeln('<html lang="en">')
+    self.writeln('<head>')
+    if title is not None:
+      self.writeln('<title>%s</title>' %title)
+    self.writeln('<meta charset="utf-8">')
+    for element in (head or []):
+      self.writeln(element)
+    self.writeln('</head>')
+    self.writeln('<body>')
+
+  def end(self):
+    ''' End the html document. '''
+    self.writeln('</body>')
+    self.writeln('</html>')
+
+  def paragraph(self, text):
+    self.writeln('<p>%s</p>' %text)
+
+  def items(self, items):
+    self.writeln('<ul style="list-style-type:none">')
+    self.write(''.join([ '<li>%s</li>\n' %i for i in items ]))
+    self.writeln('</ul>')
+
+  def alert(self, text):
+    ''' Write a (Bootstrap) warning message. '''
+    self.writeln('<div class="alert alert-danger">'\
+      '<a href="#" class="close" data-dismiss="alert" aria-label="close">&times;</a>'\
+      '<strong>Warning!</strong> %s.</div>' %text)
+
+  def begin_table(self, header, caption=None):
+    ''' Start a table.
+
+        :param header:  A list with the column names.
+        :param caption: (Optional) The table caption.
+    '''
+    self.__caption = caption
+    self.writeln('<table style="width:100%" id="t01" border="1">')
+    self.writeln('\t<thead>')
+    self.writeln('\t<tr>')
+    self.write(''.join([ '\t\t<th>%s</th>\n' %h for h in header ]))
+    self.writeln('\t</tr>')
+    self.writeln('\t</thead>')
+    self.writeln('\t<tbody>')
+
+  def rows(self, columns, formats=None, group=None, spans=()):
+    ''' Write table rows, from columnar data.
+
+        :param columns: A list of columns; all columns must have the same size.
+        :param formats: A list of format strings, one per column (default is
+                        ``'%s'``).
+        :param group:   (Optional) Index of a column; consecutive rows with the
+                        same value in this column form a group.
+        :param spans:   Indexes of columns that are written only once per group
+                        (with a ``rowspan``); only meaningfull if ``group`` is
+                        set.
+    '''
+    if not len(columns) or not len(columns[0]):
+      return
+    formats = formats or [ '%s' ]*len(columns)
+    cells   = [ __format_column__(f, c) for f, c in zip(formats, columns) ]
+    if group is None or not len(spans):
+      fmt = '\t<tr>' + '<td>%s</td>'*len(columns) + '</tr>\n'
+      self.write(''.join([ fmt %r for r in zip(*cells) ]))
+      return
+    first = '\t<tr>' + ''.join([ '<td rowspan="%i">%s</td>' if i in spans else '<td>%s</td>' for i in range(len(columns)) ]) + '</tr>\n'
+    other = '\t<tr>' + '<td>%s</td>'*(len(columns) - len(spans)) + '</tr>\n'
+    keep  = [ i for i in range(len(columns)) if i not in spans ]
+    rows  = zip(*cells)
+    out   = []
+    start = 0
+    for size in __group_sizes__(__plain_column__(columns[group])):
+      args = []
+      for i, c in enumerate(rows[start]):
+        if i in spans: args.append(size)
+        args.append(c)
+      out.append(first %tuple(args))
+      for r in rows[start+1:start+size]:
+        out.append(other %tuple([ r[i] for i in keep ]))
+      start += size
+    self.write(''.join(out))
+
+  def row(self, cells, spans=None, style=None):
+    ''' Write a single row.
+
+        :param cells: A list of (already formated) cells.
+        :param spans: (Optional) A list with the number of columns each cell
+                      spans.
+        :param style: (Optional) A css style for the row.
+    '''
+    spans = spans or [1]*len(cells)
+    tr    = '\t<tr style="%s">' %style if style else '\t<tr>'
+    tds   = [ '<td colspan="%i">%s</td>' %(s, c) if s > 1 else '<td>%s</td>' %c for c, s in zip(cells, spans) ]
+    self.writeln(tr + ''.join(tds) + '</tr>')
+
+  def end_table(self):
+    ''' End a table. '''
+    self.writeln('\t</tbody>')
+    if self.__caption is not None:
+      self.writeln('\t<caption>%s</caption>' %self.__caption)
+    self.writeln('</table>')
+
+class TextReport(ReportWriter):
+  ''' Write reports as plain text. '''
+
+  def __init__(self, stream=None, buffer_size=BUFFER_SIZE):
+    ReportWriter.__init__(self, stream, buffer_size)
+
+  def begin(self, title=None, head=None):
+    if title is not None:
+      self.writeln(title)
+
+  def paragraph(self, text):
+    self.writeln(text)
+
+  def items(self, items):
+    self.write(''.join([ '%s\n' %i for i in items ]))
+
+  def alert(self, text):
+    self.writeln('[WARNING] %s' %text)
+
+  def begin_table(self, header, caption=None):
+    if caption is not None:
+      self.writeln(caption)
+    self.writeln(' '.join(header))
+
+  def rows(self, columns, formats=None, group=None, spans=()):
+    if not len(columns) or not len(columns[0]):
+      return
+    formats = formats or [ '%s' ]*len(columns)
+    cells   = [ __format_column__(f, c) for f, c in zip(formats, columns) ]
+    self.write(''.join([ ' '.join(r) + '\n' for r in zip(*cells) ]))
+
+  def row(self, cells, spans=None, style=None):
+    self.writeln(' '.join(cells))
+
+  def end_table(self): pass
+
+class CsvReport(ReportWriter):
+  ''' Write reports as csv; paragraphs, items and warnings are written as
+      single-cell rows, tables as a header row followed by the data rows.
+      Cells spanning more than one column are padded with empty cells.
+  '''
+
+  def __init__(self, stream=None, buffer_size=BUFFER_SIZE, delimiter=','):
+    ReportWriter.__init__(self, stream, buffer_size)
+    self.__delimiter = delimiter
+
+  def __write_rows__(self, rows):
+    buf = cStringIO.StringIO()
+    csv.writer(buf, delimiter=self.__delimiter, lineterminator='\n').writerows(rows)
+    self.write(buf.getvalue())
+
+  def paragraph(self, text):
+    self.__write_rows__([[text]])
+
+  def items(self, items):
+    self.__write_rows__([ [i] for i in items ])
+
+  def alert(self, text):
+    self.__write_rows__([['WARNING', text]])
+
+  def begin_table(self, header, caption=None):
+    self.__write_rows__([header])
+
+  def rows(self, columns, formats=None, group=None, spans=()):
+    if not len(columns) or not len(columns[0]):
+      return
+    formats = formats or [ '%s' ]*len(columns)
+    cells   = [ [ v.strip() for v in __format_column__(f, c) ] for f, c in zip(formats, columns) ]
+    self.__write_rows__(zip(*cells))
+
+  def row(self, cells, spans=None, style=None):
+    spans = spans or [1]*len(cells)
+    out   = []
+    for c, s in zip(cells, spans):
+      out += [c] + ['']*(s-1)
+    self.__write_rows__([out])
+
+  def end_table(self): pass
+
+class JsonReport(ReportWriter):
+  ''' Write reports as json. The document is an object with a ``title`` and a
+      list of ``sections``; each section is an object with a ``type`` (one of
+      ``'paragraph'``, ``'items'``, ``'alert'`` or ``'table'``). Tables hold
+      their ``header`` and ``rows`` (rows hold plain values, not formated
+      strings). The document is streamed, i.e. every section is written as
+      soon as it is complete.
+  '''
+
+  def __init__(self, stream=None, buffer_size=BUFFER_SIZE):
+    ReportWriter.__init__(self, stream, buffer_size)
+    self.__sections = 0
+    self.__table    = None
+
+  def __section__(self, obj):
+    self.write((',\n' if self.__sections else '\n') + json.dumps(obj))
+    self.__sections += 1
+
+  def begin(self, title=None, head=None):
+    self.write('{"title": %s, "sections": [' %json.dumps(title))
+
+  def end(self):
+    self.writeln('\n]}')
+
+  def paragraph(self, text):
+    self.__section__({'type': 'paragraph', 'text': text})
+
+  def items(self, items):
+    self.__section__({'type': 'items', 'items': list(items)})
+
+  def alert(self, text):
+    self.__section__({'type': 'alert', 'text': text})
+
+  def begin_table(self, header, caption=None):
+    self.__table = {'type': 'table', 'header': list(header), 'caption': caption, 'rows': []}
+
+  def rows(self, columns, formats=None, group=None, spans=()):
+    if not len(columns) or not len(columns[0]):
+      return
+    self.__table['rows'] += [ list(r) for r in zip(*[ __plain_column__(c) for c in columns ]) ]
+
+  def row(self, cells, spans=None, style=None):
+    spans = spans or [1]*len(cells)
+    out   = []
+    for c, s in zip(cells, spans):
+      out += [c] + [None]*(s-1)
+    self.__table['rows'].append(out)
+
+  def end_table(self):
+    self.__section__(self.__table)
+    self.__table = None
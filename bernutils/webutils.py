@@ -1,15 +1,91 @@
 import os
+import posixpath
 import ftplib
 import urllib2
 import gzip
 import shutil
+import socket
+import time
+import atexit
+import threading
+import subprocess
+import zlib
 ## paramiko for ssh/scp
 import paramiko
 from scp import SCPClient
-## system calls
-import subprocess
+## .Z files
+import bernutils.lzw
+
+CHUNK_SIZE = 64 * 1024
+''' Default block size (in bytes) for reading from the network. '''
+
+COMPRESSION_SUFFIX = { 'gz': '.gz', 'Z': '.Z' }
+''' Filename suffix per compression method (see :py:class:`InflatingWriter`). '''
+
+def compressionMethod(filen, decompress):
+  ''' Resolve the ``decompress`` option of the downloaders, for a remote file
+      ``filen``; returns ``'gz'``, ``'Z'`` or ``None`` (no decompression).
 
-def grabHttpFile(url, files, saveas):
+      :param decompress: Any of ``None`` or ``False`` (do not decompress),
+                         ``'gz'``, ``'Z'`` or ``'auto'`` (decide from the
+                         suffix of ``filen``).
+  '''
+  if not decompress:
+    return None
+  if decompress == 'auto':
+    for method, suffix in COMPRESSION_SUFFIX.iteritems():
+      if filen.endswith(suffix): return method
+    return None
+  if decompress not in COMPRESSION_SUFFIX:
+    raise RuntimeError('Invalid decompression method: %s' %decompress)
+  return decompress
+
+def inflatedName(saveas, method):
+  ''' The name of the (decompressed) saved file; i.e. ``saveas`` without the
+      compression suffix (if any).
+  '''
+  if method and saveas.endswith(COMPRESSION_SUFFIX[method]):
+    return saveas[:-len(COMPRESSION_SUFFIX[method])]
+  return saveas
+
+class InflatingWriter:
+  ''' A (write-only) file-like object, that decompresses whatever is written
+      to it (gzip or UNIX-compressed data) and writes the result to a file.
+      Used by the downloaders, so that a compressed remote file can be
+      saved uncompressed in one pass.
+  '''
+
+  def __init__(self, fileobj, method):
+    ''' :param fileobj: The (opened, binary) output file.
+        :param method:  ``'gz'`` or ``'Z'``.
+    '''
+    self.fileobj = fileobj
+    self.method  = method
+    self.__dec   = self.__new_decompressor__()
+
+  def __new_decompressor__(self):
+    if self.method == 'gz':
+      return zlib.decompressobj(16 + zlib.MAX_WBITS)
+    elif self.method == 'Z':
+      return bernutils.lzw.LzwDecompressor()
+    raise RuntimeError('Invalid decompression method: %s' %self.method)
+
+  def write(self, data):
+    self.fileobj.write(self.__dec.decompress(data))
+    ## a gzip file may hold more than one members
+    while self.method == 'gz' and self.__dec.unused_data:
+      data = self.__dec.unused_data
+      self.fileobj.write(self.__dec.flush())
+      self.__dec = self.__new_decompressor__()
+      self.fileobj.write(self.__dec.decompress(data))
+
+  def close(self):
+    ''' Write whatever is left in the decompressor (does not close the
+        output file).
+    '''
+    self.fileobj.write(self.__dec.flush())
+
+def grabHttpFile(url, files, saveas, max_workers=4, decompress=None, chunk_size=CHUNK_SIZE):
   ''' Download file(s) from an http webserver.
 
       :param url:    The server's address/hostname; do not append the
@@ -18,6 +94,15 @@ def grabHttpFile(url, files, saveas):
                      given url.
       :param saveas: (Optional) The name(s) of the corresponding saved files, 
                      i.e. how to (localy) save each file in the ``files`` list.
+      :param max_workers: (Optional) Max number of files downloaded concurrently
+                     (see :py:func:`grabFiles`).
+      :param decompress: (Optional) Decompress while downloading; any of
+                     ``'gz'``, ``'Z'`` or ``'auto'`` (see
+                     :py:func:`compressionMethod`). Only the decompressed file
+                     is written, named as ``saveas`` without the ``.gz``/``.Z``
+                     suffix.
+      :param chunk_size: (Optional) Block size (bytes) for reading the network
+                     stream.
 
       :returns:      A list of tuples, containing (each) the web file and
                      the (absolute path of) the saved file.
@@ -26,27 +111,15 @@ def grabHttpFile(url, files, saveas):
   if len(files) != len(saveas):
     raise RuntimeError('Download file list and save file list not equal')
 
-  return_list = []
-
-  for i, j in zip(files, saveas):
-    webfile = os.path.join(url, i) ## not my os but whatever!
-    try:
-      response = urllib2.urlopen(webfile)
-    except:
-      raise RuntimeError('Failed to download file: %s' %webfile)
-    with open(j, 'w') as f: f.write(response.read())
-    return_list.append([webfile, os.path.abspath(j)])
+  opts    = {'decompress': decompress, 'chunk_size': chunk_size}
+  jobs    = [ ('http', url, '', i, j, opts) for i, j in zip(files, saveas) ]
+  results = __raise_on_failure__(grabFiles(jobs, max_workers, max_workers))
 
-  return return_list
+  return [ [x[1], x[0]] for x in results ]
 
-def grabSshFile(host, dirn, filen, saveas=None, s_username=None, s_password=None, s_port=None):
+def grabSshFile(host, dirn, filen, saveas=None, s_username=None, s_password=None, s_port=None, max_workers=4):
   '''
   '''
-  client = paramiko.SSHClient()
-  client.load_system_host_keys()
-  client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-  client.connect(host, username=s_username, password=s_password, port=s_port)
-
   if type(filen) is list:
     if not saveas:
       saveas = filen
@@ -73,18 +146,241 @@ def grabSshFile(host, dirn, filen, saveas=None, s_username=None, s_password=None
   ##  now we should have:
   ##+ three lists (filen, saveas, dirn), all with the same # of elements, or
 
-  sucess_dwl = []
-  sucess_rmt = []
+  opts = {'username': s_username, 'password': s_password, 'port': s_port}
+  jobs = [ ('ssh', host, dir_f, src_f, dst_f, opts) for src_f, dst_f, dir_f in zip(filen, saveas, dirn) ]
+
+  return [ x[0:2] for x in __raise_on_failure__(grabFiles(jobs, max_workers, max_workers)) ]
+
+FTP_CONNECTION_ERRORS = (socket.error, EOFError, ftplib.error_temp)
+''' Exceptions signaling that the control channel of an ftp session is no
+    longer usable (timeouts, ``421 Service not available``, dropped sockets).
+    When one of these is raised, the session is re-connected instead of failing.
+'''
+
+class FtpSession:
+  ''' A logged-in ``ftplib.FTP`` connection, as handed out by a
+      :py:class:`FtpSessionPool`. Besides the connection itself, it records the
+      credentials (so that the session can be re-established) and the login
+      (i.e. home) directory.
+  '''
+
+  def __init__(self, host, username=None, password=None, timeout=None):
+    self.host      = host
+    self.username  = username
+    self.password  = password
+    self.timeout   = timeout
+    self.ftp       = None
+    self.home      = '/'
+    self.last_used = time.time()
+    self.connect()
+
+  def key(self):
+    ''' The pool key of the session, i.e. ``(host, username)``. '''
+    return (self.host, self.username)
+
+  def connect(self):
+    ''' Open a new control connection and log in. '''
+    if self.timeout:
+      self.ftp = ftplib.FTP(self.host, timeout=self.timeout)
+    else:
+      self.ftp = ftplib.FTP(self.host)
+    if self.username:
+      self.ftp.login(self.username, self.password)
+    else:
+      self.ftp.login()
+    try:
+      self.home = self.ftp.pwd()
+    except ftplib.all_errors:
+      self.home = '/'
+    self.last_used = time.time()
+
+  def close(self):
+    ''' Politely quit the session; if that fails, just drop the socket. '''
+    if self.ftp is None: return
+    try:
+      self.ftp.quit()
+    except:
+      try: self.ftp.close()
+      except: pass
+    self.ftp = None
 
-  with SCPClient(client.get_transport()) as m_scp:
-    for src_f, dst_f, dir_f in zip(filen, saveas, dirn):
-      m_scp.get(os.path.join(dir_f, src_f), dst_f)
-      sucess_dwl.append(os.path.abspath(dst_f))
-      sucess_rmt.append(('%s@'%s_username) + os.path.join(host, dir_f, src_f))
+  def alive(self):
+    ''' Check (with a ``NOOP``) that the control channel is still usable. '''
+    try:
+      self.ftp.voidcmd('NOOP')
+      return True
+    except:
+      return False
+
+class FtpSessionPool:
+  ''' A thread-safe pool of persistent ftp sessions, keyed by the tuple
+      ``(host, username)``. Instead of opening a new connection (and logging in)
+      for every download, :py:func:`grabFtpFile` borrows a session from the pool
+      and returns it when done, so that consecutive downloads from the same host
+      (e.g. trying several candidate product files on CDDIS or CODE) re-use the
+      same control connection.
+
+      * Idle sessions are kept alive (via ``NOOP``) by a background (daemon)
+        thread, every ``keepalive`` seconds.
+      * Sessions idle for more than ``max_idle`` seconds are closed and evicted.
+      * If the control channel of a session is found dropped, the session is
+        transparently re-connected.
+
+      The pool keeps counters of what happened, see :py:func:`stats`.
+
+      .. note:: A process-wide pool instance is available as
+        :py:data:`bernutils.webutils.FTP_POOL`; there should be no need to
+        create more.
+  '''
 
-  return [ [x,y] for x,y in zip(sucess_dwl, sucess_rmt) ]
+  def __init__(self, max_idle=120.0, keepalive=30.0, timeout=60.0, max_per_key=4):
+    ''' Initialize an (empty) pool.
+
+        :param max_idle:    Seconds after which an idle session is closed.
+        :param keepalive:   Interval (in seconds) for sending ``NOOP`` to idle
+                            sessions; set to ``None`` or 0 to disable the
+                            keep-alive thread.
+        :param timeout:     Socket timeout (seconds) for new connections.
+        :param max_per_key: Max number of idle sessions kept per
+                            ``(host, username)``.
+    '''
+    self.max_idle    = max_idle
+    self.keepalive   = keepalive
+    self.timeout     = timeout
+    self.max_per_key = max_per_key
+    self.__lock      = threading.Lock()
+    self.__idle      = {}
+    self.__stats     = {'connects': 0, 'reconnects': 0, 'reuses': 0, 'evictions': 0}
+    self.__thread    = None
+    self.__stop      = threading.Event()
+
+  def __count__(self, counter):
+    with self.__lock:
+      self.__stats[counter] += 1
+
+  def acquire(self, host, username=None, password=None):
+    ''' Borrow a (logged-in) session for ``(host, username)``. An idle session
+        is re-used if possible (its working directory is reset to the login
+        directory); else a new connection is opened.
+
+        :returns: An :py:class:`FtpSession` instance; give it back via
+                  :py:func:`release` (or :py:func:`discard`).
+    '''
+    key = (host, username)
+    now = time.time()
+    while True:
+      with self.__lock:
+        idle = self.__idle.get(key, [])
+        session = idle.pop() if idle else None
+      if session is None:
+        break
+      if now - session.last_used > self.max_idle:
+        session.close()
+        self.__count__('evictions')
+        continue
+      try:
+        session.ftp.cwd(session.home)
+        self.__count__('reuses')
+        return session
+      except FTP_CONNECTION_ERRORS:
+        try:
+          return self.reconnect(session)
+        except ftplib.all_errors:
+          raise RuntimeError('Failed to re-connect to ftp host %s' %host)
 
-def grabFtpFile(host, dirn, filen, saveas=None, username=None, password=None):
+    try:
+      session = FtpSession(host, username, password, self.timeout)
+    except ftplib.all_errors:
+      raise RuntimeError('Failed to connect to ftp host %s' %host)
+    self.__count__('connects')
+    return session
+
+  def reconnect(self, session):
+    ''' Drop the (dead) control channel of ``session`` and log in again. '''
+    session.close()
+    session.connect()
+    self.__count__('reconnects')
+    return session
+
+  def release(self, session):
+    ''' Return a borrowed session to the pool, so that it can be re-used. '''
+    session.last_used = time.time()
+    with self.__lock:
+      idle = self.__idle.setdefault(session.key(), [])
+      if len(idle) < self.max_per_key:
+        idle.append(session)
+        session = None
+      if self.keepalive and self.__thread is None:
+        self.__thread = threading.Thread(target=self.__keepalive_loop__)
+        self.__thread.daemon = True
+        self.__thread.start()
+    if session is not None:
+      session.close()
+
+  def discard(self, session):
+    ''' Close a borrowed session, without returning it to the pool. '''
+    session.close()
+
+  def ping(self):
+    ''' Send a ``NOOP`` to every idle session; sessions that do not answer or
+        have been idle for longer than ``max_idle`` seconds are evicted. Live
+        sessions are put back, but (as in :py:func:`release`) never more than
+        ``max_per_key`` per key; sessions released during the ping count too.
+    '''
+    with self.__lock:
+      sessions = [ s for lst in self.__idle.values() for s in lst ]
+      self.__idle = {}
+    now = time.time()
+    for session in sessions:
+      if now - session.last_used > self.max_idle or not session.alive():
+        session.close()
+        self.__count__('evictions')
+        continue
+      with self.__lock:
+        idle = self.__idle.setdefault(session.key(), [])
+        if len(idle) < self.max_per_key:
+          idle.append(session)
+          session = None
+      if session is not None:
+        session.close()
+
+  def __keepalive_loop__(self):
+    while not self.__stop.wait(self.keepalive):
+      self.ping()
+
+  def close_all(self):
+    ''' Close all idle sessions and stop the keep-alive thread. '''
+    self.__stop.set()
+    with self.__lock:
+      thread, self.__thread = self.__thread, None
+    if thread is not None:
+      thread.join()
+    self.__stop.clear()
+    with self.__lock:
+      sessions = [ s for lst in self.__idle.values() for s in lst ]
+      self.__idle = {}
+    for session in sessions:
+      session.close()
+
+  def stats(self):
+    ''' Return a dictionary with the pool counters, i.e.:
+
+        * ``'connects'``   number of new connections opened,
+        * ``'reconnects'`` number of dropped sessions re-established,
+        * ``'reuses'``     number of times an idle session was re-used,
+        * ``'evictions'``  number of idle sessions closed,
+        * ``'idle'``       number of sessions currently idle in the pool.
+    '''
+    with self.__lock:
+      dct = dict(self.__stats)
+      dct['idle'] = sum([ len(x) for x in self.__idle.values() ])
+    return dct
+
+FTP_POOL = FtpSessionPool()
+''' The process-wide ftp session pool, used by :py:func:`grabFtpFile`. '''
+atexit.register(FTP_POOL.close_all)
+
+def grabFtpFile(host, dirn, filen, saveas=None, username=None, password=None, max_workers=4, decompress=None, chunk_size=CHUNK_SIZE):
   ''' Download a file from an ftp server.
 
       :param host:     The host ip/hostname (e.g. ``ftp.unibe.ch``).
@@ -95,6 +391,14 @@ def grabFtpFile(host, dirn, filen, saveas=None, username=None, password=None):
                        if not set, the name ``filen`` will be used.
       :param username: (Optional) The username to connect to the ftp site (if any).
       :param password: (Optional) The password to connect to the ftp site (if any).
+      :param max_workers: (Optional) Max number of files downloaded concurrently
+                       (see :py:func:`grabFiles`).
+      :param decompress: (Optional) Decompress while downloading; any of
+                       ``'gz'``, ``'Z'`` or ``'auto'`` (see
+                       :py:func:`compressionMethod`). Only the decompressed
+                       file is written, named as ``saveas`` without the
+                       ``.gz``/``.Z`` suffix.
+      :param chunk_size: (Optional) Block size (bytes) for ``RETR``.
 
       :returns: In sucess, a tuple is returned; first element is the
                 name of the saved file (absolute path), the second element
@@ -112,17 +416,17 @@ def grabFtpFile(host, dirn, filen, saveas=None, username=None, password=None):
            os.path.join(saveas, filen[0]), os.path.join(saveas, filen[1]), ...
         #. See the documentation API for a detailed table of valid ``stype``
                 values.
+        #. The ftp connection is borrowed from (and returned to) the
+           process-wide session pool :py:data:`FTP_POOL`, so no new login
+           is needed if a session to ``host`` is already open.
+        #. Multiple files are downloaded concurrently, via :py:func:`grabFiles`;
+           if any of them fails, a ``RuntimeError`` is raised (after all
+           downloads are done).
 
    '''
-  ftp = ftplib.FTP(host)
-
-  ## connect ...
-  if username:
-    if not password:
-      raise RuntimeError('Given username but no password; error at webutils.grabFtpFile')
-    ftp.login(username, password)
-  else:
-    ftp.login()
+  ## validate credentials ...
+  if username and not password:
+    raise RuntimeError('Given username but no password; error at webutils.grabFtpFile')
 
   if type(filen) is list:
     if not saveas:
@@ -150,75 +454,438 @@ def grabFtpFile(host, dirn, filen, saveas=None, username=None, password=None):
   ##  now we should have:
   ##+ three lists (filen, saveas, dirn), all with the same # of elements, or
 
-  sucess_dwl = []
-  sucess_rmt = []
+  opts = {'username': username, 'password': password,
+    'decompress': decompress, 'chunk_size': chunk_size}
+  jobs = [ ('ftp', host, dir_f, src_f, dst_f, opts) for src_f, dst_f, dir_f in zip(filen, saveas, dirn) ]
 
-  prev_dir = dirn[0]
-  ftp.cwd(prev_dir)
-  for src_f, dst_f, dir_f in zip(filen, saveas, dirn):
-    with open(dst_f, 'wb') as buf:
+  return [ x[0:2] for x in __raise_on_failure__(grabFiles(jobs, max_workers, max_workers)) ]
+
+def __ftp_fetch__(host, dirn, filen, saveas, opts, conns):
+  ''' Utility function; do not use as standalone. Download a single file
+      from an ftp server, using a session borrowed from :py:data:`FTP_POOL`.
+      See :py:func:`grabFiles`.
+  '''
+  method  = compressionMethod(filen, opts.get('decompress'))
+  saveas  = inflatedName(saveas, method)
+  session = FTP_POOL.acquire(host, opts.get('username'), opts.get('password'))
+  with open(saveas, 'wb') as buf:
+    ##  try twice; the second try only happens if the control channel was
+    ##+ dropped (e.g. server timeout) and the session had to re-connect.
+    for ntry in range(0, 2):
       try:
-        if prev_dir != dir_f:
-          ftp.cwd('/')
-          ftp.cwd(dir_f)
-          prev_dir = dir_f
-        ftp.retrbinary('RETR %s'%src_f, buf.write, 1024)
-        sucess_dwl.append(os.path.abspath(dst_f))
-        sucess_rmt.append(os.path.join(host, dir_f, src_f))
+        writer = InflatingWriter(buf, method) if method else buf
+        session.ftp.cwd(dirn)
+        session.ftp.retrbinary('RETR %s'%filen, writer.write, opts.get('chunk_size', CHUNK_SIZE))
+        if method: writer.close()
+        break
+      except FTP_CONNECTION_ERRORS:
+        if ntry == 0:
+          try:
+            FTP_POOL.reconnect(session)
+            buf.seek(0)
+            buf.truncate()
+            continue
+          except:
+            pass
+        FTP_POOL.discard(session)
+        try: os.remove(saveas)
+        except: print 'Failed to remove file %s' %saveas
+        raise RuntimeError('Failed to download file: %s' %(host + dirn + filen))
+      except ftplib.error_perm:
+        ## the session is still usable (e.g. '550 No such file'); keep it
+        FTP_POOL.release(session)
+        try: os.remove(saveas)
+        except: print 'Failed to remove file %s' %saveas
+        raise RuntimeError('Failed to download file: %s' %(host + dirn + filen))
       except:
-        ftp.quit()
-        try: os.remove(dst_f)
-        except: print 'Failed to remove file %s' %dst_f
-        raise RuntimeError('Failed to download file: %s' %(host + dir_f + src_f))
+        ##  failed in the middle of RETR (e.g. decompression or local write
+        ##+ error); the control channel may hold an unread reply, drop it
+        FTP_POOL.discard(session)
+        try: os.remove(saveas)
+        except: print 'Failed to remove file %s' %saveas
+        raise RuntimeError('Failed to download file: %s' %(host + dirn + filen))
+
+  FTP_POOL.release(session)
+  return [os.path.abspath(saveas), os.path.join(host, dirn, filen)]
+
+def __http_fetch__(url, dirn, filen, saveas, opts, conns):
+  ''' Utility function; do not use as standalone. Download a single file
+      from an http server. See :py:func:`grabFiles`.
+  '''
+  if dirn:
+    url = '%s/%s' %(url.rstrip('/'), dirn.strip('/'))
+  webfile = os.path.join(url, filen) ## not my os but whatever!
+  method  = compressionMethod(filen, opts.get('decompress'))
+  saveas  = inflatedName(saveas, method)
+  try:
+    response = urllib2.urlopen(webfile)
+    with open(saveas, 'wb') as f:
+      writer = InflatingWriter(f, method) if method else f
+      shutil.copyfileobj(response, writer, opts.get('chunk_size', CHUNK_SIZE))
+      if method: writer.close()
+  except:
+    try: os.remove(saveas)
+    except: pass
+    raise RuntimeError('Failed to download file: %s' %webfile)
+  return [os.path.abspath(saveas), webfile]
+
+def __ssh_fetch__(host, dirn, filen, saveas, opts, conns):
+  ''' Utility function; do not use as standalone. Download a single file
+      from an ssh server (via scp). The ssh connection is cached in ``conns``
+      so that a worker thread (see :py:func:`grabFiles`) only connects once
+      to each host.
+  '''
+  key = ('ssh', host, opts.get('username'), opts.get('port'))
+  if key not in conns:
+    client = paramiko.SSHClient()
+    client.load_system_host_keys()
+    client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+    client.connect(host, username=opts.get('username'), password=opts.get('password'), port=opts.get('port'))
+    conns[key] = client
+  with SCPClient(conns[key].get_transport()) as m_scp:
+    m_scp.get(os.path.join(dirn, filen), saveas)
+  return [os.path.abspath(saveas), ('%s@'%opts.get('username')) + os.path.join(host, dirn, filen)]
+
+fetch_dict = { 'ftp':   __ftp_fetch__,
+  'http' : __http_fetch__,
+  'https': __http_fetch__,
+  'ssh'  : __ssh_fetch__
+}
+''' A dictionary to match a protocol string (i.e. the first element of a job
+    passed to :py:func:`grabFiles`) to the function that downloads a single file
+    via that protocol.
+'''
+
+def grabFiles(jobs, max_workers=4, max_per_host=2):
+  ''' Download a batch of files, using a bounded pool of worker threads. Every
+      job is a tuple of type: ::
+
+        (protocol, host, dirn, filen, saveas[, options])
+
+      where ``protocol`` is any of the keys of :py:data:`fetch_dict` (i.e.
+      ``'ftp'``, ``'http'``, ``'https'`` or ``'ssh'``) and ``options`` is an
+      (optional) dictionary holding any of ``'username'``, ``'password'``,
+      ``'port'`` and (ftp and http(s) only) ``'decompress'`` and
+      ``'chunk_size'`` (see :py:func:`grabFtpFile`). For http(s) jobs,
+      ``host`` is the server's url.
+
+      :param jobs:         A list of jobs (as described above).
+      :param max_workers:  Max number of files being downloaded at the same time
+                           (i.e. number of worker threads).
+      :param max_per_host: Max number of files being downloaded at the same time
+                           from any single host.
+
+      :returns: A list with one entry per job (in the same order as ``jobs``), of
+                type ``[saved_file, remote_file, error]``. On success ``error``
+                is ``None``; else it is a string describing the failure. One
+                failed job does **not** abort the rest of the batch.
+
+      .. note:: If there is only one job (or ``max_workers`` is 1), no threads
+        are spawned and the job(s) are executed in the calling thread.
+  '''
+  def run(job, conns):
+    protocol, host, dirn, filen, saveas = job[0:5]
+    opts = job[5] if len(job) > 5 and job[5] else {}
+    try:
+      return __fetch__(protocol)(host, dirn, filen, saveas, opts, conns) + [None]
+    except Exception, e:
+      return [os.path.abspath(saveas), os.path.join(host, dirn, filen), str(e)]
+
+  return __run_batch__(jobs, run, max_workers, max_per_host)
+
+def __run_batch__(jobs, run, max_workers, max_per_host):
+  ''' Utility function; do not use as standalone. Execute ``run(job, conns)``
+      for every job, using (at most) ``max_workers`` threads and at most
+      ``max_per_host`` concurrent jobs per host (i.e. ``job[1]``). ``conns`` is
+      a per-thread dictionary of connections (closed when the thread is
+      done). Returns the list of the ``run`` results, in the order of ``jobs``.
+      See :py:func:`grabFiles` and :py:func:`probeFiles`.
+  '''
+  results = [ None ] * len(jobs)
+  pending = list(enumerate(jobs))
+  active  = {}
+  cond    = threading.Condition()
+
+  def next_job():
+    ## pick the first pending job whose host is not saturated
+    with cond:
+      while pending:
+        for idx, (i, job) in enumerate(pending):
+          if active.get(job[1], 0) < max_per_host:
+            del pending[idx]
+            active[job[1]] = active.get(job[1], 0) + 1
+            return i, job
+        cond.wait()
+      return None, None
+
+  def job_done(job):
+    with cond:
+      active[job[1]] -= 1
+      cond.notify_all()
+
+  def worker():
+    conns = {}
+    while True:
+      i, job = next_job()
+      if job is None: break
+      results[i] = run(job, conns)
+      job_done(job)
+    for client in conns.values():
+      try: client.close()
+      except: pass
+
+  nthreads = min(max(max_workers, 1), len(jobs))
+  if nthreads <= 1:
+    worker()
+  else:
+    threads = [ threading.Thread(target=worker) for i in range(0, nthreads) ]
+    for t in threads:
+      t.daemon = True
+      t.start()
+    for t in threads: t.join()
 
-  ftp.quit()
+  return results
 
-  return [ [x,y] for x,y in zip(sucess_dwl, sucess_rmt) ]
+def __fetch__(protocol):
+  try:
+    return fetch_dict[protocol.lower()]
+  except:
+    raise RuntimeError('Invalid download protocol: %s' %protocol)
+
+def __raise_on_failure__(results):
+  ''' Utility function; raise the error of the first failed job (if any)
+      of a :py:func:`grabFiles` result list; else return the list.
+  '''
+  for res in results:
+    if res[2] is not None:
+      raise RuntimeError(res[2])
+  return results
+
+def __ftp_probe__(host, dirn, filen, opts, conns):
+  ''' Utility function; do not use as standalone. Check if a file exists on
+      an ftp server (without downloading it), using a session borrowed from
+      :py:data:`FTP_POOL`. The file is looked up via ``SIZE``; if the server
+      does not support ``SIZE``, via an ``NLST`` of the remote directory. See
+      :py:func:`probeFiles`.
+
+      :returns: A tuple ``(exists, size)``; ``size`` is ``None`` if not known.
+  '''
+  session = FTP_POOL.acquire(host, opts.get('username'), opts.get('password'))
+  ##  try twice; the second try only happens if the control channel was
+  ##+ dropped (e.g. server timeout) and the session had to re-connect.
+  for ntry in range(0, 2):
+    try:
+      try:
+        session.ftp.cwd(dirn)
+      except ftplib.error_perm:
+        ## no such (remote) directory
+        FTP_POOL.release(session)
+        return False, None
+      try:
+        session.ftp.voidcmd('TYPE I')
+        size = session.ftp.size(filen)
+        FTP_POOL.release(session)
+        return True, size
+      except ftplib.error_perm, e:
+        if str(e)[0:3] == '550':
+          FTP_POOL.release(session)
+          return False, None
+      ## SIZE not supported; list the directory
+      try:
+        names = [ posixpath.basename(x) for x in session.ftp.nlst() ]
+      except ftplib.error_perm:
+        names = [] ## some servers reply '550 No files found'
+      FTP_POOL.release(session)
+      return filen in names, None
+    except FTP_CONNECTION_ERRORS:
+      if ntry == 0:
+        try:
+          FTP_POOL.reconnect(session)
+          continue
+        except:
+          pass
+      FTP_POOL.discard(session)
+      raise RuntimeError('Failed to probe file: %s' %(host + dirn + filen))
+    except:
+      ## e.g. a failed NLST transfer; the control channel may be out of sync
+      FTP_POOL.discard(session)
+      raise RuntimeError('Failed to probe file: %s' %(host + dirn + filen))
+
+def __http_probe__(url, dirn, filen, opts, conns):
+  ''' Utility function; do not use as standalone. Check if a file exists on
+      an http server (without downloading it), via a ``HEAD`` request. See
+      :py:func:`probeFiles`.
+
+      :returns: A tuple ``(exists, size)``; ``size`` is ``None`` if not known.
+  '''
+  if dirn:
+    url = '%s/%s' %(url.rstrip('/'), dirn.strip('/'))
+  webfile = os.path.join(url, filen)
+  request = urllib2.Request(webfile)
+  request.get_method = lambda: 'HEAD'
+  try:
+    response = urllib2.urlopen(request, timeout=opts.get('timeout', FTP_POOL.timeout))
+  except urllib2.HTTPError, e:
+    if e.code in (404, 410):
+      return False, None
+    raise RuntimeError('Failed to probe file: %s (HTTP %i)' %(webfile, e.code))
+  except:
+    raise RuntimeError('Failed to probe file: %s' %webfile)
+  size = response.info().getheader('Content-Length')
+  response.close()
+  return True, (int(size) if size and size.isdigit() else None)
+
+probe_dict = { 'ftp':   __ftp_probe__,
+  'http' : __http_probe__,
+  'https': __http_probe__
+}
+''' A dictionary to match a protocol string (i.e. the first element of a job
+    passed to :py:func:`probeFiles`) to the function that checks the existence
+    of a single remote file via that protocol.
+'''
+
+def probeFiles(jobs, max_workers=8, max_per_host=8):
+  ''' Check (concurrently) whether a batch of remote files exist, without
+      downloading them; ftp files are checked via ``SIZE`` (or ``NLST``) and
+      http(s) files via ``HEAD``. Every job is a tuple of type: ::
+
+        (protocol, host, dirn, filen[, options])
+
+      as in :py:func:`grabFiles` (but without ``saveas``); ``protocol`` is any
+      of the keys of :py:data:`probe_dict`.
+
+      :param jobs:         A list of jobs (as described above).
+      :param max_workers:  Max number of files being probed at the same time
+                           (i.e. number of worker threads).
+      :param max_per_host: Max number of files being probed at the same time
+                           on any single host.
+
+      :returns: A list with one entry per job (in the same order as ``jobs``), of
+                type ``[remote_file, exists, size, latency, error]``, where
+                ``exists`` is ``True``, ``False`` or ``None`` (the probe
+                failed; ``error`` is then a string describing the failure),
+                ``size`` is the file size in bytes (or ``None`` if not known)
+                and ``latency`` the time (in seconds) the probe took.
+
+      .. note:: Ftp probes borrow sessions from :py:data:`FTP_POOL`, so a file
+        downloaded right after it was probed re-uses the (logged-in) session.
+  '''
+  def run(job, conns):
+    protocol, host, dirn, filen = job[0:4]
+    opts  = job[4] if len(job) > 4 and job[4] else {}
+    start = time.time()
+    try:
+      exists, size = __probe__(protocol)(host, dirn, filen, opts, conns)
+      return [os.path.join(host, dirn, filen), exists, size, time.time() - start, None]
+    except Exception, e:
+      return [os.path.join(host, dirn, filen), None, None, time.time() - start, str(e)]
+
+  return __run_batch__(jobs, run, max_workers, max_per_host)
+
+def __probe__(protocol):
+  try:
+    return probe_dict[protocol.lower()]
+  except:
+    raise RuntimeError('Probing not supported for protocol: %s' %protocol)
+
+__PROGRAMS__ = {}
+
+def systemProgram(name):
+  ''' Return the full path of the executable ``name`` if it is on ``PATH``,
+      else ``None`` (the result is cached).
+  '''
+  if name not in __PROGRAMS__:
+    __PROGRAMS__[name] = None
+    for dirn in os.environ.get('PATH', '').split(os.pathsep):
+      prog = os.path.join(dirn, name)
+      if dirn and os.path.isfile(prog) and os.access(prog, os.X_OK):
+        __PROGRAMS__[name] = prog
+        break
+  return __PROGRAMS__[name]
+
+def __run_filter__(prog, inputf, outputf):
+  ''' Utility function; run ``prog -c inputf`` writing its output to
+      ``outputf`` (via a temporary file, which is then renamed). Returns
+      ``True`` on success; on failure the temporary file is removed.
+  '''
+  tmp = '%s.%i.tmp' %(outputf, os.getpid())
+  try:
+    with open(tmp, 'wb') as fout, open(os.devnull, 'w') as ferr:
+      returncode = subprocess.call([prog, '-c', inputf], stdout=fout, stderr=ferr)
+    if returncode == 0:
+      os.rename(tmp, outputf)
+      return True
+  except (OSError, IOError):
+    pass
+  try: os.remove(tmp)
+  except OSError: pass
+  return False
 
 def UnixUncompress(inputf, outputf=None):
   ''' Uncompress the UNIX-compressed file 'inputf' to 'outputf'
       Return the uncompressed file-name
+
+      .. note:: Same as ``uncompress -f`` (i.e. if no ``outputf`` is given,
+        ``inputf`` is replaced by the uncompressed file). The (system)
+        ``uncompress`` program is used if it is on ``PATH``, else the file is
+        uncompressed in-process, via :py:mod:`bernutils.lzw` (which is much
+        slower for large files).
   '''
   if not outputf:
-    sys_command = 'uncompress -f %s'%inputf
-    dotZfile    = '%s'%inputf[:-2]
+    dotZfile = '%s'%inputf[:-2]
   else:
-    sys_command = 'uncompress -f -c %s > %s'%(inputf, outputf)
-    dotZfile    = '%s'%outputf
+    dotZfile = '%s'%outputf
 
-  try:
-    p = subprocess.Popen(sys_command, shell=True,
-            stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-    output, err = p.communicate()
-    returncode  = p.returncode
-  except:
+  if not os.path.isfile(inputf):
     raise ValueError('ERROR. Cannot uncompress file: %s (1)'%inputf)
 
-  if returncode:
-    raise ValueError('ERROR. Cannot uncompress file: %s (2)'%inputf)
+  prog = systemProgram('uncompress')
+  if prog is not None:
+    if not __run_filter__(prog, inputf, dotZfile):
+      raise ValueError('ERROR. Cannot uncompress file: %s (2)'%inputf)
+  else:
+    try:
+      bernutils.lzw.decompressFile(inputf, dotZfile)
+    except IOError:
+      raise ValueError('ERROR. Cannot uncompress file: %s (1)'%inputf)
+    except ValueError:
+      try: os.remove(dotZfile)
+      except: pass
+      raise ValueError('ERROR. Cannot uncompress file: %s (2)'%inputf)
+
+  if not outputf:
+    os.remove(inputf)
 
   return dotZfile
 
 def UnixCompress(inputf, outputf=None):
   ''' Compress the file inputf to outputf using UNIX-compress.
       The function will return the name of the compressed file.
+
+      .. note:: Same as ``compress -f`` (i.e. ``inputf`` is replaced by the
+        compressed file). The (system) ``compress`` program is used if it is
+        on ``PATH``, else the file is compressed in-process, via
+        :py:mod:`bernutils.lzw`.
   '''
-  sys_command = 'compress -f %s'%inputf
-  dotZfile    = '%s.Z'%inputf
+  dotZfile = '%s.Z'%inputf
 
   if outputf:
-    sys_command += '; mv %s.Z %s'%(inputf, outputf)
-    dotZfile    = '%s'%outputf
+    dotZfile = '%s'%outputf
 
-  try:
-    p = subprocess.Popen(sys_command, shell=True,
-            stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-    output, err = p.communicate()
-    returncode  = p.returncode
-  except:
+  if not os.path.isfile(inputf):
     raise ValueError('ERROR. Cannot compress file: %s (1)'%inputf)
 
-  if returncode:
-    raise ValueError('ERROR. Cannot compress file: %s (2)'%inputf)
+  prog = systemProgram('compress')
+  if prog is not None:
+    if not __run_filter__(prog, inputf, dotZfile):
+      raise ValueError('ERROR. Cannot compress file: %s (2)'%inputf)
+  else:
+    try:
+      bernutils.lzw.compressFile(inputf, dotZfile)
+    except IOError:
+      raise ValueError('ERROR. Cannot compress file: %s (1)'%inputf)
+
+  if os.path.abspath(dotZfile) != os.path.abspath(inputf):
+    os.remove(inputf)
 
   return dotZfile
@@ -33,15 +33,23 @@ import os
 import sys
 import getopt
 import bernutils.badnq
+import bernutils.report
 
 ## ------------ DEBUGING FLAGS
 DDEBUG = True
 import traceback
 
 ## Global variables
-adnq_filen    = None
+adnq_files    = []
 table_entries = 'latcor,loncor,hgtcor,dn,de,du'
 warnings_msg  = None
+output_format = 'html'
+output_file   = None
+
+## report writers per output format
+writers = { 'html': bernutils.report.HtmlReport,
+  'json': bernutils.report.JsonReport,
+  'csv' : bernutils.report.CsvReport }
 
 ## help function
 def help (i):
@@ -56,7 +64,7 @@ def main(argv):
     help(1)
 
   try:
-    opts, args = getopt.getopt(argv,'hf:t:w:',['help','addneq-file=','table-entries=','warnings-str='])
+    opts, args = getopt.getopt(argv,'hf:t:w:o:',['help','addneq-file=','table-entries=','warnings-str=','format=','output='])
   except getopt.GetoptError:
     help(1)
 
@@ -64,14 +72,20 @@ def main(argv):
     if opt in ('-h', 'help'):
       help(0)
     elif opt in ('-f', '--addneq-file'):
-      global adnq_filen
-      adnq_filen = arg
+      global adnq_files
+      adnq_files += arg.split(',')
     elif opt in ('-t', '--table-entries'):
       global table_entries
       table_entries = arg
     elif opt in ('-w', '--warnings-str'):
       global warnings_msg
       warnings_msg = arg
+    elif opt in ('--format',):
+      global output_format
+      output_format = arg
+    elif opt in ('-o', '--output'):
+      global output_file
+      output_file = arg
     else:
       print >> sys.stderr, 'Invalid command line argument: %s' %opt
 
@@ -79,36 +93,49 @@ def main(argv):
 if __name__ == "__main__":
   main( sys.argv[1:] )
 
-if not adnq_filen:
+if not len(adnq_files):
   print >>sys.stderr, 'Must specify at least an input file!'
   sys.exit(1)
-if not os.path.isfile(adnq_filen):
-  print >>sys.stderr, 'Cannot find input file %s' %adnq_filen
+for adnq_filen in adnq_files:
+  if not os.path.isfile(adnq_filen):
+    print >>sys.stderr, 'Cannot find input file %s' %adnq_filen
+    sys.exit(1)
+if output_format not in writers:
+  print >>sys.stderr, 'Invalid output format %s' %output_format
   sys.exit(1)
 
 try:
 
-  ## create an AddnqFile instance
-  adnq = bernutils.badnq.AddneqFile(adnq_filen)
-
-  ## get and write a-priori info
-  print '<p>Addneq Filename: %s</p>' %adnq.filename()
-  print '<p>Campaign       : %s</p>' %adnq.campaign()
-  print '<p>Date           : %s, Session: %s</p>' %(adnq.date(), adnq.session())
-  print '<p>Run at: %s, by: %s</p>' %(adnq.run_at(), adnq.run_by())
-  inf = adnq.apriori_info()
-  print '<p>A-Priori Sigma of Unit Weight: %.4f</p>' %inf[0]
-  print '<p>Reference Frame              : %s</p>' %inf[1]
-  print '<p>Network Constraints          :</p>'
-  print '<ul style="list-style-type:none">'
-  for i in inf[2]: print '<li>%s -> %s (%s)</li>' %(i[0], i[1], i[2])
-  print '</ul>'
-
-  ## write the table & warnings
-  adnq.toHtml(table_entries, warnings_msg)
+  ## all output goes through a (buffered) report writer
+  fout   = open(output_file, 'w') if output_file else sys.stdout
+  writer = writers[output_format](fout)
+  writer.begin('ADDNEQ2 Report', bernutils.report.BOOTSTRAP_HEAD)
+
+  for adnq_filen in adnq_files:
+
+    ## create an AddnqFile instance
+    adnq = bernutils.badnq.AddneqFile(adnq_filen)
+
+    ## get and write a-priori info
+    writer.paragraph('Addneq Filename: %s' %adnq.filename())
+    writer.paragraph('Campaign       : %s' %adnq.campaign())
+    writer.paragraph('Date           : %s, Session: %s' %(adnq.date(), adnq.session()))
+    writer.paragraph('Run at: %s, by: %s' %(adnq.run_at(), adnq.run_by()))
+    inf = adnq.apriori_info()
+    writer.paragraph('A-Priori Sigma of Unit Weight: %.4f' %inf[0])
+    writer.paragraph('Reference Frame              : %s' %inf[1])
+    writer.paragraph('Network Constraints          :')
+    writer.items([ '%s -> %s (%s)' %(i[0], i[1], i[2]) for i in inf[2] ])
+
+    ## write the table & warnings
+    adnq.toHtml(table_entries, warnings_msg, writer)
+
+  writer.end()
+  writer.close()
+  if output_file: fout.close()
 
 except Exception, e:
   print >>sys.stderr, str(e)
   print >>sys.stderr,'Error in ADDNEQ to Html translation! Giving up.'
   if DDEBUG == True: traceback.print_exc(file=sys.stderr)
-  sys.exit(1)
\ No newline at end of file
+  sys.exit(1)
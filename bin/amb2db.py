@@ -0,0 +1,143 @@
+#! /usr/bin/python
+
+'''
+|===========================================|
+|** Higher Geodesy Laboratory             **|
+|** Dionysos Satellite Observatory        **|
+|** National Tecnical University of Athens**|
+|===========================================|
+
+filename              : amb2db.py
+version               : v-0.5
+created               : OCT-2015
+
+usage                 : Python routine to collect ambiguity resolution records
+                        from (directories of) ambiguity summary files (.SUM)
+                        into a local (SQLite) database, and report the rolling
+                        mean resolution percentage per baseline.
+
+exit code(s)          : 0 -> success
+                      : 1 -> error
+
+description           :
+
+notes                 : Files already ingested (and not changed since) are
+                        skipped, so the script can be run daily on the same
+                        directories.
+
+TODO                  :
+bugs & fixes          :
+last update           :
+
+report any bugs to    :
+                      : Xanthos Papanikolaou xanthos@mail.ntua.gr
+                      : Demitris Anastasiou  danast@mail.ntua.gr
+'''
+
+import os
+import sys
+import glob
+import getopt
+import bernutils.bambdb
+
+## ------------ DEBUGING FLAGS
+DDEBUG = True
+
+## Global variables
+directories = []
+pattern     = '*.SUM'
+database    = None
+network     = None
+processes   = None
+baselines   = []
+method      = None
+satsys      = None
+window      = 30
+
+## help function
+def help (i):
+  print ""
+  print ""
+  sys.exit(i)
+
+## Resolve command line arguments
+def main(argv):
+
+  if len(argv) < 1:
+    help(1)
+
+  try:
+    opts, args = getopt.getopt(argv,'hd:p:b:n:j:',['help','directories=','pattern=','database=','network=','processes=','rolling=','method=','satsys=','window='])
+  except getopt.GetoptError:
+    help(1)
+
+  for opt, arg in opts:
+    if opt in ('-h', 'help'):
+      help(0)
+    elif opt in ('-d', '--directories'):
+      global directories
+      directories += arg.split(',')
+    elif opt in ('-p', '--pattern'):
+      global pattern
+      pattern = arg
+    elif opt in ('-b', '--database'):
+      global database
+      database = arg
+    elif opt in ('-n', '--network'):
+      global network
+      network = arg
+    elif opt in ('-j', '--processes'):
+      global processes
+      processes = int(arg)
+    elif opt in ('--rolling',):
+      global baselines
+      baselines += arg.split(',')
+    elif opt in ('--method',):
+      global method
+      method = arg
+    elif opt in ('--satsys',):
+      global satsys
+      satsys = arg
+    elif opt in ('--window',):
+      global window
+      window = int(arg)
+    else:
+      print >> sys.stderr, 'Invalid command line argument: %s' %opt
+
+## Start main
+if __name__ == "__main__":
+  main( sys.argv[1:] )
+
+if not database:
+  print >>sys.stderr, 'Must specify a database file!'
+  sys.exit(1)
+
+db = bernutils.bambdb.AmbDatabase(database)
+
+## ingest all (new) files
+files = []
+for d in directories:
+  if not os.path.isdir(d):
+    print >>sys.stderr, 'Cannot find directory %s' %d
+    sys.exit(1)
+  files += glob.glob(os.path.join(d, pattern))
+
+if len(files):
+  ingested, failed = db.ingest(sorted(files), network, processes)
+  if DDEBUG: print 'Ingested %i (of %i) files' %(len(ingested), len(files))
+  for filen, err in failed:
+    print >>sys.stderr, '[WARNING] Failed to ingest file %s (%s)' %(filen, err)
+
+## report rolling mean percentages
+for bsl in baselines:
+  series = db.rolling_mean_percent(window, bsl, method, satsys)
+  if not len(series):
+    print >>sys.stderr, '[WARNING] No records for baseline %s' %bsl
+    continue
+  ## one series per resolution method and satellite system
+  for key in sorted(series):
+    for day, val in zip(*series[key]):
+      print '%s %-4s %-2s %s %6.2f' %(key + (day, val))
+
+db.close()
+sys.exit(0)
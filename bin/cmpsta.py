@@ -37,6 +37,7 @@ import os
 import getopt
 import bernutils.bsta
 import bernutils.webutils
+import bernutils.report
 import bernutils.products.prodgen
 
 ## ------------ DEBUGING FLAGS
@@ -48,6 +49,7 @@ reference_sta       = ''
 local_sta           = ''
 split_output        = False
 no_marker_numbers   = False
+cache_sta           = False
 stations_diff       = [] ## see Note 1
 
 '''
@@ -94,23 +96,23 @@ def print_incosistency(itype, station, l1, fn1, l2, fn2):
     if station[-1] == '?': fnn = station[0:-1]+'_'
     print 'Redirecting to %s.stadf' %fnn
     fn = '%s.stadf' %fnn
-    temp = sys.stdout #store original stdout object for later
     if itype == 2 and station in stations_diff:
-      sys.stdout = open(fn, 'a')
+      fout = open(fn, 'a')
     else:
-      sys.stdout = open(fn, 'w')
-
-  print 'INCONSISTENCY FOR STATION %s TYPE %1i' %(station, itype)
-  print 'File %s contains the Type %03i records:' %(fn1, itype)
-  for i in l1:
-    print '[%s]' %i
-  print 'File %s contains the Type %03i records:' %(fn2, itype)
-  for i in l2:
-    print '[%s]' %i
+      fout = open(fn, 'w')
+  else:
+    fout = sys.stdout
+
+  writer = bernutils.report.TextReport(fout)
+  writer.paragraph('INCONSISTENCY FOR STATION %s TYPE %1i' %(station, itype))
+  writer.paragraph('File %s contains the Type %03i records:' %(fn1, itype))
+  writer.items([ '[%s]' %i for i in l1 ])
+  writer.paragraph('File %s contains the Type %03i records:' %(fn2, itype))
+  writer.items([ '[%s]' %i for i in l2 ])
+  writer.close()
 
   if split_output == True:
-    sys.stdout.close()
-    sys.stdout = temp #restore print commands to interactive prompt
+    fout.close()
 
 ## Resolve command line arguments
 def main(argv):
@@ -119,7 +121,7 @@ def main(argv):
     help(1)
 
   try:
-    opts, args = getopt.getopt(argv,'hs:r:l:',['help', 'stations=', 'reference-sta=', 'local-sta=', 'splitout', 'no-marker-numbers'])
+    opts, args = getopt.getopt(argv,'hs:r:l:',['help', 'stations=', 'reference-sta=', 'local-sta=', 'splitout', 'no-marker-numbers', 'cache-sta'])
   except getopt.GetoptError:
     help(1)
 
@@ -142,6 +144,9 @@ def main(argv):
     elif opt in ('--no-marker-numbers'):
       global no_marker_numbers
       no_marker_numbers = True
+    elif opt in ('--cache-sta'):
+      global cache_sta
+      cache_sta = True
     else:
       print >> sys.stderr, 'Invalid command line argument: %s' %opt
 
@@ -164,7 +169,9 @@ if not os.path.isfile(reference_sta):
     sys.exit(1)
 
 ## create the two StaFile instances
-refsta = bernutils.bsta.StaFile(reference_sta)
+##  the reference .STA is (usually) big and rarely changes; if asked, keep a
+##+ (sidecar) cache of its parsed records.
+refsta = bernutils.bsta.StaFile(reference_sta, cache_sta)
 locsta = bernutils.bsta.StaFile(local_sta)
 
 ## read Type001 info (as dictionary) from both .STA files
@@ -5,7 +5,6 @@ import sys
 import datetime
 import getopt
 import bernutils.webutils
-import gzip
 
 ## help function
 def help (i):
@@ -123,24 +122,16 @@ saveas_list = list(request_list)
 if OUT_DIR != '':
     for i, f in enumerate(saveas_list):
         saveas_list[i] = os.path.join(OUT_DIR,f)
+
+##  pre-2008 files are gunzipped while downloading; only the inflated files
+##+ are written (i.e. saved without the '.gz' extension).
 try:
-    retlist = bernutils.webutils.grabHttpFile(URL,request_list,saveas_list)
+    retlist = bernutils.webutils.grabHttpFile(URL,request_list,saveas_list,decompress='auto')
 except Exception, e:
     ## TODO should delete files if this step fails
     print >> sys.stderr, 'ERROR.',str(e)
     sys.exit(EXIT_FAILURE)
 
-# WARNING pre-2008, all files are zipped into filename.gz
-if iyear <= 2008:
-    for i, f in enumerate(retlist):
-        gzfilename = f[1]
-        if gzfilename[-3:] == '.gz':
-            new_saveas = gzfilename[:-3]
-            with open(new_saveas,'w') as fn:
-                fn.write(gzip.open(gzfilename).read())
-            f[1] = new_saveas
-            os.remove(gzfilename)
-
 # print results
 for i in retlist:
     print 'Downloaded',i[0],'to',i[1]
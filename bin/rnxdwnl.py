@@ -41,6 +41,7 @@ import getopt
 import glob
 import MySQLdb
 import traceback
+import bernutils.webutils
 
 ## Debug Mode
 DDEBUG_MODE = True
@@ -89,54 +90,6 @@ def executeShellCmd(command):
   if returncode:
     raise ValueError('ERROR. Command failed: [%s].'%command)
 
-def UnixUncompress(inputf, outputf=None):
-  ''' Uncompress the UNIX-compressed file 'inputf' to 'outputf'
-      Return the uncompressed file-name
-  '''
-  if not outputf:
-    sys_command = 'uncompress -f %s'%inputf
-    dotZfile    = '%s'%inputf[:-2]
-  else:
-    sys_command = 'uncompress -f -c %s > %s'%(inputf, outputf)
-    dotZfile    = '%s'%outputf
-
-  try:
-    p = subprocess.Popen(sys_command, shell=True,
-            stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-    output, err = p.communicate()
-    returncode  = p.returncode
-  except:
-    raise ValueError('ERROR. Cannot uncompress file: %s'%inputf)
-
-  if returncode:
-    raise ValueError('ERROR. Cannot uncompress file: %s'%inputf)
-
-  return dotZfile
-
-def UnixCompress(inputf, outputf=None):
-  ''' Compress the file inputf to outputf using UNIX-compress.
-      The function will return the name of the compressed file.
-  '''
-  sys_command = 'compress -f %s'%inputf
-  dotZfile    = '%s.Z'%inputf
-
-  if outputf:
-    sys_command += '; mv %s.Z %s'%(inputf, outputf)
-    dotZfile    = '%s'%outputf
-
-  try:
-    p = subprocess.Popen(sys_command, shell=True,
-            stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-    output, err = p.communicate()
-    returncode  = p.returncode
-  except:
-    raise ValueError('ERROR. Cannot compress file: %s'%inputf)
-
-  if returncode:
-    raise ValueError('ERROR. Cannot compress file: %s'%inputf)
-
-  return dotZfile
-
 def getRinexMarkerName(filename):
   ''' Given a rinex filename, this function will search the
       header to find and return the marker name.
@@ -147,7 +100,7 @@ def getRinexMarkerName(filename):
   ufilename = filename
 
   if filename[-2:] == '.Z':
-    ufilename = UnixUncompress(filename)
+    ufilename = bernutils.webutils.UnixUncompress(filename)
 
   with open(ufilename, 'r') as fin:
     for line in fin.readlines():
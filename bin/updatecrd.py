@@ -33,7 +33,7 @@ report any bugs to    :
 import sys
 import os
 import getopt
-import bernutils.berncrd
+import bernutils.bcrd
 
 ## ------------ DEBUGING FLAGS
 DDEBUG = True
@@ -103,14 +103,10 @@ if __name__ == "__main__":
 if not os.path.isfile(update_file):
     print >> sys.stderr, 'ERROR. File does not exist:',update_file
     sys.exit (1)
-else:
-    updateCrd = CrdFile(update_file)
 
 if not os.path.isfile(reference_file):
     print >> sys.stderr, 'ERROR. File does not exist:',reference_file
     sys.exit (1)
-else:
-    referenceCrd = CrdFile(reference_file)
 
 ## Do we have a list of stations ?
 if not len(stations):
@@ -120,80 +116,39 @@ if not len(stations):
 if not len(flags):
     flags = None
 
-## Read all points from the updated file
+## Read all points from the update and the reference file
 try:
-    lst1 = updateCrd.getListOfPoints(stations, drop_marker_numbers)
-    if DDEBUG: print 'Read',len(lst1),'station from update file'
+    updateCrd = bernutils.bcrd.CrdFile(update_file).getTable(stations, drop_marker_numbers)
+    if DDEBUG: print 'Read',len(updateCrd),'station from update file'
 except:
     print >> sys.stderr,'ERROR. Failed reading points from file:',update_file
     sys.exit(1)
 
-## Read all points from the reference file
 try:
-    lst2 = referenceCrd.getListOfPoints(stations, drop_marker_numbers)
-    if DDEBUG: print 'Read',len(lst1),'station from update file'
+    referenceCrd = bernutils.bcrd.CrdFile(reference_file).getTable(stations, drop_marker_numbers)
+    if DDEBUG: print 'Read',len(referenceCrd),'station from reference file'
 except:
     print >> sys.stderr,'ERROR. Failed reading points from file:',reference_file
     sys.exit(1)
 
-## Try to match the points in reference list and update list.
-## Create a new list of (matched) points, where the point's name is
-## extracted from the update file, and all other info are extracted
-## from the reference file (i.e., coordinates, flag)
+## Match the points in reference list and update list (by name).
+## A matched point keeps the name of the update file, and all other info
+## (i.e., coordinates, flag) are extracted from the reference file.
 ## If a station is not matched, it will be included in the update list,
-## with the reciords as in the update file.
-updlst = []
-matched_stations = 0
-for point in lst1:
-    matched = False
-    for refpt in lst2:
-        if point.name(not drop_marker_numbers) == refpt.name(not drop_marker_numbers): ## match the name
-            if not flags or refpt.flag_ in flags: ## match the flag (if any)
-                pt = refpt
-                pt.name_   = point.name_
-                pt.number_ = point.number_
-                updlst.append(pt)
-                matched = True
-                matched_stations += 1
-                if DDEBUG: print 'Matched point ->',point.name(),' to point ->',refpt.name(),'number',matched_stations
-            break
-    if not matched and not delete_unmatched:
-        if DDEBUG: print 'UnMatched point ->',point.name()
-        updlst.append(point)
-
-## Now, the user may want all stations included in the reference file
-## included in the update file, regardless if it is matched.
-if include_unmatched:
-    for refpt in lst2:
-        unmatched = True
-        for mpt in updlst:
-            if refpt.name(not drop_marker_numbers) == mpt.name(not drop_marker_numbers): ## match the name
-                unmatched = False
-                break
-        if unmatched:
-            updlst.append(refpt)
+## with the records as in the update file (unless --delete-unmatched).
+## With --include-unmatched, reference stations not in the update list are
+## appended.
+updlst, matched_stations = bernutils.bcrd.mergeTables(updateCrd, referenceCrd,
+    drop_marker_numbers, flags, include_unmatched, delete_unmatched)
 
 ## if no stations are to be updated, just return
-if not updlst:
+if not len(updlst):
     if DDEBUG: print 'No stations to update. Exiting...'
     sys.exit(0)
 
-## Else, write the updated points in a temporary file, using the
-## header of the reference file
-header = referenceCrd.getCrdFileHeader()
-fin = open('.tmp.CRD','w')
-for l in header:
-    print >> fin, l
-
-j = 1
-for i in updlst:
-    print >> fin, i.asString(j)
-    j += 1
-
-fin.close()
-
-## Last step: rename the temporary file to the updated file
-os.rename('.tmp.CRD', update_file)
+## Else, write the updated points (using the header of the reference file);
+## the file is written to a temporary file, which is then renamed.
+updlst.write(update_file)
 
 ## Print the number of stations update and exit
 if DDEBUG: print 'Wrote',len(updlst),'stations in file',update_file,'.'
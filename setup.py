@@ -13,7 +13,7 @@ config = {
     'packages': ['bernutils', 'bernutils.products'],
     'scripts': [],
     'name': 'bernpy',
-    'install_requires': ['paramiko', 'scp']
+    'install_requires': ['paramiko', 'scp', 'numpy']
 }
 
 setup(**config)
@@ -0,0 +1,143 @@
+#! /usr/bin/python
+
+##  A generator of (synthetic) ADDNEQ2 output files, used by the ADDNEQ2 tests.
+##+ Only the blocks read by bernutils.badnq are written (header, input normal
+##+ equation files, a-priori information, a-priori station coordinates,
+##+ network constraints and the station coordinates of the summary), plus a
+##+ few look-alike headers the parser has to skip.
+##
+##  usage: adnqgen.py OUTPUT [NUM_STATIONS [SEED]]   (default: 20 stations, seed 0)
+
+import sys
+import math
+import random
+import datetime
+
+RULE = ' ' + '-'*131
+
+def station_list(n=20, seed=0):
+  ''' A list of ``n`` (random) stations in the Eastern Mediterranean; every
+      station is a dictionary holding its ``name``, adjustment type ``adj``,
+      a-priori ``xyz`` and ``llh`` (degrees, degrees, meters), the ``xyz``
+      and ``neu`` corrections and rms values and the error ellipses. All
+      values are rounded as they are written.
+  '''
+  rnd   = random.Random(seed)
+  codes = set()
+  while len(codes) < n:
+    codes.add(''.join([ rnd.choice('ABCDEFGHIJKLMNOPRSTUVWXYZ') for i in range(4) ]))
+  stations = []
+  for i, code in enumerate(sorted(codes)):
+    lat, lon, hgt = rnd.uniform(34, 42), rnd.uniform(19, 30), rnd.uniform(0, 2000)
+    sta = {'name': '%s %05iM%03i' %(code, 12600 + i, rnd.randint(1, 9)),
+      'adj': rnd.choice(['HELMR', 'ESTIM', 'ESTIM', 'FIXED']),
+      'llh': (round(lat, 7), round(lon, 7), round(hgt, 5)),
+      'xyz': tuple([ round(c, 5) for c in ellipsoidal2cartesian(lat, lon, hgt) ]),
+      'xyz_cor': tuple([ round(rnd.gauss(0, .004), 5) for c in range(3) ]),
+      'xyz_rms': tuple([ round(rnd.uniform(.0005, .003), 5) for c in range(3) ]),
+      'neu_cor': tuple([ round(rnd.gauss(0, .004), 5) for c in range(3) ]),
+      'neu_rms': tuple([ round(rnd.uniform(.0005, .003), 5) for c in range(3) ]),
+      'ellipse': tuple([ round(rnd.uniform(.0005, .003), 5) for c in range(3) ]) + (round(rnd.uniform(0, 180), 1),)}
+    sta['xyz_est'] = tuple([ round(a + c, 5) for a, c in zip(sta['xyz'], sta['xyz_cor']) ])
+    stations.append(sta)
+  return stations
+
+def ellipsoidal2cartesian(lat, lon, hgt):
+  ''' GRS80 ellipsoidal (degrees, degrees, meters) to cartesian coordinates. '''
+  a, f = 6378137e0, 1e0/298.257222101e0
+  e2   = f*(2e0 - f)
+  lat, lon = math.radians(lat), math.radians(lon)
+  N = a / math.sqrt(1e0 - e2*math.sin(lat)**2)
+  return (N + hgt)*math.cos(lat)*math.cos(lon), (N + hgt)*math.cos(lat)*math.sin(lon), (N*(1e0 - e2) + hgt)*math.sin(lat)
+
+def make_addneq(stations, date=datetime.date(2012, 2, 23), session='0', campaign='${P}/GREECE',
+  nq_files=3, apr_sigma=.001, ref_frame='IGb08', constraints=(('Station coordinates', '0.00010', 'meters'),)):
+  ''' Return the contents of a (synthetic) ADDNEQ2 output file, for the
+      ``stations`` of :func:`station_list`. The reference epoch of the
+      coordinates is ``date`` at noon.
+  '''
+  doy   = date.timetuple().tm_yday
+  start = datetime.datetime(date.year, date.month, date.day)
+  fmt   = '%Y-%m-%d %H:%M:%S'
+  lines = ['', ' ' + '='*131, ' Bernese GNSS Software, Version 5.2', RULE,
+    ' Program        : ADDNEQ2',
+    ' Purpose        : Combine normal equation systems', RULE,
+    ' Campaign       : %s' %campaign,
+    ' Default session: %03i%s year %i' %(doy, session, date.year),
+    ' Date           : 07-Jun-2014 01:22:57',
+    ' User name      : bpe2', ' ' + '='*131, '', '']
+
+  lines += [' INPUT NORMAL EQUATION FILES', ' ---------------------------', '', RULE, ' File  Name', RULE]
+  for i in range(1, nq_files + 1):
+    lines.append(' %5i  %s/SOL/FFG%03i000%i.NQ0' %(i, campaign, doy, i))
+  lines += [RULE, '', '', ' Main characteristics of normal equation files:',
+    ' ---------------------------------------------', '',
+    ' File  From                 To                   Number of observations / parameters / degree of freedom', RULE]
+  for i in range(1, nq_files + 1):
+    obs, par = 10000*i + 369, 100*i + 18
+    lines.append(' %5i  %s  %s  %20i %12i %12i' %(i, start.strftime(fmt),
+      (start + datetime.timedelta(days=1)).strftime(fmt), obs, par, obs - par))
+  lines += [RULE, '', '']
+
+  lines += [' A PRIORI INFORMATION', ' --------------------', '',
+    ' Observation weighting', '',
+    ' A priori sigma of unit weight: %6.4f m' %apr_sigma, '', '',
+    ' Reference frame', ' ---------------', '',
+    ' Local geodetic datum: %s' %ref_frame, '',
+    ' Datum name         Ell. param./ Scale      Shifts to WGS-84       Rotations to WGS-84', RULE,
+    ' %-18s A   =     6378137.000 m    DX =     0.0000 m    RX =    0.00000 mas' %ref_frame,
+    '                    1/F =     298.2572221      DY =     0.0000 m    RY =    0.00000 mas', '', '']
+
+  lines += [' A priori station coordinates:              %s/STA/APR%02i%03i0.CRD' %(campaign, date.year % 100, doy), '',
+    '                                                      A priori station coordinates                 A priori station coordinates',
+    '                                                                %-5s                          Ellipsoidal in local geodetic datum' %ref_frame,
+    RULE, ' num  Station name     obs e/f/h        X (m)           Y (m)           Z (m)        Latitude       Longitude    Height (m)', RULE]
+  for i, sta in enumerate(stations):
+    lines.append('%5i  %-15s Y  %-5s %15.5f %15.5f %15.5f %14.7f %14.7f %11.5f' %((i + 1, sta['name'], sta['adj']) + sta['xyz'] + sta['llh']))
+  lines += ['', '']
+
+  lines += [' Network constraints:', ' --------------------', ' Component                      A priori sigma  Unit', RULE]
+  for param, sigma, unit in constraints:
+    lines.append(' %-32s%-14s%s' %(param, sigma, unit))
+  lines += ['', '']
+
+  ## look-alike blocks; before the summary and (after the summary) without a
+  ## reference epoch
+  lines += [' Station coordinates and velocities:', ' ----------------------------------',
+    ' Sigma of unit weight from the a priori information', '', '',
+    ' SUMMARY OF RESULTS', ' ------------------', '',
+    ' Station coordinates and velocities:', ' ----------------------------------',
+    ' Velocities not estimated in this solution', '', '']
+
+  lines += [' Station coordinates and velocities:', ' ----------------------------------',
+    ' Reference epoch: %s' %(start + datetime.timedelta(hours=12)).strftime(fmt), '',
+    ' Station name          Typ   A priori value  Estimated value    Correction     RMS error      3-D ellipsoid        2-D ellipse', RULE]
+  for sta in stations:
+    lines += station_block(sta)
+  lines += ['', '', ' >>> CPU/Real time for pgm "ADDNEQ2": 0:00:01.234 / 0:00:01.301']
+  return '\n'.join(lines) + '\n'
+
+def station_block(sta):
+  ''' The (8-line) summary block of a station. '''
+  pad = ' '*23
+  e1, e2, e3, ang = sta['ellipse']
+  lat, lon, hgt = sta['llh']
+  dn, de, du = sta['neu_cor']
+  sn, se, su = sta['neu_rms']
+  out = []
+  for i, c in enumerate('XYZ'):
+    out.append('%s%s  %17.5f%17.5f%14.5f%14.5f' %(' %-22s' %sta['name'] if not i else pad, c,
+      sta['xyz'][i], sta['xyz_est'][i], sta['xyz_cor'][i], sta['xyz_rms'][i]))
+  out.append('')
+  out.append('%sU  %17.5f%17.5f%14.5f%14.5f%12.5f%7.1f' %(pad, hgt, hgt + du, du, su, e1, ang))
+  out.append('%sN  %17.7f%17.7f%14.5f%14.5f%12.5f%7.1f%12.5f%7.1f' %(pad, lat, lat + dn/111e3, dn, sn, e2, ang, e2, ang))
+  out.append('%sE  %17.7f%17.7f%14.5f%14.5f%12.5f%7.1f%12.5f' %(pad, lon, lon + de/85e3, de, se, e3, ang, e3))
+  out.append('')
+  return out
+
+if __name__ == '__main__':
+  if len(sys.argv) < 2:
+    print >> sys.stderr, 'usage: adnqgen.py OUTPUT [NUM_STATIONS [SEED]]'
+    sys.exit(1)
+  with open(sys.argv[1], 'w') as fout:
+    fout.write(make_addneq(station_list(*[ int(a) for a in sys.argv[2:4] ])))
@@ -0,0 +1,71 @@
+#! /usr/bin/python
+
+##  Benchmark: parsing the date fields of a .STA file with strptime vs the
+##+ fixed-column decoder bernutils.bsta.resolve_sta_date, plus the time to
+##+ index the whole file (with and without the sidecar cache).
+##
+##  usage: bench_bsta.py [STA_FILE]   (default: a synthetic .STA file of 12000
+##         stations, made by test/stagen.py)
+
+import sys
+import os
+import time
+import shutil
+import datetime
+import tempfile
+
+import bernutils.bsta
+from stagen import make_sta
+
+tmpdir = None
+if len(sys.argv) > 1:
+  sta_file = sys.argv[1]
+else:
+  tmpdir   = tempfile.mkdtemp()
+  sta_file = os.path.join(tmpdir, 'SYNTH.STA')
+  with open(sta_file, 'w') as fout:
+    fout.write(make_sta(12000))
+
+## collect all (Type 001 and 002) records of the file
+lines = []
+with open(sta_file, 'r') as fin:
+  itype = 0
+  skip  = 0
+  for line in fin:
+    if line.startswith('TYPE 00'):
+      itype = int(line[7])
+      skip  = 4
+    elif skip > 0:
+      skip -= 1
+    elif itype in [1, 2] and len(line.strip()) > 0:
+      lines.append(line)
+print 'Found %i Type 001/002 records in %s' %(len(lines), sta_file)
+
+def old_resolve(line, col, default):
+  ''' The (old) strptime path of Type001/Type002 '''
+  t_str = line[col:col+19].strip()
+  if len(t_str) == 0:
+    return default
+  return datetime.datetime.strptime(t_str, '%Y %m %d %H %M %S')
+
+results = {}
+for name, func in [('strptime', old_resolve), ('resolve_sta_date', bernutils.bsta.resolve_sta_date)]:
+  start = time.time()
+  results[name] = [ (func(l, 27, bernutils.bsta.MIN_STA_DATE), func(l, 48, bernutils.bsta.MAX_STA_DATE)) for l in lines ]
+  secs  = time.time() - start
+  print '%-20s %8.3f sec %10.0f dates/sec' %(name, secs, 2*len(lines)/secs)
+print 'Identical results: %s' %(results['strptime'] == results['resolve_sta_date'])
+
+## index the whole file
+start = time.time()
+bernutils.bsta.StaFile(sta_file).index()
+print '%-20s %8.3f sec' %('StaFile.index', time.time() - start)
+
+cache = sta_file + bernutils.bsta.CACHE_SUFFIX
+if os.path.isfile(cache): os.remove(cache)
+bernutils.bsta.StaFile(sta_file, cache=True).index()
+start = time.time()
+bernutils.bsta.StaFile(sta_file, cache=True).index()
+print '%-20s %8.3f sec' %('StaFile.index (cache)', time.time() - start)
+os.remove(cache)
+if tmpdir is not None: shutil.rmtree(tmpdir)
@@ -0,0 +1,69 @@
+#! /usr/bin/python
+
+##  Benchmark: scalar (math) vs array (numpy) geodesy functions, for 1e6 points.
+##
+##  usage: bench_geodesy.py [NUM_POINTS]   (default: 1000000)
+
+import sys
+import math
+import time
+import numpy
+
+import bernutils.geodesy as geo
+
+npts = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+## the scalar functions are timed on a subset and the rate is extrapolated
+nscl = min(npts, 100000)
+
+rnd = numpy.random.RandomState(1)
+lon = rnd.uniform(-math.pi, math.pi, npts)
+lat = rnd.uniform(-math.pi/2, math.pi/2, npts)
+hgt = rnd.uniform(-100., 9000., npts)
+
+def report(name, scl_secs, vec_secs):
+  scl_rate = nscl / scl_secs
+  vec_rate = npts / vec_secs
+  print '%-24s scalar: %10.0f pts/sec  numpy: %12.0f pts/sec  (x%.0f)' %(name, scl_rate, vec_rate, vec_rate/scl_rate)
+
+## ellipsoidal -> cartesian
+start = time.time()
+for i in xrange(nscl):
+  geo.ellipsoidal2cartesian(lon[i], lat[i], hgt[i])
+scl = time.time() - start
+start = time.time()
+x, y, z = geo.ellipsoidal2cartesian_vec(lon, lat, hgt)
+report('ellipsoidal2cartesian', scl, time.time() - start)
+
+## cartesian -> ellipsoidal
+start = time.time()
+for i in xrange(nscl):
+  geo.cartesian2ellipsoidal(x[i], y[i], z[i])
+scl = time.time() - start
+start = time.time()
+l, f, h = geo.cartesian2ellipsoidal_vec(x, y, z)
+report('cartesian2ellipsoidal', scl, time.time() - start)
+
+## check round trip and agreement with the scalar version
+print 'max round-trip error: lon %.2e rad, lat %.2e rad, hgt %.2e m' %(
+  numpy.abs(l - lon).max(), numpy.abs(f - lat).max(), numpy.abs(h - hgt).max())
+dmax = max([ max(abs(a-b) for a, b in zip(geo.cartesian2ellipsoidal(x[i], y[i], z[i]), (l[i], f[i], h[i]))) for i in xrange(1000) ])
+print 'max scalar/array difference: %.2e' %dmax
+
+## cartesian -> topocentric (one reference point, many rovers) -> azd
+ref = numpy.array([4595220.0, 2039434.0, 3912625.0])
+xyz = numpy.column_stack((x, y, z))
+start = time.time()
+for i in xrange(nscl):
+  geo.cartesian2topocentric(ref[0], ref[1], ref[2], x[i], y[i], z[i])
+scl = time.time() - start
+start = time.time()
+neu = geo.cartesian2topocentric_vec(ref, xyz)
+report('cartesian2topocentric', scl, time.time() - start)
+
+start = time.time()
+for i in xrange(nscl):
+  geo.topocentric2azd(neu[i,0], neu[i,1], neu[i,2])
+scl = time.time() - start
+start = time.time()
+azd = geo.topocentric2azd_vec(neu)
+report('topocentric2azd', scl, time.time() - start)
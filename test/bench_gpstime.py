@@ -0,0 +1,74 @@
+#! /usr/bin/python
+
+##  Benchmark: scalar (datetime) vs array (numpy) time conversions in
+##+ bernutils.gpstime, plus a consistency check between the two.
+##
+##  usage: bench_gpstime.py [NUM_EPOCHS]   (default: 1000000)
+
+import sys
+import time
+import datetime
+import numpy
+
+import bernutils.gpstime as gt
+
+nepochs = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+## the scalar functions are timed on a subset and the rate is extrapolated
+nscl = min(nepochs, 100000)
+
+rnd  = numpy.random.RandomState(1)
+year = rnd.randint(1981, 2099, nepochs)
+doy  = numpy.array([ rnd.randint(1, 366 + int(y%4 == 0)) for y in year ])
+sec  = rnd.randint(0, 86400, nepochs).astype(float)
+
+def report(name, scl_secs, vec_secs):
+  scl_rate = nscl / scl_secs
+  vec_rate = nepochs / vec_secs
+  print '%-20s scalar: %10.0f epochs/sec  numpy: %12.0f epochs/sec  (x%.0f)' %(name, scl_rate, vec_rate, vec_rate/scl_rate)
+
+## year, doy -> mjd
+start = time.time()
+for i in xrange(nscl):
+  gt.ydoy2mjd(year[i], doy[i])
+scl = time.time() - start
+start = time.time()
+mjd, fmjd = gt.ydoy2mjd_vec(year, doy, sec)
+report('ydoy2mjd', scl, time.time() - start)
+
+## year, doy, sec -> gps week, sow
+start = time.time()
+for i in xrange(nscl):
+  gt.ydoy2gps(year[i], doy[i], int(sec[i]) // 3600, int(sec[i]) % 3600 // 60, int(sec[i]) % 60)
+scl = time.time() - start
+start = time.time()
+week, sow = gt.ydoy2gps_vec(year, doy, sec)
+report('ydoy2gps', scl, time.time() - start)
+
+## mjd -> datetime
+start = time.time()
+for i in xrange(nscl):
+  gt.mjd2pydt(mjd[i], fmjd[i])
+scl = time.time() - start
+start = time.time()
+dt64 = gt.mjd2datetime64_vec(mjd, fmjd)
+report('mjd2datetime', scl, time.time() - start)
+
+## datetime -> year, doy
+pydt = [ gt.mjd2pydt(mjd[i], fmjd[i]) for i in xrange(nscl) ]
+start = time.time()
+for d in pydt:
+  gt.pydt2ydoy(d)
+scl = time.time() - start
+start = time.time()
+y2, d2, s2 = gt.mjd2ydoy_vec(*gt.datetime642mjd_vec(dt64))
+report('datetime2ydoy', scl, time.time() - start)
+
+## consistency checks
+print 'round trip (year, doy, sec) mismatches: %i' %(
+  numpy.count_nonzero((y2 != year) | (d2 != doy) | (numpy.abs(s2 - sec) > 1e-6)))
+nbad = 0
+for i in xrange(min(nscl, 10000)):
+  w, s = gt.ydoy2gps(year[i], doy[i], int(sec[i]) // 3600, int(sec[i]) % 3600 // 60, int(sec[i]) % 60)
+  if w != week[i] or abs(s - sow[i]) > 1e-6 or pydt[i] != dt64[i].astype(datetime.datetime):
+    nbad += 1
+print 'scalar/array mismatches: %i' %nbad
@@ -0,0 +1,104 @@
+#! /usr/bin/python
+
+##  Benchmark: uncompressing a batch of (synthetic) daily RINEX .Z files, via
+##+ the shell (uncompress, one fork+exec per file), webutils.UnixUncompress
+##+ (the system uncompress if on PATH, else bernutils.lzw) and bernutils.lzw
+##+ (in-process).
+##
+##  usage: bench_lzw.py [NUM_FILES [NUM_EPOCHS]]   (default: 200 files, 2880 epochs)
+
+import sys
+import os
+import time
+import random
+import shutil
+import tempfile
+import subprocess
+
+import bernutils.lzw
+import bernutils.webutils
+
+nfiles  = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+nepochs = int(sys.argv[2]) if len(sys.argv) > 2 else 2880
+
+def make_rinex(seed, nepochs):
+  ''' A (synthetic) 30-sec RINEX v2.11 observation file '''
+  rnd   = random.Random(seed)
+  sats  = [ 'G%02i' %i for i in rnd.sample(range(1, 33), 10) ]
+  lines = ['     2.11           OBSERVATION DATA    G (GPS)             RINEX VERSION / TYPE\n',
+           'NTUA                                                        MARKER NAME         \n',
+           '     5    L1    L2    C1    P2    S1                        # / TYPES OF OBSERV \n',
+           '                                                            END OF HEADER       \n']
+  obs   = [ rnd.uniform(-3e7, 3e7) for i in range(5*len(sats)) ]
+  for e in range(nepochs):
+    h, m, s = e//120, (e//2)%60, (e%2)*30
+    lines.append(' 15  1  1 %2i %2i %10.7f  0 %2i%s\n' %(h, m, s, len(sats), ''.join(sats)))
+    for i in range(len(sats)):
+      for j in range(5):
+        obs[5*i+j] += rnd.uniform(-2e3, 2e3)
+      lines.append(''.join([ '%14.3f %1i' %(x, rnd.randint(5,9)) for x in obs[5*i:5*i+5] ]) + '\n')
+  return ''.join(lines)
+
+def shell_uncompress(inputf, outputf):
+  ''' The (old) subprocess path of webutils.UnixUncompress '''
+  p = subprocess.Popen('uncompress -f -c %s > %s'%(inputf, outputf), shell=True,
+          stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+  p.communicate()
+  if p.returncode:
+    raise ValueError('ERROR. Cannot uncompress file: %s'%inputf)
+
+tmpdir = tempfile.mkdtemp()
+try:
+  print 'Creating %i RINEX files (%i epochs each) in %s' %(nfiles, nepochs, tmpdir)
+  files = []
+  raw   = 0
+  for i in range(nfiles):
+    data = make_rinex(i, nepochs)
+    raw += len(data)
+    fn = os.path.join(tmpdir, 'stat%03i0.15o.Z' %i)
+    with open(fn, 'wb') as fout:
+      fout.write(bernutils.lzw.compress(data))
+    files.append(fn)
+  print 'Uncompressed size: %.1f MB' %(raw/1e6)
+
+  results = []
+  if subprocess.call('which uncompress > /dev/null', shell=True) == 0:
+    start = time.time()
+    for fn in files:
+      shell_uncompress(fn, fn[:-2] + '.sh')
+    results.append(['uncompress (subprocess)', time.time() - start])
+  else:
+    print 'No uncompress executable found; skipping the subprocess path'
+
+  start = time.time()
+  for fn in files:
+    bernutils.webutils.UnixUncompress(fn, fn[:-2] + '.wu')
+  results.append(['webutils.UnixUncompress', time.time() - start])
+
+  start = time.time()
+  for fn in files:
+    bernutils.lzw.decompressFile(fn, fn[:-2] + '.py')
+  results.append(['lzw.decompressFile', time.time() - start])
+
+  start = time.time()
+  nlines = 0
+  for fn in files:
+    with bernutils.lzw.open(fn) as fin:
+      for line in fin:
+        nlines += 1
+  results.append(['lzw.open (no temp file)', time.time() - start])
+
+  for fn in files:
+    with open(fn[:-2] + '.py', 'rb') as f1:
+      ref = f1.read()
+    for ext in ('.sh', '.wu'):
+      if os.path.isfile(fn[:-2] + ext):
+        with open(fn[:-2] + ext, 'rb') as f2:
+          if f2.read() != ref: print 'Mismatch for file %s' %fn
+    if ref != make_rinex(files.index(fn), nepochs):
+      print 'Mismatch for file %s' %fn
+
+  for name, secs in results:
+    print '%-28s %8.2f sec %8.1f MB/sec %8.2f ms/file' %(name, secs, raw/1e6/secs, secs*1e3/nfiles)
+finally:
+  shutil.rmtree(tmpdir)
@@ -0,0 +1,91 @@
+#! /usr/bin/python
+
+##  Benchmark: reading a (synthetic) 15-min, multi-GNSS daily SP3-d file, plain,
+##+ UNIX-compressed (.Z) and gzip-compressed (.gz), via a line-by-line split
+##+ parser vs bernutils.products.pysp3.Sp3File (bulk fixed-width parsing).
+##
+##  usage: bench_sp3.py [NUM_EPOCHS [NUM_REPEATS]]   (default: 96 epochs, 5 repeats)
+
+import sys
+import os
+import gzip
+import math
+import time
+import shutil
+import tempfile
+
+import bernutils.lzw
+import bernutils.products.pysp3
+
+nepochs = int(sys.argv[1]) if len(sys.argv) > 1 else 96
+repeats = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+
+SATS = [ 'G%02i' %i for i in range(1, 33) ] + [ 'R%02i' %i for i in range(1, 25) ] \
+  + [ 'E%02i' %i for i in range(1, 31) ] + [ 'C%02i' %i for i in range(1, 36) ]
+
+def make_sp3(nepochs):
+  ''' A (synthetic) 15-min SP3-d file '''
+  nl    = max(5, (len(SATS) + 16) // 17)
+  sats  = SATS + ['  0'] * (17*nl - len(SATS))
+  lines = ['#dP2015  1  1  0  0  0.00000000 %7i ORBIT IGb08 HLM  IGS' %nepochs,
+           '## 1826      0.00000000   900.00000000 57023 0.0000000000000']
+  for i in range(nl):
+    lines.append(('+  %3i   ' %len(SATS) if not i else '+        ') + ''.join(sats[17*i:17*i+17]))
+  for i in range(nl):
+    lines.append('++       ' + ''.join([ '  2' ] * 17))
+  lines += ['%c M  cc GPS ccc cccc cccc cccc cccc ccccc ccccc ccccc ccccc',
+            '%c cc cc ccc ccc cccc cccc cccc cccc ccccc ccccc ccccc ccccc',
+            '%f  1.2500000  1.025000000  0.00000000000  0.000000000000000',
+            '%f  0.0000000  0.000000000  0.00000000000  0.000000000000000',
+            '%i    0    0    0    0      0      0      0      0         0',
+            '%i    0    0    0    0      0      0      0      0         0',
+            '/* synthetic sp3 file']
+  for e in range(nepochs):
+    h, m = e*15 // 60, e*15 % 60
+    lines.append('*  2015  1  1 %2i %2i  0.00000000' %(h, m))
+    for k, sv in enumerate(SATS):
+      a = 2*math.pi*e/48e0 + k
+      lines.append('P%s%14.6f%14.6f%14.6f%14.6f  5  5  5 107' %(sv, 26560e0*math.cos(a), 26560e0*math.sin(a), 1e3*k, 1e2+k*1e-3))
+  lines.append('EOF')
+  return '\n'.join(lines) + '\n'
+
+def split_parse(filen):
+  ''' A line-by-line (split) parser, for comparisson '''
+  records = {}
+  with open(filen, 'r') as fin:
+    for line in fin:
+      if line[0] == '*':
+        epoch = [ float(x) for x in line[1:].split() ]
+      elif line[0] == 'P':
+        l = line.split()
+        records.setdefault(l[0][1:], []).append([ float(x) for x in l[1:5] ])
+  return records
+
+tmpdir = tempfile.mkdtemp()
+try:
+  data  = make_sp3(nepochs)
+  plain = os.path.join(tmpdir, 'igs18260.sp3')
+  with open(plain, 'wb') as fout:
+    fout.write(data)
+  with open(plain + '.Z', 'wb') as fout:
+    fout.write(bernutils.lzw.compress(data))
+  fout = gzip.open(plain + '.gz', 'wb')
+  fout.write(data)
+  fout.close()
+  print 'SP3 file: %i epochs, %i satellites, %.1f MB' %(nepochs, len(SATS), len(data)/1e6)
+
+  results = []
+  start = time.time()
+  for i in range(repeats): split_parse(plain)
+  results.append(['line split (plain)', (time.time() - start) / repeats])
+  for fn, descr in ((plain, 'plain'), (plain + '.Z', '.Z'), (plain + '.gz', '.gz')):
+    start = time.time()
+    for i in range(repeats): sp3 = bernutils.products.pysp3.Sp3File(fn)
+    results.append(['Sp3File (%s)' %descr, (time.time() - start) / repeats])
+    if sp3.data.shape != (nepochs, len(SATS), 4):
+      print 'Mismatch for file %s' %fn
+
+  for name, secs in results:
+    print '%-28s %8.3f sec/file' %(name, secs)
+finally:
+  shutil.rmtree(tmpdir)
@@ -0,0 +1,91 @@
+#! /usr/bin/python
+
+##  Benchmark: interpolating satellite positions from (synthetic) 15-min sp3
+##+ files, via a per-epoch, per-satellite Lagrange loop vs the (vectorized,
+##+ cached) bernutils.products.pysp3_itp.Sp3Interpolator.
+##
+##  usage: bench_sp3_itp.py [NUM_EPOCHS [ORDER]]   (default: 2880 epochs, i.e.
+##         30-sec over one day, order 9)
+
+import sys
+import os
+import math
+import time
+import shutil
+import tempfile
+import numpy
+
+import bernutils.products.pysp3
+import bernutils.products.pysp3_itp
+
+nepochs = int(sys.argv[1]) if len(sys.argv) > 1 else 2880
+order   = int(sys.argv[2]) if len(sys.argv) > 2 else 9
+
+SATS = [ 'G%02i' %i for i in range(1, 33) ] + [ 'R%02i' %i for i in range(1, 25) ]
+
+def orbit(k, t):
+  ''' A (synthetic) circular orbit '''
+  a = 2*math.pi*t/43082e0 + k
+  return 26560e0*math.cos(a), 26560e0*math.sin(a)*math.cos(.96), 26560e0*math.sin(a)*math.sin(.96)
+
+def make_sp3(filen):
+  ''' A (synthetic) 15-min, daily SP3-c file '''
+  lines = ['#cP2015  1  1  0  0  0.00000000      97 ORBIT IGb08 HLM  IGS',
+           '## 1826      0.00000000   900.00000000 57023 0.0000000000000']
+  sats  = SATS + ['  0'] * (85 - len(SATS))
+  for i in range(5):
+    lines.append(('+   %2i   ' %len(SATS) if not i else '+        ') + ''.join(sats[17*i:17*i+17]))
+  for i in range(5):
+    lines.append('++       ' + ''.join([ '  2' ] * 17))
+  lines += ['%c M  cc GPS ccc cccc cccc cccc cccc ccccc ccccc ccccc ccccc',
+            '%f  1.2500000  1.025000000  0.00000000000  0.000000000000000']
+  for e in range(97):
+    lines.append('*  2015  1  %1i %2i %2i  0.00000000' %(1 + e // 96, (e*15 // 60) % 24, e*15 % 60))
+    for k, sv in enumerate(SATS):
+      lines.append('P%s%14.6f%14.6f%14.6f%14.6f' %((sv,) + orbit(k, e*900e0) + (1e2,)))
+  lines.append('EOF')
+  with open(filen, 'w') as fout:
+    fout.write('\n'.join(lines) + '\n')
+
+def lagrange(nodes, values, t, order):
+  ''' Per-epoch Lagrange interpolation, for comparisson '''
+  i = min(max(numpy.searchsorted(nodes, t) - (order + 1) // 2, 0), len(nodes) - order - 1)
+  x = nodes[i:i+order+1]
+  p = 0e0
+  for j in range(order + 1):
+    l = 1e0
+    for m in range(order + 1):
+      if m != j: l *= (t - x[m]) / (x[j] - x[m])
+    p += l * values[i+j]
+  return p
+
+tmpdir = tempfile.mkdtemp()
+try:
+  filen = os.path.join(tmpdir, 'igs18260.sp3')
+  make_sp3(filen)
+  sp3   = bernutils.products.pysp3.Sp3File(filen)
+  nodes = numpy.arange(97) * 900e0
+  secs  = numpy.linspace(0e0, 86400e0, nepochs, endpoint=False)
+  epoch = numpy.datetime64('2015-01-01T00:00', 'us') + (secs*1e6).astype('timedelta64[us]')
+  print '%i epochs x %i satellites, order %i' %(nepochs, len(SATS), order)
+
+  ## the loop is slow; only run it for every 10th epoch (and scale the time)
+  start = time.time()
+  loop  = numpy.array([ [ [ lagrange(nodes, sp3.data[:, k, c], t, order) for c in range(3) ] for k in range(len(SATS)) ] for t in secs[::10] ])
+  t_loop = (time.time() - start) * len(secs) / len(secs[::10])
+
+  itp   = bernutils.products.pysp3_itp.Sp3Interpolator(sp3, order)
+  start = time.time()
+  vect  = itp.position(epoch)
+  t_first = time.time() - start
+  start = time.time()
+  vect  = itp.position(epoch)
+  t_cached = time.time() - start
+
+  ref = numpy.array([ [ orbit(k, t) for k in range(len(SATS)) ] for t in secs ])
+  print 'max difference loop/vectorized: %.3e m' %(abs(loop - vect[::10]).max()*1e3)
+  print 'max error vs the true orbit   : %.3e m' %(abs(ref - vect).max()*1e3)
+  for name, secs in (('Lagrange loop (scaled)', t_loop), ('Sp3Interpolator (1st call)', t_first), ('Sp3Interpolator (cached)', t_cached)):
+    print '%-28s %8.3f sec' %(name, secs)
+finally:
+  shutil.rmtree(tmpdir)
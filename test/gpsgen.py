@@ -0,0 +1,133 @@
+#! /usr/bin/python
+
+##  A generator of (synthetic) GPSEST output files, used by the GPSEST tests.
+##+ Only the parts read by bernutils.bgps are written: the header, a table of
+##+ contents (repeating the section titles), the observation file tables of
+##+ '2. OBSERVATION FILES', the station list of '4. STATIONS' and the
+##+ coordinate table of '13. RESULTS (PART 1)'.
+##
+##  usage: gpsgen.py OUTPUT [NUM_STATIONS [NUM_BASELINES]]   (default: 60 stations, 250 baselines)
+
+import sys
+import random
+
+RULE = ' ' + '-'*131
+
+SECTIONS = ['1. INPUT AND OUTPUT FILENAMES', '2. OBSERVATION FILES', '3. GENERAL OPTIONS',
+  '4. STATIONS', '5. SATELLITES', '13. RESULTS (PART 1)', '14. RESULTS (PART 2)']
+
+def columns(*fields):
+  ''' Build a line from ``(column, text)`` pairs. '''
+  line = ''
+  for col, text in fields:
+    line = line.ljust(col) + text
+  return line
+
+def station_list(n=60, seed=0):
+  ''' A list of ``n`` (random) stations; every station is a dictionary holding
+      its ``name``, a-priori ``xyz`` and ``llh``, ``xyz`` and ``neu``
+      corrections and rms values. All values are rounded as they are written.
+  '''
+  rnd = random.Random(seed)
+  stations = []
+  for i in range(n):
+    sta = {'name': 'S%03i %05iM%03i' %(i, 12600 + i, rnd.randint(1, 9)),
+      'xyz': (round(rnd.uniform(4.2e6, 4.8e6), 5), round(rnd.uniform(1.8e6, 2.6e6), 5), round(rnd.uniform(3.6e6, 4.2e6), 5)),
+      'llh': (round(rnd.uniform(34, 42), 7), round(rnd.uniform(19, 30), 7), round(rnd.uniform(0, 2000), 5)),
+      'xyz_cor': tuple([ round(rnd.gauss(0, .004), 5) for c in range(3) ]),
+      'xyz_rms': tuple([ round(rnd.uniform(.0005, .003), 5) for c in range(3) ]),
+      'neu_cor': tuple([ round(rnd.gauss(0, .004), 5) for c in range(3) ]),
+      'neu_rms': tuple([ round(rnd.uniform(.0005, .003), 5) for c in range(3) ])}
+    sta['xyz_est'] = tuple([ round(a + c, 5) for a, c in zip(sta['xyz'], sta['xyz_cor']) ])
+    stations.append(sta)
+  return stations
+
+def baseline_list(stations, n=250, seed=0):
+  ''' A list of ``n`` baselines, as ``(name, station1, station2, epochs)``. '''
+  rnd = random.Random(seed)
+  out = []
+  for i in range(n):
+    j = (i * 7 + 1 + i // len(stations)) % len(stations)
+    k = i % len(stations)
+    if j == k: j = (j + 1) % len(stations)
+    s1, s2 = stations[k]['name'], stations[j]['name']
+    out.append(('%s%s1190' %(s1[0:4], s2[0:4]), s1, s2, rnd.randint(100, 2880)))
+  return out
+
+def make_gpsest(stations, baselines, session='1190', year=2015, toc=True):
+  ''' Return the contents of a (synthetic) GPSEST output file, for the
+      ``stations`` of :func:`station_list` and the ``baselines`` of
+      :func:`baseline_list`.
+  '''
+  lines = ['', ' ' + '='*131, ' Bernese GNSS Software, Version 5.2', RULE,
+    ' Program        : GPSEST', ' Purpose        : Parameter estimation', RULE,
+    ' Campaign       : ${P}/LAVMO', ' Default session: %s year %i' %(session, year),
+    ' Date           : 15-Jun-2015 15:16:49', ' User name      : xanthos', ' ' + '='*131, '', '']
+
+  if toc:
+    lines += [' TABLE OF CONTENTS', ' -----------------', '']
+    lines += [ ' %s' %s for s in SECTIONS ]
+    lines += ['', '']
+
+  lines += [RULE, ' INPUT AND OUTPUT FILENAMES', RULE, '',
+    ' Station coordinates          : ${P}/LAVMO/STA/APR151190.CRD', '', '']
+
+  lines += [' 2. OBSERVATION FILES', ' --------------------', '', ' MAIN CHARACTERISTICS:', ' --------------------', '',
+    ' Observation file headers and observation files of all baselines:', ' (sessions and receivers as read from the headers)', '', RULE,
+    ' FILE  OBSERVATION FILE HEADER          OBSERVATION FILE                  SESS     RECEIVER 1            RECEIVER 2',
+    RULE, '']
+  for i, (name, s1, s2, epochs) in enumerate(baselines):
+    lines.append('%5i  %-32s %-32s  %4s     %-20s  %-20s' %(i + 1, '${P}/LAVMO/OBS/%s.PZH' %name,
+      '${P}/LAVMO/OBS/%s.PZO' %name, session, 'TRIMBLE NETR9', 'LEICA GRX1200GGPRO'))
+  lines += ['', '',
+    ' FILE TYP FREQ.  STATION 1        STATION 2        SESS  FIRST OBSERV.TIME  #EPO  DT #EF #CLK ARC #SAT  W 12    #AMB  L1  L2  L5  RM',
+    RULE, '']
+  for i, (name, s1, s2, epochs) in enumerate(baselines):
+    lines.append(columns((0, '%5i' %(i + 1)), (6, 'PHS'), (10, 'L3'), (17, s1), (34, s2), (51, session),
+      (57, '15-04-29 00:00:00'), (77, '%4i' %epochs), (83, '30   1    1   1  32  N  1     0   0   0   0')))
+  lines += ['', '']
+
+  lines += [' 3. GENERAL OPTIONS', ' ------------------', '', ' Elevation cut-off angle: 3 degrees', '', '']
+
+  lines += [' 4. STATIONS', ' -----------', '', ' Station coordinates:   ${P}/LAVMO/STA/APR151190.CRD', '',
+    ' Local geodetic datum:   IGb08', '', ' Ellipsoid:              GRS80', '',
+    ' Coordinate estimation:  ESTIM = estimated, FIXED = fixed', '', '', '', RULE,
+    '                                                      A priori station coordinates                 A priori station coordinates',
+    '                                                                IGb08                          Ellipsoidal in local geodetic datum',
+    RULE,
+    ' num  Station name     obs e/f/h        X (m)           Y (m)           Z (m)        Latitude       Longitude    Height (m)',
+    RULE]
+  for i, sta in enumerate(stations):
+    lines.append(columns((0, '%5i' %(i + 1)), (6, sta['name']), (23, 'Y'), (27, 'ESTIM'),
+      (34, '%16.5f' %sta['xyz'][0]), (50, '%16.5f' %sta['xyz'][1]), (66, '%17.5f' %sta['xyz'][2]),
+      (83, ' %14.7f %14.7f %11.5f' %sta['llh'])))
+  lines += ['', '']
+
+  lines += [' 5. SATELLITES', ' -------------', '', ' Satellite system: GPS', '', '']
+
+  lines += [' 13. RESULTS (PART 1)', ' --------------------', '', ' Station coordinates:', '',
+    ' NUM  STATION NAME     PARAMETER    A PRIORI VALUE       NEW VALUE     NEW- A PRIORI  RMS ERROR   3-D ELLIPSOID       2-D ELLIPSE',
+    RULE, '']
+  for i, sta in enumerate(stations):
+    for c, comp in enumerate('XYZ'):
+      lines.append(columns((0, '%5i' %(i + 1)), (6, sta['name'] if not c else ''), (23, comp),
+        (36, '%15.5f' %sta['xyz'][c]), (55, '%15.5f' %sta['xyz_est'][c]), (71, '%11.5f' %sta['xyz_cor'][c]),
+        (85, '%.5f' %sta['xyz_rms'][c])))
+    lines.append('')
+    for c, comp in enumerate(('HEIGHT', 'LATITUDE', 'LONGITUDE')):
+      value = sta['llh'][(2, 0, 1)[c]]
+      cor, rms = sta['neu_cor'][(2, 0, 1)[c]], sta['neu_rms'][(2, 0, 1)[c]]
+      lines.append(columns((23, comp), (36, '%15.7f' %value), (55, '%15.7f' %value), (71, '%11.5f' %cor),
+        (85, '%10.5f' %rms), (97, '%10.5f  %5.1f' %(rms, 12.3))))
+    lines.append('')
+  lines += ['', ' 14. RESULTS (PART 2)', ' --------------------', '', '',
+    ' >>> CPU/Real time for pgm "GPSEST": 0:00:12.345 / 0:00:13.012']
+  return '\n'.join(lines) + '\n'
+
+if __name__ == '__main__':
+  if len(sys.argv) < 2:
+    print >> sys.stderr, 'usage: gpsgen.py OUTPUT [NUM_STATIONS [NUM_BASELINES]]'
+    sys.exit(1)
+  stations = station_list(int(sys.argv[2]) if len(sys.argv) > 2 else 60)
+  with open(sys.argv[1], 'w') as fout:
+    fout.write(make_gpsest(stations, baseline_list(stations, int(sys.argv[3]) if len(sys.argv) > 3 else 250)))
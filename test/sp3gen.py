@@ -0,0 +1,78 @@
+#! /usr/bin/python
+
+##  A generator of (synthetic) sp3 files, used by the sp3 tests. Satellites
+##+ follow circular orbits (see orbit), so interpolated positions can be
+##+ checked against the truth.
+##
+##  usage: sp3gen.py OUTPUT [NUM_EPOCHS]   (default: 96 epochs, 15-min, GPS+GLONASS)
+
+import sys
+import math
+import datetime
+
+GPS_EPOCH = datetime.datetime(1980, 1, 6)
+MJD_EPOCH = datetime.datetime(1858, 11, 17)
+
+SATS = [ 'G%02i' %i for i in range(1, 33) ] + [ 'R%02i' %i for i in range(1, 25) ]
+
+def orbit(sv, t):
+  ''' The (synthetic) position (km) of satellite ``sv`` at ``t`` (a
+      ``datetime``), on a circular orbit of ~12 h.
+  '''
+  k = (ord(sv[0]) - 70) * 40 + int(sv[1:])
+  s = (t - GPS_EPOCH).total_seconds()
+  a = 2*math.pi*s/43082e0 + k
+  return 26560e0*math.cos(a), 26560e0*math.sin(a)*math.cos(.96), 26560e0*math.sin(a)*math.sin(.96)
+
+def clock(sv, t):
+  ''' The (synthetic) clock (microsec) of satellite ``sv`` at ``t``; a linear
+      drift (from 2015-01-01).
+  '''
+  return 1e2 + int(sv[1:]) + (t - datetime.datetime(2015, 1, 1)).total_seconds() * 1e-5
+
+def make_sp3(start=datetime.datetime(2015, 1, 1), nepochs=96, interval=900, sats=SATS,
+  version='c', agency='IGS', velocities=False, missing=(), comment='synthetic sp3 file'):
+  ''' Return the contents of a (synthetic) sp3 file.
+
+      :param missing: A list of ``(epoch index, satellite)`` pairs, to write
+                      as absent (zero position and bad clock).
+  '''
+  nl    = max(5, (len(sats) + 16) // 17)
+  padded = list(sats) + ['  0'] * (17*nl - len(sats))
+  gps   = start - GPS_EPOCH
+  mjd   = start - MJD_EPOCH
+  systems = set([ sv[0] for sv in sats ])
+  lines = ['#%s%s%4i %2i %2i %2i %2i %11.8f %7i ORBIT IGb08 HLM  %s' %(version, 'V' if velocities else 'P',
+             start.year, start.month, start.day, start.hour, start.minute, start.second, nepochs, agency),
+           '## %4i %15.8f %14.8f %5i %15.13f' %(gps.days // 7, (gps.days % 7)*86400 + gps.seconds, interval,
+             mjd.days, mjd.seconds / 86400e0)]
+  for i in range(nl):
+    lines.append(('+  %3i   ' %len(sats) if not i else '+        ') + ''.join(padded[17*i:17*i+17]))
+  for i in range(nl):
+    lines.append('++       ' + ''.join([ '  2' ] * 17))
+  lines += ['%%c %-2s cc GPS ccc cccc cccc cccc cccc ccccc ccccc ccccc ccccc' %(systems.pop() if len(systems) == 1 else 'M'),
+            '%c cc cc ccc ccc cccc cccc cccc cccc ccccc ccccc ccccc ccccc',
+            '%f  1.2500000  1.025000000  0.00000000000  0.000000000000000',
+            '%f  0.0000000  0.000000000  0.00000000000  0.000000000000000',
+            '%i    0    0    0    0      0      0      0      0         0',
+            '%i    0    0    0    0      0      0      0      0         0',
+            '/* %s' %comment]
+  for e in range(nepochs):
+    t = start + datetime.timedelta(seconds=e*interval)
+    lines.append('*  %4i %2i %2i %2i %2i %11.8f' %(t.year, t.month, t.day, t.hour, t.minute, t.second))
+    for sv in sats:
+      if (e, sv) in missing:
+        lines.append('P%s%14.6f%14.6f%14.6f%14.6f' %(sv, 0e0, 0e0, 0e0, 999999.999999))
+      else:
+        lines.append('P%s%14.6f%14.6f%14.6f%14.6f' %((sv,) + orbit(sv, t) + (clock(sv, t),)))
+      if velocities:
+        lines.append('V%s%14.6f%14.6f%14.6f%14.6f' %(sv, 1e0, 2e0, 3e0, 0e0))
+  lines.append('EOF')
+  return '\n'.join(lines) + '\n'
+
+if __name__ == '__main__':
+  if len(sys.argv) < 2:
+    print >> sys.stderr, 'usage: sp3gen.py OUTPUT [NUM_EPOCHS]'
+    sys.exit(1)
+  with open(sys.argv[1], 'w') as fout:
+    fout.write(make_sp3(nepochs=int(sys.argv[2]) if len(sys.argv) > 2 else 96))
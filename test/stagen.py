@@ -0,0 +1,116 @@
+#! /usr/bin/python
+
+##  A generator of (synthetic) Bernese .STA files, used by the .STA tests and
+##+ benchmarks (so that they do not need to download CODE.STA).
+##
+##  usage: stagen.py OUTPUT [NUM_STATIONS [SEED]]   (default: 400 stations, seed 0)
+
+import sys
+import random
+import datetime
+
+RECEIVERS = ['LEICA GRX1200GGPRO', 'TRIMBLE NETR9', 'SEPT POLARX4', 'JAVAD TRE_G3TH DELTA', 'TRIMBLE 4000SSE']
+ANTENNAS  = ['LEIAT504GG      LEIS', 'TRM59800.00     NONE', 'JAV_RINGANT_G3T NONE', 'TRM22020.00+GP  NONE']
+
+HEADER = '''SYNTHETIC STATION INFORMATION FILE                               01-JAN-16 00:00
+--------------------------------------------------------------------------------
+
+FORMAT VERSION: 1.01
+TECHNIQUE:      GNSS
+
+'''
+
+TYPE_HEADERS = {
+  1: ('TYPE 001: RENAMING OF STATIONS\n'
+      '------------------------------\n\n'
+      'STATION NAME          FLG          FROM                   TO         OLD STATION NAME      REMARK\n'
+      '****************      ***  YYYY MM DD HH MM SS  YYYY MM DD HH MM SS  ********************  ************************\n'),
+  2: ('TYPE 002: STATION INFORMATION\n'
+      '-----------------------------\n\n'
+      'STATION NAME          FLG          FROM                   TO         RECEIVER TYPE         RECEIVER SERIAL NBR   REC #   ANTENNA TYPE          ANTENNA SERIAL NBR    ANT #    NORTH      EAST      UP      DESCRIPTION             REMARK\n'
+      '****************      ***  YYYY MM DD HH MM SS  YYYY MM DD HH MM SS  ********************  ********************  ******  ********************  ********************  ******  ***.****  ***.****  ***.****  **********************  ************************\n'),
+  3: ('TYPE 003: HANDLING OF STATION PROBLEMS\n'
+      '--------------------------------------\n\n'
+      'STATION NAME          FLG          FROM                   TO         REMARK\n'
+      '****************      ***  YYYY MM DD HH MM SS  YYYY MM DD HH MM SS  ************************************************************\n'),
+  4: ('TYPE 004: STATION COORDINATES AND VELOCITIES (ADDNEQ)\n'
+      '-----------------------------------------------------\n'
+      '                                            RELATIVE CONSTR. POSITION     RELATIVE CONSTR. VELOCITY\n'
+      'STATION NAME 1        STATION NAME 2        NORTH     EAST      UP        NORTH     EAST      UP\n'
+      '****************      ****************      **.*****  **.*****  **.*****  **.*****  **.*****  **.*****\n'),
+  5: ('TYPE 005: HANDLING STATION TYPES\n'
+      '--------------------------------\n\n'
+      'STATION NAME          FLG  FROM                 TO                   MARKER TYPE           REMARK\n'
+      '****************      ***  YYYY MM DD HH MM SS  YYYY MM DD HH MM SS  ********************  ************************\n')
+}
+
+def sta_date(date):
+  ''' Format a date field (or blanks for an open end) '''
+  return date.strftime('%Y %m %d %H %M %S') if date is not None else ' '*19
+
+def station_names(count, seed=0):
+  ''' Return ``count`` (unique) station names, as (id, domes) tuples '''
+  rnd   = random.Random(seed)
+  names = set()
+  while len(names) < count:
+    sid = ''.join([ rnd.choice('ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789') for i in range(4) ])
+    if sid[0].isdigit() or sid in [ n[0] for n in names ]: continue
+    names.add((sid, '%05iM%03i' %(rnd.randint(10000, 99999), rnd.randint(1, 9))))
+  return sorted(names)
+
+def make_sta(count=400, seed=0):
+  ''' Return the contents of a (synthetic) .STA file with ``count`` stations.
+      Each station has one or two (renaming) Type 001 records, one to five
+      Type 002 records (back to back, some open ended), maybe a Type 003
+      record and a Type 005 record; a few stations are related by Type 004
+      records. A (wildcard) old station name, a flag 003 renaming and a
+      station without a marker number are always included.
+  '''
+  rnd   = random.Random(seed)
+  names = station_names(count, seed)
+  t1, t2, t3, t4, t5 = [], [], [], [], []
+  for k, (sid, domes) in enumerate(names):
+    name = '%s %s' %(sid, domes) if k % 50 else sid
+    if k % 7 == 3:
+      ## renamed (the marker number changed in 2010)
+      t1.append('%-16s      001  %19s  %19s  %-20s  %s' %(name, sta_date(None), sta_date(datetime.datetime(2009, 12, 31, 23, 59, 59)), sid + ' OLD', ''))
+      t1.append('%-16s      001  %19s  %19s  %-20s  %s' %(name, sta_date(datetime.datetime(2010, 1, 1)), sta_date(None), sid + '*', 'renamed'))
+    elif k % 11 == 5:
+      t1.append('%-16s      001  %19s  %19s  %-20s  %s' %(name, sta_date(datetime.datetime(1980, 1, 6)), sta_date(datetime.datetime(2099, 12, 31)), sid + '*', 'MGEX'))
+    else:
+      t1.append('%-16s      001  %19s  %19s  %-20s  %s' %(name, sta_date(None), sta_date(None), name, ''))
+    if k % 97 == 13:
+      t1.append('%-16s      003  %19s  %19s  %-20s  %s' %(sid + 'X', sta_date(None), sta_date(None), sid + 'X', 'EXTRA RENAMING'))
+
+    start = datetime.datetime(1995 + rnd.randint(0, 10), rnd.randint(1, 12), rnd.randint(1, 28))
+    nrec  = rnd.randint(1, 5)
+    for i in range(nrec):
+      stop = start + datetime.timedelta(days=rnd.randint(100, 1500), seconds=-1)
+      rec_start = start if i else (None if k % 3 == 0 else start)
+      rec_stop  = None if i == nrec - 1 and k % 2 == 0 else stop
+      t2.append('%-16s      001  %19s  %19s  %-20s  %-20s  %-6s  %-20s  %-20s  %-6s  %8.4f  %8.4f  %8.4f  %-22s  %s'
+        %(name, sta_date(rec_start), sta_date(rec_stop), rnd.choice(RECEIVERS), str(rnd.randint(1000, 9999)),
+          '999999', rnd.choice(ANTENNAS), str(rnd.randint(1000, 9999)), '999999',
+          0e0, 0e0, rnd.randint(0, 2000)*1e-4, 'Somewhere, XX', 'NEW'))
+      start = stop + datetime.timedelta(seconds=1)
+
+    if k % 5 == 1:
+      t3.append('%-16s      001  %19s  %19s  %s' %(name, sta_date(datetime.datetime(2004, 1, 1)), sta_date(datetime.datetime(2004, 1, 31, 23, 59, 59)), 'Receiver problems'))
+    if k % 40 == 2 and k > 0:
+      t4.append('%-16s      %-16s       0.00010   0.00010   0.00010   0.00001   0.00001   0.00001' %(name, names[k-1][0] + ' ' + names[k-1][1]))
+    t5.append('%-16s      001  %19s  %19s  %-20s  %s' %(name, sta_date(None), sta_date(None), 'GEODETIC', ''))
+
+  out = [HEADER]
+  for itype, recs in zip(range(1, 6), (t1, t2, t3, t4, t5)):
+    out.append(TYPE_HEADERS[itype])
+    out.append(''.join([ r + '\n' for r in recs ]))
+    out.append('\n\n')
+  return ''.join(out)
+
+if __name__ == '__main__':
+  if len(sys.argv) < 2:
+    print >> sys.stderr, 'usage: stagen.py OUTPUT [NUM_STATIONS [SEED]]'
+    sys.exit(1)
+  with open(sys.argv[1], 'w') as fout:
+    fout.write(make_sta(int(sys.argv[2]) if len(sys.argv) > 2 else 400,
+      int(sys.argv[3]) if len(sys.argv) > 3 else 0))
@@ -0,0 +1,268 @@
+#! /usr/bin/python
+
+##  Regression tests for bernutils.badnq, on (synthetic) ADDNEQ2 output files
+##+ made by test/adnqgen.py.
+##
+##  usage: python -m pytest test/test_badnq.py   (or python test/test_badnq.py)
+
+import os
+import shutil
+import datetime
+import tempfile
+import unittest
+import cStringIO
+
+import bernutils.badnq
+import bernutils.report
+from test.adnqgen import station_list, make_addneq
+
+class CountingOpen:
+  ''' Stand-in for the module's ``open``; counts the files opened '''
+  def __init__(self):
+    self.opened = []
+  def __call__(self, name, *args):
+    self.opened.append(name)
+    return open(name, *args)
+
+class AddneqTestCase(unittest.TestCase):
+
+  def setUp(self):
+    self.tmpdir   = tempfile.mkdtemp()
+    self.stations = station_list(30)
+    self.filen    = self.write('FFG120540.OUT', make_addneq(self.stations))
+
+  def tearDown(self):
+    shutil.rmtree(self.tmpdir)
+
+  def write(self, name, contents):
+    filen = os.path.join(self.tmpdir, name)
+    with open(filen, 'w') as fout:
+      fout.write(contents)
+    return filen
+
+class TestAddneqFile(AddneqTestCase):
+
+  def test_header(self):
+    adnq = bernutils.badnq.AddneqFile(self.filen)
+    self.assertEqual((adnq.campaign(), adnq.date(), adnq.session(), adnq.run_by()),
+      ('GREECE', datetime.datetime(2012, 2, 23), '0', 'bpe2'))
+    self.assertRaises(RuntimeError, bernutils.badnq.AddneqFile, os.path.join(self.tmpdir, 'NONE.OUT'))
+    bad = self.write('BAD.OUT', make_addneq(self.stations).replace('Version 5.2', 'Version 5.0'))
+    self.assertRaises(RuntimeError, bernutils.badnq.AddneqFile, bad)
+
+  def test_apriori_info(self):
+    constraints = [['Station coordinates', '0.00010', 'meters'], ['Troposphere', '5.00000', 'meters']]
+    adnq = bernutils.badnq.AddneqFile(self.write('C.OUT', make_addneq(self.stations, constraints=constraints)))
+    self.assertEqual(adnq.apriori_info(), (.001, 'IGb08', constraints))
+    ## a copy is returned
+    adnq.apriori_info()[2][0][1] = '1.0'
+    self.assertEqual(adnq.apriori_info()[2], constraints)
+
+  def test_nq_files(self):
+    nq = bernutils.badnq.AddneqFile(self.filen).get_nq_files()
+    self.assertEqual(sorted(nq), [1, 2, 3])
+    self.assertEqual(nq[2], ['${P}/GREECE/SOL/FFG0540002.NQ0', datetime.datetime(2012, 2, 23),
+      datetime.datetime(2012, 2, 24), 20369, 218, 20151])
+
+  def test_station_coordinates(self):
+    adnq = bernutils.badnq.AddneqFile(self.filen)
+    self.assertEqual(adnq.reference_epoch(), datetime.datetime(2012, 2, 23, 12))
+    crd = adnq.get_station_coordinates()
+    self.assertEqual(sorted(crd), sorted([ s['name'] for s in self.stations ]))
+    for sta in self.stations:
+      x, y, z, u, n, e = crd[sta['name']]
+      for i, c in enumerate((x, y, z)):
+        self.assertEqual(c, [sta['xyz'][i], sta['xyz_est'][i], sta['xyz_cor'][i], sta['xyz_rms'][i]])
+      self.assertEqual([ c[0] for c in (n, e, u) ], list(sta['llh']))
+      self.assertEqual([ c[2] for c in (n, e, u) ], list(sta['neu_cor']))
+      self.assertEqual([ c[3] for c in (n, e, u) ], list(sta['neu_rms']))
+      self.assertEqual((len(u), len(n), len(e)), (6, 8, 7))
+    ## a copy is returned
+    crd.clear()
+    self.assertEqual(len(adnq.get_station_coordinates()), len(self.stations))
+
+  def test_apriori_coordinates(self):
+    apr = bernutils.badnq.AddneqFile(self.filen).get_apriori_coordinates()
+    for i, sta in enumerate(self.stations):
+      self.assertEqual(apr[sta['name']], [i + 1, 'Y', sta['adj']] + list(sta['xyz']) + list(sta['llh']))
+
+  def test_single_scan(self):
+    ## after the header, the file is opened once for the section index and
+    ## once per parsed block (coordinates, a-priori info and a-priori
+    ## coordinates); repeated calls are memoized
+    counter = CountingOpen()
+    adnq = bernutils.badnq.AddneqFile(self.filen)
+    bernutils.badnq.open = counter
+    try:
+      for i in range(2):
+        adnq.get_station_coordinates()
+        adnq.reference_epoch()
+        adnq.apriori_info()
+        adnq.full_station_records()
+    finally:
+      del bernutils.badnq.open
+    self.assertEqual(len(counter.opened), 4)
+
+  def test_missing_sections(self):
+    ## only the look-alike coordinate blocks are left
+    contents = make_addneq(self.stations)
+    adnq = bernutils.badnq.AddneqFile(self.write('NOCRD.OUT', contents[:contents.index(' Reference epoch:')]))
+    self.assertRaises(RuntimeError, adnq.get_station_coordinates)
+    self.assertRaises(RuntimeError, adnq.reference_epoch)
+    adnq = bernutils.badnq.AddneqFile(self.write('NOAPR.OUT', contents.replace(' A PRIORI INFORMATION', ' A PRIORI INFO')))
+    self.assertRaises(RuntimeError, adnq.apriori_info)
+
+def old_warnings(mdict, format_str):
+  ''' The warning messages, as the per-station loop of (the old)
+      ``AddneqFile.warnings`` produced them.
+  '''
+  out = []
+  for sta, val in mdict.iteritems():
+    for frm in format_str.split(','):
+      func, limit = frm.split('=')
+      limit = float(limit)
+      if abs(bernutils.badnq.func_dict[func](val)) > limit:
+        func_name = bernutils.badnq.html_header_dict[func]
+        out.append('Station %s has %s = %.4f ; limit = %.4f' %(sta, func_name, bernutils.badnq.func_dict[func](val), limit))
+  return out
+
+class TestStationRecords(AddneqTestCase):
+
+  def test_slots(self):
+    rec = bernutils.badnq.AddneqFile(self.filen).full_station_records()[self.stations[0]['name']]
+    self.assertFalse(hasattr(rec, '__dict__'))
+    self.assertEqual(rec.xapr(), self.stations[0]['xyz'][0])
+    self.assertEqual(rec.zest(), self.stations[0]['xyz_est'][2])
+    self.assertEqual(rec.adjtp(), self.stations[0]['adj'])
+
+  def test_incompatible_records(self):
+    adnq = bernutils.badnq.AddneqFile(self.filen)
+    name = self.stations[3]['name']
+    apr, crd = adnq.get_apriori_coordinates()[name], adnq.get_station_coordinates()[name]
+    bernutils.badnq.FullStationRecord(name, apr + crd)
+    apr[4] += 1e-3
+    self.assertRaises(RuntimeError, bernutils.badnq.FullStationRecord, name, apr + crd)
+
+  def test_station_table(self):
+    mdict = bernutils.badnq.AddneqFile(self.filen).full_station_records()
+    table = bernutils.badnq.station_table(mdict)
+    self.assertEqual(table['station'].tolist(), list(mdict))
+    for i, rec in enumerate(mdict.values()):
+      self.assertEqual(table['adj'][i], rec.adjtp())
+      for field in bernutils.badnq.STATION_TABLE_FIELDS:
+        self.assertEqual(table[field][i], bernutils.badnq.func_dict[field](rec))
+    self.assertEqual(len(bernutils.badnq.station_table({})), 0)
+
+  def test_warnings(self):
+    ## same messages, in the same order, as the per-station loop
+    adnq  = bernutils.badnq.AddneqFile(self.filen)
+    mdict = adnq.full_station_records()
+    for format_str in ('dn=.002,de=.002,du=.003', 'xcor=.004,du=.001,yrms=.002', 'dn=1', 'hgtcor=.0'):
+      expected = old_warnings(mdict, format_str)
+      buf = cStringIO.StringIO()
+      writer = bernutils.report.TextReport(buf)
+      adnq.warnings(format_str, writer=writer)
+      writer.close()
+      self.assertEqual(buf.getvalue(), ''.join([ '[WARNING] %s\n' %w for w in expected ]))
+      buf = cStringIO.StringIO()
+      writer = bernutils.report.HtmlReport(buf)
+      adnq.warnings(format_str, mdict=mdict, writer=writer)
+      writer.close()
+      self.assertEqual(buf.getvalue().count('<strong>Warning!</strong>'), len(expected))
+      for w in expected:
+        self.assertTrue('<strong>Warning!</strong> %s.</div>' %w in buf.getvalue())
+    self.assertTrue(len(old_warnings(mdict, 'dn=.002,de=.002,du=.003')) > 5)
+
+class TestTimeSeries(AddneqTestCase):
+
+  def setUp(self):
+    AddneqTestCase.setUp(self)
+    self.store = os.path.join(self.tmpdir, 'ts.npz')
+    self.files = [ self.daily(i) for i in range(4) ]
+
+  def daily(self, day, stations=None, dirn=None):
+    date = datetime.date(2012, 2, 23) + datetime.timedelta(days=day)
+    name = 'FFG%02i%03i0.OUT' %(date.year % 100, date.timetuple().tm_yday)
+    if dirn is not None:
+      os.mkdir(os.path.join(self.tmpdir, dirn))
+      name = os.path.join(dirn, name)
+    return self.write(name, make_addneq(stations or self.stations, date=date))
+
+  def ingest(self, files=None, processes=1):
+    return bernutils.badnq.ingest_time_series(files or self.files, self.store, processes=processes)
+
+  def test_ingest(self):
+    ts, parsed, failed = self.ingest(processes=2)
+    self.assertEqual((parsed, failed), (self.files, []))
+    self.assertEqual(len(ts), 4 * len(self.stations))
+    self.assertEqual(ts.stations(), sorted([ s['name'] for s in self.stations ]))
+    sta = self.stations[7]
+    series = bernutils.badnq.read_time_series(self.store).station(sta['name'])
+    self.assertEqual(series['epoch'].tolist(), [ datetime.datetime(2012, 2, 23 + i, 12) for i in range(4) ])
+    self.assertEqual(series['dn'].tolist(), [ sta['neu_cor'][0] ] * 4)
+    self.assertEqual(series['zrms'].tolist(), [ sta['xyz_rms'][2] ] * 4)
+    self.assertEqual(series['file'].tolist(), range(4))
+    self.assertRaises(RuntimeError, ts.station, 'NONE')
+
+  def test_incremental(self):
+    self.ingest(self.files[0:2])
+    ts, parsed, failed = self.ingest()
+    self.assertEqual((parsed, failed), (self.files[2:], []))
+    self.assertEqual(len(ts), 4 * len(self.stations))
+    ## nothing to do
+    ts, parsed, failed = self.ingest()
+    self.assertEqual((parsed, failed, len(ts)), ([], [], 4 * len(self.stations)))
+    self.assertEqual(ts.source_files(), self.files)
+
+  def test_changed_file_replaces_records(self):
+    self.ingest()
+    self.daily(1, self.stations[0:5])
+    os.utime(self.files[1], (0, 0))
+    ts, parsed, failed = self.ingest()
+    self.assertEqual(parsed, [ self.files[1] ])
+    self.assertEqual(len(ts), 3 * len(self.stations) + 5)
+    self.assertEqual(len(ts.station(self.stations[9]['name'])['epoch']), 3)
+    self.assertEqual(ts.source_files(), self.files)
+    self.assertEqual(len(bernutils.badnq.read_time_series(self.store)), len(ts))
+
+  def test_failed_files(self):
+    bad  = self.write('BAD.OUT', 'not an ADDNEQ2 file\n' * 20)
+    gone = os.path.join(self.tmpdir, 'GONE.OUT')
+    ts, parsed, failed = self.ingest(self.files[0:2] + [gone, bad])
+    self.assertEqual(parsed, self.files[0:2])
+    self.assertEqual([ f[0] for f in failed ], [gone, bad])
+    self.assertEqual(ts.source_files(), self.files[0:2])
+    ## failed files are retried
+    self.assertEqual([ f[0] for f in self.ingest(self.files[0:2] + [gone, bad])[2] ], [gone, bad])
+
+  def test_file_removed_while_parsed(self):
+    parse = bernutils.badnq.__addneq_time_series__
+    def parse_and_remove(filen):
+      res = parse(filen)
+      if filen == self.files[2]: os.remove(filen)
+      return res
+    bernutils.badnq.__addneq_time_series__ = parse_and_remove
+    try:
+      ts, parsed, failed = self.ingest()
+    finally:
+      bernutils.badnq.__addneq_time_series__ = parse
+    self.assertEqual(parsed, [ self.files[i] for i in (0, 1, 3) ])
+    self.assertEqual([ f[0] for f in failed ], [ self.files[2] ])
+    self.assertEqual(len(ts), 3 * len(self.stations))
+
+  def test_long_path(self):
+    ## paths wider than any fixed-size field are stored in full, so the file
+    ## is not ingested again
+    filen = self.daily(0, dirn='D' * 250)
+    for i in range(3):
+      ts, parsed, failed = self.ingest([filen])
+      self.assertEqual(failed, [])
+    self.assertEqual(ts.source_files(), [filen])
+    self.assertEqual(len(ts), len(self.stations))
+
+  def test_empty_store(self):
+    ts = bernutils.badnq.read_time_series(self.store)
+    self.assertEqual((len(ts), ts.stations(), ts.source_files()), (0, [], []))
+
+if __name__ == '__main__':
+  unittest.main()
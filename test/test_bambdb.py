@@ -0,0 +1,93 @@
+#! /usr/bin/python
+
+##  Regression tests for bernutils.bambdb, on (daily copies of) the ambiguity
+##+ summary file of test/test_bamb.py.
+##
+##  usage: python -m pytest test/test_bambdb.py   (or python test/test_bambdb.py)
+
+import os
+import shutil
+import datetime
+import tempfile
+import unittest
+import numpy
+
+import bernutils.bambdb
+from test.test_bamb import SUM_FILE
+
+##  the pbnl, GPS record of AAAH resolves 100%; on odd days 50%
+AAAH_PBNL_G = '100.0 G    0.150  0.052'
+
+class TestAmbDatabase(unittest.TestCase):
+
+  def setUp(self):
+    self.tmpdir = tempfile.mkdtemp()
+    self.db     = bernutils.bambdb.AmbDatabase(os.path.join(self.tmpdir, 'amb.db'))
+    self.files  = [ self.write(doy) for doy in range(100, 104) ]
+
+  def tearDown(self):
+    self.db.close()
+    shutil.rmtree(self.tmpdir)
+
+  def write(self, doy):
+    fn = os.path.join(self.tmpdir, 'FFU15%03i0_GNSS.SUM' %doy)
+    with open(fn, 'w') as fout:
+      fout.write(SUM_FILE if doy % 2 == 0 else SUM_FILE.replace(AAAH_PBNL_G, AAAH_PBNL_G.replace('100.0', ' 50.0')))
+    return fn
+
+  def count(self):
+    return self.db.connection().execute('SELECT COUNT(*) FROM records').fetchone()[0]
+
+  def test_ingest(self):
+    self.assertTrue(AAAH_PBNL_G in SUM_FILE)
+    ingested, failed = self.db.ingest(self.files, processes=1)
+    self.assertEqual((len(ingested), failed), (4, []))
+    nrec = self.count()
+    ## 5 pbwl, 6 pbnl, 4 qif and 6 l12 records per file
+    self.assertEqual(nrec, 4*21)
+    ## unchanged files are skipped, changed files replace their records
+    self.assertEqual(self.db.ingest(self.files, processes=1), ([], []))
+    with open(self.files[0], 'a') as fout:
+      fout.write('\n')
+    os.utime(self.files[0], (0, 0))
+    self.assertEqual(self.db.ingest(self.files, processes=2)[0], [ self.files[0] ])
+    self.assertEqual(self.count(), nrec)
+    row = self.db.connection().execute('SELECT network, date FROM files WHERE path = ?', (self.files[1],)).fetchone()
+    self.assertEqual(row, ('FFU', '2015-04-11'))
+
+  def test_vanished_and_invalid_files(self):
+    bad = os.path.join(self.tmpdir, 'NONAME.SUM')
+    with open(bad, 'w') as fout:
+      fout.write(SUM_FILE)
+    gone = os.path.join(self.tmpdir, 'FFU151100_GNSS.SUM')
+    ingested, failed = self.db.ingest(self.files[0:2] + [gone, bad], processes=1)
+    self.assertEqual(ingested, self.files[0:2])
+    self.assertEqual([ f[0] for f in failed ], [gone, bad])
+
+  def test_daily_percent(self):
+    self.db.ingest(self.files, processes=1)
+    daily = self.db.daily_percent('AAAH')
+    ## one series per method and satellite system, never averaged together
+    self.assertEqual(sorted(daily), [ ('AAAH', m, s) for m in ('pbnl', 'pbwl') for s in ('G', 'GR', 'R') ])
+    dates, percent = daily[('AAAH', 'pbnl', 'G')]
+    self.assertEqual(dates.tolist(), [ datetime.date(2015, 4, 10) + datetime.timedelta(days=i) for i in range(4) ])
+    self.assertTrue(numpy.allclose(percent, [100, 50, 100, 50]))
+    self.assertTrue(numpy.allclose(daily[('AAAH', 'pbnl', 'R')][1], 74.5))
+    self.assertTrue(numpy.allclose(daily[('AAAH', 'pbnl', 'GR')][1], 87.2))
+    self.assertTrue(numpy.allclose(daily[('AAAH', 'pbwl', 'GR')][1], 88.3))
+    self.assertEqual(sorted(self.db.daily_percent('AAAH', 'pbnl', 'G')), [('AAAH', 'pbnl', 'G')])
+    self.assertEqual(self.db.daily_percent('AAAH', 'qif'), {})
+    self.assertEqual(len(self.db.daily_percent(satsys='R', start=datetime.date(2015, 4, 12))[('ANNI', 'qif', 'R')][0]), 2)
+
+  def test_rolling_mean(self):
+    self.db.ingest(self.files, processes=1)
+    dates, mean = self.db.rolling_mean_percent(2, 'AAAH', 'pbnl', 'G')[('AAAH', 'pbnl', 'G')]
+    self.assertTrue(numpy.allclose(mean, [100, 75, 75, 75]))
+    series = self.db.rolling_mean_percent(30, 'AAAH', 'pbnl')
+    self.assertEqual(len(series), 3)
+    self.assertTrue(numpy.allclose(series[('AAAH', 'pbnl', 'GR')][1], 87.2))
+    dates, mean = self.db.rolling_mean_percent(30, 'AAAH', satsys='G')[('AAAH', 'pbwl', 'G')]
+    self.assertTrue(numpy.allclose(mean, 100))
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,112 @@
+#! /usr/bin/python
+
+##  Regression tests for bernutils.bgps, on a (synthetic) GPSEST output file
+##+ made by test/gpsgen.py; the file has a table of contents (repeating the
+##+ section headers) and more than 200 baselines.
+##
+##  usage: python -m pytest test/test_bgps.py   (or python test/test_bgps.py)
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import bernutils.bgps
+from test.gpsgen import station_list, baseline_list, make_gpsest
+from test.test_badnq import CountingOpen
+
+class TestGpsestFile(unittest.TestCase):
+
+  def setUp(self):
+    self.tmpdir    = tempfile.mkdtemp()
+    self.stations  = station_list(60)
+    self.baselines = baseline_list(self.stations, 250)
+    self.filen     = self.write('FFG151190.OUT', make_gpsest(self.stations, self.baselines))
+
+  def tearDown(self):
+    shutil.rmtree(self.tmpdir)
+
+  def write(self, name, contents):
+    filen = os.path.join(self.tmpdir, name)
+    with open(filen, 'w') as fout:
+      fout.write(contents)
+    return filen
+
+  def test_header(self):
+    gout = bernutils.bgps.gpsoutfile(self.filen)
+    self.assertEqual(gout.getHeaderInfo(), ('LAVMO', '119', '0', '2015', '15-Jun-2015 15:16:49', 'xanthos'))
+    gout.close()
+
+  def test_sections(self):
+    ## every numbered header is found twice; in the table of contents and in
+    ## the body of the file
+    headers = [ h for o, h in bernutils.bgps.gpsoutfile(self.filen).sections() ]
+    self.assertEqual(headers.count('4. STATIONS'), 2)
+    self.assertEqual(headers.count('13. RESULTS (PART 1)'), 2)
+    self.assertEqual(headers.count('INPUT AND OUTPUT FILENAMES'), 1)
+    self.assertTrue(headers.index('INPUT AND OUTPUT FILENAMES') > headers.index('14. RESULTS (PART 2)'))
+
+  def test_baselines(self):
+    gout = bernutils.bgps.gpsoutfile(self.filen)
+    baselines = gout.getBaselineList()
+    self.assertEqual(len(baselines), 250)
+    self.assertEqual(baselines, [ [str(i + 1), name + '.', 'PHS', 'L3', s1, s2, '15-04-29 00:00:00', epochs]
+      for i, (name, s1, s2, epochs) in enumerate(self.baselines) ])
+    ## a copy is returned
+    baselines[0][1] = 'XXXX'
+    del baselines[1:]
+    self.assertEqual(len(gout.getBaselineList()), 250)
+    self.assertEqual(gout.getBaselineList()[0][1], self.baselines[0][0] + '.')
+    gout.close()
+
+  def test_invalid_session(self):
+    contents = make_gpsest(self.stations, self.baselines)
+    gout = bernutils.bgps.gpsoutfile(self.write('SES.OUT', contents.replace(' 1190     TRIMBLE', ' 1200     TRIMBLE', 1)))
+    self.assertRaises(RuntimeError, gout.getBaselineList)
+    gout.close()
+
+  def test_coordinates(self):
+    gout = bernutils.bgps.gpsoutfile(self.filen)
+    crd  = gout.getCrdSolInfo()
+    self.assertEqual(len(crd), 60)
+    for sta, info in zip(self.stations, crd):
+      expected = ['%-15s' %sta['name']]
+      for c in range(3):
+        expected += [sta['xyz'][c], sta['xyz_est'][c], sta['xyz_cor'][c], sta['xyz_rms'][c]]
+      for c in (2, 0, 1):
+        expected += [sta['neu_cor'][c], sta['neu_rms'][c]]
+      self.assertEqual(info, expected)
+    ## a copy is returned
+    crd[0][1] = 0e0
+    self.assertEqual(gout.getCrdSolInfo()[0][1], self.stations[0]['xyz'][0])
+    gout.close()
+
+  def test_single_stream(self):
+    ## one scan for the section index plus one input stream, whatever the
+    ## number of calls; no file access for memoized results
+    counter = CountingOpen()
+    gout = bernutils.bgps.gpsoutfile(self.filen)
+    bernutils.bgps.open = counter
+    try:
+      for i in range(3):
+        gout.getHeaderInfo()
+        gout.getBaselineList()
+        gout.getCrdSolInfo()
+      self.assertEqual(len(counter.opened), 2)
+      gout.close()
+      gout.getHeaderInfo()
+      gout.getBaselineList()
+      gout.getCrdSolInfo()
+    finally:
+      del bernutils.bgps.open
+    self.assertEqual(len(counter.opened), 2)
+
+  def test_missing_sections(self):
+    contents = make_gpsest(self.stations, self.baselines)
+    gout = bernutils.bgps.gpsoutfile(self.write('NOCRD.OUT', contents[:contents.index(' 13. RESULTS (PART 1)\n --')]))
+    self.assertRaises(RuntimeError, gout.getCrdSolInfo)
+    gout.close()
+    self.assertRaises(IOError, bernutils.bgps.gpsoutfile, os.path.join(self.tmpdir, 'NOFILE.OUT'))
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,156 @@
+#! /usr/bin/python
+
+##  Regression tests for bernutils.bsta, on a (synthetic) .STA file made by
+##+ test/stagen.py (no network access, no CODE.STA needed).
+##
+##  usage: python -m pytest test/test_bsta.py   (or python test/test_bsta.py)
+
+import os
+import random
+import fnmatch
+import shutil
+import datetime
+import tempfile
+import unittest
+
+import bernutils.bsta
+from test.stagen import make_sta
+
+class CountingFile(file):
+  ''' A file counting the times it is rewound (i.e. read from the start) '''
+  rewinds = 0
+  def seek(self, pos, whence=0):
+    if pos == 0 and whence == 0: self.rewinds += 1
+    return file.seek(self, pos, whence)
+
+class StaTestCase(unittest.TestCase):
+
+  def setUp(self):
+    self.tmpdir = tempfile.mkdtemp()
+    self.filen  = os.path.join(self.tmpdir, 'TEST.STA')
+    with open(self.filen, 'w') as fout:
+      fout.write(make_sta(200))
+
+  def tearDown(self):
+    shutil.rmtree(self.tmpdir)
+
+  def block_lines(self, itype):
+    ''' The (raw) records of a type, read independently of bernutils.bsta '''
+    with open(self.filen) as fin:
+      lines = fin.read().split('\n')
+    start = [ i for i, l in enumerate(lines) if l.startswith('TYPE %03i:' %itype) ][0] + 5
+    stop  = lines.index('', start)
+    return lines[start:stop]
+
+class TestStaIndex(StaTestCase):
+
+  def test_records(self):
+    idx = bernutils.bsta.StaFile(self.filen).index()
+    for itype in range(1, 6):
+      self.assertEqual([ str(r).rstrip() for r in idx.records[itype] ],
+        [ l.rstrip() for l in self.block_lines(itype) ])
+
+  def test_single_pass(self):
+    ## count from construction on (the module's open is shadowed)
+    bernutils.bsta.open = CountingFile
+    try:
+      sta = bernutils.bsta.StaFile(self.filen)
+    finally:
+      del bernutils.bsta.open
+    stream = sta._StaFile__stream
+    sta.index()
+    ## the type ranges are marked while indexing; no re-scan
+    ranges = [ sta.__type_range__(i) for i in range(1, 6) ]
+    self.assertEqual(stream.rewinds, 1)
+    for itype, (start, stop) in zip(range(1, 6), ranges):
+      stream.seek(start)
+      self.assertTrue(stream.readline().startswith('---'))
+      self.assertTrue(start < stop)
+
+  def test_type_range_from_cache(self):
+    first = bernutils.bsta.StaFile(self.filen, cache=True)
+    first.index()
+    ranges = [ first.__type_range__(i) for i in range(1, 6) ]
+    second = bernutils.bsta.StaFile(self.filen, cache=True)
+    idx = second.index()
+    self.assertEqual([ str(r) for r in idx.records[2] ], [ str(r) for r in first.index().records[2] ])
+    self.assertEqual([ second.__type_range__(i) for i in range(1, 6) ], ranges)
+
+  def test_invalid(self):
+    with open(self.filen, 'w') as fout:
+      fout.write(make_sta(10).replace('TYPE 002:', 'TYPE 00X:'))
+    sta = bernutils.bsta.StaFile(self.filen)
+    self.assertRaises(RuntimeError, sta.index)
+    self.assertRaises(RuntimeError, bernutils.bsta.StaFile, self.filen + '.nofile')
+
+  def test_resolve_sta_date(self):
+    for line in self.block_lines(1) + self.block_lines(2):
+      for col, default in [(27, bernutils.bsta.MIN_STA_DATE), (48, bernutils.bsta.MAX_STA_DATE)]:
+        t_str = line[col:col+19].strip()
+        expected = datetime.datetime.strptime(t_str, '%Y %m %d %H %M %S') if t_str else default
+        self.assertEqual(bernutils.bsta.resolve_sta_date(line, col, default), expected)
+    self.assertEqual(bernutils.bsta.resolve_sta_date(' '*27 + '2015  1  1  0  0  0', 27, None),
+      datetime.datetime(2015, 1, 1))
+    self.assertRaises(RuntimeError, bernutils.bsta.resolve_sta_date, ' '*27 + '2015 13 01 00 00 00', 27, None)
+
+class TestMatching(StaTestCase):
+  ''' The (indexed) matching vs a brute-force scan of the records '''
+
+  def setUp(self):
+    StaTestCase.setUp(self)
+    self.sta = bernutils.bsta.StaFile(self.filen)
+    self.t1  = [ bernutils.bsta.Type001(l) for l in self.block_lines(1) ]
+    self.t2  = [ bernutils.bsta.Type002(l) for l in self.block_lines(2) ]
+    self.stations = [ t.station_name() for t in self.t1 ][::3] \
+      + [ t.station_name()[0:4] + ' OLD' for t in self.t1 ][::5] + ['NONE', 'ZZZZ 00000M000']
+
+  def brute_type_001(self, stations):
+    result, claimed = {}, set()
+    for sta in stations:
+      if sta in result: continue
+      result[sta] = []
+      for t1 in self.t1:
+        if fnmatch.fnmatch(sta, t1.old_staname()) and t1.flag() != 3 and t1 not in claimed:
+          result[sta].append(t1)
+          claimed.add(t1)
+    return result
+
+  def test_type_001(self):
+    result = self.sta.__match_type_001__(self.stations)
+    expected = self.brute_type_001(self.stations)
+    self.assertEqual(sorted(result), sorted(expected))
+    for sta in expected:
+      self.assertEqual([ str(t) for t in result[sta] ], [ str(t) for t in expected[sta] ])
+
+  def test_type_002(self):
+    dictnr = self.sta.__match_type_001__(self.stations)
+    for no_marker_number in (False, True):
+      result = self.sta.__match_type_002__(dictnr, no_marker_number)
+      claimed = set()
+      for sta in dictnr:
+        expected = []
+        for tp1 in dictnr[sta]:
+          for k, t2 in enumerate(self.t2):
+            if t2.__match_t1__(tp1, no_marker_number) and k not in claimed:
+              expected.append((t2.start(), k))
+              claimed.add(k)
+        expected = [ str(self.t2[k]) for start, k in sorted(expected) ]
+        self.assertEqual([ str(t) for t in result[sta] ], expected)
+
+  def test_interval_index(self):
+    itv = self.sta.interval_index()
+    rnd = random.Random(1)
+    names  = sorted(set([ t.station_name() for t in self.t2 ]))
+    pairs  = [ (rnd.choice(names), datetime.datetime(1994, 1, 1) + datetime.timedelta(seconds=rnd.randint(0, 25*365*86400)))
+      for i in range(2000) ]
+    found  = itv.at_many([ p[0] for p in pairs ], [ p[1] for p in pairs ])
+    for (name, epoch), rec in zip(pairs, found):
+      valid = [ t for t in self.t2 if t.station_name() == name and t.start() <= epoch <= t.stop() ]
+      ## if more than one is valid, the one starting last
+      expected = max(valid, key=lambda t: t.start()) if valid else None
+      self.assertEqual(str(rec), str(expected))
+      self.assertEqual(str(itv.at(name, epoch)), str(expected))
+    self.assertEqual(itv.at('NONE', datetime.datetime(2015, 1, 1)), None)
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,114 @@
+#! /usr/bin/python
+
+##  Regression tests for bernutils.bcrd (CrdTable and the CRD merge API).
+##
+##  usage: python -m pytest test/test_crd.py   (or python test/test_crd.py)
+
+import os
+import shutil
+import tempfile
+import unittest
+import numpy
+
+import bernutils.bcrd
+
+HEADER = [ 'SYNTHETIC CRD FILE                                               01-JAN-15 00:00',
+  '--------------------------------------------------------------------------------',
+  'LOCAL GEODETIC DATUM: IGb08             EPOCH: 2015-01-01 00:00:00',
+  '',
+  'NUM  STATION NAME           X (M)          Y (M)          Z (M)     FLAG',
+  '' ]
+
+def make_table(points, header=HEADER):
+  ''' A CrdTable from a list of (name, number, x, y, z, flag) tuples '''
+  return bernutils.bcrd.CrdTable(numpy.array(points, dtype=bernutils.bcrd.CRD_DTYPE), list(header))
+
+class TestCrdTable(unittest.TestCase):
+
+  def setUp(self):
+    self.tmpdir = tempfile.mkdtemp()
+
+  def tearDown(self):
+    shutil.rmtree(self.tmpdir)
+
+  def test_write_read_roundtrip(self):
+    table = make_table([('ANKR', '20805M002', 4121948.51, 2652187.91, 4069023.79, 'A'),
+      ('DYNG', '12602M006', 4595220.05, 2039434.09, 3912625.94, 'W')])
+    fn = os.path.join(self.tmpdir, 'TEST.CRD')
+    table.write(fn)
+    back = bernutils.bcrd.CrdFile(fn).getTable()
+    self.assertEqual(back.header, HEADER)
+    self.assertEqual(back.data['name'].tolist(), ['ANKR', 'DYNG'])
+    self.assertEqual(back.data['number'].tolist(), ['20805M002', '12602M006'])
+    self.assertEqual(back.data['flag'].tolist(), ['A', 'W'])
+    numpy.testing.assert_allclose(back.data['x'], table.data['x'], atol=1e-5)
+    ## same points as the (legacy) point list
+    points = bernutils.bcrd.CrdFile(fn).getListOfPoints()
+    self.assertEqual([ p.name().rstrip() for p in points ], back.names().tolist())
+
+  def test_select(self):
+    table = make_table([('ANKR', '20805M002', 1., 2., 3., 'A'),
+      ('DYNG', '12602M006', 4., 5., 6., 'W'),
+      ('HARK', '', 7., 8., 9., 'A')])
+    self.assertEqual(table.select(['HARK']).data['name'].tolist(), ['HARK'])
+    self.assertEqual(table.select(['ANKR 99999M999'], disregard_number=True).data['name'].tolist(), ['ANKR'])
+    self.assertEqual(len(table.select(['ANKR 99999M999'])), 0)
+    self.assertEqual(table.select(flags=['A']).data['name'].tolist(), ['ANKR', 'HARK'])
+
+class TestMergeTables(unittest.TestCase):
+
+  def setUp(self):
+    self.update = make_table([('ANKR', '20805M002', 1., 1., 1., 'A'),
+      ('DYNG', '12602M006', 2., 2., 2., 'A'),
+      ('HARK', '', 3., 3., 3., 'A')])
+    self.reference = make_table([('DYNG', '12602M006', 20., 20., 20., 'W'),
+      ('HARK', '', 30., 30., 30., 'I'),
+      ('WTZR', '14201M010', 40., 40., 40., 'W')], HEADER[0:5] + ['REFERENCE'])
+
+  def test_matched(self):
+    table, matched = bernutils.bcrd.mergeTables(self.update, self.reference)
+    self.assertEqual(matched, 2)
+    self.assertEqual(table.header, self.reference.header)
+    self.assertEqual(table.data['x'].tolist(), [1., 20., 30.])
+    self.assertEqual(table.data['flag'].tolist(), ['A', 'W', 'I'])
+
+  def test_flags(self):
+    table, matched = bernutils.bcrd.mergeTables(self.update, self.reference, flags=['W'])
+    self.assertEqual(matched, 1)
+    self.assertEqual(table.data['x'].tolist(), [1., 20., 3.])
+
+  def test_include_delete_unmatched(self):
+    table, matched = bernutils.bcrd.mergeTables(self.update, self.reference, include_unmatched=True)
+    self.assertEqual(table.data['name'].tolist(), ['ANKR', 'DYNG', 'HARK', 'WTZR'])
+    table, matched = bernutils.bcrd.mergeTables(self.update, self.reference, delete_unmatched=True)
+    self.assertEqual(table.data['name'].tolist(), ['DYNG', 'HARK'])
+
+  def test_disregard_number(self):
+    update = make_table([('DYNG', '99999M999', 2., 2., 2., 'A')])
+    table, matched = bernutils.bcrd.mergeTables(update, self.reference)
+    self.assertEqual(matched, 0)
+    table, matched = bernutils.bcrd.mergeTables(update, self.reference, disregard_number=True)
+    self.assertEqual(matched, 1)
+    ## the matched point keeps its name and number
+    self.assertEqual(table.data['number'].tolist(), ['99999M999'])
+    self.assertEqual(table.data['x'].tolist(), [20.])
+
+  def test_empty_reference(self):
+    ## e.g. updatecrd.py -s with stations not in the reference file
+    empty = make_table([])
+    for flags in (None, ['W']):
+      table, matched = bernutils.bcrd.mergeTables(self.update, empty, flags=flags)
+      self.assertEqual(matched, 0)
+      self.assertEqual(table.data.tolist(), self.update.data.tolist())
+      table, matched = bernutils.bcrd.mergeTables(self.update, empty, flags=flags,
+        include_unmatched=True, delete_unmatched=True)
+      self.assertEqual(len(table), 0)
+
+  def test_empty_update(self):
+    table, matched = bernutils.bcrd.mergeTables(make_table([]), self.reference, flags=['W'],
+      include_unmatched=True)
+    self.assertEqual(matched, 0)
+    self.assertEqual(table.data['name'].tolist(), ['DYNG', 'HARK', 'WTZR'])
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,74 @@
+#! /usr/bin/python
+
+##  Regression tests for bernutils.geodesy; the array (*_vec) transformations
+##+ vs the scalar ones, on (seeded) random points.
+##
+##  usage: python -m pytest test/test_geodesy.py   (or python test/test_geodesy.py)
+
+import math
+import random
+import unittest
+import numpy
+
+import bernutils.geodesy
+
+def random_points(n, seed=0):
+  ''' ``n`` cartesian points, from the Earth's surface up to GNSS altitudes,
+      plus the poles and points on the equator.
+  '''
+  rnd = random.Random(seed)
+  pts = []
+  for i in range(n):
+    lon = rnd.uniform(-math.pi, math.pi)
+    lat = rnd.uniform(-math.pi/2, math.pi/2)
+    pts.append(bernutils.geodesy.ellipsoidal2cartesian(lon, lat, rnd.choice([rnd.uniform(-100, 9000), rnd.uniform(0, 2.6e7)])))
+  pts += [(0e0, 0e0, 6356752.3), (0e0, 0e0, -6356752.3), (6378137e0, 0e0, 0e0), (0e0, -6378137e0, 0e0)]
+  return numpy.array(pts)
+
+class TestVec(unittest.TestCase):
+
+  def setUp(self):
+    self.xyz = random_points(500)
+
+  def test_cartesian2ellipsoidal(self):
+    lon, lat, hgt = bernutils.geodesy.cartesian2ellipsoidal_vec(self.xyz[:, 0], self.xyz[:, 1], self.xyz[:, 2])
+    for i, (x, y, z) in enumerate(self.xyz.tolist()):
+      slon, slat, shgt = bernutils.geodesy.cartesian2ellipsoidal(x, y, z)
+      self.assertAlmostEqual(lon[i], slon, 12)
+      self.assertAlmostEqual(lat[i], slat, 12)
+      self.assertAlmostEqual(hgt[i], shgt, 6)
+    ## (N,3) in, (N,3) out; other ellipsoids
+    ell = bernutils.geodesy.getEllipsoid('WGS84')
+    stacked = bernutils.geodesy.cartesian2ellipsoidal_vec(self.xyz, ellipsoid=ell)
+    self.assertEqual(stacked.shape, self.xyz.shape)
+    self.assertAlmostEqual(stacked[7, 2], bernutils.geodesy.cartesian2ellipsoidal(*self.xyz[7], ellipsoid=ell)[2], 6)
+
+  def test_ellipsoidal2cartesian(self):
+    llh = bernutils.geodesy.cartesian2ellipsoidal_vec(self.xyz)
+    xyz = bernutils.geodesy.ellipsoidal2cartesian_vec(llh)
+    ## round trip; the (single) Halley step is exact near the surface, and
+    ## sub-mm (as the scalar version) at GNSS altitudes
+    near = llh[:, 2] < 1e4
+    self.assertTrue(numpy.abs(xyz - self.xyz)[near].max() < 1e-6)
+    self.assertTrue(numpy.abs(xyz - self.xyz).max() < 1e-3)
+    for i, (lon, lat, hgt) in enumerate(llh.tolist()):
+      self.assertTrue(numpy.allclose(xyz[i], bernutils.geodesy.ellipsoidal2cartesian(lon, lat, hgt), rtol=0, atol=1e-7))
+
+  def test_topocentric(self):
+    ref = self.xyz[3]
+    neu = bernutils.geodesy.cartesian2topocentric_vec(ref, self.xyz[10:20])
+    self.assertEqual(neu.shape, (10, 3))
+    pairs = bernutils.geodesy.cartesian2topocentric_vec(self.xyz[0:10, 0], self.xyz[0:10, 1], self.xyz[0:10, 2],
+      self.xyz[10:20, 0], self.xyz[10:20, 1], self.xyz[10:20, 2])
+    for i in range(10):
+      self.assertTrue(numpy.allclose(neu[i], bernutils.geodesy.cartesian2topocentric(*(tuple(ref) + tuple(self.xyz[10+i]))), rtol=0, atol=1e-6))
+      self.assertTrue(numpy.allclose([ c[i] for c in pairs ],
+        bernutils.geodesy.cartesian2topocentric(*(tuple(self.xyz[i]) + tuple(self.xyz[10+i]))), rtol=0, atol=1e-6))
+    azd = bernutils.geodesy.topocentric2azd_vec(neu)
+    for i in range(10):
+      self.assertTrue(numpy.allclose(azd[i], bernutils.geodesy.topocentric2azd(*neu[i]), rtol=0, atol=1e-9))
+    self.assertRaises(RuntimeError, bernutils.geodesy.topocentric2azd_vec, numpy.zeros((2, 3)))
+    self.assertRaises(RuntimeError, bernutils.geodesy.cartesian2ellipsoidal_vec, numpy.zeros((2, 2)))
+
+if __name__ == '__main__':
+  unittest.main()
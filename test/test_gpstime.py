@@ -0,0 +1,77 @@
+#! /usr/bin/python
+
+##  Regression tests for bernutils.gpstime; the array (*_vec) conversions vs
+##+ the scalar ones and the Python datetime module.
+##
+##  usage: python -m pytest test/test_gpstime.py   (or python test/test_gpstime.py)
+
+import random
+import datetime
+import unittest
+import numpy
+
+import bernutils.gpstime
+
+GPS_EPOCH = datetime.datetime(1980, 1, 6)
+
+def random_epochs(n, seed=0):
+  ''' ``n`` (year, doy, sec) tuples in 1901-2099, plus leap days and the gps epoch '''
+  rnd = random.Random(seed)
+  out = [ (rnd.randint(1901, 2099), rnd.randint(1, 365), rnd.randint(0, 86399) + rnd.choice([0, .5, .125]))
+    for i in range(n) ]
+  return out + [(2000, 366, 0), (2016, 60, 43200), (1980, 6, 0), (2099, 365, 86399)]
+
+def hms(sec):
+  ''' Split seconds of day to (hour, minute, seconds) '''
+  return int(sec // 3600), int(sec % 3600 // 60), sec % 60
+
+class TestVec(unittest.TestCase):
+
+  def setUp(self):
+    self.epochs = random_epochs(1000)
+    self.year, self.doy, self.sec = [ numpy.array(c) for c in zip(*self.epochs) ]
+
+  def test_ydoy2mjd(self):
+    mjd, fmjd = bernutils.gpstime.ydoy2mjd_vec(self.year, self.doy, self.sec)
+    for i, (y, d, s) in enumerate(self.epochs):
+      smjd, sfmjd = bernutils.gpstime.ydoy2mjd(y, d, *hms(s))
+      self.assertEqual(mjd[i], smjd)
+      self.assertAlmostEqual(fmjd[i], sfmjd, 12)
+    self.assertRaises(RuntimeError, bernutils.gpstime.ydoy2mjd_vec, [2015], [367])
+    self.assertRaises(RuntimeError, bernutils.gpstime.ydoy2mjd_vec, [2015], [1], [-1])
+
+  def test_mjd2ydoy(self):
+    mjd, fmjd = bernutils.gpstime.ydoy2mjd_vec(self.year, self.doy, self.sec)
+    year, doy, sec = bernutils.gpstime.mjd2ydoy_vec(mjd, fmjd)
+    self.assertTrue((year == self.year).all() and (doy == self.doy).all())
+    self.assertTrue(numpy.allclose(sec, self.sec, rtol=0, atol=1e-6))
+    ## a float mjd, or the fraction split in any way
+    year, doy, sec = bernutils.gpstime.mjd2ydoy_vec(mjd - 2, fmjd + 2)
+    self.assertTrue((year == self.year).all() and (doy == self.doy).all())
+    for i in range(0, len(mjd), 50):
+      dt = bernutils.gpstime.mjd2pydt(int(mjd[i]), float(fmjd[i]))
+      self.assertEqual((dt.year, dt.timetuple().tm_yday), (year[i], doy[i]))
+
+  def test_gps(self):
+    week, sow = bernutils.gpstime.ydoy2gps_vec(self.year, self.doy, self.sec)
+    for i, (y, d, s) in enumerate(self.epochs):
+      sweek, ssow = bernutils.gpstime.ydoy2gps(y, d, *hms(s))
+      self.assertEqual(week[i], sweek)
+      self.assertAlmostEqual(sow[i], ssow, 6)
+    mjd, fmjd = bernutils.gpstime.gps2mjd_vec(week, sow)
+    self.assertTrue((mjd == bernutils.gpstime.ydoy2mjd_vec(self.year, self.doy)[0]).all())
+    self.assertTrue(numpy.allclose(fmjd * 86400e0, self.sec, rtol=0, atol=1e-6))
+
+  def test_datetime64(self):
+    dt64 = bernutils.gpstime.ydoy2datetime64_vec(self.year, self.doy, self.sec)
+    for i, (y, d, s) in enumerate(self.epochs):
+      expected = datetime.datetime(y, 1, 1) + datetime.timedelta(days=d-1, seconds=s)
+      self.assertEqual(dt64[i].astype(datetime.datetime), expected)
+    mjd, fmjd = bernutils.gpstime.datetime642mjd_vec(dt64)
+    self.assertTrue((mjd == bernutils.gpstime.ydoy2mjd_vec(self.year, self.doy)[0]).all())
+    week, sow = bernutils.gpstime.ydoy2gps_vec(self.year, self.doy, self.sec)
+    self.assertTrue((bernutils.gpstime.gps2datetime64_vec(week, sow) == dt64).all())
+    self.assertEqual(bernutils.gpstime.gps2datetime64_vec([0], [0])[0].astype(datetime.datetime), GPS_EPOCH)
+
+if __name__ == '__main__':
+  unittest.main()
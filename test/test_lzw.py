@@ -0,0 +1,101 @@
+#! /usr/bin/python
+
+##  Regression tests for bernutils.lzw and the (Unix) compress wrappers of
+##+ bernutils.webutils.
+##
+##  usage: python -m pytest test/test_lzw.py   (or python test/test_lzw.py)
+
+import os
+import random
+import shutil
+import tempfile
+import unittest
+
+import bernutils.lzw
+import bernutils.webutils
+
+def sample_data(size, seed=0):
+  ''' Compressible (text-like) data of ``size`` bytes '''
+  rnd   = random.Random(seed)
+  words = [ 'G%02i' %i for i in range(1, 33) ] + [ '%14.3f' %rnd.uniform(-3e7, 3e7) for i in range(200) ]
+  out, n = [], 0
+  while n < size:
+    out.append(rnd.choice(words) + (' ' if rnd.random() < .9 else '\n'))
+    n += len(out[-1])
+  return ''.join(out)[0:size]
+
+class TestLzw(unittest.TestCase):
+
+  def test_roundtrip(self):
+    for size in (0, 1, 100, 100000):
+      data = sample_data(size, size)
+      self.assertEqual(bernutils.lzw.decompress(bernutils.lzw.compress(data)), data)
+
+  def test_roundtrip_maxbits(self):
+    ## small code tables, so that they fill up (and are reset)
+    data = sample_data(20000)
+    for maxbits in (10, 12):
+      self.assertEqual(bernutils.lzw.decompress(bernutils.lzw.compress(data, maxbits)), data)
+
+  def test_incremental(self):
+    data = sample_data(20000)
+    comp = bernutils.lzw.compress(data)
+    dec  = bernutils.lzw.LzwDecompressor()
+    out  = ''.join([ dec.decompress(comp[i:i+333]) for i in range(0, len(comp), 333) ]) + dec.flush()
+    self.assertEqual(out, data)
+
+  def test_invalid(self):
+    self.assertRaises(ValueError, bernutils.lzw.decompress, 'not a .Z file')
+
+class TestCompressFiles(unittest.TestCase):
+
+  def setUp(self):
+    self.tmpdir   = tempfile.mkdtemp()
+    self.data     = sample_data(20000)
+    self.programs = dict(bernutils.webutils.__PROGRAMS__)
+
+  def tearDown(self):
+    bernutils.webutils.__PROGRAMS__.clear()
+    bernutils.webutils.__PROGRAMS__.update(self.programs)
+    shutil.rmtree(self.tmpdir)
+
+  def roundtrip(self):
+    fn = os.path.join(self.tmpdir, 'ankr0010.15o')
+    with open(fn, 'wb') as fout:
+      fout.write(self.data)
+    zfile = bernutils.webutils.UnixCompress(fn)
+    self.assertEqual(zfile, fn + '.Z')
+    self.assertFalse(os.path.exists(fn))
+    with open(zfile, 'rb') as fin:
+      self.assertEqual(bernutils.lzw.decompress(fin.read()), self.data)
+    ## to a given output file (the input is kept)
+    out = bernutils.webutils.UnixUncompress(zfile, os.path.join(self.tmpdir, 'copy'))
+    with open(out, 'rb') as fin:
+      self.assertEqual(fin.read(), self.data)
+    self.assertTrue(os.path.exists(zfile))
+    ## in place
+    self.assertEqual(bernutils.webutils.UnixUncompress(zfile), fn)
+    self.assertFalse(os.path.exists(zfile))
+    with open(fn, 'rb') as fin:
+      self.assertEqual(fin.read(), self.data)
+
+  def test_roundtrip_system(self):
+    ## whatever programs are on PATH (the rest via bernutils.lzw)
+    self.roundtrip()
+
+  def test_roundtrip_in_process(self):
+    bernutils.webutils.__PROGRAMS__.update({'compress': None, 'uncompress': None})
+    self.roundtrip()
+
+  def test_invalid(self):
+    fn = os.path.join(self.tmpdir, 'bad.Z')
+    with open(fn, 'wb') as fout:
+      fout.write('\x1f\x9d\x90garbage')
+    for programs in (self.programs, {'compress': None, 'uncompress': None}):
+      bernutils.webutils.__PROGRAMS__.update(programs)
+      self.assertRaises(ValueError, bernutils.webutils.UnixUncompress, fn, fn + '.out')
+      self.assertFalse(os.path.exists(fn + '.out'))
+    self.assertRaises(ValueError, bernutils.webutils.UnixUncompress, fn + '.nofile')
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,218 @@
+#! /usr/bin/python
+
+##  Regression tests for bernutils.products.prodcache (no network access).
+##
+##  usage: python -m pytest test/test_prodcache.py   (or python test/test_prodcache.py)
+
+import os
+import json
+import multiprocessing
+import shutil
+import tempfile
+import unittest
+
+import bernutils.webutils
+import bernutils.products.prodcache
+from test.test_webutils import FakeFtp, FakeSession
+
+def store_many(cache_dir, tmpdir, tag, count):
+  ''' Store ``count`` (distinct) files in the cache; run in a child process. '''
+  cache = bernutils.products.prodcache.ProductCache(cache_dir)
+  for i in range(count):
+    fn = os.path.join(tmpdir, '%s%03i' %(tag, i))
+    with open(fn, 'w') as fout:
+      fout.write('%s %i' %(tag, i))
+    cache.store('ftp.%s' %tag, '/dir/', 'igs%05i.sp3.Z' %i, fn)
+
+class TestProductClass(unittest.TestCase):
+
+  def test_classes(self):
+    for filen, pclass in [('igs18250.sp3.Z', 'final'),
+      ('COD18250.EPH.Z', 'final'),
+      ('igr18250.sp3.Z', 'rapid'),
+      ('igu18250_00.sp3.Z', 'ultra-rapid'),
+      ('brdc0010.15n.Z', 'broadcast'),
+      ('brdc0010.15g.Z', 'broadcast'),
+      ('ankr001a.15n.Z', 'broadcast'),
+      ('P1C11501.DCB.Z', 'final'),
+      ('P1C1.DCB', 'running')]:
+      self.assertEqual(bernutils.products.prodcache.productClass(filen)[0], pclass, filen)
+
+  def test_broadcast_expires(self):
+    ## a (partial) current-day nav file must not be served forever
+    pclass, ttl = bernutils.products.prodcache.productClass('brdc0010.15n.Z')
+    self.assertTrue(ttl is not None and ttl <= 6*3600)
+
+class TestProductCache(unittest.TestCase):
+
+  def setUp(self):
+    self.tmpdir = tempfile.mkdtemp()
+    self.cache  = bernutils.products.prodcache.ProductCache(os.path.join(self.tmpdir, 'cache'))
+
+  def tearDown(self):
+    shutil.rmtree(self.tmpdir)
+
+  def local_file(self, name, data):
+    fn = os.path.join(self.tmpdir, name)
+    with open(fn, 'w') as fout:
+      fout.write(data)
+    return fn
+
+  def test_store_lookup_serve(self):
+    self.assertEqual(self.cache.lookup('ftp.host', '/dir/', 'igs18250.sp3.Z'), None)
+    self.cache.store('ftp.host', '/dir/', 'igs18250.sp3.Z', self.local_file('a', 'orbit'))
+    cached = self.cache.lookup('ftp.host', '/dir', 'igs18250.sp3.Z')
+    self.assertTrue(cached is not None)
+    saveas = self.cache.serve(cached, os.path.join(self.tmpdir, 'igs18250.sp3.Z'))
+    with open(saveas) as fin:
+      self.assertEqual(fin.read(), 'orbit')
+    stats = self.cache.stats()
+    self.assertEqual((stats['hits'], stats['misses'], stats['entries']), (1, 1, 1))
+
+  def test_served_file_rewritten_in_place(self):
+    ## e.g. a later download to the same local name truncates and re-writes
+    ## the served file; the cached object must not change
+    self.cache.store('ftp.host', '/dir/', 'igs18250.sp3.Z', self.local_file('a', 'AAAA'))
+    saveas = self.cache.serve(self.cache.lookup('ftp.host', '/dir/', 'igs18250.sp3.Z'),
+      os.path.join(self.tmpdir, 'igs18250.sp3.Z'))
+    with open(saveas, 'wb') as fout:
+      fout.write('BBBB')
+    cached = self.cache.lookup('ftp.host', '/dir/', 'igs18250.sp3.Z')
+    with open(cached) as fin:
+      self.assertEqual(fin.read(), 'AAAA')
+
+  def test_expired(self):
+    self.cache.store('ftp.host', '/dir/', 'brdc0010.15n.Z', self.local_file('a', 'nav'))
+    self.cache.store('ftp.host', '/dir/', 'igs18250.sp3.Z', self.local_file('b', 'orbit'))
+    ## age the entries by a day (the index is re-read on every lookup)
+    index_file = os.path.join(self.cache.cache_dir, 'index.json')
+    with open(index_file) as fin:
+      index = json.load(fin)
+    for entry in index.values():
+      entry['fetched'] -= 24*3600
+    with open(index_file, 'w') as fout:
+      json.dump(index, fout)
+    self.assertEqual(self.cache.lookup('ftp.host', '/dir/', 'brdc0010.15n.Z'), None)
+    self.assertTrue(self.cache.lookup('ftp.host', '/dir/', 'igs18250.sp3.Z') is not None)
+    self.assertEqual(self.cache.stats()['expired'], 1)
+
+  def test_content_addressed(self):
+    self.cache.store('ftp.a', '/dir/', 'igs18250.sp3.Z', self.local_file('a', 'orbit'))
+    self.cache.store('ftp.b', '/dir/', 'igs18250.sp3.Z', self.local_file('b', 'orbit'))
+    stats = self.cache.stats()
+    self.assertEqual((stats['entries'], stats['bytes']), (2, 5))
+
+  def test_evict_lru(self):
+    cache = bernutils.products.prodcache.ProductCache(os.path.join(self.tmpdir, 'small'), max_bytes=10)
+    cache.store('h', '/', 'igs18250.sp3.Z', self.local_file('a', 'x'*6))
+    cache.store('h', '/', 'igs18251.sp3.Z', self.local_file('b', 'y'*6))
+    self.assertEqual(cache.lookup('h', '/', 'igs18250.sp3.Z'), None)
+    self.assertTrue(cache.lookup('h', '/', 'igs18251.sp3.Z') is not None)
+
+  def test_hit_does_not_rewrite_index(self):
+    self.cache.store('h', '/', 'igs18250.sp3.Z', self.local_file('a', 'orbit'))
+    index_file = os.path.join(self.cache.cache_dir, 'index.json')
+    before = os.stat(index_file)
+    for i in range(10):
+      self.assertTrue(self.cache.lookup('h', '/', 'igs18250.sp3.Z') is not None)
+    after = os.stat(index_file)
+    self.assertEqual((before.st_ino, before.st_mtime), (after.st_ino, after.st_mtime))
+    ## the access time is written on flush
+    self.cache.flush()
+    with open(index_file) as fin:
+      entry = json.load(fin).values()[0]
+    self.assertTrue(entry['accessed'] > entry['fetched'])
+
+  def test_shared_between_processes(self):
+    cache_dir = self.cache.cache_dir
+    procs = [ multiprocessing.Process(target=store_many, args=(cache_dir, self.tmpdir, tag, 20))
+      for tag in ('a', 'b', 'c', 'd') ]
+    for p in procs: p.start()
+    for p in procs: p.join()
+    self.assertEqual([ p.exitcode for p in procs ], [0, 0, 0, 0])
+    ## no entry lost and no (referenced) object removed
+    for tag in ('a', 'b', 'c', 'd'):
+      for i in range(20):
+        cached = self.cache.lookup('ftp.%s' %tag, '/dir/', 'igs%05i.sp3.Z' %i)
+        self.assertTrue(cached is not None)
+        with open(cached) as fin:
+          self.assertEqual(fin.read(), '%s %i' %(tag, i))
+
+class BrokenCache(bernutils.products.prodcache.ProductCache):
+  ''' A cache whose (found) files vanish before they are served. '''
+  def serve(self, cached, saveas):
+    raise OSError('No such file or directory: %s' %cached)
+
+class TestPlan(unittest.TestCase):
+
+  files = {'/pub/igr18250.sp3.Z': 'rapid',
+    '/pub/igu18250_00.sp3.Z': 'ultra-rapid'}
+  options = [['igs18250.sp3.Z', 'fake.host', '/pub/'],
+    ['igr18250.sp3.Z', 'fake.host', '/pub/'],
+    ['igu18250_00.sp3.Z', 'fake.host', '/pub/']]
+
+  def setUp(self):
+    self.tmpdir = tempfile.mkdtemp()
+    self.pool   = bernutils.webutils.FtpSessionPool(max_idle=1e9, keepalive=None)
+    self.ftp    = FakeFtp(dict(self.files))
+    self.pool.release(FakeSession('fake.host', self.ftp))
+    self.saved  = bernutils.webutils.FTP_POOL, bernutils.products.prodcache.PRODUCT_CACHE
+    bernutils.webutils.FTP_POOL = self.pool
+    bernutils.products.prodcache.PRODUCT_CACHE = None
+
+  def tearDown(self):
+    bernutils.webutils.FTP_POOL, bernutils.products.prodcache.PRODUCT_CACHE = self.saved
+    shutil.rmtree(self.tmpdir)
+
+  def read(self, fn):
+    with open(fn) as fin:
+      return fin.read()
+
+  def test_plan(self):
+    plan = bernutils.products.prodcache.planDownload(self.options)
+    self.assertEqual([ p['status'] for p in plan ], ['missing', 'available', 'available'])
+    self.assertEqual([ p['size'] for p in plan ], [None, 5, 11])
+    self.assertTrue(all([ p['latency'] is not None for p in plan ]))
+    report = bernutils.products.prodcache.planReport(plan).splitlines()
+    self.assertEqual(len(report), 3)
+    self.assertTrue(' missing ' in report[0] and ' sec ' in report[0])
+
+  def test_grab_first_available(self):
+    saved, remote = bernutils.products.prodcache.grabFirstAvailable(self.options, self.tmpdir)
+    self.assertEqual(self.read(saved), 'rapid')
+    self.assertEqual(remote, 'fake.host/pub/igr18250.sp3.Z')
+
+  def test_none_available(self):
+    self.assertRaises(RuntimeError, bernutils.products.prodcache.grabFirstAvailable,
+      self.options[0:1] + [['igs18251.sp3.Z', 'fake.host', '/pub/']], self.tmpdir)
+
+  def test_cached(self):
+    cache = bernutils.products.prodcache.ProductCache(os.path.join(self.tmpdir, 'cache'))
+    bernutils.products.prodcache.PRODUCT_CACHE = cache
+    fn = os.path.join(self.tmpdir, 'u')
+    with open(fn, 'w') as fout: fout.write('cached ultra-rapid')
+    cache.store('fake.host', '/pub/', 'igu18250_00.sp3.Z', fn)
+    plan = bernutils.products.prodcache.planDownload(self.options)
+    self.assertEqual([ p['status'] for p in plan ], ['missing', 'available', 'cached'])
+    ## the preferred (rapid) file is downloaded, although the ultra-rapid is cached
+    saved, remote = bernutils.products.prodcache.grabFirstAvailable(self.options, self.tmpdir)
+    self.assertEqual(self.read(saved), 'rapid')
+
+  def test_cached_serve_fails(self):
+    ## the cached candidate is downloaded instead
+    cache = BrokenCache(os.path.join(self.tmpdir, 'cache'))
+    bernutils.products.prodcache.PRODUCT_CACHE = cache
+    fn = os.path.join(self.tmpdir, 'r')
+    with open(fn, 'w') as fout: fout.write('cached rapid')
+    cache.store('fake.host', '/pub/', 'igr18250.sp3.Z', fn)
+    plan = bernutils.products.prodcache.planDownload(self.options)
+    self.assertEqual([ p['status'] for p in plan ], ['unknown', 'cached', 'skipped'])
+    saved, remote = bernutils.products.prodcache.grabFirstAvailable(self.options, self.tmpdir)
+    self.assertEqual(self.read(saved), 'rapid')
+    ## ... or, if not on the host, the (skipped) less preferred candidates
+    del self.ftp.files['/pub/igr18250.sp3.Z']
+    saved, remote = bernutils.products.prodcache.grabFirstAvailable(self.options, self.tmpdir)
+    self.assertEqual(self.read(saved), 'ultra-rapid')
+
+if __name__ == '__main__':
+  unittest.main()
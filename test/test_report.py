@@ -0,0 +1,192 @@
+#! /usr/bin/python
+
+##  Regression tests for bernutils.report (all back-ends) and for the report
+##+ output of bin/adnq2html.py, on a (synthetic) ADDNEQ2 file made by
+##+ test/adnqgen.py.
+##
+##  usage: python -m pytest test/test_report.py   (or python test/test_report.py)
+
+import os
+import sys
+import csv
+import json
+import numpy
+import shutil
+import tempfile
+import unittest
+import cStringIO
+import subprocess
+
+import bernutils.report
+from test.adnqgen import station_list, make_addneq
+
+HEADER  = ['Station', 'Sys', 'dN']
+COLUMNS = [['AAAA', 'AAAA', 'BBBB'], ('G', 'R', 'G'), numpy.array([.001, .002, .003])]
+FORMATS = ['%s', '%s', '%.3f']
+
+def render(cls, **kwargs):
+  ''' Write the same (small) report with the back-end ``cls``; return the
+      output.
+  '''
+  buf = cStringIO.StringIO()
+  out = cls(buf, **kwargs)
+  out.begin('Title')
+  out.paragraph('Some text')
+  out.items(['one', 'two'])
+  out.alert('Station AAAA has dN = 0.0030')
+  out.begin_table(HEADER, 'A caption')
+  out.rows(COLUMNS, FORMATS, group=0, spans=(0,))
+  out.row(['Total', '0.006'], spans=[2, 1], style='font-weight:bold')
+  out.end_table()
+  out.table(HEADER, COLUMNS, FORMATS)
+  out.end()
+  out.close()
+  return buf.getvalue()
+
+class TestHtml(unittest.TestCase):
+
+  def test_report(self):
+    html = render(bernutils.report.HtmlReport)
+    self.assertTrue(html.startswith('<!DOCTYPE html>\n<html lang="en">\n<head>\n<title>Title</title>\n'))
+    self.assertTrue(html.endswith('</body>\n</html>\n'))
+    self.assertTrue('<p>Some text</p>\n<ul style="list-style-type:none">\n<li>one</li>\n<li>two</li>\n</ul>\n' in html)
+    self.assertTrue('<strong>Warning!</strong> Station AAAA has dN = 0.0030.</div>\n' in html)
+    self.assertTrue('\t\t<th>Station</th>\n\t\t<th>Sys</th>\n\t\t<th>dN</th>\n' in html)
+    ## grouped rows; the station cell spans the group
+    self.assertTrue('\t<tr><td rowspan="2">AAAA</td><td>G</td><td>0.001</td></tr>\n'
+      '\t<tr><td>R</td><td>0.002</td></tr>\n'
+      '\t<tr><td rowspan="1">BBBB</td><td>G</td><td>0.003</td></tr>\n'
+      '\t<tr style="font-weight:bold"><td colspan="2">Total</td><td>0.006</td></tr>\n'
+      '\t</tbody>\n\t<caption>A caption</caption>\n</table>\n' in html)
+    ## ungrouped rows; no caption
+    self.assertTrue('\t<tr><td>AAAA</td><td>G</td><td>0.001</td></tr>\n'
+      '\t<tr><td>AAAA</td><td>R</td><td>0.002</td></tr>\n'
+      '\t<tr><td>BBBB</td><td>G</td><td>0.003</td></tr>\n'
+      '\t</tbody>\n</table>\n</body>' in html)
+
+  def test_head(self):
+    buf = cStringIO.StringIO()
+    out = bernutils.report.HtmlReport(buf)
+    out.begin(head=bernutils.report.BOOTSTRAP_HEAD)
+    out.close()
+    self.assertTrue('\n'.join(bernutils.report.BOOTSTRAP_HEAD) + '\n</head>' in buf.getvalue())
+    self.assertFalse('<title>' in buf.getvalue())
+
+  def test_buffering(self):
+    ## the output does not depend on the buffer size; nothing is written
+    ## before the buffer fills
+    self.assertEqual(render(bernutils.report.HtmlReport, buffer_size=16), render(bernutils.report.HtmlReport))
+    buf = cStringIO.StringIO()
+    out = bernutils.report.HtmlReport(buf)
+    out.paragraph('x')
+    self.assertEqual(buf.getvalue(), '')
+    out.close()
+    self.assertEqual(buf.getvalue(), '<p>x</p>\n')
+    self.assertFalse(buf.closed)
+
+  def test_empty_rows(self):
+    buf = cStringIO.StringIO()
+    for cls in (bernutils.report.HtmlReport, bernutils.report.TextReport, bernutils.report.CsvReport):
+      out = cls(buf)
+      out.rows([[], []])
+      out.rows([])
+      out.close()
+    self.assertEqual(buf.getvalue(), '')
+
+class TestText(unittest.TestCase):
+
+  def test_report(self):
+    self.assertEqual(render(bernutils.report.TextReport),
+      'Title\nSome text\none\ntwo\n[WARNING] Station AAAA has dN = 0.0030\n'
+      'A caption\nStation Sys dN\nAAAA G 0.001\nAAAA R 0.002\nBBBB G 0.003\nTotal 0.006\n'
+      'Station Sys dN\nAAAA G 0.001\nAAAA R 0.002\nBBBB G 0.003\n')
+
+class TestCsv(unittest.TestCase):
+
+  def test_report(self):
+    text = render(bernutils.report.CsvReport)
+    self.assertEqual(list(csv.reader(cStringIO.StringIO(text))),
+      [['Some text'], ['one'], ['two'], ['WARNING', 'Station AAAA has dN = 0.0030'],
+      HEADER, ['AAAA', 'G', '0.001'], ['AAAA', 'R', '0.002'], ['BBBB', 'G', '0.003'], ['Total', '', '0.006'],
+      HEADER, ['AAAA', 'G', '0.001'], ['AAAA', 'R', '0.002'], ['BBBB', 'G', '0.003']])
+
+  def test_quoting(self):
+    ## padded cells are stripped, cells holding the delimiter are quoted
+    buf = cStringIO.StringIO()
+    out = bernutils.report.CsvReport(buf, delimiter=';')
+    out.table(['a', 'b'], [['x;y', 'z'], [1.5, 2.5]], ['%s', '%8.2f'])
+    out.close()
+    self.assertEqual(buf.getvalue(), 'a;b\n"x;y";1.50\nz;2.50\n')
+
+class TestJson(unittest.TestCase):
+
+  def test_report(self):
+    doc = json.loads(render(bernutils.report.JsonReport))
+    self.assertEqual(doc['title'], 'Title')
+    self.assertEqual([ s['type'] for s in doc['sections'] ], ['paragraph', 'items', 'alert', 'table', 'table'])
+    self.assertEqual(doc['sections'][1]['items'], ['one', 'two'])
+    self.assertEqual(doc['sections'][2]['text'], 'Station AAAA has dN = 0.0030')
+    table = doc['sections'][3]
+    self.assertEqual((table['header'], table['caption']), (HEADER, 'A caption'))
+    ## plain (not formated) values; spanning cells padded with null
+    self.assertEqual(table['rows'], [['AAAA', 'G', .001], ['AAAA', 'R', .002], ['BBBB', 'G', .003], ['Total', None, '0.006']])
+    self.assertEqual(doc['sections'][4]['caption'], None)
+
+  def test_empty(self):
+    buf = cStringIO.StringIO()
+    out = bernutils.report.JsonReport(buf)
+    out.begin()
+    out.table(HEADER, [[], [], []])
+    out.end()
+    out.close()
+    doc = json.loads(buf.getvalue())
+    self.assertEqual((doc['title'], doc['sections'][0]['rows']), (None, []))
+
+class TestAdnq2Html(unittest.TestCase):
+  ''' Run bin/adnq2html.py (in a subprocess) with every output format. '''
+
+  def setUp(self):
+    self.tmpdir = tempfile.mkdtemp()
+    self.filen  = os.path.join(self.tmpdir, 'FFG120540.OUT')
+    self.stations = station_list(12)
+    with open(self.filen, 'w') as fout:
+      fout.write(make_addneq(self.stations))
+
+  def tearDown(self):
+    shutil.rmtree(self.tmpdir)
+
+  def run_script(self, *args):
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env  = dict(os.environ)
+    env['PYTHONPATH'] = root + os.pathsep + env.get('PYTHONPATH', '')
+    proc = subprocess.Popen([sys.executable, os.path.join(root, 'bin', 'adnq2html.py')] + list(args),
+      stdout=subprocess.PIPE, stderr=subprocess.PIPE, env=env)
+    out, err = proc.communicate()
+    return proc.returncode, out, err
+
+  def test_formats(self):
+    outputs = {}
+    for fmt in ('html', 'json', 'csv'):
+      out = os.path.join(self.tmpdir, 'report.' + fmt)
+      status, stdout, stderr = self.run_script('-f', self.filen, '-t', 'dn,de,du', '-w', 'du=.002', '--format', fmt, '-o', out)
+      self.assertEqual((status, stdout), (0, ''), stderr)
+      with open(out) as fin:
+        outputs[fmt] = fin.read()
+    doc   = json.loads(outputs['json'])
+    table = [ s for s in doc['sections'] if s['type'] == 'table' ][0]
+    self.assertEqual(table['header'], ['Station', 'dNorth', 'dEast', 'dUp'])
+    self.assertEqual(sorted([ r[0] for r in table['rows'] ]), sorted([ s['name'] for s in self.stations ]))
+    alerts = [ s['text'] for s in doc['sections'] if s['type'] == 'alert' ]
+    self.assertTrue(len(alerts) > 0)
+    self.assertEqual(outputs['html'].count('<strong>Warning!</strong>'), len(alerts))
+    rows = list(csv.reader(cStringIO.StringIO(outputs['csv'])))
+    self.assertTrue(['Station', 'dNorth', 'dEast', 'dUp'] in rows)
+    self.assertEqual(len([ r for r in rows if r[0] == 'WARNING' ]), len(alerts))
+
+  def test_invalid_format(self):
+    status, stdout, stderr = self.run_script('-f', self.filen, '--format', 'xml')
+    self.assertEqual(status, 1)
+    self.assertTrue('Invalid output format' in stderr)
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,225 @@
+#! /usr/bin/python
+
+##  Regression tests for the sp3 modules of bernutils.products, on (synthetic)
+##+ sp3 files made by test/sp3gen.py (no network access).
+##
+##  usage: python -m pytest test/test_sp3.py   (or python test/test_sp3.py)
+
+import os
+import gzip
+import shutil
+import datetime
+import tempfile
+import unittest
+import numpy
+
+import bernutils.lzw
+import bernutils.products.pysp3
+import bernutils.products.pysp3_itp
+import bernutils.products.pysp3_mrg
+import bernutils.products.pysp3_splice
+from test.sp3gen import make_sp3, orbit, clock, SATS
+
+class Sp3TestCase(unittest.TestCase):
+
+  def setUp(self):
+    self.tmpdir = tempfile.mkdtemp()
+
+  def tearDown(self):
+    shutil.rmtree(self.tmpdir)
+
+  def write(self, filen, data, compression=None):
+    fn = os.path.join(self.tmpdir, filen)
+    if compression == 'Z':
+      data = bernutils.lzw.compress(data)
+    if compression == 'gz':
+      fout = gzip.open(fn, 'wb')
+      fout.write(data)
+      fout.close()
+    else:
+      with open(fn, 'wb') as fout:
+        fout.write(data)
+    return fn
+
+  def truth(self, epochs, sats):
+    ''' The (synthetic) records, as an array of shape (epochs, sats, 4) '''
+    return numpy.array([ [ orbit(sv, t) + (clock(sv, t),) for sv in sats ]
+      for t in epochs ])
+
+class TestSp3File(Sp3TestCase):
+
+  def test_read(self):
+    data = make_sp3(missing=[(3, 'G05')])
+    for compression in (None, 'Z', 'gz'):
+      sp3 = bernutils.products.pysp3.Sp3File(self.write('igs18260.sp3', data, compression))
+      self.assertEqual(sp3.data.shape, (96, len(SATS), 4))
+      self.assertEqual(sp3.satellites, SATS)
+      self.assertEqual(sp3.interval(), 900e0)
+      self.assertEqual(sp3.header['gps_week'], 1825)
+      self.assertEqual(sp3.header['num_of_epochs'], 96)
+      epochs = [ datetime.datetime(2015, 1, 1) + datetime.timedelta(seconds=900*i) for i in range(96) ]
+      self.assertEqual(sp3.epochs.astype(datetime.datetime).tolist(), epochs)
+      truth = self.truth(epochs, SATS)
+      ## the absent record is nan
+      self.assertTrue(numpy.isnan(sp3.satellite('G05')[3]).all())
+      truth[3, SATS.index('G05')] = numpy.nan
+      self.assertTrue(numpy.allclose(sp3.data, truth, atol=1e-6, equal_nan=True))
+      self.assertTrue(sp3.velocities is None)
+
+  def test_velocities(self):
+    sp3 = bernutils.products.pysp3.Sp3File(self.write('a.sp3', make_sp3(nepochs=4, velocities=True)))
+    self.assertEqual(sp3.velocities.shape, (4, len(SATS), 4))
+    self.assertTrue((sp3.velocities[:, :, 0:3] == [1e0, 2e0, 3e0]).all())
+
+  def test_satellite_ids(self):
+    ## a blank system identifier means GPS
+    data = make_sp3(nepochs=2, sats=['G01', 'G12'])
+    data = data.replace('G01', ' 01')
+    sp3 = bernutils.products.pysp3.Sp3File(self.write('a.sp3', data))
+    self.assertEqual(sp3.satellites, ['G01', 'G12'])
+    self.assertTrue(numpy.allclose(sp3.satellite('G 1'), sp3.data[:, 0, :]))
+    self.assertRaises(RuntimeError, sp3.satellite, 'R01')
+
+  def test_sp3d(self):
+    sats = [ 'G%02i' %i for i in range(1, 33) ] + [ 'E%02i' %i for i in range(1, 37) ] \
+      + [ 'C%02i' %i for i in range(1, 31) ]
+    sp3 = bernutils.products.pysp3.Sp3File(self.write('a.sp3', make_sp3(nepochs=3, sats=sats, version='d')))
+    self.assertEqual(sp3.satellites, sats)
+    self.assertEqual(sp3.header['version'], 'd')
+
+  def test_invalid(self):
+    self.assertRaises(RuntimeError, bernutils.products.pysp3.Sp3File, self.write('a.sp3', 'not an sp3 file\n'))
+    data = make_sp3(nepochs=2, sats=['G01'])
+    self.assertRaises(RuntimeError, bernutils.products.pysp3.Sp3File,
+      self.write('b.sp3', data.replace('PG01', 'PG02')))
+    self.assertRaises(RuntimeError, bernutils.products.pysp3.Sp3File,
+      self.write('c.sp3', data.split('*')[0]))
+
+class TestInterpolator(Sp3TestCase):
+
+  def setUp(self):
+    Sp3TestCase.setUp(self)
+    self.days = [ datetime.datetime(2015, 1, 1) + datetime.timedelta(days=d) for d in range(3) ]
+    ## daily files, each holding the next midnight too
+    self.files = [ self.write('igs%i.sp3' %i, make_sp3(start=d, nepochs=97, sats=SATS[0:8]))
+      for i, d in enumerate(self.days) ]
+
+  def test_concatenate(self):
+    epochs, sats, data = bernutils.products.pysp3_itp.concatenate(list(reversed(self.files)))
+    self.assertEqual(len(epochs), 3*96 + 1)
+    self.assertEqual(sats, SATS[0:8])
+    self.assertTrue((numpy.diff(epochs) == numpy.timedelta64(900, 's')).all())
+
+  def test_position(self):
+    itp = bernutils.products.pysp3_itp.Sp3Interpolator(self.files)
+    epochs = [ self.days[0] + datetime.timedelta(seconds=s) for s in range(0, 3*86400, 317) ]
+    pos = itp.position(epochs)
+    truth = self.truth(epochs, SATS[0:8])
+    ## order 9 on 15-min nodes of a 12 h orbit: below a cm (at the arc ends)
+    self.assertTrue(numpy.abs(pos - truth[:, :, 0:3]).max() < 1e-5)
+    ## at the nodes, the sp3 values (to the sp3 resolution)
+    pos = itp.position(self.days, ['G03', 'G01'])
+    self.assertTrue(numpy.abs(pos - self.truth(self.days, ['G03', 'G01'])[:, :, 0:3]).max() < 1e-6)
+
+  def test_clock(self):
+    itp = bernutils.products.pysp3_itp.Sp3Interpolator(self.files[0])
+    t = self.days[0] + datetime.timedelta(seconds=450)
+    clk = itp.clock(t, ['G02'])
+    self.assertAlmostEqual(clk[0, 0], (clock('G02', self.days[0]) + clock('G02', t + datetime.timedelta(seconds=450))) / 2e0, 6)
+    self.assertEqual(itp.interpolate([t, t], ['G02', 'G05']).shape, (2, 2, 4))
+
+  def test_outside_and_absent(self):
+    fn  = self.write('a.sp3', make_sp3(nepochs=48, sats=SATS[0:3], missing=[(20, 'G02')]))
+    itp = bernutils.products.pysp3_itp.Sp3Interpolator(fn)
+    t0  = datetime.datetime(2015, 1, 1)
+    pos = itp.position([t0 - datetime.timedelta(seconds=1), t0 + datetime.timedelta(hours=5, seconds=1),
+      t0 + datetime.timedelta(hours=11)])
+    self.assertTrue(numpy.isnan(pos[0]).all())
+    ## the window around epoch 20 includes the absent record
+    self.assertTrue(numpy.isnan(pos[1, 1]).all() and not numpy.isnan(pos[1, [0, 2]]).any())
+    self.assertFalse(numpy.isnan(pos[2]).any())
+    self.assertRaises(RuntimeError, itp.position, t0, ['R01'])
+    self.assertRaises(RuntimeError, bernutils.products.pysp3_itp.Sp3Interpolator, fn, 48)
+
+class TestMerge(Sp3TestCase):
+
+  def merge(self, files):
+    out = os.path.join(self.tmpdir, 'merged.sp3')
+    with open(out, 'w') as fout:
+      nepochs = bernutils.products.pysp3_mrg.merge(files, fout)
+    return nepochs, bernutils.products.pysp3.Sp3File(out)
+
+  def test_gps_glonass(self):
+    igs = self.write('igs.sp3', make_sp3(nepochs=8, sats=SATS[0:32]))
+    igl = self.write('igl.sp3', make_sp3(nepochs=8, sats=SATS[32:], agency='IGL'), 'Z')
+    out = os.path.join(self.tmpdir, 'merged.sp3')
+    bernutils.products.pysp3.merge_sp3_GR(igs, igl, out)
+    sp3 = bernutils.products.pysp3.Sp3File(out)
+    self.assertEqual(sp3.satellites, SATS)
+    self.assertEqual((sp3.header['file_type'], sp3.header['agency'], sp3.header['num_of_epochs']), ('M', 'MIX', 8))
+    self.assertTrue(numpy.allclose(sp3.data, self.truth(sp3.epochs.astype(datetime.datetime).tolist(), SATS), atol=1e-6))
+
+  def test_overlap(self):
+    ## G03 and G04 in both files; taken from the first one (where G03 is absent at epoch 30)
+    t0 = datetime.datetime(2015, 1, 1)
+    first  = self.write('a.sp3', make_sp3(nepochs=48, sats=SATS[0:4], missing=[(30, 'G03')]))
+    second = self.write('b.sp3', make_sp3(start=t0 + datetime.timedelta(hours=6), nepochs=48, sats=SATS[2:6]), 'gz')
+    nepochs, sp3 = self.merge([first, second])
+    self.assertEqual((nepochs, sp3.header['num_of_epochs'], len(sp3.epochs)), (72, 72, 72))
+    self.assertEqual(sp3.satellites, SATS[0:6])
+    self.assertTrue(numpy.isnan(sp3.satellite('G03')[30]).all())
+    self.assertFalse(numpy.isnan(sp3.satellite('G04')).any())
+    ## the records of each file, only within its span
+    self.assertTrue(numpy.isnan(sp3.satellite('G05')[0:24]).all())
+    self.assertTrue(numpy.isnan(sp3.satellite('G01')[48:]).all())
+
+  def test_many_satellites(self):
+    sats = [ 'E%02i' %i for i in range(1, 37) ] + [ 'C%02i' %i for i in range(1, 61) ]
+    files = [ self.write('%s.sp3' %s, make_sp3(nepochs=4, sats=[ sv for sv in sats if sv[0] == s ])) for s in 'EC' ]
+    nepochs, sp3 = self.merge(files)
+    self.assertEqual((sp3.header['version'], sp3.satellites), ('d', sats))
+
+  def test_incompatible(self):
+    a = self.write('a.sp3', make_sp3(nepochs=4, sats=SATS[0:2]))
+    b = self.write('b.sp3', make_sp3(nepochs=4, sats=SATS[2:4], interval=300))
+    self.assertRaises(RuntimeError, self.merge, [a, b])
+
+class TestSplice(Sp3TestCase):
+
+  def setUp(self):
+    Sp3TestCase.setUp(self)
+    self.days = [ datetime.datetime(2015, 1, 1) + datetime.timedelta(days=d) for d in range(3) ]
+    self.files = [ self.write('igs%i.sp3' %i, make_sp3(start=d, nepochs=97, sats=SATS[0:8]), 'Z')
+      for i, d in enumerate(self.days) ]
+
+  def splice(self, **kwargs):
+    out = os.path.join(self.tmpdir, 'spliced.sp3')
+    with open(out, 'w') as fout:
+      nepochs = bernutils.products.pysp3_splice.splice(list(reversed(self.files)), fout, **kwargs)
+    sp3 = bernutils.products.pysp3.Sp3File(out)
+    self.assertEqual((nepochs, sp3.header['num_of_epochs']), (len(sp3.epochs), len(sp3.epochs)))
+    return sp3
+
+  def test_native(self):
+    sp3 = self.splice()
+    self.assertEqual(len(sp3.epochs), 3*96 + 1)
+    self.assertTrue((numpy.diff(sp3.epochs) == numpy.timedelta64(900, 's')).all())
+    self.assertTrue(numpy.allclose(sp3.data, self.truth(sp3.epochs.astype(datetime.datetime).tolist(), SATS[0:8]), atol=1e-6))
+
+  def test_clip(self):
+    start = self.days[1] - datetime.timedelta(hours=2)
+    sp3 = self.splice(start=start, stop=self.days[2] + datetime.timedelta(hours=2))
+    self.assertEqual(len(sp3.epochs), 28*4 + 1)
+    self.assertEqual(sp3.epochs[0].astype(datetime.datetime), start)
+    self.assertEqual(sp3.header['start'].astype(datetime.datetime), start)
+    self.assertEqual((sp3.header['gps_week'], sp3.header['sow']), (1825, 5*86400e0 - 7200e0))
+
+  def test_resample(self):
+    sp3 = self.splice(interval=300, start=self.days[1], stop=self.days[2])
+    self.assertEqual((len(sp3.epochs), sp3.interval()), (289, 300e0))
+    truth = self.truth(sp3.epochs.astype(datetime.datetime).tolist(), SATS[0:8])
+    self.assertTrue(numpy.abs(sp3.data[:, :, 0:3] - truth[:, :, 0:3]).max() < 1e-5)
+    self.assertTrue(numpy.abs(sp3.data[:, :, 3] - truth[:, :, 3]).max() < 1e-5)
+
+if __name__ == '__main__':
+  unittest.main()
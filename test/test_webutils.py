@@ -0,0 +1,245 @@
+#! /usr/bin/python
+
+##  Regression tests for bernutils.webutils; no network access, the ftp
+##+ sessions are served by a fake (in-memory) ftp server.
+##
+##  usage: python -m pytest test/test_webutils.py   (or python test/test_webutils.py)
+
+import os
+import gzip
+import ftplib
+import time
+import shutil
+import tempfile
+import threading
+import unittest
+
+import bernutils.lzw
+import bernutils.webutils
+
+class FakeFtp:
+  ''' An in-memory ftp server, holding a dictionary ``{path: data}``. '''
+
+  def __init__(self, files, size=True):
+    self.files  = files
+    self.size_  = size
+    self.wd     = '/'
+    self.closed = False
+
+  def cwd(self, dirn):
+    dirn = '/' + dirn.strip('/')
+    if dirn != '/' and not any([ f.startswith(dirn + '/') for f in self.files ]):
+      raise ftplib.error_perm('550 No such file or directory.')
+    self.wd = dirn
+
+  def path(self, filen):
+    return os.path.join(self.wd, filen)
+
+  def retrbinary(self, cmd, callback, blocksize=8192):
+    data = self.files.get(self.path(cmd.split()[1]))
+    if data is None:
+      raise ftplib.error_perm('550 No such file or directory.')
+    for i in range(0, len(data), blocksize):
+      callback(data[i:i+blocksize])
+
+  def voidcmd(self, cmd):
+    return '200 OK'
+
+  def size(self, filen):
+    if not self.size_:
+      raise ftplib.error_perm('500 Unknown command.')
+    if self.path(filen) not in self.files:
+      raise ftplib.error_perm('550 No such file or directory.')
+    return len(self.files[self.path(filen)])
+
+  def nlst(self):
+    return [ f for f in self.files if os.path.dirname(f) == self.wd ]
+
+  def quit(self):
+    self.closed = True
+
+  def close(self):
+    self.closed = True
+
+class FakeSession(bernutils.webutils.FtpSession):
+  ''' A pool session over a :class:`FakeFtp` (no connection is made). '''
+
+  def __init__(self, host, ftp):
+    self.host, self.username, self.password, self.timeout = host, None, None, None
+    self.home      = '/'
+    self.ftp       = ftp
+    self.last_used = 0
+
+  def connect(self):
+    raise ftplib.error_temp('421 Cannot re-connect a fake session')
+
+class FtpTestCase(unittest.TestCase):
+  ''' Swap the process-wide ftp pool with a pool holding one fake session. '''
+
+  files = {}
+
+  def setUp(self):
+    self.tmpdir = tempfile.mkdtemp()
+    self.pool   = bernutils.webutils.FtpSessionPool(max_idle=1e9, keepalive=None)
+    self.ftp    = FakeFtp(dict(self.files))
+    self.pool.release(FakeSession('fake.host', self.ftp))
+    self.saved_pool, bernutils.webutils.FTP_POOL = bernutils.webutils.FTP_POOL, self.pool
+
+  def tearDown(self):
+    bernutils.webutils.FTP_POOL = self.saved_pool
+    shutil.rmtree(self.tmpdir)
+
+class TestFtpFetch(FtpTestCase):
+
+  files = {'/pub/a.txt': 'some data\n' * 100,
+    '/pub/a.txt.Z': bernutils.lzw.compress('some data\n' * 100),
+    '/pub/bad.Z': '\x1f\x9d\x90' + 'garbage' * 10}
+
+  def fetch(self, filen, decompress=None):
+    return bernutils.webutils.grabFtpFile('fake.host', '/pub/', filen,
+      os.path.join(self.tmpdir, filen), decompress=decompress)
+
+  def test_download(self):
+    saved = self.fetch('a.txt')[0][0]
+    with open(saved) as fin:
+      self.assertEqual(fin.read(), self.files['/pub/a.txt'])
+    self.assertEqual(self.pool.stats()['idle'], 1)
+
+  def test_decompress(self):
+    saved = self.fetch('a.txt.Z', 'auto')[0][0]
+    self.assertEqual(saved, os.path.join(self.tmpdir, 'a.txt'))
+    with open(saved) as fin:
+      self.assertEqual(fin.read(), self.files['/pub/a.txt'])
+
+  def test_missing_file_keeps_session(self):
+    self.assertRaises(RuntimeError, self.fetch, 'nofile.txt')
+    self.assertEqual(self.pool.stats()['idle'], 1)
+    self.assertFalse(self.ftp.closed)
+    self.assertFalse(os.path.exists(os.path.join(self.tmpdir, 'nofile.txt')))
+
+  def test_failed_transfer_discards_session(self):
+    ## a failure in the middle of RETR may leave an unread reply on the
+    ## control channel; the session must not go back to the pool
+    self.assertRaises(RuntimeError, self.fetch, 'bad.Z', 'Z')
+    self.assertEqual(self.pool.stats()['idle'], 0)
+    self.assertTrue(self.ftp.closed)
+    self.assertFalse(os.path.exists(os.path.join(self.tmpdir, 'bad')))
+
+class TestPool(unittest.TestCase):
+
+  def test_ping_keeps_max_per_key(self):
+    ## sessions released while ping checks the idle ones (outside the lock)
+    ## must not push the idle list past max_per_key
+    pool = bernutils.webutils.FtpSessionPool(max_idle=1e9, keepalive=None, max_per_key=2)
+    pinged, late = FakeFtp({}), [ FakeFtp({}) for i in range(2) ]
+    def noop(cmd):
+      for ftp in late:
+        pool.release(FakeSession('fake.host', ftp))
+      return '200 OK'
+    pinged.voidcmd = noop
+    pool.release(FakeSession('fake.host', pinged))
+    pool.ping()
+    self.assertEqual(pool.stats()['idle'], 2)
+    self.assertEqual(sorted([ f.closed for f in [pinged] + late ]), [False, False, True])
+
+class TestGrabFiles(unittest.TestCase):
+  ''' Run batches on a fake protocol (added to ``fetch_dict``), recording the
+      number of concurrent jobs per host.
+  '''
+
+  def setUp(self):
+    self.lock   = threading.Lock()
+    self.active = {}
+    self.peak   = {}
+    bernutils.webutils.fetch_dict['fake'] = self.fetch
+
+  def tearDown(self):
+    del bernutils.webutils.fetch_dict['fake']
+
+  def fetch(self, host, dirn, filen, saveas, opts, conns):
+    with self.lock:
+      self.active[host] = self.active.get(host, 0) + 1
+      self.peak[host] = max(self.peak.get(host, 0), self.active[host])
+    time.sleep(.01)
+    with self.lock:
+      self.active[host] -= 1
+    if filen == 'bad':
+      raise RuntimeError('cannot fetch %s' %filen)
+    return [saveas, host + os.path.join(dirn, filen)]
+
+  def test_per_host_bound(self):
+    jobs = [ ('fake', host, '/pub/', 'f%02i' %i, '/tmp/f%02i' %i) for i in range(12) for host in ('a.host', 'b.host') ]
+    res = bernutils.webutils.grabFiles(jobs, max_workers=8, max_per_host=2)
+    self.assertEqual(self.peak, {'a.host': 2, 'b.host': 2})
+    self.assertEqual([ r[2] for r in res ], [None] * len(jobs))
+    self.assertEqual([ r[0] for r in res ], [ j[4] for j in jobs ])
+
+  def test_failure_is_isolated(self):
+    jobs = [ ('fake', 'a.host', '/pub/', f, '/tmp/' + f) for f in ('f1', 'bad', 'f2', 'f3') ]
+    res = bernutils.webutils.grabFiles(jobs, max_workers=3)
+    self.assertEqual([ r[2] is None for r in res ], [True, False, True, True])
+    self.assertTrue('cannot fetch bad' in res[1][2])
+    self.assertEqual(res[3][0:2], ['/tmp/f3', 'a.host/pub/f3'])
+    self.assertRaises(RuntimeError, bernutils.webutils.__raise_on_failure__, res)
+
+class TestProbe(FtpTestCase):
+
+  files = {'/pub/2015/igr18250.sp3.Z': 'x' * 10,
+    '/pub/2015/igs18250.sp3.Z': 'y' * 20}
+
+  def probe(self, names):
+    jobs = [ ('ftp', 'fake.host', dirn, filen) for dirn, filen in names ]
+    return bernutils.webutils.probeFiles(jobs, max_workers=1)
+
+  def test_size(self):
+    res = self.probe([('/pub/2015/', 'igr18250.sp3.Z'), ('/pub/2015/', 'igu18250_00.sp3.Z'),
+      ('/pub/2099/', 'igr18250.sp3.Z')])
+    self.assertEqual([ r[1:3] for r in res ], [[True, 10], [False, None], [False, None]])
+    self.assertEqual([ r[4] for r in res ], [None, None, None])
+    self.assertTrue(all([ r[3] >= 0e0 for r in res ]))
+    self.assertEqual(self.pool.stats()['idle'], 1)
+
+  def test_nlst(self):
+    ## servers not supporting SIZE
+    self.ftp.size_ = False
+    res = self.probe([('/pub/2015/', 'igs18250.sp3.Z'), ('/pub/2015/', 'igu18250_00.sp3.Z')])
+    self.assertEqual([ r[1:3] for r in res ], [[True, None], [False, None]])
+
+  def test_unsupported(self):
+    res = bernutils.webutils.probeFiles([('ssh', 'fake.host', '/pub/', 'a')])
+    self.assertEqual(res[0][1], None)
+    self.assertTrue(res[0][4] is not None)
+
+class TestCompression(unittest.TestCase):
+
+  def test_method(self):
+    self.assertEqual(bernutils.webutils.compressionMethod('a.sp3.Z', 'auto'), 'Z')
+    self.assertEqual(bernutils.webutils.compressionMethod('a.sp3.gz', 'auto'), 'gz')
+    self.assertEqual(bernutils.webutils.compressionMethod('a.sp3', 'auto'), None)
+    self.assertEqual(bernutils.webutils.compressionMethod('a.sp3.Z', None), None)
+    self.assertRaises(RuntimeError, bernutils.webutils.compressionMethod, 'a', 'bz2')
+    self.assertEqual(bernutils.webutils.inflatedName('a.sp3.Z', 'Z'), 'a.sp3')
+
+  def test_inflating_writer_gzip_members(self):
+    tmpdir = tempfile.mkdtemp()
+    try:
+      fn = os.path.join(tmpdir, 'a.gz')
+      for part in ('first member\n', 'second member\n'):
+        fout = gzip.open(fn, 'ab')
+        fout.write(part)
+        fout.close()
+      with open(fn, 'rb') as fin:
+        data = fin.read()
+      out = os.path.join(tmpdir, 'a')
+      with open(out, 'wb') as fout:
+        writer = bernutils.webutils.InflatingWriter(fout, 'gz')
+        for i in range(0, len(data), 7):
+          writer.write(data[i:i+7])
+        writer.close()
+      with open(out) as fin:
+        self.assertEqual(fin.read(), 'first member\nsecond member\n')
+    finally:
+      shutil.rmtree(tmpdir)
+
+if __name__ == '__main__':
+  unittest.main()